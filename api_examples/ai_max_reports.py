@@ -12,13 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""This example gets AI Max performance reports."""
+"""This example gets AI Max performance reports.
+
+The "all" report type writes every report in one run: the reports are fetched
+concurrently with one client, the campaign details and landing page matches
+are read from a single query, and rows are written to their CSV files by a
+writer thread while the streams are still being read.
+"""
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import csv
 from datetime import datetime, timedelta
+import queue
 import sys
-from typing import List, TYPE_CHECKING
+import threading
+from typing import Any, Dict, List, TYPE_CHECKING
 
 from google.ads.googleads.errors import GoogleAdsException
 
@@ -52,16 +61,37 @@ def _write_to_csv(
   print(f"Report written to {file_path}")
 
 
-def get_campaign_details(client: "GoogleAdsClient", customer_id: str) -> None:
-  """Gets AI Max campaign details and writes them to a CSV file.
-
-  Args:
-      client: An initialized GoogleAdsClient instance.
-      customer_id: The client customer ID.
-  """
-  ga_service = client.get_service("GoogleAdsService")
-
-  query = """
+# Queue size of the "all" mode writer thread, in batches. When the CSV files
+# fall behind, the streams wait instead of buffering rows in memory.
+_WRITER_QUEUE_SIZE = 8
+
+_CAMPAIGN_DETAILS_PATH = "saved_csv/ai_max_campaign_details.csv"
+_CAMPAIGN_DETAILS_HEADERS = [
+    "Campaign ID",
+    "Campaign Name",
+    "Expanded Landing Page URL",
+    "AI Max Enabled",
+]
+_LANDING_PAGE_MATCHES_PATH = "saved_csv/ai_max_landing_page_matches.csv"
+_LANDING_PAGE_MATCHES_HEADERS = [
+    "Campaign ID",
+    "Campaign Name",
+    "Expanded Landing Page URL",
+]
+_SEARCH_TERMS_PATH = "saved_csv/ai_max_search_terms.csv"
+_SEARCH_TERMS_HEADERS = [
+    "Campaign ID",
+    "Campaign Name",
+    "Search Term",
+    "Impressions",
+    "Clicks",
+    "Cost (micros)",
+    "Conversions",
+]
+
+# The landing page matches query selects a prefix of the campaign details
+# fields over the same rows, so "all" mode reads both from this one query.
+_CAMPAIGN_DETAILS_QUERY = """
         SELECT
             campaign.id,
             campaign.name,
@@ -74,19 +104,180 @@ def get_campaign_details(client: "GoogleAdsClient", customer_id: str) -> None:
         ORDER BY
             campaign.id"""
 
-  response = ga_service.search_stream(customer_id=customer_id, query=query)
 
-  _write_to_csv(
-      "saved_csv/ai_max_campaign_details.csv",
-      [
-          "Campaign ID",
-          "Campaign Name",
-          "Expanded Landing Page URL",
-          "AI Max Enabled",
-      ],
-      response,
+def _get_search_terms_query() -> str:
+  """Returns the search terms query for the last 30 days."""
+  end_date = datetime.now()
+  start_date = end_date - timedelta(days=30)
+
+  return f"""
+        SELECT
+            campaign.id,
+            campaign.name,
+            ai_max_search_term_ad_combination_view.search_term,
+            metrics.impressions,
+            metrics.clicks,
+            metrics.cost_micros,
+            metrics.conversions
+        FROM
+            ai_max_search_term_ad_combination_view
+        WHERE
+            segments.date BETWEEN '{start_date.strftime("%Y-%m-%d")}' AND '{end_date.strftime("%Y-%m-%d")}'
+        ORDER BY
+            metrics.impressions DESC
+    """
+
+
+class _CsvWriterThread:
+  """Writes rows to several CSV files from one background thread.
+
+  Streams hand over each batch with put(), which only blocks while the
+  bounded queue is full, so reading a stream overlaps with writing the rows
+  of earlier batches.
+  """
+
+  def __init__(self, files: Dict[str, List[str]]):
+    """Opens the CSV files and starts the writer thread.
+
+    Args:
+        files: A dictionary mapping each file path to its headers.
+    """
+    self._files = {}
+    self._writers = {}
+    for file_path, headers in files.items():
+      self._files[file_path] = open(
+          file_path, "w", newline="", encoding="utf-8"
+      )
+      self._writers[file_path] = csv.writer(self._files[file_path])
+      self._writers[file_path].writerow(headers)
+    self._queue: queue.Queue = queue.Queue(maxsize=_WRITER_QUEUE_SIZE)
+    self._error = None
+    self._thread = threading.Thread(target=self._drain, daemon=True)
+    self._thread.start()
+
+  def put(self, file_path: str, rows: List[List[Any]]) -> None:
+    """Queues rows to be written to one of the files."""
+    if self._error:
+      raise self._error
+    self._queue.put((file_path, rows))
+
+  def close(self) -> None:
+    """Writes the remaining queued rows and closes every file."""
+    self._queue.put(None)
+    self._thread.join()
+    for csvfile in self._files.values():
+      csvfile.close()
+    if self._error:
+      raise self._error
+    for file_path in self._files:
+      print(f"Report written to {file_path}")
+
+  def _drain(self) -> None:
+    while True:
+      item = self._queue.get()
+      if item is None:
+        return
+      if self._error:
+        continue  # Keep draining so that put() never blocks forever.
+      file_path, rows = item
+      try:
+        self._writers[file_path].writerows(rows)
+      except Exception as ex:  # Raised to the streams by put() and close().
+        self._error = ex
+
+
+def _stream_landing_pages(
+    ga_service: Any, customer_id: str, writer: _CsvWriterThread
+) -> None:
+  """Streams the campaign details query into both landing page reports."""
+  stream = ga_service.search_stream(
+      customer_id=customer_id, query=_CAMPAIGN_DETAILS_QUERY
+  )
+  for batch in stream:
+    rows = [
+        [
+            row.campaign.id,
+            row.campaign.name,
+            row.expanded_landing_page_view.expanded_final_url,
+            row.campaign.ai_max_setting.enable_ai_max,
+        ]
+        for row in batch.results
+    ]
+    writer.put(_CAMPAIGN_DETAILS_PATH, rows)
+    writer.put(_LANDING_PAGE_MATCHES_PATH, [row[:3] for row in rows])
+
+
+def _stream_search_terms(
+    ga_service: Any, customer_id: str, writer: _CsvWriterThread
+) -> None:
+  """Streams the search terms query into its report."""
+  stream = ga_service.search_stream(
+      customer_id=customer_id, query=_get_search_terms_query()
+  )
+  for batch in stream:
+    writer.put(
+        _SEARCH_TERMS_PATH,
+        [
+            [
+                row.campaign.id,
+                row.campaign.name,
+                row.ai_max_search_term_ad_combination_view.search_term,
+                row.metrics.impressions,
+                row.metrics.clicks,
+                row.metrics.cost_micros,
+                row.metrics.conversions,
+            ]
+            for row in batch.results
+        ],
+    )
+
+
+def get_all_reports(client: "GoogleAdsClient", customer_id: str) -> None:
+  """Gets every AI Max report in one pass and writes each to its CSV file.
+
+  The landing page and search terms streams run concurrently, so the pass
+  takes about as long as the slower of the two.
+
+  Args:
+      client: An initialized GoogleAdsClient instance.
+      customer_id: The client customer ID.
+  """
+  ga_service = client.get_service("GoogleAdsService")
+
+  writer = _CsvWriterThread(
+      {
+          _CAMPAIGN_DETAILS_PATH: _CAMPAIGN_DETAILS_HEADERS,
+          _LANDING_PAGE_MATCHES_PATH: _LANDING_PAGE_MATCHES_HEADERS,
+          _SEARCH_TERMS_PATH: _SEARCH_TERMS_HEADERS,
+      }
+  )
+  try:
+    with ThreadPoolExecutor(max_workers=2) as executor:
+      futures = [
+          executor.submit(stream, ga_service, customer_id, writer)
+          for stream in (_stream_landing_pages, _stream_search_terms)
+      ]
+      for future in futures:
+        future.result()
+  finally:
+    writer.close()
+
+
+def get_campaign_details(client: "GoogleAdsClient", customer_id: str) -> None:
+  """Gets AI Max campaign details and writes them to a CSV file.
+
+  Args:
+      client: An initialized GoogleAdsClient instance.
+      customer_id: The client customer ID.
+  """
+  ga_service = client.get_service("GoogleAdsService")
+
+  response = ga_service.search_stream(
+      customer_id=customer_id, query=_CAMPAIGN_DETAILS_QUERY
   )
 
+  _write_to_csv(_CAMPAIGN_DETAILS_PATH, _CAMPAIGN_DETAILS_HEADERS, response)
+
 
 def get_landing_page_matches(
     client: "GoogleAdsClient", customer_id: str
@@ -114,9 +305,7 @@ def get_landing_page_matches(
   response = ga_service.search_stream(customer_id=customer_id, query=query)
 
   _write_to_csv(
-      "saved_csv/ai_max_landing_page_matches.csv",
-      ["Campaign ID", "Campaign Name", "Expanded Landing Page URL"],
-      response,
+      _LANDING_PAGE_MATCHES_PATH, _LANDING_PAGE_MATCHES_HEADERS, response
   )
 
 
@@ -129,42 +318,12 @@ def get_search_terms(client: "GoogleAdsClient", customer_id: str) -> None:
   """
   ga_service = client.get_service("GoogleAdsService")
 
-  end_date = datetime.now()
-  start_date = end_date - timedelta(days=30)
-
-  gaql_query = f"""
-        SELECT
-            campaign.id,
-            campaign.name,
-            ai_max_search_term_ad_combination_view.search_term,
-            metrics.impressions,
-            metrics.clicks,
-            metrics.cost_micros,
-            metrics.conversions
-        FROM
-            ai_max_search_term_ad_combination_view
-        WHERE
-            segments.date BETWEEN '{start_date.strftime("%Y-%m-%d")}' AND '{end_date.strftime("%Y-%m-%d")}'
-        ORDER BY
-            metrics.impressions DESC
-    """
-
-  stream = ga_service.search_stream(customer_id=customer_id, query=gaql_query)
-
-  _write_to_csv(
-      "saved_csv/ai_max_search_terms.csv",
-      [
-          "Campaign ID",
-          "Campaign Name",
-          "Search Term",
-          "Impressions",
-          "Clicks",
-          "Cost (micros)",
-          "Conversions",
-      ],
-      stream,
+  stream = ga_service.search_stream(
+      customer_id=customer_id, query=_get_search_terms_query()
   )
 
+  _write_to_csv(_SEARCH_TERMS_PATH, _SEARCH_TERMS_HEADERS, stream)
+
 
 def main(client: "GoogleAdsClient", customer_id: str, report_type: str) -> None:
   """The main method that creates all necessary entities for the example.
@@ -172,10 +331,12 @@ def main(client: "GoogleAdsClient", customer_id: str, report_type: str) -> None:
   Args:
       client: an initialized GoogleAdsClient instance.
       customer_id: a client customer ID.
-      report_type: the type of report to generate.
+      report_type: the type of report to generate, or "all".
   """
   try:
-    if report_type == "campaign_details":
+    if report_type == "all":
+      get_all_reports(client, customer_id)
+    elif report_type == "campaign_details":
       get_campaign_details(client, customer_id)
     elif report_type == "landing_page_matches":
       get_landing_page_matches(client, customer_id)
@@ -213,11 +374,18 @@ if __name__ == "__main__":
       "--report_type",
       type=str,
       required=True,
-      choices=["campaign_details", "landing_page_matches", "search_terms"],
-      help="The type of report to generate.",
+      choices=[
+          "all",
+          "campaign_details",
+          "landing_page_matches",
+          "search_terms",
+      ],
+      help="The type of report to generate, or all of them in one pass.",
   )
   args = parser.parse_args()
 
+  from google.ads.googleads.client import GoogleAdsClient
+
   # GoogleAdsClient will read the google-ads.yaml configuration file in the
   # home directory if none is specified.
   googleads_client = GoogleAdsClient.load_from_storage(version="v22")
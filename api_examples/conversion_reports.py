@@ -16,12 +16,29 @@
 
 import argparse
 import csv
+import operator
 import sys
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
+import proto
+
+# The columns of the conversion performance report, in output order, keyed
+# by the GAQL field they are read from.
+_PERFORMANCE_COLUMNS: List[Tuple[str, str]] = [
+    ("segments.date", "Date"),
+    ("segments.conversion_action_name", "Conversion Action Name"),
+    ("campaign.id", "Campaign ID"),
+    ("campaign.name", "Campaign Name"),
+    ("metrics.conversions", "Conversions"),
+    ("metrics.all_conversions", "All Conversions"),
+    ("metrics.conversions_value", "Conversions Value"),
+    ("metrics.all_conversions_value", "All Conversions Value"),
+    ("metrics.clicks", "Clicks"),
+    ("metrics.impressions", "Impressions"),
+]
 
 
 def handle_googleads_exception(exception: GoogleAdsException) -> None:
@@ -301,6 +318,18 @@ def get_conversion_performance_report(
 
     query = " ".join(query_parts)
 
+    # Resolve the output columns once, rather than checking every field for
+    # every row. A single attrgetter reads all of them from the raw protobuf
+    # row, which skips the proto-plus wrapper on each attribute access. There
+    # are always at least two columns, so it always returns a tuple.
+    columns = [
+        (field, header)
+        for field, header in _PERFORMANCE_COLUMNS
+        if field in all_select_fields
+    ]
+    headers = [header for _, header in columns]
+    read_row = operator.attrgetter(*[field for field, _ in columns])
+
     # --- Execute Query and Process Results ---
     try:
         stream = ga_service.search_stream(customer_id=customer_id, query=query)
@@ -308,33 +337,9 @@ def get_conversion_performance_report(
         results_data: List[Dict[str, Any]] = []
         for batch in stream:
             for row in batch.results:
-                row_data: Dict[str, Any] = {}
-                if "segments.date" in all_select_fields:
-                    row_data["Date"] = row.segments.date
-                if "segments.conversion_action_name" in all_select_fields:
-                    row_data["Conversion Action Name"] = (
-                        row.segments.conversion_action_name
-                    )
-                if "campaign.id" in all_select_fields:
-                    row_data["Campaign ID"] = row.campaign.id
-                if "campaign.name" in all_select_fields:
-                    row_data["Campaign Name"] = row.campaign.name
-                if "metrics.conversions" in all_select_fields:
-                    row_data["Conversions"] = row.metrics.conversions
-                if "metrics.all_conversions" in all_select_fields:
-                    row_data["All Conversions"] = row.metrics.all_conversions
-                if "metrics.conversions_value" in all_select_fields:
-                    row_data["Conversions Value"] = row.metrics.conversions_value
-                if "metrics.all_conversions_value" in all_select_fields:
-                    row_data["All Conversions Value"] = (
-                        row.metrics.all_conversions_value
-                    )
-                if "metrics.clicks" in all_select_fields:
-                    row_data["Clicks"] = row.metrics.clicks
-                if "metrics.impressions" in all_select_fields:
-                    row_data["Impressions"] = row.metrics.impressions
-
-                results_data.append(row_data)
+                if isinstance(row, proto.Message):
+                    row = type(row).pb(row)
+                results_data.append(dict(zip(headers, read_row(row))))
 
         _process_and_output_results(results_data, output_format, output_file)
 
@@ -14,22 +14,237 @@
 
 """This example gets geo targets.
 
+The geo target constants of all LOCATION criteria are resolved after the
+criteria are read. If prefetch_api_constants.py has stored the geo target
+constants, they are looked up there without any API calls. The remaining
+distinct criterion IDs are looked up in chunked IN (...) queries that run in
+parallel, and the results are kept in an LRU cache that can be persisted with
+--cache_file, since geo target constants rarely change.
+
 To get campaigns, run get_campaigns.py.
 """
 
 import argparse
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import json
+import os
 import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 
+# Number of geo target constants resolved per query, and the number of those
+# queries run at the same time.
+GEO_TARGET_CHUNK_SIZE = 500
+MAX_GEO_TARGET_WORKERS = 4
+
+# Number of geo target constants kept in the process-wide cache.
+GEO_TARGET_CACHE_SIZE = 10000
+
+UNKNOWN_GEO_TARGET = ("Unknown", "Unknown", "Unknown")
+
+
+class GeoTargetCache:
+    """A thread-safe LRU cache of geo target constant details by ID.
+
+    Values are (name, canonical_name, country_code) tuples.
+    """
+
+    def __init__(self, maxsize: int = GEO_TARGET_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "collections.OrderedDict[int, Tuple[str, str, str]]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, criterion_id: int) -> Optional[Tuple[str, str, str]]:
+        """Returns the cached details of a geo target, or None."""
+        with self._lock:
+            value = self._entries.get(criterion_id)
+            if value is not None:
+                self._entries.move_to_end(criterion_id)
+            return value
+
+    def put(self, criterion_id: int, value: Tuple[str, str, str]) -> None:
+        """Caches the details of a geo target, evicting the least recent."""
+        with self._lock:
+            self._entries[criterion_id] = value
+            self._entries.move_to_end(criterion_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def load(self, path: str) -> None:
+        """Adds the entries saved in a JSON file, if it exists."""
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            for criterion_id, value in json.load(f).items():
+                self.put(int(criterion_id), tuple(value))
 
-def main(client: "GoogleAdsClient", customer_id: str) -> None:
+    def save(self, path: str) -> None:
+        """Saves the cached entries to a JSON file."""
+        with self._lock:
+            entries = {str(key): value for key, value in self._entries.items()}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+
+
+# Shared by every call in this process.
+_geo_target_cache = GeoTargetCache()
+
+GEO_TARGET_TABLE = "geo_target_constant"
+
+
+@functools.lru_cache(maxsize=None)
+def _default_constant_store() -> Optional[Any]:
+    """Returns the prefetch_api_constants.py store if it has geo targets.
+
+    The store is opened once per process. Returns None if there is no store
+    for this API version or it has no geo target constants.
+    """
+    # prefetch_api_constants.py sits next to this script.
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from prefetch_api_constants import ConstantStore, default_store_path
+
+    path = default_store_path()
+    if not os.path.exists(path):
+        return None
+    store = ConstantStore(path)
+    if GEO_TARGET_TABLE not in store.tables():
+        store.close()
+        return None
+    return store
+
+
+def _fetch_geo_target_chunk(
+    ga_service: Any, customer_id: str, criterion_ids: List[int]
+) -> Dict[int, Tuple[str, str, str]]:
+    """Looks up one chunk of geo target constants with a single query."""
+    resource_names = ", ".join(
+        f"'geoTargetConstants/{criterion_id}'" for criterion_id in criterion_ids
+    )
+    query = f"""
+        SELECT
+            geo_target_constant.id,
+            geo_target_constant.name,
+            geo_target_constant.canonical_name,
+            geo_target_constant.country_code
+        FROM
+            geo_target_constant
+        WHERE
+            geo_target_constant.resource_name IN ({resource_names})"""
+
+    geo_targets = {}
+    response = ga_service.search_stream(customer_id=customer_id, query=query)
+    for batch in response:
+        for row in batch.results:
+            geo_target_constant = row.geo_target_constant
+            geo_targets[geo_target_constant.id] = (
+                geo_target_constant.name,
+                geo_target_constant.canonical_name,
+                geo_target_constant.country_code,
+            )
+    return geo_targets
+
+
+def resolve_geo_targets(
+    ga_service: Any,
+    customer_id: str,
+    criterion_ids: Iterable[int],
+    cache: Optional[GeoTargetCache] = None,
+    chunk_size: int = GEO_TARGET_CHUNK_SIZE,
+    max_workers: int = MAX_GEO_TARGET_WORKERS,
+    constant_store: Optional[Any] = None,
+) -> Dict[int, Tuple[str, str, str]]:
+    """Returns the details of the geo target constants with the given IDs.
+
+    IDs found in the cache or in the prefetched constant store are not
+    queried. The rest are resolved in chunks of chunk_size with an IN (...)
+    query each, run in parallel. If a chunk fails, the error is printed and
+    its IDs are left out.
+
+    Args:
+        ga_service: the GoogleAdsService client.
+        customer_id: a client customer ID.
+        criterion_ids: the criterion IDs of LOCATION criteria.
+        cache: the cache to use. Defaults to the process-wide cache.
+        chunk_size: the number of IDs resolved per query.
+        max_workers: the number of queries run at the same time.
+        constant_store: a prefetch_api_constants.ConstantStore with geo
+            target constants. Defaults to the store prefetch_api_constants.py
+            writes for this API version, if there is one.
+
+    Returns:
+        A dictionary mapping criterion IDs to (name, canonical_name,
+        country_code) tuples.
+    """
+    cache = _geo_target_cache if cache is None else cache
+    if constant_store is None:
+        constant_store = _default_constant_store()
+    elif GEO_TARGET_TABLE not in constant_store.tables():
+        constant_store = None
+    geo_targets = {}
+    missing = []
+    for criterion_id in dict.fromkeys(criterion_ids):
+        cached = cache.get(criterion_id)
+        if cached is None and constant_store is not None:
+            constant = constant_store.get(GEO_TARGET_TABLE, criterion_id)
+            if constant is not None:
+                cached = (
+                    constant["name"],
+                    constant["canonical_name"],
+                    constant["country_code"],
+                )
+        if cached is None:
+            missing.append(criterion_id)
+        else:
+            geo_targets[criterion_id] = cached
+
+    chunks = [
+        missing[i : i + chunk_size] for i in range(0, len(missing), chunk_size)
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_fetch_geo_target_chunk, ga_service, customer_id, chunk)
+            for chunk in chunks
+        ]
+        for chunk, future in zip(chunks, futures):
+            try:
+                chunk_geo_targets = future.result()
+            except GoogleAdsException as geo_ex:
+                resource_names = ", ".join(
+                    f"geoTargetConstants/{criterion_id}" for criterion_id in chunk
+                )
+                print(
+                    f"Error retrieving geo target details for {resource_names}: "
+                    f"{geo_ex.failure.errors[0].message}"
+                )
+                continue
+            for criterion_id, value in chunk_geo_targets.items():
+                cache.put(criterion_id, value)
+                geo_targets[criterion_id] = value
+    return geo_targets
+
+
+def main(
+    client: "GoogleAdsClient", customer_id: str, cache_file: Optional[str] = None
+) -> None:
     """The main method that creates all necessary entities for the example.
 
     Args:
         client: an initialized GoogleAdsClient instance.
         customer_id: a client customer ID.
+        cache_file: an optional JSON file the geo target cache is loaded from
+            and saved to.
     """
     ga_service = client.get_service("GoogleAdsService")
 
@@ -44,57 +259,30 @@ def main(client: "GoogleAdsClient", customer_id: str) -> None:
         WHERE
             campaign_criterion.type = 'LOCATION'"""
 
+    if cache_file:
+        _geo_target_cache.load(cache_file)
+
     try:
         response = ga_service.search_stream(customer_id=customer_id, query=query)
         print("Geo targets found:")
-        for batch in response:
-            for row in batch.results:
-                campaign = row.campaign
-                campaign_criterion = row.campaign_criterion
-                criterion_id = campaign_criterion.criterion_id
-
-                geo_target_constant_resource_name = f"geoTargetConstants/{criterion_id}"
-
-                # Query the geo_target_constant resource to get its name
-                geo_target_query = f"""
-                    SELECT
-                        geo_target_constant.name,
-                        geo_target_constant.canonical_name,
-                        geo_target_constant.country_code
-                    FROM
-                        geo_target_constant
-                    WHERE
-                        geo_target_constant.resource_name = '{geo_target_constant_resource_name}'"""
-
-                geo_target_name = "Unknown"
-                geo_target_canonical_name = "Unknown"
-                geo_target_country_code = "Unknown"
-
-                try:
-                    geo_target_response = ga_service.search_stream(
-                        customer_id=customer_id, query=geo_target_query
-                    )
-                    for geo_batch in geo_target_response:
-                        for geo_row in geo_batch.results:
-                            geo_target_name = geo_row.geo_target_constant.name
-                            geo_target_canonical_name = (
-                                geo_row.geo_target_constant.canonical_name
-                            )
-                            geo_target_country_code = (
-                                geo_row.geo_target_constant.country_code
-                            )
-                            break  # Assuming only one result for a given resource name
-                        if geo_target_name != "Unknown":
-                            break
-                except GoogleAdsException as geo_ex:
-                    print(
-                                                    f"Error retrieving geo target details for {geo_target_constant_resource_name}: {geo_ex.failure.errors[0].message}"
-                        
-                    )
+        rows = [row for batch in response for row in batch.results]
+        geo_targets = resolve_geo_targets(
+            ga_service,
+            customer_id,
+            [row.campaign_criterion.criterion_id for row in rows],
+        )
+        for row in rows:
+            campaign = row.campaign
+            campaign_criterion = row.campaign_criterion
+            (
+                geo_target_name,
+                geo_target_canonical_name,
+                geo_target_country_code,
+            ) = geo_targets.get(campaign_criterion.criterion_id, UNKNOWN_GEO_TARGET)
 
-                print(
-                    f"Campaign with ID {campaign.id}, name '{campaign.name}' has geo target '{geo_target_name}' (Canonical Name: '{geo_target_canonical_name}', Country Code: '{geo_target_country_code}', Negative: {campaign_criterion.negative})"
-                )
+            print(
+                f"Campaign with ID {campaign.id}, name '{campaign.name}' has geo target '{geo_target_name}' (Canonical Name: '{geo_target_canonical_name}', Country Code: '{geo_target_country_code}', Negative: {campaign_criterion.negative})"
+            )
     except GoogleAdsException as ex:
         print(
             f'Request with ID "{ex.request_id}" failed with status "{ex.error.code.name}" and includes the following errors:'
@@ -106,6 +294,9 @@ def main(client: "GoogleAdsClient", customer_id: str) -> None:
                     print(f"\t\tOn field: {field_path_element.field_name}")
         sys.exit(1)
 
+    if cache_file:
+        _geo_target_cache.save(cache_file)
+
 
 if __name__ == "__main__":
     # GoogleAdsClient will read the google-ads.yaml configuration file in the
@@ -123,6 +314,14 @@ if __name__ == "__main__":
         required=True,
         help="The Google Ads customer ID.",
     )
+    parser.add_argument(
+        "--cache_file",
+        type=str,
+        help=(
+            "A JSON file to load resolved geo target constants from and save "
+            "them to, so later runs do not query them again."
+        ),
+    )
     args = parser.parse_args()
 
-    main(google_ads_client, args.customer_id)
+    main(google_ads_client, args.customer_id, args.cache_file)
@@ -12,20 +12,136 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""This example downloads multiple reports in parallel."""
+"""This example downloads multiple reports in parallel.
+
+Two engines are available. The default "threads" engine runs each report
+stream on a worker thread. The "asyncio" engine uses the async gRPC transport
+and runs every stream on a single event loop, so concurrency is bounded by a
+semaphore rather than by the number of OS threads.
+
+By default all rows are kept in memory and a sample is printed. With
+--output_dir, each report is instead streamed to a CSV, JSONL or Parquet file
+through a bounded queue, so memory use depends on the batch size rather than
+on the size of the report. Adding --decode_workers moves the decoding and
+flattening of those batches to a process pool, so that it is not bound by
+the GIL of the process reading the streams.
+
+With --channels, reports lease their GoogleAdsService from a fixed pool of
+gRPC channels rather than opening a new channel and connection each, and the
+utilization of every channel is printed at the end of the run.
+
+With --metrics, the latency, time to first batch and throughput of every
+stream attempt are written to a JSONL file (or a SQLite database for .db
+paths), and p50/p95/p99 latencies per report and per customer are printed.
+
+Instead of (or as well as) listing --customer_ids, pass --manager_customer_id
+to run the reports for every client account under a manager. The
+customer_client hierarchy is walked level by level, querying the managers of
+each level concurrently, and the tree is cached for a day.
+
+With --engine asyncio and --hedge_percentile, a stream whose first batch is
+later than that percentile of the run's first-batch times is sent a second
+time, and the copy that answers first is kept. Hedges are capped at
+--max_hedge_ratio of all streams and counted in the --metrics output.
+
+With --job_history, the duration of every (customer, report) job is remembered
+across runs and jobs are started longest first, so the largest reports no
+longer start last and stretch the total run time.
+
+With --fuse_queries, reports of a customer that differ only in the fields they
+select are run as a single query, and the rows are split back into one output
+per report.
+
+The sinks, channel pool, manifest, metrics, hedging, discovery and fusion used
+here live in the report_downloader package next to this script.
+"""
 
 import argparse
-from concurrent.futures import as_completed, ThreadPoolExecutor
+import asyncio
+import contextlib
+from concurrent.futures import (
+    as_completed,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+import functools
+import inspect
+import os
+import sys
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 
+# The report_downloader package sits next to this script.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from report_downloader import (
+    CHANNEL_KEEPALIVE_MS,
+    DISCOVERY_CACHE_PATH,
+    HEDGE_HISTORY_SIZE,
+    MAX_ADAPTIVE_LIMIT,
+    MAX_HEDGE_RATIO,
+    MAX_STREAMS_PER_CHANNEL,
+    OUTPUT_FORMATS,
+    AdaptiveConcurrencyController,
+    BoundedSinkWriter,
+    HedgingPolicy,
+    JobDurationHistory,
+    MetricsRecorder,
+    RateLimitError,
+    ReportSink,
+    RunManifest,
+    ServicePool,
+    SqliteMetricsRecorder,
+    StreamTimer,
+    acquire_rate_limit,
+    build_job_sink_factory,
+    fetch_async_with_manifest,
+    fetch_with_manifest,
+    filter_client_accounts,
+    fuse_jobs,
+    fused_sink_factory,
+    hedged_stream,
+    is_quota_error,
+    load_client_accounts,
+    make_sink,
+    merge_sharded_results,
+    open_metrics_recorder,
+    order_jobs_longest_first,
+    plan_date_shards,
+    print_google_ads_exception,
+    print_metrics_summary,
+    split_fused_results,
+    take_hedge_slot,
+)
+
 # Maximum number of worker threads to use for parallel downloads.
 # Adjust this based on your system's capabilities and network conditions.
 MAX_WORKERS = 5
 
+# Maximum number of concurrent streams for the asyncio engine. Streams share
+# one event loop and one channel, so this can be much higher than MAX_WORKERS.
+MAX_ASYNC_STREAMS = 100
+
+ENGINES = ("threads", "asyncio")
+
+# Number of times a report is retried after a quota error before giving up.
+MAX_QUOTA_RETRIES = 3
+
+# Number of days covered by each shard when a report's date range is split
+# into sub-queries with --shard_by.
+SHARD_SIZES = {"day": 1, "week": 7}
+
 
 def _get_date_range_strings() -> Tuple[str, str]:
     """Calculates and returns the start and end date strings for reports.
@@ -40,7 +156,16 @@ def _get_date_range_strings() -> Tuple[str, str]:
 
 
 def fetch_report_threaded(
-    client: GoogleAdsClient, customer_id: str, query: str, report_name: str
+    client: GoogleAdsClient,
+    customer_id: str,
+    query: str,
+    report_name: str,
+    sink: Optional[ReportSink] = None,
+    service_pool: Optional[ServicePool] = None,
+    metrics: Optional[MetricsRecorder] = None,
+    attempt: int = 0,
+    rate_limiter: Optional[Any] = None,
+    on_start: Optional[Callable[[], None]] = None,
 ) -> Tuple[str, Optional[List[Any]], Optional[GoogleAdsException]]:
     """Fetches a single Google Ads API report in a separate thread.
 
@@ -49,54 +174,377 @@ def fetch_report_threaded(
         customer_id: The ID of the customer to retrieve data for.
         query: The GAQL query for the report.
         report_name: A descriptive name for the report.
+        sink: An optional sink. When given, batches are streamed to it through
+            a bounded queue instead of being collected in memory.
+        service_pool: An optional pool to lease the GoogleAdsService from,
+            instead of opening a new channel for this report.
+        metrics: An optional recorder for the timings of the stream.
+        attempt: The number of earlier attempts at this report, for metrics.
+        rate_limiter: An optional limiter, e.g. one shared with other
+            processes on the host. Its acquire() is called before the stream
+            is opened and blocks until the request may be sent. If it raises,
+            the report fails with a RateLimitError.
+        on_start: An optional callable that is called when the fetch starts,
+            i.e. once the report holds its concurrency slot.
 
     Returns:
         A tuple containing:
         - report_name (str): The name of the report.
-        - rows (List[Any] | None): A list of GoogleAdsRow objects if successful, None otherwise.
-        - exception (GoogleAdsException | None): The exception if an error occurred, None otherwise.
+        - rows (List[Any] | None): A list of GoogleAdsRow objects, or None when a sink is used.
+        - exception (Exception | None): The exception if an error occurred, None otherwise.
+          Errors other than GoogleAdsException and RateLimitError, e.g. from
+          the sink, are printed and returned too, so only this report fails.
     """
-    googleads_service = client.get_service("GoogleAdsService")
+    if on_start:
+        on_start()
+    if service_pool:
+        lease = service_pool.lease()
+    else:
+        lease = contextlib.nullcontext(client.get_service("GoogleAdsService"))
     print(f"[{report_name}] Starting report fetch for customer {customer_id}...")
     rows = []
     exception = None
+    writer = None
+    timer = None
     try:
-        stream = googleads_service.search_stream(customer_id=customer_id, query=query)
-        for batch in stream:
-            for row in batch.results:
-                rows.append(row)
-        print(f"[{report_name}] Finished report fetch. Found {len(rows)} rows.")
+        try:
+            if rate_limiter:
+                acquire_rate_limit(rate_limiter)
+            if metrics:
+                timer = StreamTimer(metrics, report_name, customer_id, attempt)
+            if sink:
+                writer = BoundedSinkWriter(sink, decode_pool=sink.decode_pool)
+            with lease as googleads_service:
+                stream = googleads_service.search_stream(
+                    customer_id=customer_id, query=query
+                )
+                if timer:
+                    stream = timer.wrap(stream)
+                for batch in stream:
+                    if writer:
+                        writer.put(batch)
+                    else:
+                        for row in batch.results:
+                            rows.append(row)
+        finally:
+            if writer:
+                writer.close()
     except GoogleAdsException as ex:
+        print_google_ads_exception(report_name, ex)
+        exception = ex
+    except RateLimitError as ex:
+        print(f"[{report_name}] Not sent: {ex}")
+        exception = ex
+    except Exception as ex:
+        print(f"[{report_name}] Report fetch failed: {ex!r}")
+        exception = ex
+    except BaseException as ex:
+        exception = ex
+        raise
+    finally:
+        if timer:
+            timer.finish(exception, writer)
+    if not exception:
+        row_count = sink.rows_written if sink else len(rows)
+        print(f"[{report_name}] Finished report fetch. Found {row_count} rows.")
+    return report_name, None if sink else rows, exception
+
+
+async def fetch_report_async(
+    googleads_service: Any,
+    customer_id: str,
+    query: str,
+    report_name: str,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    sink: Optional[ReportSink] = None,
+    service_pool: Optional[ServicePool] = None,
+    metrics: Optional[MetricsRecorder] = None,
+    attempt: int = 0,
+    rate_limiter: Optional[Any] = None,
+    hedging: Optional[HedgingPolicy] = None,
+    on_start: Optional[Callable[[], None]] = None,
+    controller: Optional[AdaptiveConcurrencyController] = None,
+    sink_executor: Optional[Executor] = None,
+    limiter_executor: Optional[Executor] = None,
+) -> Tuple[str, Optional[List[Any]], Optional[GoogleAdsException]]:
+    """Fetches a single Google Ads API report on the running event loop.
+
+    Args:
+        googleads_service: An async GoogleAdsService client, as returned by
+            client.get_service("GoogleAdsService", is_async=True). Ignored
+            when a service_pool is given.
+        customer_id: The ID of the customer to retrieve data for.
+        query: The GAQL query for the report.
+        report_name: A descriptive name for the report.
+        semaphore: Bounds the number of streams open at the same time. May be
+            omitted when the caller already limits concurrency.
+        sink: An optional sink, as for fetch_report_threaded. Sink writes run
+            on a writer thread, and handing batches to it runs on
+            sink_executor, so they never block the event loop.
+        service_pool: An optional pool of async services to lease from.
+        metrics: An optional recorder for the timings of the stream.
+        attempt: The number of earlier attempts at this report, for metrics.
+        rate_limiter: An optional limiter, as for fetch_report_threaded. Its
+            blocking acquire() runs on limiter_executor.
+        hedging: An optional policy that sends a duplicate request when the
+            first batch of the stream is late. The hedge takes a slot of its
+            own from the semaphore or controller, and a channel from the
+            service_pool, and is not sent if none is free.
+        on_start: An optional callable that is called once the semaphore is
+            acquired.
+        controller: The adaptive controller that granted this report its
+            slot, if any; only used to take slots for hedges.
+        sink_executor: The executor that hands batches to the sink writer.
+            Defaults to the event loop's default executor.
+        limiter_executor: The executor rate_limiter.acquire() runs on, so
+            that a slow limiter cannot hold up other work. Defaults to the
+            event loop's default executor.
+
+    Returns:
+        The same (report_name, rows, exception) tuple as fetch_report_threaded.
+    """
+    loop = asyncio.get_running_loop()
+    async with semaphore or contextlib.nullcontext():
+        if on_start:
+            on_start()
+        print(f"[{report_name}] Starting report fetch for customer {customer_id}...")
+        rows = []
+        exception = None
+        writer = None
+        if service_pool:
+            lease = service_pool.lease(block=False)
+        else:
+            lease = contextlib.nullcontext(googleads_service)
+        timer = None
+        try:
+            try:
+                if rate_limiter:
+                    await loop.run_in_executor(
+                        limiter_executor, acquire_rate_limit, rate_limiter
+                    )
+                if metrics:
+                    timer = StreamTimer(metrics, report_name, customer_id, attempt)
+                if sink:
+                    writer = BoundedSinkWriter(sink, decode_pool=sink.decode_pool)
+                with lease as leased_service:
+                    if hedging:
+                        stream, hedged, hedge_won = await hedged_stream(
+                            leased_service,
+                            customer_id,
+                            query,
+                            report_name,
+                            hedging,
+                            rate_limiter,
+                            functools.partial(
+                                take_hedge_slot,
+                                leased_service,
+                                semaphore,
+                                controller,
+                                service_pool,
+                            ),
+                            limiter_executor,
+                        )
+                        if timer:
+                            timer.entry["hedged"] = int(hedged)
+                            timer.entry["hedge_won"] = int(hedge_won)
+                    else:
+                        stream = leased_service.search_stream(
+                            customer_id=customer_id, query=query
+                        )
+                        # The async client returns an awaitable that resolves to
+                        # the stream call, which is then iterated asynchronously.
+                        if inspect.isawaitable(stream):
+                            stream = await stream
+                    if timer:
+                        stream = timer.wrap_async(stream)
+                    async for batch in stream:
+                        if writer:
+                            await loop.run_in_executor(sink_executor, writer.put, batch)
+                        else:
+                            rows.extend(batch.results)
+            finally:
+                if writer:
+                    await loop.run_in_executor(sink_executor, writer.close)
+        except GoogleAdsException as ex:
+            print_google_ads_exception(report_name, ex)
+            exception = ex
+        except RateLimitError as ex:
+            print(f"[{report_name}] Not sent: {ex}")
+            exception = ex
+        except Exception as ex:
+            print(f"[{report_name}] Report fetch failed: {ex!r}")
+            exception = ex
+        except BaseException as ex:
+            exception = ex
+            raise
+        finally:
+            if timer:
+                timer.finish(exception, writer)
+        if not exception:
+            row_count = sink.rows_written if sink else len(rows)
+            print(f"[{report_name}] Finished report fetch. Found {row_count} rows.")
+    return report_name, None if sink else rows, exception
+
+
+def _fetch_report_adaptive(
+    controller: AdaptiveConcurrencyController,
+    client: GoogleAdsClient,
+    customer_id: str,
+    query: str,
+    report_name: str,
+    sink: Optional[ReportSink] = None,
+    service_pool: Optional[ServicePool] = None,
+    metrics: Optional[MetricsRecorder] = None,
+    rate_limiter: Optional[Any] = None,
+    on_start: Optional[Callable[[], None]] = None,
+) -> Tuple[str, Optional[List[Any]], Optional[GoogleAdsException]]:
+    """Runs fetch_report_threaded under the adaptive controller.
+
+    Reports that fail with a quota error are retried with jittered backoff,
+    up to MAX_QUOTA_RETRIES times, instead of being dropped.
+
+    Args:
+        controller: The controller that grants concurrency slots.
+        client: An initialized GoogleAdsClient instance.
+        customer_id: The ID of the customer to retrieve data for.
+        query: The GAQL query for the report.
+        report_name: A descriptive name for the report.
+        sink: An optional sink. Each retry re-opens it, which discards the
+            rows written by the failed attempt.
+        service_pool: An optional pool to lease the service from.
+        metrics: An optional recorder; every attempt is recorded separately.
+        rate_limiter: An optional limiter; every attempt acquires from it.
+        on_start: An optional callable that every attempt calls once the
+            controller has granted it a slot.
+
+    Returns:
+        The (report_name, rows, exception) tuple of the last attempt.
+    """
+    attempt = 0
+    while True:
+        controller.acquire()
+        start = time.monotonic()
+        exception = None
+        try:
+            result = fetch_report_threaded(
+                client,
+                customer_id,
+                query,
+                report_name,
+                sink,
+                service_pool,
+                metrics,
+                attempt,
+                rate_limiter,
+                on_start,
+            )
+            exception = result[2]
+        finally:
+            controller.release(time.monotonic() - start, exception)
+        if exception is None or not is_quota_error(exception):
+            return result
+        attempt += 1
+        if attempt > MAX_QUOTA_RETRIES:
+            return result
+        delay = controller.backoff_delay(attempt)
         print(
-            f"[{report_name}] Request with ID '{ex.request_id}' failed with status "
-            f"'{ex.error.code().name}' and includes the following errors:"
+            f"[{report_name}] Quota error, retrying in {delay:.1f}s "
+            f"(attempt {attempt}/{MAX_QUOTA_RETRIES}, limit {controller.limit})."
         )
-        for error in ex.failure.errors:
-            print(f"\tError with message '{error.message}'.")
-            if error.location:
-                for field_path_element in error.location.field_path_elements:
-                    print(f"\t\tOn field: {field_path_element.field_name}")
-        exception = ex
-    return report_name, rows, exception
+        time.sleep(delay)
 
 
-def main(customer_ids: List[str], login_customer_id: Optional[str]) -> None:
-    """Main function to run multiple reports concurrently using threads.
+async def _fetch_report_async_adaptive(
+    controller: AdaptiveConcurrencyController,
+    googleads_service: Any,
+    customer_id: str,
+    query: str,
+    report_name: str,
+    sink: Optional[ReportSink] = None,
+    service_pool: Optional[ServicePool] = None,
+    metrics: Optional[MetricsRecorder] = None,
+    rate_limiter: Optional[Any] = None,
+    hedging: Optional[HedgingPolicy] = None,
+    on_start: Optional[Callable[[], None]] = None,
+    sink_executor: Optional[Executor] = None,
+    limiter_executor: Optional[Executor] = None,
+) -> Tuple[str, Optional[List[Any]], Optional[GoogleAdsException]]:
+    """Runs fetch_report_async under the adaptive controller.
 
     Args:
-        customer_ids: A list of customer IDs to run reports for.
-        login_customer_id: The login customer ID to use (optional).
+        controller: The controller that grants concurrency slots.
+        googleads_service: An async GoogleAdsService client.
+        customer_id: The ID of the customer to retrieve data for.
+        query: The GAQL query for the report.
+        report_name: A descriptive name for the report.
+        sink: An optional sink. Each retry re-opens it, which discards the
+            rows written by the failed attempt.
+        service_pool: An optional pool to lease the service from.
+        metrics: An optional recorder; every attempt is recorded separately.
+        rate_limiter: An optional limiter; every attempt acquires from it.
+        hedging: An optional policy for hedging late first batches.
+        on_start: An optional callable that every attempt calls once the
+            controller has granted it a slot.
+        sink_executor: The executor that hands batches to the sink writer.
+        limiter_executor: The executor rate_limiter.acquire() runs on.
+
+    Returns:
+        The (report_name, rows, exception) tuple of the last attempt.
     """
-    googleads_client = GoogleAdsClient.load_from_storage(version="v22")
+    attempt = 0
+    while True:
+        while not controller.try_acquire():
+            await asyncio.sleep(0.05)
+        start = time.monotonic()
+        exception = None
+        try:
+            result = await fetch_report_async(
+                googleads_service,
+                customer_id,
+                query,
+                report_name,
+                sink=sink,
+                service_pool=service_pool,
+                metrics=metrics,
+                attempt=attempt,
+                rate_limiter=rate_limiter,
+                hedging=hedging,
+                on_start=on_start,
+                controller=controller,
+                sink_executor=sink_executor,
+                limiter_executor=limiter_executor,
+            )
+            exception = result[2]
+        finally:
+            controller.release(time.monotonic() - start, exception)
+        if exception is None or not is_quota_error(exception):
+            return result
+        attempt += 1
+        if attempt > MAX_QUOTA_RETRIES:
+            return result
+        delay = controller.backoff_delay(attempt)
+        print(
+            f"[{report_name}] Quota error, retrying in {delay:.1f}s "
+            f"(attempt {attempt}/{MAX_QUOTA_RETRIES}, limit {controller.limit})."
+        )
+        await asyncio.sleep(delay)
 
-    if login_customer_id:
-        googleads_client.login_customer_id = login_customer_id
 
-    start_date_str, end_date_str = _get_date_range_strings()
+def _get_report_definitions(
+    start_date_str: str, end_date_str: str
+) -> List[Dict[str, str]]:
+    """Returns the reports to run for every customer.
+
+    Args:
+        start_date_str: The first day of the reporting window (YYYY-MM-DD).
+        end_date_str: The last day of the reporting window (YYYY-MM-DD).
 
+    Returns:
+        A list of dictionaries, each with a "name" and a GAQL "query".
+    """
     # Each dictionary represents a report to be run.
     # You can add more reports here.
-    report_definitions = [
+    return [
         {
             "name": "Campaign Performance (Last 30 Days)",
             "query": f"""
@@ -153,33 +601,285 @@ def main(customer_ids: List[str], login_customer_id: Optional[str]) -> None:
         },
     ]
 
+
+def _build_report_jobs(
+    customer_ids: List[str], report_definitions: List[Dict[str, str]]
+) -> List[Tuple[str, str, str]]:
+    """Expands customers x report definitions into individual report jobs.
+
+    Args:
+        customer_ids: The customer IDs to run reports for.
+        report_definitions: The reports to run for each customer.
+
+    Returns:
+        A list of (customer_id, query, report_name_with_customer) tuples.
+    """
+    jobs = []
+    for cust_id in customer_ids:
+        for report_def in report_definitions:
+            report_name_with_customer = f"{report_def['name']} (Customer: {cust_id})"
+            jobs.append((cust_id, report_def["query"], report_name_with_customer))
+    return jobs
+
+
+def _skip_completed_jobs(
+    jobs: List[Tuple[str, str, str]],
+    manifest: RunManifest,
+    sink_factory: Callable[[str, str], ReportSink],
+) -> Tuple[List[Tuple[str, str, str]], Dict[str, Dict[str, Any]]]:
+    """Removes the jobs that a previous run with this manifest completed.
+
+    Args:
+        jobs: The (customer_id, query, report_name) jobs of the run.
+        manifest: The run manifest.
+        sink_factory: The sink factory of the run, used to find each job's
+            expected output file.
+
+    Returns:
+        A tuple of the jobs left to run and the results of the completed
+        jobs, pointing at their existing output files.
+    """
+    remaining_jobs = []
+    completed_results: Dict[str, Dict[str, Any]] = {}
+    for cust_id, query, report_name in jobs:
+        sink = sink_factory(query, report_name)
+        if manifest.is_done(report_name, sink.path):
+            sink.rows_written = manifest.units[report_name].get("rows", 0)
+            completed_results[report_name] = {
+                "rows": None,
+                "exception": None,
+                "sink": sink,
+            }
+        else:
+            remaining_jobs.append((cust_id, query, report_name))
+    return remaining_jobs, completed_results
+
+
+def _expand_sharded_jobs(
+    jobs: List[Tuple[str, str, str]], shard_days: int
+) -> Tuple[List[Tuple[str, str, str]], Dict[str, Dict[str, Any]]]:
+    """Replaces each shardable report job with one job per date shard.
+
+    Args:
+        jobs: The (customer_id, query, report_name) jobs to run.
+        shard_days: The number of days in each shard.
+
+    Returns:
+        A tuple of the expanded job list and a dictionary mapping each sharded
+        report name to its original "query", its "shard_names" and whether it
+        "needs_merge" (see plan_date_shards).
+    """
+    expanded_jobs = []
+    shard_groups: Dict[str, Dict[str, Any]] = {}
+    for cust_id, query, report_name in jobs:
+        plan = plan_date_shards(query, shard_days)
+        if not plan:
+            expanded_jobs.append((cust_id, query, report_name))
+            continue
+        shard_names = []
+        for start, end, shard_query in plan["shards"]:
+            shard_name = f"{report_name} [{start}..{end}]"
+            shard_names.append(shard_name)
+            expanded_jobs.append((cust_id, shard_query, shard_name))
+        shard_groups[report_name] = {
+            "query": query,
+            "shard_names": shard_names,
+            "needs_merge": plan["needs_merge"],
+        }
+    return expanded_jobs, shard_groups
+
+
+def _run_reports_threaded(
+    client: GoogleAdsClient,
+    jobs: List[Tuple[str, str, str]],
+    max_workers: int,
+    controller: Optional[AdaptiveConcurrencyController] = None,
+    sink_factory: Optional[Callable[[str, str], ReportSink]] = None,
+    manifest: Optional[RunManifest] = None,
+    service_pool: Optional[ServicePool] = None,
+    metrics: Optional[MetricsRecorder] = None,
+    rate_limiter: Optional[Any] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Runs report jobs on a thread pool.
+
+    Args:
+        client: An initialized GoogleAdsClient instance.
+        jobs: The (customer_id, query, report_name) jobs to run.
+        max_workers: The number of worker threads. With a controller, this is
+            only an upper bound and the controller decides how many of the
+            threads may stream at the same time.
+        controller: An optional adaptive concurrency controller.
+        sink_factory: An optional callable that takes (query, report_name) and
+            returns the sink for that report.
+        manifest: An optional run manifest that records the state of each
+            job. Requires a sink_factory.
+        service_pool: An optional pool of services shared by all jobs.
+        metrics: An optional recorder for the timings of every stream.
+        rate_limiter: An optional limiter every stream acquires from first.
+
+    Returns:
+        A dictionary mapping each report name to its "rows" and "exception",
+        plus its "sink" when a sink_factory is given.
+    """
     all_results: Dict[str, Dict[str, Any]] = {}
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {}
-        for cust_id in customer_ids:
-            for report_def in report_definitions:
-                report_name_with_customer = (
-                    f"{report_def['name']} (Customer: {cust_id})"
+        for cust_id, query, report_name_with_customer in jobs:
+            sink = None
+            if sink_factory:
+                sink = sink_factory(query, report_name_with_customer)
+            if controller:
+                fetch = _fetch_report_adaptive
+                args = (controller, client, cust_id, query, report_name_with_customer)
+            else:
+                fetch = fetch_report_threaded
+                args = (client, cust_id, query, report_name_with_customer)
+            if service_pool or metrics or rate_limiter:
+                fetch = functools.partial(
+                    fetch,
+                    service_pool=service_pool,
+                    metrics=metrics,
+                    rate_limiter=rate_limiter,
                 )
+            if manifest:
                 future = executor.submit(
-                    fetch_report_threaded,
-                    googleads_client,
-                    cust_id,
-                    report_def["query"],
+                    fetch_with_manifest,
+                    manifest,
                     report_name_with_customer,
+                    sink,
+                    fetch,
+                    *args,
+                    sink,
                 )
-                futures[future] = report_name_with_customer
+            else:
+                future = executor.submit(fetch, *args, sink)
+            futures[future] = (report_name_with_customer, sink)
 
         for future in as_completed(futures):
-            report_name_with_customer = futures[future]
+            report_name_with_customer, sink = futures[future]
             report_name, rows, exception = future.result()
             all_results[report_name_with_customer] = {
                 "rows": rows,
                 "exception": exception,
             }
+            if sink:
+                all_results[report_name_with_customer]["sink"] = sink
 
-    # Process and print all collected results
+    return all_results
+
+
+async def _run_reports_async(
+    client: GoogleAdsClient,
+    jobs: List[Tuple[str, str, str]],
+    max_streams: int,
+    controller: Optional[AdaptiveConcurrencyController] = None,
+    sink_factory: Optional[Callable[[str, str], ReportSink]] = None,
+    manifest: Optional[RunManifest] = None,
+    service_pool: Optional[ServicePool] = None,
+    metrics: Optional[MetricsRecorder] = None,
+    rate_limiter: Optional[Any] = None,
+    hedging: Optional[HedgingPolicy] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Runs report jobs concurrently on the current event loop.
+
+    Args:
+        client: An initialized GoogleAdsClient instance.
+        jobs: The (customer_id, query, report_name) jobs to run.
+        max_streams: The maximum number of streams open at the same time.
+            Ignored when a controller is given.
+        controller: An optional adaptive concurrency controller.
+        sink_factory: An optional callable that takes (query, report_name) and
+            returns the sink for that report.
+        manifest: An optional run manifest that records the state of each
+            job. Requires a sink_factory.
+        service_pool: An optional pool of async services shared by all jobs.
+            It is opened on the current event loop and closed when the jobs
+            are done.
+        metrics: An optional recorder for the timings of every stream.
+        rate_limiter: An optional limiter every stream acquires from first.
+        hedging: An optional policy for hedging streams with late first
+            batches.
+
+    Returns:
+        A dictionary mapping each report name to its "rows" and "exception",
+        plus its "sink" when a sink_factory is given.
+    """
+    googleads_service = None
+    if service_pool:
+        service_pool.open()
+    else:
+        googleads_service = client.get_service("GoogleAdsService", is_async=True)
+    semaphore = asyncio.Semaphore(max_streams)
+    # Handing batches to sink writers and waiting for the rate limiter block,
+    # so they run on threads of their own rather than on the loop's default
+    # executor, where a slow limiter could starve everything else. Every
+    # stream slot may need one of each.
+    stream_limit = controller.max_limit if controller else max_streams
+    sink_executor = ThreadPoolExecutor(
+        max_workers=stream_limit, thread_name_prefix="sink-writer"
+    )
+    limiter_executor = ThreadPoolExecutor(
+        max_workers=stream_limit, thread_name_prefix="rate-limiter"
+    )
+    sinks = [
+        sink_factory(query, report_name_with_customer) if sink_factory else None
+        for _, query, report_name_with_customer in jobs
+    ]
+    if controller:
+        fetch = functools.partial(_fetch_report_async_adaptive, controller)
+    else:
+        fetch = functools.partial(fetch_report_async, semaphore=semaphore)
+    coroutines = []
+    for (cust_id, query, report_name_with_customer), sink in zip(jobs, sinks):
+        args = (googleads_service, cust_id, query, report_name_with_customer)
+        kwargs = {
+            "sink": sink,
+            "service_pool": service_pool,
+            "metrics": metrics,
+            "rate_limiter": rate_limiter,
+            "hedging": hedging,
+            "sink_executor": sink_executor,
+            "limiter_executor": limiter_executor,
+        }
+        if manifest:
+            coroutine = fetch_async_with_manifest(
+                manifest,
+                report_name_with_customer,
+                sink,
+                functools.partial(fetch, *args, **kwargs),
+            )
+        else:
+            coroutine = fetch(*args, **kwargs)
+        coroutines.append(coroutine)
+    try:
+        results = await asyncio.gather(*coroutines)
+    finally:
+        if service_pool:
+            await service_pool.aclose()
+        sink_executor.shutdown()
+        limiter_executor.shutdown()
+
+    all_results: Dict[str, Dict[str, Any]] = {}
+    for (_, _, report_name_with_customer), sink, (_, rows, exception) in zip(
+        jobs, sinks, results
+    ):
+        all_results[report_name_with_customer] = {
+            "rows": rows,
+            "exception": exception,
+        }
+        if sink:
+            all_results[report_name_with_customer]["sink"] = sink
+    return all_results
+
+
+def _print_results(all_results: Dict[str, Dict[str, Any]]) -> None:
+    """Prints a short summary of every collected report.
+
+    Args:
+        all_results: A dictionary mapping report names to "rows", "exception"
+            and, for reports written to disk, "sink".
+    """
     for report_name_with_customer, result_data in all_results.items():
         rows = result_data["rows"]
         exception = result_data["exception"]
@@ -187,6 +887,9 @@ def main(customer_ids: List[str], login_customer_id: Optional[str]) -> None:
         print(f"\n--- Results for {report_name_with_customer} ---")
         if exception:
             print(f"Report failed with exception: {exception}")
+        elif "sink" in result_data:
+            sink = result_data["sink"]
+            print(f"Wrote {sink.rows_written} rows to {sink.path}")
         elif not rows:
             print("No data found.")
         else:
@@ -199,24 +902,496 @@ def main(customer_ids: List[str], login_customer_id: Optional[str]) -> None:
                 print(f"  Row {i + 1}: {row}")
 
 
+def main(
+    customer_ids: Optional[List[str]],
+    login_customer_id: Optional[str],
+    engine: str = "threads",
+    max_concurrency: Optional[int] = None,
+    adaptive: bool = False,
+    output_dir: Optional[str] = None,
+    output_format: str = "csv",
+    shard_by: Optional[str] = None,
+    manifest_path: Optional[str] = None,
+    decode_workers: Optional[int] = None,
+    channels: Optional[int] = None,
+    max_streams_per_channel: int = MAX_STREAMS_PER_CHANNEL,
+    keepalive_ms: int = CHANNEL_KEEPALIVE_MS,
+    metrics_path: Optional[str] = None,
+    manager_customer_id: Optional[str] = None,
+    account_statuses: Optional[List[str]] = ("ENABLED",),
+    include_managers: bool = False,
+    currency_codes: Optional[List[str]] = None,
+    discovery_cache_path: Optional[str] = DISCOVERY_CACHE_PATH,
+    refresh_discovery: bool = False,
+    rate_limiter: Optional[Any] = None,
+    hedge_percentile: Optional[int] = None,
+    max_hedge_ratio: float = MAX_HEDGE_RATIO,
+    job_history_path: Optional[str] = None,
+    fuse_queries: bool = False,
+) -> None:
+    """Main function to run multiple reports concurrently.
+
+    Args:
+        customer_ids: A list of customer IDs to run reports for.
+        login_customer_id: The login customer ID to use (optional). Defaults
+            to manager_customer_id when accounts are discovered.
+        engine: "threads" to use a thread pool, or "asyncio" to run every
+            stream on one event loop with the async gRPC transport.
+        max_concurrency: The number of worker threads or concurrent streams.
+            Defaults to MAX_WORKERS for threads and MAX_ASYNC_STREAMS for
+            asyncio. With adaptive=True this is the upper bound of the
+            controller instead (default MAX_ADAPTIVE_LIMIT for threads).
+        adaptive: Whether to size concurrency with an AIMD controller that
+            backs off on quota errors and retries throttled reports.
+        output_dir: If given, rows are streamed to one file per report in
+            this directory instead of being kept in memory.
+        output_format: The file format used with output_dir, one of
+            OUTPUT_FORMATS.
+        shard_by: "day" or "week" to split each report's segments.date range
+            into shards that are fetched concurrently and merged afterwards.
+        manifest_path: If given, the state of every (customer, report, shard)
+            unit is recorded in this file. Re-running with the same manifest
+            skips units that already completed. Requires output_dir.
+        decode_workers: If given, response batches are decoded and flattened
+            by a pool of this many processes. Requires output_dir.
+        channels: If given, all reports share a ServicePool with this many
+            gRPC channels instead of opening a channel per report (threads)
+            or sharing a single one (asyncio).
+        max_streams_per_channel: The number of concurrent streams each
+            pooled channel carries.
+        keepalive_ms: The keepalive ping interval of pooled channels.
+        metrics_path: If given, timings of every stream are recorded in this
+            file: a SQLite database for .db/.sqlite paths, JSONL otherwise.
+        manager_customer_id: If given, reports are also run for the accounts
+            found by walking the customer_client hierarchy under this manager.
+        account_statuses: The statuses of discovered accounts to keep, or
+            None to keep all.
+        include_managers: Whether to run reports for discovered managers.
+        currency_codes: The currencies of discovered accounts to keep, or
+            None to keep all.
+        discovery_cache_path: The file caching discovered trees, or None to
+            always walk the hierarchy.
+        refresh_discovery: Whether to walk the hierarchy even if the cached
+            tree is fresh.
+        rate_limiter: An optional limiter shared with other processes on the
+            host. Every stream acquires from it before it is opened.
+        hedge_percentile: If given, streams whose first batch is later than
+            this percentile of the first-batch times seen so far are sent a
+            second time, and the faster copy is kept. Between 1 and 99.
+            Requires the asyncio engine.
+        max_hedge_ratio: The maximum fraction of streams that are hedged.
+        job_history_path: If given, jobs are started longest first according
+            to the durations recorded in this file, which is updated with the
+            durations of this run.
+        fuse_queries: Whether to run reports of a customer that differ only
+            in their SELECT fields as one query, split back into one result
+            per report.
+    """
+    if hedge_percentile is not None:
+        if not 1 <= hedge_percentile <= 99:
+            raise ValueError(
+                f"hedge_percentile must be between 1 and 99, got {hedge_percentile}."
+            )
+        if engine != "asyncio":
+            raise ValueError("Hedged requests require the asyncio engine.")
+
+    googleads_client = GoogleAdsClient.load_from_storage(version="v22")
+
+    if login_customer_id or manager_customer_id:
+        googleads_client.login_customer_id = login_customer_id or manager_customer_id
+
+    customer_ids = list(customer_ids or [])
+    if manager_customer_id:
+        accounts = load_client_accounts(
+            googleads_client,
+            manager_customer_id,
+            cache_path=discovery_cache_path,
+            refresh=refresh_discovery,
+        )
+        discovered_ids = filter_client_accounts(
+            accounts, account_statuses, include_managers, currency_codes
+        )
+        print(
+            f"Running reports for {len(discovered_ids)} of {len(accounts)} "
+            f"accounts under manager {manager_customer_id}."
+        )
+        customer_ids += [cid for cid in discovered_ids if cid not in customer_ids]
+    if not customer_ids:
+        raise ValueError("No customer IDs to run reports for.")
+
+    start_date_str, end_date_str = _get_date_range_strings()
+    report_definitions = _get_report_definitions(start_date_str, end_date_str)
+    jobs = _build_report_jobs(customer_ids, report_definitions)
+    shard_groups: Dict[str, Dict[str, Any]] = {}
+    if shard_by:
+        jobs, shard_groups = _expand_sharded_jobs(jobs, SHARD_SIZES[shard_by])
+    fusion_groups: Dict[str, List[Tuple[str, str]]] = {}
+    if fuse_queries:
+        jobs, fusion_groups = fuse_jobs(jobs)
+        if fusion_groups:
+            fused_count = sum(len(members) for members in fusion_groups.values())
+            print(f"Fused {fused_count} reports into {len(fusion_groups)} queries.")
+
+    controller = None
+    if adaptive:
+        default_limit = MAX_ASYNC_STREAMS if engine == "asyncio" else MAX_ADAPTIVE_LIMIT
+        controller = AdaptiveConcurrencyController(
+            initial_limit=MAX_WORKERS, max_limit=max_concurrency or default_limit
+        )
+
+    sink_factory = None
+    job_sink_factory = None
+    decode_pool = None
+    if decode_workers:
+        if not output_dir:
+            raise ValueError("Process-pool decoding requires an output directory.")
+        decode_pool = ProcessPoolExecutor(max_workers=decode_workers)
+    if output_dir:
+        sink_factory = functools.partial(make_sink, output_dir, output_format)
+        job_sink_factory = build_job_sink_factory(
+            output_dir, output_format, shard_groups, decode_pool
+        )
+        if fusion_groups:
+            job_sink_factory = fused_sink_factory(job_sink_factory, fusion_groups)
+
+    manifest = None
+    completed_results: Dict[str, Dict[str, Any]] = {}
+    if manifest_path:
+        if not job_sink_factory:
+            raise ValueError("A run manifest requires an output directory.")
+        manifest = RunManifest(manifest_path)
+        jobs, completed_results = _skip_completed_jobs(jobs, manifest, job_sink_factory)
+        if completed_results:
+            print(
+                f"Resuming run: skipping {len(completed_results)} completed "
+                f"units, fetching {len(jobs)}."
+            )
+        manifest.register(jobs)
+
+    service_pool = None
+    if channels:
+        service_pool = ServicePool(
+            googleads_client,
+            channels,
+            max_streams_per_channel=max_streams_per_channel,
+            keepalive_ms=keepalive_ms,
+            is_async=engine == "asyncio",
+        )
+
+    job_history = None
+    if job_history_path:
+        job_history = JobDurationHistory(job_history_path)
+        jobs = order_jobs_longest_first(jobs, job_history)
+
+    metrics = None
+    if metrics_path:
+        metrics = open_metrics_recorder(metrics_path)
+    elif job_history:
+        metrics = MetricsRecorder(None)
+
+    hedging = None
+    if hedge_percentile is not None:
+        hedging = HedgingPolicy(hedge_percentile, max_hedge_ratio)
+        # A metrics database gives the policy a deadline from the first stream.
+        if isinstance(metrics, SqliteMetricsRecorder):
+            for entry in metrics.load()[-HEDGE_HISTORY_SIZE:]:
+                if entry["time_to_first_batch"] is not None:
+                    hedging.observe(entry["time_to_first_batch"])
+
+    try:
+        if engine == "asyncio":
+            all_results = asyncio.run(
+                _run_reports_async(
+                    googleads_client,
+                    jobs,
+                    max_concurrency or MAX_ASYNC_STREAMS,
+                    controller,
+                    job_sink_factory,
+                    manifest,
+                    service_pool,
+                    metrics,
+                    rate_limiter,
+                    hedging,
+                )
+            )
+        else:
+            all_results = _run_reports_threaded(
+                googleads_client,
+                jobs,
+                controller.max_limit if controller else max_concurrency or MAX_WORKERS,
+                controller,
+                job_sink_factory,
+                manifest,
+                service_pool,
+                metrics,
+                rate_limiter,
+            )
+    finally:
+        if service_pool:
+            service_pool.close()
+        if decode_pool:
+            decode_pool.shutdown()
+        if metrics:
+            metrics.close()
+    all_results.update(completed_results)
+
+    if fusion_groups:
+        all_results = split_fused_results(all_results, fusion_groups)
+
+    if shard_groups:
+        all_results = merge_sharded_results(all_results, shard_groups, sink_factory)
+
+    if controller:
+        print(f"Adaptive concurrency finished at a limit of {controller.limit}.")
+    if service_pool:
+        service_pool.print_stats()
+    if hedging:
+        print(
+            f"Hedged {hedging.hedges} of {hedging.streams} streams; "
+            f"the hedge was faster for {hedging.hedge_wins}."
+        )
+    if job_history:
+        job_history.update(metrics.entries)
+    if metrics_path:
+        print_metrics_summary(metrics)
+
+    # Process and print all collected results
+    _print_results(all_results)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Downloads multiple Google Ads API reports in parallel using threads."
+        description="Downloads multiple Google Ads API reports in parallel."
     )
     parser.add_argument(
         "-c",
         "--customer_ids",
         nargs="+",
         type=str,
-        required=True,
         help="The Google Ads customer IDs (can provide multiple).",
     )
+    parser.add_argument(
+        "-M",
+        "--manager_customer_id",
+        type=str,
+        help=(
+            "Run the reports for every client account under this manager, "
+            "found by walking its customer_client hierarchy."
+        ),
+    )
+    parser.add_argument(
+        "--account_statuses",
+        nargs="+",
+        default=["ENABLED"],
+        help=("Statuses of discovered accounts to run reports for (default: ENABLED)."),
+    )
+    parser.add_argument(
+        "--include_managers",
+        action="store_true",
+        help="Also run reports for discovered manager accounts.",
+    )
+    parser.add_argument(
+        "--currency_codes",
+        nargs="+",
+        help="Only run reports for discovered accounts in these currencies.",
+    )
+    parser.add_argument(
+        "--discovery_cache",
+        type=str,
+        default=DISCOVERY_CACHE_PATH,
+        help=(
+            "File caching discovered account trees for a day "
+            f"(default: {DISCOVERY_CACHE_PATH})."
+        ),
+    )
+    parser.add_argument(
+        "--hedge_percentile",
+        type=int,
+        help=(
+            "Send a second request for streams whose first batch is later "
+            "than this percentile of the run's first-batch times (e.g. 95) "
+            "and keep the faster one. Between 1 and 99. Requires --engine "
+            "asyncio."
+        ),
+    )
+    parser.add_argument(
+        "--max_hedge_ratio",
+        type=float,
+        default=MAX_HEDGE_RATIO,
+        help=(
+            f"Maximum fraction of streams that are hedged (default: {MAX_HEDGE_RATIO})."
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--job_history",
+        type=str,
+        help=(
+            "Start the longest jobs first, using the per customer and report "
+            "durations recorded in this file by earlier runs."
+        ),
+    )
+    parser.add_argument(
+        "-u",
+        "--fuse_queries",
+        action="store_true",
+        help=(
+            "Run reports of a customer that share their FROM, WHERE, segments "
+            "and ORDER BY/LIMIT as one query with the union of their fields."
+        ),
+    )
+    parser.add_argument(
+        "--refresh_discovery",
+        action="store_true",
+        help="Walk the account hierarchy even if the cached tree is fresh.",
+    )
     parser.add_argument(
         "-l",
         "--login_customer_id",
         type=str,
         help="The login customer ID (optional).",
     )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        choices=ENGINES,
+        default="threads",
+        help="The download engine to use (default: threads).",
+    )
+    parser.add_argument(
+        "-n",
+        "--max_concurrency",
+        type=int,
+        help=(
+            "Worker threads (threads engine) or concurrent streams (asyncio "
+            f"engine). Defaults to {MAX_WORKERS} and {MAX_ASYNC_STREAMS}."
+        ),
+    )
+    parser.add_argument(
+        "-a",
+        "--adaptive",
+        action="store_true",
+        help=(
+            "Size concurrency automatically, backing off and retrying on quota "
+            "errors. --max_concurrency then sets the upper limit."
+        ),
+    )
+    parser.add_argument(
+        "-o",
+        "--output_dir",
+        type=str,
+        help=(
+            "Stream each report to a file in this directory instead of "
+            "keeping all rows in memory."
+        ),
+    )
+    parser.add_argument(
+        "-f",
+        "--output_format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="The file format used with --output_dir (default: csv).",
+    )
+    parser.add_argument(
+        "-s",
+        "--shard_by",
+        choices=sorted(SHARD_SIZES),
+        help=(
+            "Split each report's date range into per-day or per-week "
+            "sub-queries that are fetched concurrently and merged."
+        ),
+    )
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        type=str,
+        help=(
+            "Record the state of every report unit in this file. Re-running "
+            "with the same manifest only fetches units that did not complete. "
+            "Requires --output_dir."
+        ),
+    )
+    parser.add_argument(
+        "-d",
+        "--decode_workers",
+        type=int,
+        help=(
+            "Decode and flatten response batches in this many worker "
+            "processes. Requires --output_dir."
+        ),
+    )
+    parser.add_argument(
+        "-p",
+        "--channels",
+        type=int,
+        help=(
+            "Share this many pooled gRPC channels between all reports instead "
+            "of opening a channel per report."
+        ),
+    )
+    parser.add_argument(
+        "--max_streams_per_channel",
+        type=int,
+        default=MAX_STREAMS_PER_CHANNEL,
+        help=(
+            "Concurrent streams per pooled channel "
+            f"(default: {MAX_STREAMS_PER_CHANNEL})."
+        ),
+    )
+    parser.add_argument(
+        "--keepalive_ms",
+        type=int,
+        default=CHANNEL_KEEPALIVE_MS,
+        help=(
+            "Keepalive ping interval of pooled channels in milliseconds "
+            f"(default: {CHANNEL_KEEPALIVE_MS})."
+        ),
+    )
+    parser.add_argument(
+        "-t",
+        "--metrics",
+        type=str,
+        help=(
+            "Record the timings of every stream in this file: a SQLite "
+            "database for .db/.sqlite paths, JSONL otherwise."
+        ),
+    )
     args = parser.parse_args()
+    if not args.customer_ids and not args.manager_customer_id:
+        parser.error("Provide --customer_ids, --manager_customer_id or both.")
+    if args.manifest and not args.output_dir:
+        parser.error("--manifest requires --output_dir.")
+    if args.decode_workers and not args.output_dir:
+        parser.error("--decode_workers requires --output_dir.")
+    if args.hedge_percentile is not None:
+        if not 1 <= args.hedge_percentile <= 99:
+            parser.error("--hedge_percentile must be between 1 and 99.")
+        if args.engine != "asyncio":
+            parser.error("--hedge_percentile requires --engine asyncio.")
 
-    main(args.customer_ids, args.login_customer_id)
+    main(
+        args.customer_ids,
+        args.login_customer_id,
+        engine=args.engine,
+        max_concurrency=args.max_concurrency,
+        adaptive=args.adaptive,
+        output_dir=args.output_dir,
+        output_format=args.output_format,
+        shard_by=args.shard_by,
+        manifest_path=args.manifest,
+        decode_workers=args.decode_workers,
+        channels=args.channels,
+        max_streams_per_channel=args.max_streams_per_channel,
+        keepalive_ms=args.keepalive_ms,
+        metrics_path=args.metrics,
+        manager_customer_id=args.manager_customer_id,
+        account_statuses=args.account_statuses,
+        include_managers=args.include_managers,
+        currency_codes=args.currency_codes,
+        discovery_cache_path=args.discovery_cache,
+        refresh_discovery=args.refresh_discovery,
+        hedge_percentile=args.hedge_percentile,
+        max_hedge_ratio=args.max_hedge_ratio,
+        job_history_path=args.job_history,
+        fuse_queries=args.fuse_queries,
+    )
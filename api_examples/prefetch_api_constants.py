@@ -0,0 +1,421 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""This example prefetches static API constants into a local lookup store.
+
+Geo target, language, carrier, mobile device and product category constants
+only change between API versions, so they are downloaded once per version
+into a SQLite file and resolved locally afterwards without any API calls.
+Each constant table is indexed by ID and by its canonical name(s), and the
+store is opened read-only with memory-mapped I/O, so a lookup takes a few
+microseconds.
+
+Prefetch every table (tables already in the store are skipped):
+    python api_examples/prefetch_api_constants.py -c 1234567890
+
+Look constants up without calling the API:
+    python api_examples/prefetch_api_constants.py --get geo_target_constant 21137
+    python api_examples/prefetch_api_constants.py --find language_constant en
+
+Scripts can do the same with ConstantStore:
+    with ConstantStore() as store:
+        store.get("geo_target_constant", 21137)["canonical_name"]
+"""
+
+import argparse
+from datetime import datetime
+import json
+import os
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from google.ads.googleads.client import GoogleAdsClient
+from google.ads.googleads.errors import GoogleAdsException
+
+API_VERSION = "v22"
+
+# One store per API version, since constants may change between versions.
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".google-ads-constants")
+
+# Bytes of the store file SQLite maps into memory instead of reading it.
+STORE_MMAP_SIZE = 256 * 1024 * 1024
+
+
+class ConstantTable(NamedTuple):
+    """How one constant resource is fetched and indexed.
+
+    Attributes:
+        id_field: the field used as the lookup ID.
+        fields: the fields stored for each constant.
+        name_fields: the fields a constant can be found by with find().
+    """
+
+    id_field: str
+    fields: Tuple[str, ...]
+    name_fields: Tuple[str, ...]
+
+
+CONSTANT_TABLES = {
+    "geo_target_constant": ConstantTable(
+        "id",
+        (
+            "id",
+            "name",
+            "canonical_name",
+            "country_code",
+            "target_type",
+            "status",
+            "parent_geo_target",
+        ),
+        ("canonical_name", "name"),
+    ),
+    "language_constant": ConstantTable(
+        "id", ("id", "code", "name", "targetable"), ("code", "name")
+    ),
+    "carrier_constant": ConstantTable("id", ("id", "name", "country_code"), ("name",)),
+    "mobile_device_constant": ConstantTable(
+        "id",
+        ("id", "name", "manufacturer_name", "operating_system_name", "type"),
+        ("name",),
+    ),
+    # Product categories have no name field; "name" is taken from the en-US
+    # localization, and every localization is stored under "localizations".
+    "product_category_constant": ConstantTable(
+        "category_id",
+        (
+            "category_id",
+            "level",
+            "state",
+            "product_category_constant_parent",
+            "localizations",
+        ),
+        ("name",),
+    ),
+}
+
+_METADATA_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS prefetched_tables (
+        name TEXT PRIMARY KEY,
+        api_version TEXT NOT NULL,
+        fetched_at TEXT NOT NULL,
+        row_count INTEGER NOT NULL
+    )"""
+
+
+def default_store_path(api_version: str = API_VERSION) -> str:
+    """Returns the default store file for an API version."""
+    return os.path.join(DEFAULT_STORE_DIR, f"{api_version}.sqlite3")
+
+
+def _name_key(name: str) -> str:
+    return name.strip().casefold()
+
+
+def _field_value(message: Any, field: str) -> Any:
+    """Returns a JSON-friendly value of a constant's field."""
+    value = getattr(message, field if hasattr(message, field) else f"{field}_")
+    if hasattr(value, "name") and hasattr(value, "value"):
+        return value.name
+    return value
+
+
+def _constant_entry(table: str, row: Any) -> Tuple[int, Dict[str, Any]]:
+    """Returns the (ID, stored fields) of the constant in a GoogleAdsRow."""
+    spec = CONSTANT_TABLES[table]
+    constant = getattr(row, table)
+    entry = {}
+    for field in spec.fields:
+        if field == "localizations":
+            localizations = {
+                f"{item.language_code}-{item.region_code}": item.value
+                for item in constant.localizations
+            }
+            entry["localizations"] = localizations
+            entry["name"] = localizations.get(
+                "en-US", next(iter(localizations.values()), "")
+            )
+        else:
+            entry[field] = _field_value(constant, field)
+    return entry[spec.id_field], entry
+
+
+def _create_table(connection: sqlite3.Connection, table: str) -> None:
+    connection.execute(
+        f"CREATE TABLE IF NOT EXISTS {table} "
+        "(id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+    )
+    connection.execute(
+        f"CREATE TABLE IF NOT EXISTS {table}_names (name_key TEXT NOT NULL, "
+        "id INTEGER NOT NULL, PRIMARY KEY (name_key, id)) WITHOUT ROWID"
+    )
+
+
+def _fetch_constants(
+    ga_service: Any, customer_id: str, table: str
+) -> Iterable[Tuple[int, Dict[str, Any]]]:
+    """Streams every constant of a table as (ID, stored fields) pairs."""
+    fields = ", ".join(f"{table}.{field}" for field in CONSTANT_TABLES[table].fields)
+    query = f"SELECT {fields} FROM {table}"
+    response = ga_service.search_stream(customer_id=customer_id, query=query)
+    for batch in response:
+        for row in batch.results:
+            yield _constant_entry(table, row)
+
+
+def prefetch_constants(
+    ga_service: Any,
+    customer_id: str,
+    path: str,
+    tables: Optional[Iterable[str]] = None,
+    api_version: str = API_VERSION,
+    refresh: bool = False,
+) -> Dict[str, int]:
+    """Downloads constant tables into the store.
+
+    Tables that are already in the store are skipped unless refresh is set.
+    A table is replaced in a single transaction, so readers never see it
+    half written.
+
+    Args:
+        ga_service: the GoogleAdsService client.
+        customer_id: any customer ID the credentials can access; constants
+            are the same for every customer.
+        path: the store file, created if needed.
+        tables: the tables to prefetch. Defaults to every table.
+        api_version: the API version the constants come from.
+        refresh: download tables that are already in the store again.
+
+    Returns:
+        A dictionary mapping each downloaded table to its number of constants.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fetched = {}
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute(_METADATA_SCHEMA)
+        existing = {
+            name
+            for (name,) in connection.execute(
+                "SELECT name FROM prefetched_tables WHERE api_version = ?",
+                (api_version,),
+            )
+        }
+        for table in tables or CONSTANT_TABLES:
+            if table in existing and not refresh:
+                print(f"Skipping {table}, already prefetched for {api_version}.")
+                continue
+            entries = list(_fetch_constants(ga_service, customer_id, table))
+            name_fields = CONSTANT_TABLES[table].name_fields
+            with connection:
+                _create_table(connection, table)
+                connection.execute(f"DELETE FROM {table}")
+                connection.execute(f"DELETE FROM {table}_names")
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)",
+                    (
+                        (constant_id, json.dumps(entry, separators=(",", ":")))
+                        for constant_id, entry in entries
+                    ),
+                )
+                connection.executemany(
+                    f"INSERT OR IGNORE INTO {table}_names (name_key, id) VALUES (?, ?)",
+                    (
+                        (_name_key(entry[field]), constant_id)
+                        for constant_id, entry in entries
+                        for field in name_fields
+                        if entry.get(field)
+                    ),
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO prefetched_tables "
+                    "(name, api_version, fetched_at, row_count) VALUES (?, ?, ?, ?)",
+                    (
+                        table,
+                        api_version,
+                        datetime.now().isoformat(timespec="seconds"),
+                        len(entries),
+                    ),
+                )
+            fetched[table] = len(entries)
+            print(f"Prefetched {len(entries)} {table} rows.")
+    finally:
+        connection.close()
+    return fetched
+
+
+class ConstantStore:
+    """Read-only lookups of prefetched constants.
+
+    Args:
+        path: the store file written by prefetch_constants.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_store_path()
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(
+                f"No constant store at {self.path}; run "
+                "prefetch_api_constants.py first."
+            )
+        self._connection = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._connection.execute(f"PRAGMA mmap_size = {STORE_MMAP_SIZE}")
+        self._tables = {
+            name: (api_version, fetched_at, row_count)
+            for name, api_version, fetched_at, row_count in self._connection.execute(
+                "SELECT name, api_version, fetched_at, row_count FROM prefetched_tables"
+            )
+        }
+
+    def __enter__(self) -> "ConstantStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def tables(self) -> Dict[str, Tuple[str, str, int]]:
+        """Returns {table: (api_version, fetched_at, row_count)}."""
+        return dict(self._tables)
+
+    def _check_table(self, table: str) -> None:
+        if table not in self._tables:
+            raise KeyError(f"{table} has not been prefetched into {self.path}.")
+
+    def get(self, table: str, constant_id: int) -> Optional[Dict[str, Any]]:
+        """Returns the stored fields of a constant by ID, or None."""
+        self._check_table(table)
+        row = self._connection.execute(
+            f"SELECT data FROM {table} WHERE id = ?", (int(constant_id),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, table: str, name: str) -> List[Dict[str, Any]]:
+        """Returns the constants with a canonical name, ignoring case.
+
+        Names are not always unique, e.g. several geo targets are named
+        "Springfield", so every match is returned, ordered by ID.
+        """
+        self._check_table(table)
+        rows = self._connection.execute(
+            f"SELECT data FROM {table} JOIN {table}_names USING (id) "
+            "WHERE name_key = ? ORDER BY id",
+            (_name_key(name),),
+        )
+        return [json.loads(data) for (data,) in rows]
+
+
+def main(
+    client: "GoogleAdsClient",
+    customer_id: str,
+    store_path: Optional[str] = None,
+    tables: Optional[List[str]] = None,
+    refresh: bool = False,
+) -> None:
+    """The main method that prefetches the constant tables.
+
+    Args:
+        client: an initialized GoogleAdsClient instance.
+        customer_id: a client customer ID.
+        store_path: the store file. Defaults to one per API version in
+            ~/.google-ads-constants.
+        tables: the tables to prefetch. Defaults to every table.
+        refresh: download tables that are already in the store again.
+    """
+    ga_service = client.get_service("GoogleAdsService")
+    store_path = store_path or default_store_path()
+    try:
+        prefetch_constants(ga_service, customer_id, store_path, tables, refresh=refresh)
+    except GoogleAdsException as ex:
+        print(
+            f'Request with ID "{ex.request_id}" failed with status "{ex.error.code.name}" and includes the following errors:'
+        )
+        for error in ex.failure.errors:
+            print(f'\tError with message "{error.message}"')
+            if error.location:
+                for field_path_element in error.location.field_path_elements:
+                    print(f"\t\tOn field: {field_path_element.field_name}")
+        sys.exit(1)
+    print(f"Constant store: {store_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Prefetches static API constants into a local lookup store."
+    )
+    parser.add_argument(
+        "-c",
+        "--customer_id",
+        type=str,
+        help="The Google Ads customer ID. Required to prefetch.",
+    )
+    parser.add_argument(
+        "--tables",
+        nargs="+",
+        choices=list(CONSTANT_TABLES),
+        help="The constant tables to prefetch. Defaults to every table.",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        help=f"The store file. Defaults to {default_store_path()}.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Download tables that are already in the store again.",
+    )
+    lookup = parser.add_mutually_exclusive_group()
+    lookup.add_argument(
+        "--get",
+        nargs=2,
+        metavar=("TABLE", "ID"),
+        help="Print a prefetched constant by ID instead of prefetching.",
+    )
+    lookup.add_argument(
+        "--find",
+        nargs=2,
+        metavar=("TABLE", "NAME"),
+        help="Print the prefetched constants with a name instead of prefetching.",
+    )
+    args = parser.parse_args()
+
+    if args.get or args.find:
+        with ConstantStore(args.store) as store:
+            if args.get:
+                matches = [store.get(args.get[0], int(args.get[1]))]
+            else:
+                matches = store.find(*args.find)
+        for match in filter(None, matches):
+            print(json.dumps(match, ensure_ascii=False))
+        sys.exit(0 if any(matches) else 1)
+
+    if not args.customer_id:
+        parser.error("--customer_id is required to prefetch.")
+
+    # GoogleAdsClient will read the google-ads.yaml configuration file in the
+    # home directory if none is specified.
+    google_ads_client = GoogleAdsClient.load_from_storage(version=API_VERSION)
+
+    main(
+        google_ads_client,
+        args.customer_id,
+        args.store,
+        args.tables,
+        args.refresh,
+    )
@@ -0,0 +1,165 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reusable parts of the parallel report downloader example.
+
+parallel_report_downloader_optimized.py combines these into a command line
+tool. They can also be used on their own:
+
+* errors: quota errors and rate limiting.
+* pool: a pool of gRPC channels and the adaptive concurrency controller.
+* gaql: GAQL parsing, row flattening and date sharding of queries.
+* sinks: CSV, JSONL and Parquet sinks, and the merge of sharded output.
+* manifest: the run manifest that lets a restarted run skip finished reports.
+* metrics: stream timings, their percentiles and remembered job durations.
+* hedging: hedged requests for slow streams of the asyncio engine.
+* discovery: the client accounts under a manager account.
+* fusion: reports that differ only in their fields, run as one query.
+"""
+
+from .errors import (
+    acquire_rate_limit,
+    is_quota_error,
+    print_google_ads_exception,
+    RateLimitError,
+)
+from .pool import (
+    BASE_CHANNEL_OPTIONS,
+    CHANNEL_KEEPALIVE_MS,
+    INITIAL_ADAPTIVE_LIMIT,
+    MAX_ADAPTIVE_LIMIT,
+    MAX_STREAMS_PER_CHANNEL,
+    AdaptiveConcurrencyController,
+    ServicePool,
+)
+from .gaql import (
+    compile_row_accessor,
+    merge_shard_rows,
+    plan_date_shards,
+)
+from .sinks import (
+    MERGE_BATCH_SIZE,
+    OUTPUT_FORMATS,
+    SHARD_STAGING_DIR,
+    SINK_QUEUE_SIZE,
+    SINK_TYPES,
+    BoundedSinkWriter,
+    build_job_sink_factory,
+    CsvSink,
+    JsonlSink,
+    make_sink,
+    merge_sharded_results,
+    ParquetSink,
+    ReportSink,
+)
+from .manifest import (
+    fetch_async_with_manifest,
+    fetch_with_manifest,
+    RunManifest,
+)
+from .metrics import (
+    JOB_HISTORY_SMOOTHING,
+    JobDurationHistory,
+    JsonlMetricsRecorder,
+    MetricsRecorder,
+    open_metrics_recorder,
+    order_jobs_longest_first,
+    print_metrics_summary,
+    SqliteMetricsRecorder,
+    StreamTimer,
+    summarize_stream_metrics,
+)
+from .hedging import (
+    HEDGE_HISTORY_SIZE,
+    HEDGE_MIN_DELAY_SECONDS,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_PERCENTILE,
+    MAX_HEDGE_RATIO,
+    hedged_stream,
+    HedgingPolicy,
+    take_hedge_slot,
+)
+from .discovery import (
+    DISCOVERY_CACHE_PATH,
+    DISCOVERY_CACHE_TTL_SECONDS,
+    MAX_DISCOVERY_WORKERS,
+    discover_client_accounts,
+    filter_client_accounts,
+    load_client_accounts,
+)
+from .fusion import (
+    fuse_jobs,
+    fused_sink_factory,
+    split_fused_results,
+)
+
+__all__ = [
+    "acquire_rate_limit",
+    "is_quota_error",
+    "print_google_ads_exception",
+    "RateLimitError",
+    "BASE_CHANNEL_OPTIONS",
+    "CHANNEL_KEEPALIVE_MS",
+    "INITIAL_ADAPTIVE_LIMIT",
+    "MAX_ADAPTIVE_LIMIT",
+    "MAX_STREAMS_PER_CHANNEL",
+    "AdaptiveConcurrencyController",
+    "ServicePool",
+    "compile_row_accessor",
+    "merge_shard_rows",
+    "plan_date_shards",
+    "MERGE_BATCH_SIZE",
+    "OUTPUT_FORMATS",
+    "SHARD_STAGING_DIR",
+    "SINK_QUEUE_SIZE",
+    "SINK_TYPES",
+    "BoundedSinkWriter",
+    "build_job_sink_factory",
+    "CsvSink",
+    "JsonlSink",
+    "make_sink",
+    "merge_sharded_results",
+    "ParquetSink",
+    "ReportSink",
+    "fetch_async_with_manifest",
+    "fetch_with_manifest",
+    "RunManifest",
+    "JOB_HISTORY_SMOOTHING",
+    "JobDurationHistory",
+    "JsonlMetricsRecorder",
+    "MetricsRecorder",
+    "open_metrics_recorder",
+    "order_jobs_longest_first",
+    "print_metrics_summary",
+    "SqliteMetricsRecorder",
+    "StreamTimer",
+    "summarize_stream_metrics",
+    "HEDGE_HISTORY_SIZE",
+    "HEDGE_MIN_DELAY_SECONDS",
+    "HEDGE_MIN_SAMPLES",
+    "HEDGE_PERCENTILE",
+    "MAX_HEDGE_RATIO",
+    "hedged_stream",
+    "HedgingPolicy",
+    "take_hedge_slot",
+    "DISCOVERY_CACHE_PATH",
+    "DISCOVERY_CACHE_TTL_SECONDS",
+    "MAX_DISCOVERY_WORKERS",
+    "discover_client_accounts",
+    "filter_client_accounts",
+    "load_client_accounts",
+    "fuse_jobs",
+    "fused_sink_factory",
+    "split_fused_results",
+]
@@ -0,0 +1,231 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Discovery of the client accounts under a manager account."""
+
+from concurrent.futures import (
+    as_completed,
+    ThreadPoolExecutor,
+)
+import json
+import os
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+)
+
+from google.ads.googleads.client import GoogleAdsClient
+from google.ads.googleads.errors import GoogleAdsException
+
+from .errors import print_google_ads_exception
+
+# Account discovery under a manager account. The customer_client tree changes
+# rarely, so a discovered tree is reused for a day before it is walked again.
+DISCOVERY_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".google-ads-customer-clients.json"
+)
+DISCOVERY_CACHE_TTL_SECONDS = 24 * 60 * 60
+MAX_DISCOVERY_WORKERS = 10
+
+
+_CUSTOMER_CLIENT_QUERY = """
+    SELECT
+        customer_client.id,
+        customer_client.descriptive_name,
+        customer_client.currency_code,
+        customer_client.manager,
+        customer_client.status,
+        customer_client.level
+    FROM
+        customer_client
+    WHERE
+        customer_client.level <= 1
+"""
+
+
+def _fetch_direct_clients(
+    googleads_service: Any, manager_id: str
+) -> List[Dict[str, Any]]:
+    """Returns the accounts directly linked to one manager account.
+
+    Args:
+        googleads_service: The GoogleAdsService to query with.
+        manager_id: The manager account to list the clients of.
+
+    Returns:
+        A dictionary per client account, excluding the manager itself.
+    """
+    clients = []
+    stream = googleads_service.search_stream(
+        customer_id=manager_id, query=_CUSTOMER_CLIENT_QUERY
+    )
+    for batch in stream:
+        for row in batch.results:
+            customer_client = row.customer_client
+            if customer_client.level == 0:
+                continue  # The manager itself.
+            clients.append(
+                {
+                    "customer_id": str(customer_client.id),
+                    "descriptive_name": customer_client.descriptive_name,
+                    "currency_code": customer_client.currency_code,
+                    "manager": customer_client.manager,
+                    "status": customer_client.status.name,
+                    "parent_id": manager_id,
+                }
+            )
+    return clients
+
+
+def discover_client_accounts(
+    client: GoogleAdsClient,
+    manager_customer_id: str,
+    max_workers: int = MAX_DISCOVERY_WORKERS,
+) -> List[Dict[str, Any]]:
+    """Walks the customer_client hierarchy under a manager account.
+
+    The tree is walked level by level. Every manager found on one level is
+    queried concurrently for its direct clients, which form the next level,
+    so a hierarchy with thousands of accounts takes one round of requests per
+    level rather than one sequential request per manager. Accounts linked
+    under several managers are only listed, and descended into, once.
+
+    Args:
+        client: An initialized GoogleAdsClient instance.
+        manager_customer_id: The manager account at the root of the tree.
+        max_workers: The number of managers queried concurrently.
+
+    Returns:
+        A dictionary per account below the root, with its customer_id,
+        descriptive_name, currency_code, manager flag, status name, the
+        parent_id it was first found under and its level below the root.
+    """
+    googleads_service = client.get_service("GoogleAdsService")
+    root_id = manager_customer_id.replace("-", "")
+    seen = {root_id}
+    accounts: List[Dict[str, Any]] = []
+    level_managers = [root_id]
+    level = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while level_managers:
+            level += 1
+            futures = {
+                executor.submit(
+                    _fetch_direct_clients, googleads_service, manager_id
+                ): manager_id
+                for manager_id in level_managers
+            }
+            next_managers = []
+            for future in as_completed(futures):
+                try:
+                    clients = future.result()
+                except GoogleAdsException as ex:
+                    print_google_ads_exception(
+                        f"Discovery (Manager: {futures[future]})", ex
+                    )
+                    continue
+                for account in clients:
+                    if account["customer_id"] in seen:
+                        continue
+                    seen.add(account["customer_id"])
+                    account["level"] = level
+                    accounts.append(account)
+                    # Cancelled or suspended managers cannot be queried.
+                    if account["manager"] and account["status"] == "ENABLED":
+                        next_managers.append(account["customer_id"])
+            print(
+                f"Discovery level {level}: queried {len(level_managers)} "
+                f"managers, {len(accounts)} accounts found so far."
+            )
+            level_managers = next_managers
+    return accounts
+
+
+def load_client_accounts(
+    client: GoogleAdsClient,
+    manager_customer_id: str,
+    cache_path: Optional[str] = DISCOVERY_CACHE_PATH,
+    ttl_seconds: int = DISCOVERY_CACHE_TTL_SECONDS,
+    refresh: bool = False,
+) -> List[Dict[str, Any]]:
+    """Returns the accounts under a manager, reusing a cached tree if fresh.
+
+    The cache file holds the tree of every manager discovered with it, keyed
+    by manager ID, and is replaced atomically when a tree is rediscovered.
+
+    Args:
+        client: An initialized GoogleAdsClient instance.
+        manager_customer_id: The manager account at the root of the tree.
+        cache_path: The cache file, or None to always walk the tree.
+        ttl_seconds: How long a cached tree is used before it is rediscovered.
+        refresh: Whether to rediscover the tree even if the cache is fresh.
+
+    Returns:
+        The accounts, as returned by discover_client_accounts.
+    """
+    root_id = manager_customer_id.replace("-", "")
+    cache: Dict[str, Any] = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+    entry = cache.get(root_id)
+    if entry and not refresh and time.time() - entry["discovered_at"] < ttl_seconds:
+        print(
+            f"Using {len(entry['accounts'])} cached accounts under manager "
+            f"{root_id} from {cache_path}."
+        )
+        return entry["accounts"]
+
+    accounts = discover_client_accounts(client, root_id)
+    if cache_path:
+        cache[root_id] = {"discovered_at": time.time(), "accounts": accounts}
+        tmp_path = f"{cache_path}.tmp"
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    return accounts
+
+
+def filter_client_accounts(
+    accounts: List[Dict[str, Any]],
+    statuses: Optional[List[str]] = ("ENABLED",),
+    include_managers: bool = False,
+    currency_codes: Optional[List[str]] = None,
+) -> List[str]:
+    """Selects the customer IDs to run reports for from discovered accounts.
+
+    Args:
+        accounts: The accounts returned by discover_client_accounts.
+        statuses: The account statuses to keep, or None to keep all.
+        include_managers: Whether to keep manager accounts. Managers have no
+            metrics of their own, so by default only client accounts are kept.
+        currency_codes: The currencies to keep, or None to keep all.
+
+    Returns:
+        The selected customer IDs, in discovery order.
+    """
+    return [
+        account["customer_id"]
+        for account in accounts
+        if (include_managers or not account["manager"])
+        and (statuses is None or account["status"] in statuses)
+        and (currency_codes is None or account["currency_code"] in currency_codes)
+    ]
@@ -0,0 +1,75 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Errors raised while downloading reports."""
+
+from typing import Any
+
+import grpc
+from google.ads.googleads.errors import GoogleAdsException
+
+
+def is_quota_error(ex: GoogleAdsException) -> bool:
+    """Returns True if the exception was caused by rate limits or quota.
+
+    Args:
+        ex: The exception raised by a report request.
+    """
+    error = getattr(ex, "error", None)
+    code = getattr(error, "code", None)
+    if callable(code) and code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+        return True
+    failure = getattr(ex, "failure", None)
+    for error in getattr(failure, "errors", None) or []:
+        if "quota_error" in error.error_code:
+            return True
+    return False
+
+
+class RateLimitError(Exception):
+    """Raised when a rate limiter does not grant a report's request.
+
+    For example once a limiter's daily budget of operations is spent. The
+    report fails; the other reports carry on.
+    """
+
+
+def acquire_rate_limit(rate_limiter: Any) -> None:
+    """Takes a token from a rate limiter, waiting as long as it allows.
+
+    Raises:
+        RateLimitError: if the limiter refuses the request.
+    """
+    try:
+        rate_limiter.acquire()
+    except Exception as ex:
+        raise RateLimitError(str(ex)) from ex
+
+
+def print_google_ads_exception(report_name: str, ex: GoogleAdsException) -> None:
+    """Prints the details of a failed report request.
+
+    Args:
+        report_name: The name of the report that failed.
+        ex: The exception raised by the request.
+    """
+    print(
+        f"[{report_name}] Request with ID '{ex.request_id}' failed with status "
+        f"'{ex.error.code().name}' and includes the following errors:"
+    )
+    for error in ex.failure.errors:
+        print(f"\tError with message '{error.message}'.")
+        if error.location:
+            for field_path_element in error.location.field_path_elements:
+                print(f"\t\tOn field: {field_path_element.field_name}")
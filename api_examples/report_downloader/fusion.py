@@ -0,0 +1,194 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Fusion of reports that differ only in their selected fields."""
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Tuple,
+)
+
+from .gaql import _parse_select_fields, _split_query_clauses
+from .metrics import _report_definition_name
+from .sinks import ReportSink
+
+
+class _FusedReportSink(ReportSink):
+    """Splits the rows of a fused query across the sinks of its reports.
+
+    Every member sink projects the fused rows onto its own fields, so each
+    report's file is the same as if its query had run on its own. The first
+    member's path stands for the fused job in the run manifest.
+    """
+
+    def __init__(self, members: List[ReportSink], fields: List[str]):
+        super().__init__(members[0].path, fields)
+        self.members = members
+
+    def open(self) -> None:
+        self.rows_written = 0
+        for member in self.members:
+            member.open()
+
+    def write_batch(self, results: Any) -> None:
+        for member in self.members:
+            member.write_batch(results)
+        self.rows_written = self.members[0].rows_written
+
+    def write_columns(self, columns: Dict[str, List[Any]]) -> None:
+        for member in self.members:
+            member.write_columns({field: columns[field] for field in member.fields})
+        self.rows_written = self.members[0].rows_written
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        for member in self.members:
+            member.write_rows(
+                [{field: row[field] for field in member.fields} for row in rows]
+            )
+        self.rows_written = self.members[0].rows_written
+
+    def close(self) -> None:
+        for member in self.members:
+            member.close()
+
+
+def _fusion_key(customer_id: str, query: str) -> Tuple:
+    """Returns what a query must share with another to be fused with it.
+
+    Queries are only fused when they return the same rows: the same resource,
+    filter, order, limit and segments. Selecting metrics drops rows without
+    any activity, so queries with and without metrics are not fused either.
+    """
+    clauses = _split_query_clauses(query)
+    fields = _parse_select_fields(query)
+    return (
+        customer_id,
+        clauses.get("FROM"),
+        clauses.get("WHERE"),
+        clauses.get("ORDER"),
+        clauses.get("LIMIT"),
+        clauses.get("PARAMETERS"),
+        tuple(sorted(field for field in fields if field.startswith("segments."))),
+        any(field.startswith("metrics.") for field in fields),
+    )
+
+
+def fuse_jobs(
+    jobs: List[Tuple[str, str, str]],
+) -> Tuple[List[Tuple[str, str, str]], Dict[str, List[Tuple[str, str]]]]:
+    """Fuses jobs of one customer that differ only in their SELECT fields.
+
+    Such jobs are replaced by a single job selecting the union of their
+    fields, which costs one request and one scan instead of one per report.
+    split_fused_results turns its result back into one result per report.
+
+    Args:
+        jobs: The (customer_id, query, report_name) jobs to run.
+
+    Returns:
+        A tuple of the job list with fused jobs in place of their members, and
+        a dictionary mapping each fused job name to its members' (report_name,
+        query) pairs.
+    """
+    groups: Dict[Tuple, List[Tuple[str, str, str]]] = {}
+    for job in jobs:
+        groups.setdefault(_fusion_key(job[0], job[1]), []).append(job)
+
+    fused_jobs = []
+    fusion_groups: Dict[str, List[Tuple[str, str]]] = {}
+    for job in jobs:
+        group = groups[_fusion_key(job[0], job[1])]
+        if len(group) == 1:
+            fused_jobs.append(job)
+            continue
+        if job is not group[0]:
+            continue  # Added with the first job of its group.
+        fields: List[str] = []
+        for _, query, _ in group:
+            fields += [f for f in _parse_select_fields(query) if f not in fields]
+        clauses = _split_query_clauses(job[1])
+        fused_query = f"SELECT {', '.join(fields)} FROM {clauses['FROM']}"
+        for clause, clause_keyword in (
+            ("WHERE", "WHERE"),
+            ("ORDER", "ORDER BY"),
+            ("LIMIT", "LIMIT"),
+            ("PARAMETERS", "PARAMETERS"),
+        ):
+            if clause in clauses:
+                fused_query += f" {clause_keyword} {clauses[clause]}"
+        # Keep the customer and shard suffix, e.g. "A + B (Customer: 1) [..]".
+        definition = _report_definition_name(job[2])
+        fused_name = (
+            " + ".join(_report_definition_name(name) for _, _, name in group)
+            + job[2][len(definition) :]
+        )
+        fused_jobs.append((job[0], fused_query, fused_name))
+        fusion_groups[fused_name] = [(name, query) for _, query, name in group]
+    return fused_jobs, fusion_groups
+
+
+def fused_sink_factory(
+    sink_factory: Callable[[str, str], ReportSink],
+    fusion_groups: Dict[str, List[Tuple[str, str]]],
+) -> Callable[[str, str], ReportSink]:
+    """Wraps a sink factory so fused jobs write to their members' sinks."""
+
+    def fused_sink_factory(query: str, report_name: str) -> ReportSink:
+        if report_name not in fusion_groups:
+            return sink_factory(query, report_name)
+        members = [
+            sink_factory(member_query, member_name)
+            for member_name, member_query in fusion_groups[report_name]
+        ]
+        sink = _FusedReportSink(members, _parse_select_fields(query))
+        sink.decode_pool = members[0].decode_pool
+        return sink
+
+    return fused_sink_factory
+
+
+def split_fused_results(
+    all_results: Dict[str, Dict[str, Any]],
+    fusion_groups: Dict[str, List[Tuple[str, str]]],
+) -> Dict[str, Dict[str, Any]]:
+    """Turns the result of every fused job back into one result per report.
+
+    In memory, every member gets the fused rows, which hold the fields of all
+    members. With sinks, every member gets its own sink.
+
+    Args:
+        all_results: The results of every job, including fused jobs.
+        fusion_groups: The fusion groups returned by fuse_jobs.
+
+    Returns:
+        The results keyed by the original report names.
+    """
+    for fused_name, members in fusion_groups.items():
+        result = all_results.pop(fused_name)
+        sink = result.get("sink")
+        for i, (member_name, _) in enumerate(members):
+            all_results[member_name] = {
+                "rows": result["rows"],
+                "exception": result["exception"],
+            }
+            if sink:
+                member_sink = sink.members[i]
+                # A fused job restored from the manifest only has the row
+                # count of the fused sink; every member wrote the same rows.
+                member_sink.rows_written = sink.rows_written
+                all_results[member_name]["sink"] = member_sink
+    return all_results
@@ -0,0 +1,421 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""GAQL query parsing, row flattening and date sharding."""
+
+from datetime import datetime, timedelta
+import enum
+import functools
+import keyword
+import re
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from google.ads.googleads.v22.services.types.google_ads_service import (
+    GoogleAdsRow,
+    SearchGoogleAdsStreamResponse,
+)
+from google.protobuf.descriptor import FieldDescriptor
+import proto
+
+_DATE_RANGE_PATTERN = re.compile(
+    r"segments\.date\s+BETWEEN\s+'(\d{4}-\d{2}-\d{2})'\s+AND\s+'(\d{4}-\d{2}-\d{2})'",
+    re.IGNORECASE,
+)
+
+# Metrics that are ratios, averages or shares cannot be summed across date
+# shards. Reports selecting them are only sharded when segments.date is
+# selected too, since each row then belongs to exactly one shard.
+_NON_ADDITIVE_METRIC_PATTERN = re.compile(
+    r"average|rate|ctr|share|_per_|roas|percentage|position|ratio|cp[cmve]$"
+)
+
+
+def _parse_select_fields(query: str) -> List[str]:
+    """Returns the field names in the SELECT clause of a GAQL query.
+
+    Args:
+        query: The GAQL query.
+    """
+    match = re.search(r"\bSELECT\b(.*?)\bFROM\b", query, re.IGNORECASE | re.DOTALL)
+    if not match:
+        raise ValueError(f"Could not find a SELECT clause in query: {query}")
+    return [field.strip() for field in match.group(1).split(",") if field.strip()]
+
+
+def _get_field_value(row: Any, field_path: str) -> Any:
+    """Reads a GAQL field, e.g. "campaign.status", from a GoogleAdsRow.
+
+    Enum values are returned by name so that they can be written as text.
+
+    Args:
+        row: A GoogleAdsRow.
+        field_path: The dotted GAQL field name.
+    """
+    value = row
+    for part in field_path.split("."):
+        # proto-plus appends an underscore to fields that shadow Python
+        # builtins, e.g. listing_group.type becomes listing_group.type_.
+        if not hasattr(value, part) and hasattr(value, f"{part}_"):
+            part = f"{part}_"
+        value = getattr(value, part)
+    if isinstance(value, enum.Enum):
+        return value.name
+    return value
+
+
+def _flatten_row(row: Any, fields: List[str]) -> Dict[str, Any]:
+    """Flattens a GoogleAdsRow into a dictionary keyed by GAQL field name.
+
+    Args:
+        row: A GoogleAdsRow.
+        fields: The GAQL fields to read.
+    """
+    return {field: _get_field_value(row, field) for field in fields}
+
+
+class _EnumNames(dict):
+    """Maps enum numbers to names, passing through numbers it does not know.
+
+    Unknown numbers appear when the API adds enum values that this version of
+    the client library does not have yet.
+    """
+
+    def __missing__(self, number: int) -> int:
+        return number
+
+
+def _compile_field_expression(
+    field_path: str, descriptor: Any, namespace: Dict[str, Any]
+) -> str:
+    """Returns a Python expression that reads a GAQL field from a raw row.
+
+    Args:
+        field_path: The dotted GAQL field name.
+        descriptor: The protobuf descriptor of GoogleAdsRow.
+        namespace: The namespace of the generated function. Enum lookup
+            tables needed by the expression are added to it.
+    """
+    expression = "row"
+    field = None
+    for part in field_path.split("."):
+        if field is not None:
+            if field.message_type is None:
+                raise ValueError(f"{field_path} is not a valid GAQL field.")
+            descriptor = field.message_type
+        # As in proto-plus, fields that shadow Python builtins carry a
+        # trailing underscore in the generated descriptors.
+        field = descriptor.fields_by_name.get(part)
+        if field is None:
+            field = descriptor.fields_by_name.get(f"{part}_")
+            part = f"{part}_"
+        if field is None:
+            raise ValueError(f"{field_path} is not a valid GAQL field.")
+        if keyword.iskeyword(part):
+            expression = f"getattr({expression}, {part!r})"
+        else:
+            expression = f"{expression}.{part}"
+
+    # FieldDescriptor.label is deprecated in newer protobuf releases.
+    if hasattr(field, "is_repeated"):
+        repeated = field.is_repeated
+    else:
+        repeated = field.label == FieldDescriptor.LABEL_REPEATED
+    if field.enum_type is not None:
+        table = f"_enum_{len(namespace)}"
+        namespace[table] = _EnumNames(
+            (value.number, value.name) for value in field.enum_type.values
+        )
+        if repeated:
+            return f"[{table}[value] for value in {expression}]"
+        return f"{table}[{expression}]"
+    if repeated:
+        return f"list({expression})"
+    return expression
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_row_accessor(fields: Tuple[str, ...]) -> Callable[[Any], Tuple]:
+    namespace: Dict[str, Any] = {}
+    descriptor = GoogleAdsRow.pb().DESCRIPTOR
+    expressions = [
+        _compile_field_expression(field, descriptor, namespace) for field in fields
+    ]
+    source = f"def accessor(row):\n    return ({', '.join(expressions)},)\n"
+    exec(compile(source, f"<accessor for {', '.join(fields)}>", "exec"), namespace)
+    return namespace["accessor"]
+
+
+def compile_row_accessor(fields: List[str]) -> Callable[[Any], Tuple]:
+    """Compiles a function that reads the given GAQL fields from a raw row.
+
+    The returned function takes a raw protobuf GoogleAdsRow (as returned with
+    use_proto_plus=False, or by _raw_message) and returns a tuple with one
+    value per field. Its body is generated from the SELECT list, so reading a
+    row is a single chain of attribute lookups per field, with enums mapped
+    to their names through precomputed tables. Accessors are cached, so each
+    SELECT list is compiled once per process.
+
+    Args:
+        fields: The GAQL fields to read, e.g. from _parse_select_fields.
+
+    Returns:
+        The accessor function.
+
+    Raises:
+        ValueError: If a field does not exist on GoogleAdsRow.
+    """
+    return _compile_row_accessor(tuple(fields))
+
+
+def _raw_message(message: Any) -> Any:
+    """Returns the raw protobuf message behind a proto-plus message."""
+    if isinstance(message, proto.Message):
+        return type(message).pb(message)
+    return message
+
+
+def _decode_batch(data: bytes, fields: List[str]) -> Dict[str, List[Any]]:
+    """Decodes a serialized response batch into one list of values per field.
+
+    Runs in a decode worker process, so it only takes and returns picklable
+    values. The batch is parsed straight into raw protobuf messages, without
+    proto-plus wrappers.
+
+    Args:
+        data: A serialized SearchGoogleAdsStreamResponse.
+        fields: The GAQL fields to read.
+
+    Returns:
+        A dictionary mapping each field to its values, in row order.
+    """
+    results = SearchGoogleAdsStreamResponse.pb().FromString(data).results
+    accessor = compile_row_accessor(fields)
+    values = [accessor(row) for row in results]
+    return {field: [row[i] for row in values] for i, field in enumerate(fields)}
+
+
+def _parse_order_by(query: str) -> List[Tuple[str, bool]]:
+    """Returns the ORDER BY clause of a GAQL query.
+
+    Args:
+        query: The GAQL query.
+
+    Returns:
+        A list of (field, descending) tuples, in priority order.
+    """
+    match = re.search(
+        r"\bORDER\s+BY\b(.*?)(?:\bLIMIT\b|\bPARAMETERS\b|$)",
+        query,
+        re.IGNORECASE | re.DOTALL,
+    )
+    if not match:
+        return []
+    order_by = []
+    for term in match.group(1).split(","):
+        parts = term.split()
+        if parts:
+            order_by.append((parts[0], len(parts) > 1 and parts[1].upper() == "DESC"))
+    return order_by
+
+
+def _parse_limit(query: str) -> Optional[int]:
+    """Returns the LIMIT of a GAQL query, or None if it has none.
+
+    Args:
+        query: The GAQL query.
+    """
+    match = re.search(r"\bLIMIT\s+(\d+)", query, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def _remove_limit(query: str) -> str:
+    """Returns the query without its LIMIT clause.
+
+    Args:
+        query: The GAQL query.
+    """
+    return re.sub(r"\bLIMIT\s+\d+", "", query, flags=re.IGNORECASE)
+
+
+def _split_date_range(
+    start_date_str: str, end_date_str: str, shard_days: int
+) -> List[Tuple[str, str]]:
+    """Splits an inclusive date range into consecutive shards.
+
+    Args:
+        start_date_str: The first day of the range (YYYY-MM-DD).
+        end_date_str: The last day of the range (YYYY-MM-DD).
+        shard_days: The number of days in each shard. The last shard may be
+            shorter.
+
+    Returns:
+        A list of (start, end) date strings, both inclusive.
+    """
+    start = datetime.strptime(start_date_str, "%Y-%m-%d")
+    end = datetime.strptime(end_date_str, "%Y-%m-%d")
+    shards = []
+    while start <= end:
+        shard_end = min(start + timedelta(days=shard_days - 1), end)
+        shards.append((start.strftime("%Y-%m-%d"), shard_end.strftime("%Y-%m-%d")))
+        start = shard_end + timedelta(days=1)
+    return shards
+
+
+def plan_date_shards(query: str, shard_days: int) -> Optional[Dict[str, Any]]:
+    """Plans how to split a report into date-range sub-queries.
+
+    Args:
+        query: The GAQL query of the report.
+        shard_days: The number of days in each shard.
+
+    Returns:
+        None if the query cannot be sharded, otherwise a dictionary with:
+        - "shards": a list of (start, end, shard_query) tuples.
+        - "reaggregate": whether rows from different shards must be summed,
+          because segments.date is not selected.
+        - "needs_merge": whether shard results must be merged in memory to
+          re-aggregate or to apply the query's global ORDER BY and LIMIT.
+    """
+    match = _DATE_RANGE_PATTERN.search(query)
+    if not match:
+        return None
+    date_ranges = _split_date_range(match.group(1), match.group(2), shard_days)
+    if len(date_ranges) < 2:
+        return None
+
+    fields = _parse_select_fields(query)
+    order_by = _parse_order_by(query)
+    limit = _parse_limit(query)
+    reaggregate = "segments.date" not in fields
+    if reaggregate and any(
+        field.startswith("metrics.") and _NON_ADDITIVE_METRIC_PATTERN.search(field)
+        for field in fields
+    ):
+        return None
+    if any(field not in fields for field, _ in order_by):
+        return None
+
+    # Each shard can keep its own LIMIT when rows are not re-aggregated: the
+    # global top N is always within the union of the per-shard top N.
+    shard_template = _remove_limit(query) if reaggregate else query
+    shards = []
+    for start, end in date_ranges:
+        shard_query = (
+            shard_template[: match.start()]
+            + f"segments.date BETWEEN '{start}' AND '{end}'"
+            + shard_template[match.end() :]
+        )
+        shards.append((start, end, shard_query))
+    return {
+        "shards": shards,
+        "reaggregate": reaggregate,
+        "needs_merge": reaggregate or bool(order_by) or limit is not None,
+    }
+
+
+def merge_shard_rows(query: str, shard_rows: List[List[Any]]) -> List[Dict[str, Any]]:
+    """Merges the rows of a report's date shards into the report's result.
+
+    Args:
+        query: The original, unsharded GAQL query.
+        shard_rows: The GoogleAdsRow results of each shard.
+
+    Returns:
+        The merged rows, as dictionaries keyed by GAQL field name.
+    """
+    fields = _parse_select_fields(query)
+    accessor = compile_row_accessor(fields)
+    return _merge_flat_rows(
+        query,
+        [
+            dict(zip(fields, accessor(_raw_message(row))))
+            for rows in shard_rows
+            for row in rows
+        ],
+    )
+
+
+def _merge_flat_rows(query: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merges flattened shard rows into the result of the unsharded query.
+
+    When segments.date is not selected, rows with the same attributes and
+    segments are combined by summing their metrics. The query's ORDER BY and
+    LIMIT are then applied globally.
+
+    Args:
+        query: The original, unsharded GAQL query.
+        rows: The rows of every shard, keyed by GAQL field name.
+
+    Returns:
+        The merged rows.
+    """
+    fields = _parse_select_fields(query)
+    if "segments.date" not in fields:
+        metric_fields = [field for field in fields if field.startswith("metrics.")]
+        key_fields = [field for field in fields if field not in metric_fields]
+        groups: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+        for row in rows:
+            key = tuple(row[field] for field in key_fields)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = dict(row)
+            else:
+                for field in metric_fields:
+                    group[field] += row[field]
+        rows = list(groups.values())
+
+    # Stable sorts applied from the lowest to the highest priority field.
+    for field, descending in reversed(_parse_order_by(query)):
+        rows.sort(key=lambda row: row[field], reverse=descending)
+
+    limit = _parse_limit(query)
+    return rows[:limit] if limit is not None else rows
+
+
+# A run of non-whitespace, where quoted string literals may contain spaces.
+_GAQL_TOKEN_PATTERN = re.compile(
+    r"(?:'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|[^\s'\"])+"
+)
+_GAQL_CLAUSES = ("SELECT", "FROM", "WHERE", "ORDER", "LIMIT", "PARAMETERS")
+
+
+def _split_query_clauses(query: str) -> Dict[str, str]:
+    """Splits a GAQL query into its clauses, with whitespace normalized.
+
+    Args:
+        query: The GAQL query.
+
+    Returns:
+        A dictionary mapping "SELECT", "FROM", "WHERE", "ORDER" (without the
+        BY), "LIMIT" and "PARAMETERS" to the text of each clause present.
+    """
+    clauses: Dict[str, List[str]] = {}
+    current = None
+    for token in _GAQL_TOKEN_PATTERN.findall(query):
+        keyword = token.upper()
+        if keyword in _GAQL_CLAUSES:
+            current = keyword
+            clauses[current] = []
+        elif current == "ORDER" and keyword == "BY" and not clauses[current]:
+            continue
+        elif current is not None:
+            clauses[current].append(token)
+    return {clause: " ".join(tokens) for clause, tokens in clauses.items()}
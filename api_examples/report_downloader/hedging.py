@@ -0,0 +1,293 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Hedged (duplicate) requests for slow report streams."""
+
+import asyncio
+import contextlib
+import collections
+from concurrent.futures import Executor
+import inspect
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Optional,
+    Tuple,
+)
+
+from .errors import acquire_rate_limit, RateLimitError
+from .metrics import _percentile
+from .pool import AdaptiveConcurrencyController, ServicePool
+
+# Hedged requests (asyncio engine). A stream that has not produced its first
+# batch by the given percentile of the first-batch times seen so far gets a
+# duplicate request, at most for MAX_HEDGE_RATIO of all streams. No hedges are
+# sent until HEDGE_MIN_SAMPLES first batches have been observed.
+HEDGE_PERCENTILE = 95
+MAX_HEDGE_RATIO = 0.05
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 1.0
+HEDGE_HISTORY_SIZE = 1000
+
+
+class HedgingPolicy:
+    """Decides when a slow stream gets a duplicate (hedged) request.
+
+    The policy learns the distribution of time to first batch from the
+    streams of the run. Once it has seen min_samples of them, a stream that
+    has not produced its first batch by the given percentile of that
+    distribution is sent a second time, and whichever copy produces a first
+    batch sooner is kept. The number of hedges is capped at max_hedge_ratio
+    of the streams started, so a general slowdown cannot double the load.
+
+    The policy is only used from the event loop, so it needs no locking.
+    """
+
+    def __init__(
+        self,
+        percentile: int = HEDGE_PERCENTILE,
+        max_hedge_ratio: float = MAX_HEDGE_RATIO,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        min_delay: float = HEDGE_MIN_DELAY_SECONDS,
+    ):
+        """Initializes the policy.
+
+        Args:
+            percentile: The percentile of first-batch times used as deadline.
+            max_hedge_ratio: The maximum fraction of streams that are hedged.
+            min_samples: The number of first batches to observe before the
+                first hedge is sent.
+            min_delay: The shortest deadline, in seconds.
+
+        Raises:
+            ValueError: if percentile is not between 1 and 99.
+        """
+        if not 1 <= percentile <= 99:
+            raise ValueError(
+                f"Hedge percentile must be between 1 and 99, got {percentile}."
+            )
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._first_batch_times: collections.deque = collections.deque(
+            maxlen=HEDGE_HISTORY_SIZE
+        )
+        self.streams = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, seconds: float) -> None:
+        """Adds the time to first batch of one stream to the distribution."""
+        self._first_batch_times.append(seconds)
+
+    def deadline(self) -> Optional[float]:
+        """Returns the current hedging deadline in seconds, or None if the
+        policy has not observed enough streams yet."""
+        if len(self._first_batch_times) < self.min_samples:
+            return None
+        return max(
+            self.min_delay, _percentile(list(self._first_batch_times), self.percentile)
+        )
+
+    def try_hedge(self) -> bool:
+        """Returns True, and counts a hedge, if the hedge budget allows one."""
+        if self.hedges + 1 > self.max_hedge_ratio * self.streams:
+            return False
+        self.hedges += 1
+        return True
+
+
+async def _open_stream(
+    googleads_service: Any, customer_id: str, query: str
+) -> Tuple[Any, Any, Any]:
+    """Opens an async stream and waits for its first batch.
+
+    Returns:
+        The stream call, its iterator and the first batch, which is None if
+        the stream is empty.
+    """
+    call = googleads_service.search_stream(customer_id=customer_id, query=query)
+    if inspect.isawaitable(call):
+        call = await call
+    iterator = call.__aiter__()
+    try:
+        return call, iterator, await iterator.__anext__()
+    except StopAsyncIteration:
+        return call, iterator, None
+    except asyncio.CancelledError:
+        if hasattr(call, "cancel"):
+            call.cancel()
+        raise
+
+
+async def _iterate_from(first_batch: Any, iterator: Any) -> Any:
+    """Yields an already received first batch and then the rest of a stream."""
+    if first_batch is None:
+        return
+    yield first_batch
+    while True:
+        try:
+            batch = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        yield batch
+
+
+async def take_hedge_slot(
+    googleads_service: Any,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    controller: Optional[AdaptiveConcurrencyController] = None,
+    service_pool: Optional[ServicePool] = None,
+) -> Optional[Tuple[contextlib.ExitStack, Any]]:
+    """Takes a stream slot and a channel for a hedged request, if both are free.
+
+    A hedge never waits for them, so it cannot take more streams or channel
+    capacity than the run allows, and reports queued for a slot go first.
+
+    Args:
+        googleads_service: The service to send the hedge on without a pool.
+        semaphore: The semaphore bounding the streams of the run, if any.
+        controller: The adaptive controller of the run, if any.
+        service_pool: The pool to lease the hedge's channel from, if any.
+
+    Returns:
+        None if no slot or channel is free. Otherwise an ExitStack that gives
+        them back when closed, and the service to send the hedge on.
+    """
+    if semaphore is not None and semaphore.locked():
+        return None
+    if service_pool is not None and not service_pool.has_capacity():
+        return None
+    if controller is not None and not controller.try_acquire():
+        return None
+    slot = contextlib.ExitStack()
+    if controller is not None:
+        slot.callback(controller.release_unused)
+    if semaphore is not None:
+        await semaphore.acquire()  # Free, so this does not wait.
+        slot.callback(semaphore.release)
+    if service_pool is not None:
+        googleads_service = slot.enter_context(service_pool.lease(block=False))
+    return slot, googleads_service
+
+
+async def hedged_stream(
+    googleads_service: Any,
+    customer_id: str,
+    query: str,
+    report_name: str,
+    hedging: HedgingPolicy,
+    rate_limiter: Optional[Any] = None,
+    take_hedge_slot: Optional[
+        Callable[[], Awaitable[Optional[Tuple[contextlib.ExitStack, Any]]]]
+    ] = None,
+    limiter_executor: Optional[Executor] = None,
+) -> Tuple[Any, bool, bool]:
+    """Opens a stream, hedging it if its first batch is late.
+
+    The copy that produces a first batch first is kept and the other is
+    cancelled, so only one copy ever reaches the sink. If one copy fails, the
+    other is still waited for.
+
+    The hedge holds a slot of its own from take_hedge_slot while both copies
+    race, and is not sent if none is free. Once one copy is left, the slot
+    is given back: the kept copy runs in the slot of the original request.
+
+    Args:
+        googleads_service: The service to send the original request on.
+        customer_id: The ID of the customer to retrieve data for.
+        query: The GAQL query for the report.
+        report_name: A descriptive name for the report.
+        hedging: The hedging policy.
+        rate_limiter: An optional limiter the hedge acquires from first.
+        take_hedge_slot: Returns the slot and service for a hedge, see
+            take_hedge_slot. Without it, hedges use googleads_service and
+            no slot.
+        limiter_executor: The executor the limiter's acquire() runs on.
+
+    Returns:
+        The batches of the kept stream, whether a hedge was sent and whether
+        the hedge was the copy kept.
+    """
+    start = time.monotonic()
+    hedging.streams += 1
+    primary = asyncio.ensure_future(_open_stream(googleads_service, customer_id, query))
+    pending = {primary}
+    hedge = None
+    hedge_slot = contextlib.ExitStack()
+    deadline = hedging.deadline()
+    if deadline is not None:
+        done, _ = await asyncio.wait(pending, timeout=deadline)
+        if not done:
+            if take_hedge_slot:
+                taken = await take_hedge_slot()
+            else:
+                taken = contextlib.ExitStack(), googleads_service
+            if taken is None:
+                print(f"[{report_name}] Not hedging: no free stream slot.")
+            elif not hedging.try_hedge():
+                taken[0].close()
+            else:
+                hedge_slot, hedge_service = taken
+                try:
+                    if rate_limiter:
+                        await asyncio.get_running_loop().run_in_executor(
+                            limiter_executor, acquire_rate_limit, rate_limiter
+                        )
+                except RateLimitError as ex:
+                    # The original request is still running; just don't hedge it.
+                    hedge_slot.close()
+                    print(f"[{report_name}] Not hedging: {ex}")
+                else:
+                    print(
+                        f"[{report_name}] No first batch after {deadline:.2f}s, "
+                        "sending a hedged request."
+                    )
+                    hedge = asyncio.ensure_future(
+                        _open_stream(hedge_service, customer_id, query)
+                    )
+                    pending.add(hedge)
+
+    winner = None
+    error: Optional[BaseException] = None
+    try:
+        while winner is None and pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # If both copies are ready at once, keep the original request.
+            for task in sorted(done, key=lambda task: task is not primary):
+                if task.exception() is not None:
+                    error = task.exception()
+                elif winner is None:
+                    winner = task
+                elif hasattr(task.result()[0], "cancel"):
+                    task.result()[0].cancel()
+    finally:
+        for task in pending:
+            task.cancel()
+        hedge_slot.close()
+    if winner is None:
+        raise error
+
+    _, iterator, first_batch = winner.result()
+    if first_batch is not None:
+        hedging.observe(time.monotonic() - start)
+    hedge_won = winner is hedge
+    if hedge_won:
+        hedging.hedge_wins += 1
+    return _iterate_from(first_batch, iterator), hedge is not None, hedge_won
@@ -0,0 +1,196 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A resumable record of the report units of a run."""
+
+from datetime import datetime
+import functools
+import json
+import os
+import threading
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from google.ads.googleads.errors import GoogleAdsException
+
+from .sinks import ReportSink
+
+
+class RunManifest:
+    """Tracks the state of every report unit of a run in a JSONL file.
+
+    A unit is one job: a (customer, report) pair, or one date shard of it.
+    Each state change is appended as one line, so updates stay cheap for runs
+    with thousands of units and a crash can at worst lose the line being
+    written. Loading the file replays the lines, keeping the latest state of
+    each unit. A restarted run skips units that are done and whose output
+    file still exists.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path: str):
+        """Loads the manifest, or starts a new one if the file doesn't exist.
+
+        Args:
+            path: The manifest file.
+        """
+        self.path = path
+        self.units: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A partial line left by an interrupted run.
+                    self.units.setdefault(entry["unit"], {}).update(entry)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def is_done(self, unit: str, output: str) -> bool:
+        """Returns True if the unit finished and its output is still on disk.
+
+        Args:
+            unit: The unit (job report name).
+            output: The output file the unit is expected to have written.
+        """
+        entry = self.units.get(unit, {})
+        return (
+            entry.get("status") == self.DONE
+            and entry.get("output") == output
+            and os.path.exists(output)
+        )
+
+    def register(self, jobs: List[Tuple[str, str, str]]) -> None:
+        """Records every job of the run as pending.
+
+        Args:
+            jobs: The (customer_id, query, report_name) jobs to run.
+        """
+        self._append(
+            [
+                {"unit": name, "customer_id": cust_id, "status": self.PENDING}
+                for cust_id, _, name in jobs
+            ]
+        )
+
+    def mark_running(self, unit: str) -> None:
+        """Records that a unit started downloading."""
+        self._append([{"unit": unit, "status": self.RUNNING}])
+
+    def mark_finished(
+        self,
+        unit: str,
+        exception: Optional[Exception],
+        sink: Optional[ReportSink],
+    ) -> None:
+        """Records the outcome of a unit.
+
+        Args:
+            unit: The unit (job report name).
+            exception: The exception the unit failed with, if any.
+            sink: The sink the unit wrote to.
+        """
+        if exception or sink is None:
+            entry = {"unit": unit, "status": self.FAILED, "error": str(exception)}
+        else:
+            entry = {
+                "unit": unit,
+                "status": self.DONE,
+                "output": sink.path,
+                "rows": sink.rows_written,
+            }
+        self._append([entry])
+
+    def _append(self, entries: List[Dict[str, Any]]) -> None:
+        updated = datetime.now().isoformat(timespec="seconds")
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                entry["updated"] = updated
+                self.units.setdefault(entry["unit"], {}).update(entry)
+                f.write(json.dumps(entry) + "\n")
+
+
+def fetch_with_manifest(
+    manifest: RunManifest,
+    report_name: str,
+    sink: ReportSink,
+    fetch: Callable[..., Tuple],
+    *args: Any,
+) -> Tuple[str, Optional[List[Any]], Optional[GoogleAdsException]]:
+    """Runs a threaded fetch function and records its outcome in the manifest.
+
+    Args:
+        manifest: The run manifest.
+        report_name: The unit being fetched.
+        sink: The sink the unit writes to.
+        fetch: fetch_report_threaded or _fetch_report_adaptive. It marks the
+            unit running once the unit holds a concurrency slot.
+        *args: The arguments of fetch.
+    """
+    exception = None
+    try:
+        result = fetch(
+            *args, on_start=functools.partial(manifest.mark_running, report_name)
+        )
+        exception = result[2]
+        return result
+    except Exception as ex:
+        exception = ex
+        raise
+    finally:
+        manifest.mark_finished(report_name, exception, sink)
+
+
+async def fetch_async_with_manifest(
+    manifest: RunManifest,
+    report_name: str,
+    sink: ReportSink,
+    fetch: Callable[..., Awaitable[Tuple]],
+) -> Tuple[str, Optional[List[Any]], Optional[GoogleAdsException]]:
+    """Awaits an async fetch and records its outcome in the manifest.
+
+    Args:
+        manifest: The run manifest.
+        report_name: The unit being fetched.
+        sink: The sink the unit writes to.
+        fetch: fetch_report_async or _fetch_report_async_adaptive, with
+            every argument but on_start bound. It marks the unit running once
+            the unit holds a concurrency slot, so units still queued behind
+            the semaphore or controller stay pending.
+    """
+    exception = None
+    try:
+        result = await fetch(
+            on_start=functools.partial(manifest.mark_running, report_name)
+        )
+        exception = result[2]
+        return result
+    except Exception as ex:
+        exception = ex
+        raise
+    finally:
+        manifest.mark_finished(report_name, exception, sink)
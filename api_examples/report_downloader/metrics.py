@@ -0,0 +1,445 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Stream timings, their percentiles and remembered job durations."""
+
+from datetime import datetime
+import json
+import os
+import re
+import sqlite3
+import statistics
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .gaql import _raw_message
+from .sinks import BoundedSinkWriter
+
+# Weight of the latest run in a job's remembered duration (--job_history).
+JOB_HISTORY_SMOOTHING = 0.5
+
+
+_REPORT_SUFFIX_PATTERN = re.compile(r"\s*\(Customer: [^)]*\)(\s*\[[^\]]*\])?$")
+
+
+def _report_definition_name(report_name: str) -> str:
+    """Returns the report definition of a job, without customer or shard.
+
+    Args:
+        report_name: A job name such as "Campaigns (Customer: 1) [a..b]".
+    """
+    return _REPORT_SUFFIX_PATTERN.sub("", report_name)
+
+
+def _percentile(values: List[float], percent: int) -> Optional[float]:
+    """Returns a percentile of values, or None if there are none.
+
+    Raises:
+        ValueError: if percent is not between 1 and 99.
+    """
+    if not 1 <= percent <= 99:
+        raise ValueError(f"Percentile must be between 1 and 99, got {percent}.")
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def summarize_stream_metrics(
+    entries: List[Dict[str, Any]], group_by: str = "report"
+) -> List[Dict[str, Any]]:
+    """Aggregates stream metrics by report definition or customer.
+
+    Args:
+        entries: Entries as recorded by a MetricsRecorder.
+        group_by: "report" or "customer_id".
+
+    Returns:
+        One summary per group, slowest total time first, with the number of
+        streams, failures, retries, hedges and hedges that won, total rows,
+        bytes and seconds, and the
+        p50/p95/p99 of stream duration and time to first batch.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in entries:
+        groups.setdefault(entry[group_by], []).append(entry)
+    summaries = []
+    for key, group in groups.items():
+        summary = {
+            group_by: key,
+            "streams": len(group),
+            "failed": sum(1 for entry in group if entry["error"]),
+            "retries": sum(1 for entry in group if entry["attempt"] > 0),
+            "hedges": sum(entry.get("hedged") or 0 for entry in group),
+            "hedge_wins": sum(entry.get("hedge_won") or 0 for entry in group),
+            "rows": sum(entry["rows"] for entry in group),
+            "bytes": sum(entry["bytes"] for entry in group),
+            "total_seconds": sum(entry["total_seconds"] for entry in group),
+        }
+        for metric in ("total_seconds", "time_to_first_batch"):
+            values = sorted(
+                entry[metric] for entry in group if entry[metric] is not None
+            )
+            for percent in (50, 95, 99):
+                summary[f"{metric}_p{percent}"] = _percentile(values, percent)
+        summaries.append(summary)
+    return sorted(summaries, key=lambda s: s["total_seconds"], reverse=True)
+
+
+class MetricsRecorder:
+    """Stores one metrics entry per search_stream attempt.
+
+    Subclasses persist the entries; the entries of the current run are also
+    kept in memory for the end-of-run summary.
+    """
+
+    FIELDS = (
+        "recorded_at",
+        "report",
+        "report_name",
+        "customer_id",
+        "attempt",
+        "hedged",
+        "hedge_won",
+        "request_id",
+        "time_to_first_batch",
+        "batches",
+        "interval_mean",
+        "interval_max",
+        "rows",
+        "bytes",
+        "wait_seconds",
+        "handle_seconds",
+        "decode_seconds",
+        "total_seconds",
+        "error",
+    )
+
+    def __init__(self, path: Optional[str]):
+        """Initializes the recorder.
+
+        Args:
+            path: The file to store the metrics in, or None to only keep them
+                in memory.
+        """
+        self.path = path
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        """Stores one entry, filling in its report definition and time."""
+        entry = dict(
+            entry,
+            report=_report_definition_name(entry["report_name"]),
+            recorded_at=datetime.now().isoformat(timespec="seconds"),
+        )
+        with self._lock:
+            self.entries.append(entry)
+            self._store(entry)
+
+    def close(self) -> None:
+        """Releases the underlying store."""
+
+    def _store(self, entry: Dict[str, Any]) -> None:
+        """Persists one entry. The base recorder only keeps entries in memory."""
+
+
+class JsonlMetricsRecorder(MetricsRecorder):
+    """Appends metrics entries to a JSONL file."""
+
+    def _store(self, entry: Dict[str, Any]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class SqliteMetricsRecorder(MetricsRecorder):
+    """Stores metrics entries in a stream_metrics table of a SQLite file.
+
+    Entries accumulate across runs, so the table can be queried for the
+    history of every report and customer.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS stream_metrics ({', '.join(self.FIELDS)})"
+        )
+        # Stores written by older versions lack the newer columns.
+        columns = {
+            row[1]
+            for row in self._connection.execute("PRAGMA table_info(stream_metrics)")
+        }
+        for field in self.FIELDS:
+            if field not in columns:
+                self._connection.execute(
+                    f"ALTER TABLE stream_metrics ADD COLUMN {field}"
+                )
+        self._connection.commit()
+
+    def _store(self, entry: Dict[str, Any]) -> None:
+        self._connection.execute(
+            f"INSERT INTO stream_metrics ({', '.join(self.FIELDS)}) "
+            f"VALUES ({', '.join('?' * len(self.FIELDS))})",
+            [entry[field] for field in self.FIELDS],
+        )
+        self._connection.commit()
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Returns every entry in the store, from all runs."""
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT {', '.join(self.FIELDS)} FROM stream_metrics"
+            )
+            return [dict(zip(self.FIELDS, row)) for row in cursor]
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def open_metrics_recorder(path: str) -> MetricsRecorder:
+    """Returns a SQLite recorder for .db/.sqlite paths and JSONL otherwise."""
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteMetricsRecorder(path)
+    return JsonlMetricsRecorder(path)
+
+
+class StreamTimer:
+    """Measures one search_stream attempt for a MetricsRecorder.
+
+    wait_seconds is the time spent waiting for the next batch to arrive,
+    handle_seconds the time the stream's loop spent on each batch (including
+    backpressure from a sink), and decode_seconds the time the sink writer
+    spent flattening and writing batches.
+    """
+
+    def __init__(
+        self,
+        recorder: MetricsRecorder,
+        report_name: str,
+        customer_id: str,
+        attempt: int,
+    ):
+        self._recorder = recorder
+        self._start = time.monotonic()
+        self._last_batch: Optional[float] = None
+        self._intervals: List[float] = []
+        self.entry: Dict[str, Any] = {
+            "report_name": report_name,
+            "customer_id": customer_id,
+            "attempt": attempt,
+            "hedged": 0,
+            "hedge_won": 0,
+            "request_id": None,
+            "time_to_first_batch": None,
+            "rows": 0,
+            "bytes": 0,
+            "wait_seconds": 0.0,
+            "handle_seconds": 0.0,
+            "decode_seconds": 0.0,
+        }
+
+    def _on_batch(self, batch: Any, wait: float) -> None:
+        now = time.monotonic()
+        if self._last_batch is None:
+            self.entry["time_to_first_batch"] = now - self._start
+            self.entry["request_id"] = getattr(batch, "request_id", None) or None
+        else:
+            self._intervals.append(now - self._last_batch)
+        self._last_batch = now
+        self.entry["wait_seconds"] += wait
+        self.entry["rows"] += len(batch.results)
+        raw_batch = _raw_message(batch)
+        if hasattr(raw_batch, "ByteSize"):
+            self.entry["bytes"] += raw_batch.ByteSize()
+
+    def wrap(self, stream: Any) -> Any:
+        """Yields the batches of a stream, timing each one."""
+        iterator = iter(stream)
+        while True:
+            start = time.monotonic()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self._on_batch(batch, time.monotonic() - start)
+            start = time.monotonic()
+            yield batch
+            self.entry["handle_seconds"] += time.monotonic() - start
+
+    async def wrap_async(self, stream: Any) -> Any:
+        """Yields the batches of an async stream, timing each one."""
+        iterator = stream.__aiter__()
+        while True:
+            start = time.monotonic()
+            try:
+                batch = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            self._on_batch(batch, time.monotonic() - start)
+            start = time.monotonic()
+            yield batch
+            self.entry["handle_seconds"] += time.monotonic() - start
+
+    def finish(
+        self,
+        exception: Optional[BaseException],
+        writer: Optional[BoundedSinkWriter] = None,
+    ) -> None:
+        """Records the entry for the attempt.
+
+        Args:
+            exception: The exception the stream failed with, if any.
+            writer: The sink writer of the stream, if any.
+        """
+        if exception is not None:
+            self.entry["request_id"] = getattr(exception, "request_id", None)
+            self.entry["error"] = str(exception)
+        else:
+            self.entry["error"] = None
+        if writer is not None:
+            self.entry["decode_seconds"] = writer.write_seconds
+        self.entry["batches"] = len(self._intervals) + (self._last_batch is not None)
+        self.entry["interval_mean"] = (
+            statistics.fmean(self._intervals) if self._intervals else None
+        )
+        self.entry["interval_max"] = max(self._intervals, default=None)
+        self.entry["total_seconds"] = time.monotonic() - self._start
+        self._recorder.record(self.entry)
+
+
+class JobDurationHistory:
+    """Remembers how long each (customer, report) job took in past runs.
+
+    Durations are the stream time of successful attempts, smoothed across
+    runs with JOB_HISTORY_SMOOTHING, and kept in a JSON file keyed by
+    customer ID and report definition. Date shards of a report share the
+    entry of their report, holding the mean duration of one shard.
+    """
+
+    def __init__(self, path: str):
+        """Loads the history, or starts an empty one if the file doesn't exist.
+
+        Args:
+            path: The history file.
+        """
+        self.path = path
+        self.durations: Dict[str, float] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.durations = json.load(f)
+
+    @staticmethod
+    def _key(customer_id: str, report_name: str) -> str:
+        return f"{customer_id}\t{_report_definition_name(report_name)}"
+
+    def estimate(self, customer_id: str, report_name: str) -> float:
+        """Returns the expected duration of a job in seconds.
+
+        Jobs without history are estimated by the mean of the same report for
+        other customers, or else by the longest known duration, so that new
+        jobs are not left until the end of the run.
+        """
+        key = self._key(customer_id, report_name)
+        if key in self.durations:
+            return self.durations[key]
+        report = key.split("\t", 1)[1]
+        same_report = [
+            seconds
+            for other, seconds in self.durations.items()
+            if other.split("\t", 1)[1] == report
+        ]
+        if same_report:
+            return statistics.fmean(same_report)
+        return max(self.durations.values(), default=0.0)
+
+    def update(self, entries: List[Dict[str, Any]]) -> None:
+        """Folds the metrics entries of a run into the history and saves it.
+
+        Args:
+            entries: Entries as recorded by a MetricsRecorder.
+        """
+        run_durations: Dict[str, List[float]] = {}
+        for entry in entries:
+            if entry["error"] is None:
+                key = self._key(entry["customer_id"], entry["report_name"])
+                run_durations.setdefault(key, []).append(entry["total_seconds"])
+        for key, seconds in run_durations.items():
+            duration = statistics.fmean(seconds)
+            if key in self.durations:
+                duration = (
+                    JOB_HISTORY_SMOOTHING * duration
+                    + (1 - JOB_HISTORY_SMOOTHING) * self.durations[key]
+                )
+            self.durations[key] = duration
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.durations, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def order_jobs_longest_first(
+    jobs: List[Tuple[str, str, str]], history: JobDurationHistory
+) -> List[Tuple[str, str, str]]:
+    """Orders jobs by their expected duration, longest first.
+
+    Both engines start jobs in submission order as slots free up, so this is
+    greedy longest-processing-time scheduling: the long reports start while
+    every slot is still free, and the short ones fill slots as they become
+    idle towards the end, which keeps the makespan close to the minimum for
+    the worker budget.
+
+    Args:
+        jobs: The (customer_id, query, report_name) jobs to run.
+        history: The durations of earlier runs.
+
+    Returns:
+        The jobs, longest expected first. Jobs with equal estimates keep
+        their original order.
+    """
+    return sorted(jobs, key=lambda job: history.estimate(job[0], job[2]), reverse=True)
+
+
+def print_metrics_summary(recorder: MetricsRecorder) -> None:
+    """Prints the slowest report definitions and customers of the run."""
+
+    def seconds(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.2f}s"
+
+    print(f"\n--- Stream metrics (written to {recorder.path}) ---")
+    for group_by in ("report", "customer_id"):
+        for summary in summarize_stream_metrics(recorder.entries, group_by)[:10]:
+            print(
+                f"{summary[group_by]}: {summary['streams']} streams, "
+                f"{summary['rows']} rows, {summary['bytes']} bytes, "
+                f"{summary['total_seconds']:.2f}s total, "
+                f"duration p50/p95/p99 {seconds(summary['total_seconds_p50'])}/"
+                f"{seconds(summary['total_seconds_p95'])}/"
+                f"{seconds(summary['total_seconds_p99'])}, "
+                f"first batch p50 {seconds(summary['time_to_first_batch_p50'])}, "
+                f"{summary['retries']} retries, {summary['hedges']} hedges "
+                f"({summary['hedge_wins']} won), {summary['failed']} failed"
+            )
@@ -0,0 +1,457 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Pooled gRPC channels and adaptive concurrency for report streams."""
+
+import contextlib
+import logging
+import random
+import threading
+import time
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+import grpc
+from google.ads.googleads import interceptors
+from google.ads.googleads.client import GoogleAdsClient
+from google.ads.googleads.v22.services.services.google_ads_service import (
+    GoogleAdsServiceAsyncClient,
+    GoogleAdsServiceClient,
+)
+
+from .errors import is_quota_error
+
+# Default limits of the adaptive concurrency controller. It starts at
+# INITIAL_ADAPTIVE_LIMIT and grows towards MAX_ADAPTIVE_LIMIT while requests
+# stay healthy.
+INITIAL_ADAPTIVE_LIMIT = 5
+MAX_ADAPTIVE_LIMIT = 32
+
+# Defaults for the channels of a ServicePool. Google's front ends accept up to
+# 100 concurrent streams per HTTP/2 connection; keepalive pings keep idle
+# connections from being dropped between reports.
+MAX_STREAMS_PER_CHANNEL = 100
+CHANNEL_KEEPALIVE_MS = 30000
+# The message size limits of the channels client.get_service() creates.
+BASE_CHANNEL_OPTIONS = [
+    ("grpc.max_metadata_size", 16 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 64 * 1024 * 1024),
+]
+
+
+class AdaptiveConcurrencyController:
+    """Sizes report concurrency with additive-increase/multiplicative-decrease.
+
+    The limit grows by one slot for every `limit` healthy completions, i.e.
+    roughly once per "round" of requests, as long as latency stays under the
+    target and the recent error rate is low. A quota error or an error rate
+    above the threshold cuts the limit by `decrease_factor`. Decreases are
+    spaced by `cooldown_seconds` so that one burst of RESOURCE_EXHAUSTED
+    responses counts as a single congestion signal.
+
+    The controller is thread-safe. Threads block in acquire(); the asyncio
+    engine polls try_acquire() so that it never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = INITIAL_ADAPTIVE_LIMIT,
+        min_limit: int = 1,
+        max_limit: int = MAX_ADAPTIVE_LIMIT,
+        decrease_factor: float = 0.5,
+        latency_target: Optional[float] = None,
+        max_error_rate: float = 0.2,
+        error_window: int = 20,
+        cooldown_seconds: float = 5.0,
+    ):
+        """Initializes the controller.
+
+        Args:
+            initial_limit: The number of concurrent requests to start with.
+            min_limit: The limit never drops below this value.
+            max_limit: The limit never grows above this value.
+            decrease_factor: Multiplier applied to the limit on congestion.
+            latency_target: Requests slower than this many seconds do not
+                count towards an increase. None disables the latency check.
+            max_error_rate: Non-quota error rate, over the last
+                `error_window` completions, above which the limit is cut.
+            error_window: Number of recent completions used for the error rate.
+            cooldown_seconds: Minimum time between two decreases.
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.max_error_rate = max_error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self._limit = min(max(initial_limit, self.min_limit), self.max_limit)
+        self._in_flight = 0
+        self._healthy_streak = 0
+        self._recent_errors: List[bool] = []
+        self._error_window = error_window
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """The current number of requests allowed to run at the same time."""
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        """The number of requests currently holding a slot."""
+        return self._in_flight
+
+    def try_acquire(self) -> bool:
+        """Takes a slot if one is free.
+
+        Returns:
+            True if a slot was taken, False otherwise.
+        """
+        with self._condition:
+            if self._in_flight < self._limit:
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until a slot is free and takes it.
+
+        Args:
+            timeout: Maximum number of seconds to wait, or None to wait forever.
+
+        Returns:
+            True if a slot was taken, False if the timeout expired.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._in_flight < self._limit, timeout=timeout
+            ):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency: float, exception: Optional[Exception] = None) -> None:
+        """Returns a slot and adjusts the limit from the request outcome.
+
+        Args:
+            latency: How long the request took, in seconds.
+            exception: The exception the request failed with, if any.
+        """
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            quota_error = exception is not None and is_quota_error(exception)
+            other_error = exception is not None and not quota_error
+            self._recent_errors.append(other_error)
+            del self._recent_errors[: -self._error_window]
+            error_rate = sum(self._recent_errors) / len(self._recent_errors)
+
+            if quota_error or (
+                len(self._recent_errors) >= self._error_window
+                and error_rate > self.max_error_rate
+            ):
+                self._decrease()
+            elif exception is None and (
+                self.latency_target is None or latency <= self.latency_target
+            ):
+                self._healthy_streak += 1
+                if self._healthy_streak >= self._limit:
+                    self._healthy_streak = 0
+                    self._limit = min(self._limit + 1, self.max_limit)
+            self._condition.notify_all()
+
+    def release_unused(self) -> None:
+        """Returns a slot without counting an outcome, e.g. for a hedged
+        request that was cancelled."""
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._condition.notify_all()
+
+    def backoff_delay(
+        self, attempt: int, base: float = 1.0, cap: float = 60.0
+    ) -> float:
+        """Returns the delay before retrying a throttled request.
+
+        Args:
+            attempt: The retry number, starting at 1.
+            base: The delay for the first retry, in seconds.
+            cap: The maximum delay, in seconds.
+        """
+        # Full jitter keeps retried requests from arriving in lockstep.
+        return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+    def _decrease(self) -> None:
+        """Cuts the limit, at most once per cooldown period."""
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_seconds:
+            return
+        self._last_decrease = now
+        self._healthy_streak = 0
+        self._limit = max(self.min_limit, int(self._limit * self.decrease_factor))
+
+
+def _create_pooled_service(
+    client: GoogleAdsClient,
+    options: List[Tuple[str, Any]],
+    is_async: bool = False,
+) -> Tuple[Any, Any]:
+    """Creates a GoogleAdsService client on a channel of its own.
+
+    This builds the service the way client.get_service() does, with the same
+    interceptors, but on a channel created with the given options.
+
+    Args:
+        client: An initialized GoogleAdsClient instance.
+        options: The gRPC channel options.
+        is_async: Whether to create an async service on a grpc.aio channel.
+            Async channels belong to the event loop they are created on.
+
+    Returns:
+        The service and its channel.
+    """
+    version = client.version or "v22"
+    service_class = GoogleAdsServiceAsyncClient if is_async else GoogleAdsServiceClient
+    transport_class = service_class.get_transport_class(
+        "grpc_asyncio" if is_async else None
+    )
+    endpoint = client.endpoint or service_class.DEFAULT_ENDPOINT
+    logger = logging.getLogger(GoogleAdsClient.__module__)
+    metadata_args = (
+        client.developer_token,
+        client.login_customer_id,
+        client.linked_customer_id,
+        client.use_cloud_org_for_api_access,
+    )
+    if is_async:
+        # grpc.aio takes separate unary-unary and unary-stream interceptors.
+        channel = transport_class.create_channel(
+            host=endpoint,
+            credentials=client.credentials,
+            options=options,
+            interceptors=[
+                interceptors.AsyncUnaryUnaryMetadataInterceptor(*metadata_args),
+                interceptors.AsyncUnaryStreamMetadataInterceptor(*metadata_args),
+                interceptors.AsyncUnaryUnaryLoggingInterceptor(
+                    logger, version, endpoint
+                ),
+                interceptors.AsyncUnaryStreamLoggingInterceptor(
+                    logger, version, endpoint
+                ),
+                interceptors.AsyncUnaryUnaryExceptionInterceptor(
+                    version, use_proto_plus=client.use_proto_plus
+                ),
+                interceptors.AsyncUnaryStreamExceptionInterceptor(
+                    version, use_proto_plus=client.use_proto_plus
+                ),
+            ],
+        )
+        intercepted_channel = channel
+    else:
+        channel = transport_class.create_channel(
+            host=endpoint, credentials=client.credentials, options=options
+        )
+        intercepted_channel = grpc.intercept_channel(
+            channel,
+            interceptors.MetadataInterceptor(*metadata_args),
+            interceptors.LoggingInterceptor(logger, version, endpoint),
+            interceptors.ExceptionInterceptor(
+                version, use_proto_plus=client.use_proto_plus
+            ),
+        )
+    service = service_class(transport=transport_class(channel=intercepted_channel))
+    return service, channel
+
+
+class ServicePool:
+    """Shares a fixed set of GoogleAdsService channels between report fetches.
+
+    client.get_service() opens a new gRPC channel, with its own connection
+    and TLS handshake, on every call. A pool creates its services once and
+    leases them to fetches, always picking the channel with the fewest open
+    streams. It also records how busy each channel was, see stats().
+
+    grpc.aio channels belong to the event loop they are created on, so an
+    async pool only creates its channels when it is opened on the loop that
+    runs the reports, and is closed on that loop with aclose().
+    """
+
+    def __init__(
+        self,
+        client: GoogleAdsClient,
+        channels: int = 1,
+        max_streams_per_channel: int = MAX_STREAMS_PER_CHANNEL,
+        keepalive_ms: int = CHANNEL_KEEPALIVE_MS,
+        is_async: bool = False,
+    ):
+        """Creates the services of the pool.
+
+        Args:
+            client: An initialized GoogleAdsClient instance.
+            channels: The number of channels, and so of connections, to open.
+            max_streams_per_channel: The number of streams a channel carries
+                before lease() waits for a free one.
+            keepalive_ms: The interval of HTTP/2 keepalive pings.
+            is_async: Whether to create async services for the asyncio engine.
+                Their channels are created by open().
+        """
+        self.max_streams_per_channel = max_streams_per_channel
+        self.is_async = is_async
+        self._client = client
+        self._condition = threading.Condition()
+        self._created = time.monotonic()
+        self.channel_options = BASE_CHANNEL_OPTIONS + [
+            ("grpc.keepalive_time_ms", keepalive_ms),
+            ("grpc.keepalive_permit_without_calls", 1),
+            # Channels with identical arguments otherwise share one
+            # connection through gRPC's global subchannel pool.
+            ("grpc.use_local_subchannel_pool", 1),
+        ]
+        self._services = []
+        self._grpc_channels = []
+        self._channels = [
+            {
+                "streams": 0,
+                "in_flight": 0,
+                "peak_in_flight": 0,
+                "stream_seconds": 0.0,
+                "busy_seconds": 0.0,
+                "busy_since": None,
+            }
+            for _ in range(channels)
+        ]
+        self.wait_seconds = 0.0
+        if not is_async:
+            self.open()
+
+    def open(self) -> None:
+        """Creates the channels of the pool, unless they are open already.
+
+        An async pool must be opened on the event loop that uses it.
+        """
+        if self._services:
+            return
+        for _ in self._channels:
+            service, channel = _create_pooled_service(
+                self._client, self.channel_options, self.is_async
+            )
+            self._services.append(service)
+            self._grpc_channels.append(channel)
+
+    def close(self) -> None:
+        """Closes the channels of a sync pool."""
+        for channel in self._grpc_channels:
+            channel.close()
+        self._services, self._grpc_channels = [], []
+
+    async def aclose(self) -> None:
+        """Closes the channels of an async pool, on the loop they belong to."""
+        for channel in self._grpc_channels:
+            await channel.close()
+        self._services, self._grpc_channels = [], []
+
+    def has_capacity(self) -> bool:
+        """Returns True if a channel carries fewer than max_streams_per_channel
+        streams, i.e. lease() would not have to wait."""
+        with self._condition:
+            return any(
+                channel["in_flight"] < self.max_streams_per_channel
+                for channel in self._channels
+            )
+
+    @contextlib.contextmanager
+    def lease(self, block: bool = True):
+        """Leases the least busy service for the duration of one stream.
+
+        Args:
+            block: Whether to wait while every channel carries
+                max_streams_per_channel streams. The asyncio engine passes
+                False, since waiting here would block its event loop; its
+                semaphore bounds the number of streams instead.
+
+        Yields:
+            A GoogleAdsService client.
+        """
+        self.open()
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                index = min(
+                    range(len(self._channels)),
+                    key=lambda i: self._channels[i]["in_flight"],
+                )
+                channel = self._channels[index]
+                if not block or channel["in_flight"] < self.max_streams_per_channel:
+                    break
+                self._condition.wait()
+            acquired = time.monotonic()
+            self.wait_seconds += acquired - start
+            if channel["in_flight"] == 0:
+                channel["busy_since"] = acquired
+            channel["streams"] += 1
+            channel["in_flight"] += 1
+            channel["peak_in_flight"] = max(
+                channel["peak_in_flight"], channel["in_flight"]
+            )
+        try:
+            yield self._services[index]
+        finally:
+            with self._condition:
+                now = time.monotonic()
+                channel["in_flight"] -= 1
+                channel["stream_seconds"] += now - acquired
+                if channel["in_flight"] == 0:
+                    channel["busy_seconds"] += now - channel["busy_since"]
+                    channel["busy_since"] = None
+                self._condition.notify()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Returns the utilization of each channel since the pool was created.
+
+        Each entry has the number of "streams" started, the "peak_in_flight"
+        streams, "busy" (the fraction of time with at least one open stream)
+        and "mean_in_flight" (the average number of open streams).
+        """
+        with self._condition:
+            now = time.monotonic()
+            elapsed = max(now - self._created, 1e-9)
+            stats = []
+            for channel in self._channels:
+                busy_seconds = channel["busy_seconds"]
+                if channel["busy_since"] is not None:
+                    busy_seconds += now - channel["busy_since"]
+                stats.append(
+                    {
+                        "streams": channel["streams"],
+                        "peak_in_flight": channel["peak_in_flight"],
+                        "busy": busy_seconds / elapsed,
+                        "mean_in_flight": channel["stream_seconds"] / elapsed,
+                    }
+                )
+            return stats
+
+    def print_stats(self) -> None:
+        """Prints one utilization line per channel."""
+        for index, channel in enumerate(self.stats()):
+            print(
+                f"Channel {index}: {channel['streams']} streams, "
+                f"peak {channel['peak_in_flight']} in flight, "
+                f"busy {channel['busy']:.0%}, "
+                f"{channel['mean_in_flight']:.1f} streams on average."
+            )
+        print(f"Waited {self.wait_seconds:.1f}s in total for a free channel.")
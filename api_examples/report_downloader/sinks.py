@@ -0,0 +1,527 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sinks that stream report rows to CSV, JSONL or Parquet files."""
+
+from concurrent.futures import (
+    Executor,
+    Future,
+)
+import csv
+import functools
+import heapq
+import itertools
+import json
+import os
+import queue
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from .gaql import (
+    _decode_batch,
+    _parse_limit,
+    _parse_order_by,
+    _parse_select_fields,
+    _raw_message,
+    compile_row_accessor,
+    merge_shard_rows,
+)
+
+# Number of response batches (up to 10,000 rows each) that may wait between a
+# stream and its sink. Peak memory per report is bounded by this, not by the
+# size of the report.
+SINK_QUEUE_SIZE = 4
+
+OUTPUT_FORMATS = ("csv", "jsonl", "parquet")
+
+
+class ReportSink:
+    """Writes the rows of one report to a file as they arrive.
+
+    A sink is cheap to create: the file is only opened by open(), which also
+    truncates any output left behind by a previous attempt.
+    """
+
+    extension = ""
+
+    def __init__(self, path: str, fields: List[str]):
+        """Initializes the sink.
+
+        Args:
+            path: The file to write to.
+            fields: The GAQL fields of the report, in column order.
+        """
+        self.path = path
+        self.fields = fields
+        self.rows_written = 0
+        # Set by the sink factory when batches should be decoded in a process
+        # pool rather than on the writer thread.
+        self.decode_pool: Optional[Executor] = None
+
+    def open(self) -> None:
+        """Opens (or re-opens) the output file."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.rows_written = 0
+        self._open()
+
+    def write_batch(self, results: Any) -> None:
+        """Flattens and writes one batch of GoogleAdsRow results.
+
+        Args:
+            results: The results of one SearchGoogleAdsStreamResponse.
+        """
+        accessor = compile_row_accessor(self.fields)
+        self.write_rows(
+            [dict(zip(self.fields, accessor(_raw_message(row)))) for row in results]
+        )
+
+    def write_columns(self, columns: Dict[str, List[Any]]) -> None:
+        """Writes rows given as one list of values per GAQL field.
+
+        Args:
+            columns: The columns returned by _decode_batch.
+        """
+        self.write_rows(
+            [dict(zip(self.fields, values)) for values in zip(*columns.values())]
+        )
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """Writes rows that are already flattened by GAQL field name.
+
+        Args:
+            rows: The rows to write.
+        """
+        if rows:
+            self._write_rows(rows)
+            self.rows_written += len(rows)
+
+    def close(self) -> None:
+        """Flushes and closes the output file."""
+        raise NotImplementedError
+
+    def _open(self) -> None:
+        raise NotImplementedError
+
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+
+class CsvSink(ReportSink):
+    """Writes rows as CSV with one column per GAQL field."""
+
+    extension = "csv"
+
+    def _open(self) -> None:
+        self._file = open(self.path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fields)
+        self._writer.writeheader()
+
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class JsonlSink(ReportSink):
+    """Writes rows as JSON objects, one per line."""
+
+    extension = "jsonl"
+
+    def _open(self) -> None:
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self._file.writelines(json.dumps(row, default=str) + "\n" for row in rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink(ReportSink):
+    """Writes rows as Parquet, one row group per response batch.
+
+    Requires pyarrow, which is not a dependency of this project.
+    """
+
+    extension = "parquet"
+
+    def _open(self) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as ex:
+            raise ImportError(
+                "The parquet output format requires pyarrow. "
+                "Install it with: pip install pyarrow"
+            ) from ex
+        self._pyarrow = pyarrow
+        self._writer = None
+        self._parquet = pyarrow.parquet
+
+    def write_columns(self, columns: Dict[str, List[Any]]) -> None:
+        # Decoded columns map directly onto an Arrow table.
+        row_count = len(next(iter(columns.values()), []))
+        if row_count:
+            self._write_table(self._pyarrow.Table.from_pydict, columns)
+            self.rows_written += row_count
+
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self._write_table(self._pyarrow.Table.from_pylist, rows)
+
+    def _write_table(self, from_data: Callable[..., Any], data: Any) -> None:
+        if self._writer is None:
+            table = from_data(data)
+            self._writer = self._parquet.ParquetWriter(self.path, table.schema)
+        else:
+            table = from_data(data, schema=self._writer.schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+SINK_TYPES = {sink.extension: sink for sink in (CsvSink, JsonlSink, ParquetSink)}
+
+
+# Date shards written to disk are staged in this subdirectory of the output
+# directory, as JSONL so that metric types survive the round trip, and then
+# merged into their report's output file.
+SHARD_STAGING_DIR = "shards"
+
+# Number of rows written to a report's sink at a time when merging its shards.
+MERGE_BATCH_SIZE = 10000
+
+
+def make_sink(
+    output_dir: str, output_format: str, query: str, report_name: str
+) -> ReportSink:
+    """Creates the sink for one report job.
+
+    Args:
+        output_dir: The directory to write report files to.
+        output_format: One of OUTPUT_FORMATS.
+        query: The GAQL query of the report.
+        report_name: The report name, used to derive the file name.
+    """
+    file_name = re.sub(r"[^A-Za-z0-9]+", "_", report_name).strip("_").lower()
+    sink_class = SINK_TYPES[output_format]
+    path = os.path.join(output_dir, f"{file_name}.{sink_class.extension}")
+    return sink_class(path, _parse_select_fields(query))
+
+
+def _iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Yields the rows written by a JsonlSink one at a time.
+
+    Args:
+        path: The JSONL file to read.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class _OrderByKey:
+    """Compares flattened rows by the fields and directions of an ORDER BY."""
+
+    __slots__ = ("order_by", "row")
+
+    def __init__(self, order_by: List[Tuple[str, bool]], row: Dict[str, Any]):
+        self.order_by = order_by
+        self.row = row
+
+    def __lt__(self, other: "_OrderByKey") -> bool:
+        for field, descending in self.order_by:
+            value, other_value = self.row[field], other.row[field]
+            if value != other_value:
+                return value > other_value if descending else value < other_value
+        return False
+
+
+def _reaggregate_staged_shards(
+    query: str, paths: List[str]
+) -> Iterator[Dict[str, Any]]:
+    """Yields the re-aggregated rows of staged shards, in the query's order.
+
+    The rows are summed, sorted and limited by SQLite in a temporary database
+    next to the shard files, which spills to disk instead of holding every
+    group in memory.
+
+    Args:
+        query: The original, unsharded GAQL query, without segments.date.
+        paths: The JSONL files of the report's shards.
+    """
+    fields = _parse_select_fields(query)
+    metric_fields = [field for field in fields if field.startswith("metrics.")]
+    key_fields = [field for field in fields if field not in metric_fields]
+    order_by = _parse_order_by(query)
+    # Attribute and segment fields are grouped on as a JSON key, so their
+    # values come back with their original types; the ones the query orders
+    # by also get a column of their own.
+    sort_fields = [field for field, _ in order_by if field in key_fields]
+    order_terms = [
+        (
+            f"MIN(s{sort_fields.index(field)})"
+            if field in sort_fields
+            else f"SUM(m{metric_fields.index(field)})"
+        )
+        + (" DESC" if descending else "")
+        for field, descending in order_by
+    ]
+    columns = ["key"] + [f"s{i}" for i in range(len(sort_fields))]
+    columns += [f"m{i}" for i in range(len(metric_fields))]
+    limit = _parse_limit(query)
+
+    fd, db_path = tempfile.mkstemp(dir=os.path.dirname(paths[0]), suffix=".sqlite3")
+    os.close(fd)
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.execute(f"CREATE TABLE rows ({', '.join(columns)})")
+        connection.executemany(
+            f"INSERT INTO rows VALUES ({', '.join('?' * len(columns))})",
+            (
+                (
+                    json.dumps([row[field] for field in key_fields]),
+                    *(row[field] for field in sort_fields),
+                    *(row[field] for field in metric_fields),
+                )
+                for path in paths
+                for row in _iter_jsonl(path)
+            ),
+        )
+        sums = "".join(f", SUM(m{i})" for i in range(len(metric_fields)))
+        sql = f"SELECT key{sums} FROM rows GROUP BY key"
+        if order_terms:
+            sql += f" ORDER BY {', '.join(order_terms)}"
+        if limit is not None:
+            sql += f" LIMIT {limit}"
+        for key, *metrics in connection.execute(sql):
+            values = dict(zip(key_fields, json.loads(key)))
+            values.update(zip(metric_fields, metrics))
+            yield {field: values[field] for field in fields}
+    finally:
+        connection.close()
+        os.remove(db_path)
+
+
+def _merge_staged_shards(query: str, paths: List[str]) -> Iterable[Dict[str, Any]]:
+    """Lazily merges the staged shard files of a report into its result.
+
+    Reports that select segments.date are merged as streams: every shard
+    query kept the report's ORDER BY, so its file is already sorted, and
+    heapq.merge only holds one row per shard. Other reports are re-aggregated
+    by _reaggregate_staged_shards.
+
+    Args:
+        query: The original, unsharded GAQL query.
+        paths: The JSONL files of the report's shards, in date order.
+
+    Returns:
+        An iterable over the merged rows.
+    """
+    if "segments.date" not in _parse_select_fields(query):
+        return _reaggregate_staged_shards(query, paths)
+    streams = [_iter_jsonl(path) for path in paths]
+    order_by = _parse_order_by(query)
+    if order_by:
+        rows = heapq.merge(*streams, key=functools.partial(_OrderByKey, order_by))
+    else:
+        rows = itertools.chain.from_iterable(streams)
+    limit = _parse_limit(query)
+    return itertools.islice(rows, limit) if limit is not None else rows
+
+
+def _write_merged_rows(sink: ReportSink, rows: Iterable[Dict[str, Any]]) -> None:
+    """Writes rows to a sink in batches of MERGE_BATCH_SIZE and closes it.
+
+    Args:
+        sink: The report's sink.
+        rows: The merged rows of the report's shards.
+    """
+    rows = iter(rows)
+    sink.open()
+    try:
+        for batch in iter(lambda: list(itertools.islice(rows, MERGE_BATCH_SIZE)), []):
+            sink.write_rows(batch)
+    finally:
+        sink.close()
+
+
+def build_job_sink_factory(
+    output_dir: str,
+    output_format: str,
+    shard_groups: Dict[str, Dict[str, Any]],
+    decode_pool: Optional[Executor] = None,
+) -> Callable[[str, str], ReportSink]:
+    """Returns the sink factory for the jobs of a run.
+
+    Shards are staged as JSONL under SHARD_STAGING_DIR, to be merged into
+    their report's output file; every other job writes its final output file.
+
+    Args:
+        output_dir: The directory to write report files to.
+        output_format: One of OUTPUT_FORMATS.
+        shard_groups: The shard groups returned by _expand_sharded_jobs.
+        decode_pool: An optional process pool that decodes the batches of
+            every sink.
+    """
+    staged_shards = {
+        name for group in shard_groups.values() for name in group["shard_names"]
+    }
+    staging_dir = os.path.join(output_dir, SHARD_STAGING_DIR)
+
+    def job_sink_factory(query: str, report_name: str) -> ReportSink:
+        if report_name in staged_shards:
+            sink = make_sink(staging_dir, "jsonl", query, report_name)
+        else:
+            sink = make_sink(output_dir, output_format, query, report_name)
+        sink.decode_pool = decode_pool
+        return sink
+
+    return job_sink_factory
+
+
+class BoundedSinkWriter:
+    """Moves response batches from a stream to a sink on a writer thread.
+
+    The queue between the two is bounded, so a slow sink applies
+    backpressure to the stream instead of letting rows pile up in memory.
+
+    With a decode pool, put() hands the serialized batch to the pool and
+    queues the pending result instead, so up to queue_size batches of one
+    stream are decoded in parallel while the writer keeps them in order.
+    """
+
+    def __init__(
+        self,
+        sink: ReportSink,
+        queue_size: int = SINK_QUEUE_SIZE,
+        decode_pool: Optional[Executor] = None,
+    ):
+        self._sink = sink
+        self._decode_pool = decode_pool
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.write_seconds = 0.0
+        self._error: Optional[BaseException] = None
+        sink.open()
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def put(self, batch: Any) -> None:
+        """Queues one response batch, blocking while the queue is full."""
+        if self._error:
+            raise self._error
+        if self._decode_pool:
+            data = type(batch).serialize(batch)
+            self._queue.put(
+                self._decode_pool.submit(_decode_batch, data, self._sink.fields)
+            )
+        else:
+            self._queue.put(batch)
+
+    def close(self) -> None:
+        """Waits for queued batches to be written and closes the sink."""
+        self._queue.put(None)
+        self._thread.join()
+        self._sink.close()
+        if self._error:
+            raise self._error
+
+    def _drain(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error:
+                continue  # Keep draining so that put() never blocks forever.
+            start = time.monotonic()
+            try:
+                if isinstance(item, Future):
+                    self._sink.write_columns(item.result())
+                else:
+                    self._sink.write_batch(item.results)
+            except Exception as ex:  # Surfaced to the stream by put()/close().
+                self._error = ex
+            self.write_seconds += time.monotonic() - start
+
+
+def merge_sharded_results(
+    all_results: Dict[str, Dict[str, Any]],
+    shard_groups: Dict[str, Dict[str, Any]],
+    sink_factory: Optional[Callable[[str, str], ReportSink]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """Combines the results of date shards back into one result per report.
+
+    Args:
+        all_results: The results of every job, including shard jobs.
+        shard_groups: The shard groups returned by _expand_sharded_jobs.
+        sink_factory: The sink factory used for the run, if any. Every
+            report's JSONL shard files are then read back and written to the
+            report's own sink: merged by _merge_staged_shards if the report
+            needs a merge, otherwise streamed one after another. Either way
+            only a batch of rows is held in memory at a time.
+
+    Returns:
+        The results keyed by the original report names.
+    """
+    for report_name, group in shard_groups.items():
+        shard_results = [all_results.pop(name) for name in group["shard_names"]]
+        exception = next(
+            (result["exception"] for result in shard_results if result["exception"]),
+            None,
+        )
+        merged: Dict[str, Any] = {"rows": None, "exception": exception}
+        if exception:
+            pass
+        elif group["needs_merge"] and sink_factory:
+            sink = sink_factory(group["query"], report_name)
+            _write_merged_rows(
+                sink,
+                _merge_staged_shards(
+                    group["query"], [result["sink"].path for result in shard_results]
+                ),
+            )
+            merged["sink"] = sink
+        elif group["needs_merge"]:
+            merged["rows"] = merge_shard_rows(
+                group["query"], [result["rows"] for result in shard_results]
+            )
+        elif sink_factory:
+            sink = sink_factory(group["query"], report_name)
+            _write_merged_rows(
+                sink,
+                itertools.chain.from_iterable(
+                    _iter_jsonl(result["sink"].path) for result in shard_results
+                ),
+            )
+            merged["sink"] = sink
+        else:
+            merged["rows"] = [row for result in shard_results for row in result["rows"]]
+        all_results[report_name] = merged
+    return all_results
@@ -0,0 +1,629 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks parallel_report_downloader_optimized against a fake API.
+
+FakeGoogleAdsService streams synthetic SearchGoogleAdsStreamResponse batches
+for any GAQL query, with configurable row counts, batch sizes, per-batch
+latency and error injection. Every batch is deserialized from bytes as it is
+yielded, as the real transport does, so decoding costs are realistic. No
+network access or credentials are needed.
+
+Each scenario runs in a fresh process, so that its peak RSS can be measured,
+and reports rows/s, time to first row, peak RSS and CPU time per report.
+Results can be saved and compared against an earlier baseline.
+
+Usage:
+    python api_examples/tests/benchmark_parallel_report_downloader.py \\
+        --engines threads asyncio --reports 20 --rows 50000 --latency_ms 5
+    python api_examples/tests/benchmark_parallel_report_downloader.py \\
+        --output_format csv --decode_workers 0 4 --save baseline.json
+    python api_examples/tests/benchmark_parallel_report_downloader.py \\
+        --output_format csv --decode_workers 0 4 --compare baseline.json
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import json
+import multiprocessing
+import random
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from unittest import mock
+from typing import Any, Dict, List, Optional
+
+import grpc
+from google.ads.googleads.errors import GoogleAdsException
+from google.ads.googleads.v22.errors.types.errors import (
+    ErrorCode,
+    GoogleAdsError,
+    GoogleAdsFailure,
+)
+from google.ads.googleads.v22.services.types.google_ads_service import SearchGoogleAdsStreamResponse
+from google.protobuf.descriptor import FieldDescriptor
+
+from api_examples.parallel_report_downloader_optimized import (
+    MAX_WORKERS,
+    _run_reports_async,
+    _run_reports_threaded,
+)
+from report_downloader import (
+    AdaptiveConcurrencyController,
+    build_job_sink_factory,
+    pool,
+    ServicePool,
+)
+from report_downloader.gaql import _parse_select_fields
+
+# Field sets for the synthetic reports. "campaign" matches the downloader's
+# default campaign report; "wide" adds strings and enums, which dominate
+# decoding costs in real reports.
+FIELD_SETS = {
+    "campaign": [
+        "campaign.id",
+        "campaign.name",
+        "metrics.clicks",
+        "metrics.impressions",
+        "metrics.cost_micros",
+    ],
+    "wide": [
+        "campaign.id",
+        "campaign.name",
+        "campaign.status",
+        "campaign.advertising_channel_type",
+        "campaign.bidding_strategy_type",
+        "ad_group.id",
+        "ad_group.name",
+        "ad_group.status",
+        "segments.date",
+        "segments.device",
+        "metrics.impressions",
+        "metrics.clicks",
+        "metrics.cost_micros",
+        "metrics.conversions",
+        "metrics.conversions_value",
+        "metrics.all_conversions",
+        "metrics.engagements",
+        "metrics.interactions",
+    ],
+}
+
+# Rows per response batch of the real API.
+API_BATCH_SIZE = 10000
+
+ERROR_KINDS = ("quota", "internal")
+
+
+class _FakeRpcError(grpc.RpcError):
+    def __init__(self, code: grpc.StatusCode):
+        self._code = code
+
+    def code(self) -> grpc.StatusCode:
+        return self._code
+
+
+def make_google_ads_exception(kind: str = "quota") -> GoogleAdsException:
+    """Returns a GoogleAdsException like the ones the API raises mid-stream.
+
+    Args:
+        kind: "quota" for a RESOURCE_EXHAUSTED quota error, or "internal".
+    """
+    if kind == "quota":
+        status = grpc.StatusCode.RESOURCE_EXHAUSTED
+        error_code = ErrorCode(quota_error=2)  # RESOURCE_EXHAUSTED
+    else:
+        status = grpc.StatusCode.INTERNAL
+        error_code = ErrorCode(internal_error=2)  # INTERNAL_ERROR
+    failure = GoogleAdsFailure(
+        errors=[GoogleAdsError(error_code=error_code, message=f"Injected {kind} error")]
+    )
+    return GoogleAdsException(
+        error=_FakeRpcError(status), call=None, failure=failure, request_id="fake"
+    )
+
+
+def _synthetic_value(field: Any, leaf: str, index: int) -> Any:
+    if field.enum_type is not None:
+        # Skip UNSPECIFIED and UNKNOWN, which real rows never contain.
+        values = field.enum_type.values[2:] or field.enum_type.values
+        return values[index % len(values)].number
+    if field.type == FieldDescriptor.TYPE_STRING:
+        if leaf == "date":
+            return f"2025-01-{index % 28 + 1:02d}"
+        return f"{leaf} {index}"
+    if field.type in (FieldDescriptor.TYPE_DOUBLE, FieldDescriptor.TYPE_FLOAT):
+        return index * 0.25
+    if field.type == FieldDescriptor.TYPE_BOOL:
+        return index % 2 == 0
+    return index
+
+
+def _set_synthetic_field(row: Any, field_path: str, index: int) -> None:
+    message = row
+    descriptor = row.DESCRIPTOR
+    parts = field_path.split(".")
+    for position, part in enumerate(parts):
+        field = descriptor.fields_by_name.get(part) or descriptor.fields_by_name.get(
+            f"{part}_"
+        )
+        if field is None:
+            raise ValueError(f"{field_path} is not a valid GAQL field.")
+        if position < len(parts) - 1:
+            message = getattr(message, field.name)
+            descriptor = field.message_type
+            continue
+        value = _synthetic_value(field, part, index)
+        if hasattr(field, "is_repeated"):
+            repeated = field.is_repeated
+        else:
+            repeated = field.label == FieldDescriptor.LABEL_REPEATED
+        if repeated:
+            getattr(message, field.name).append(value)
+        else:
+            setattr(message, field.name, value)
+
+
+def make_batch_bytes(fields: List[str], row_count: int, offset: int = 0) -> bytes:
+    """Returns a serialized response batch with synthetic values for fields.
+
+    Args:
+        fields: The GAQL fields to populate.
+        row_count: The number of rows in the batch.
+        offset: The index of the first row, so that batches differ.
+    """
+    response = SearchGoogleAdsStreamResponse.pb()()
+    for index in range(offset, offset + row_count):
+        row = response.results.add()
+        for field in fields:
+            _set_synthetic_field(row, field, index)
+    return response.SerializeToString()
+
+
+def _batch_count(stream: Dict[str, Any]) -> int:
+    if stream["fail_at"] is None:
+        return len(stream["batches"])
+    return stream["fail_at"] + 1
+
+
+class FakeGoogleAdsService:
+    """A GoogleAdsService whose search_stream returns synthetic batches.
+
+    Every stream returns rows_per_stream rows for the fields of its query,
+    regardless of WHERE or LIMIT clauses. The time each stream was opened and
+    delivered its first batch is recorded in `streams`.
+    """
+
+    def __init__(
+        self,
+        rows_per_stream: int = 10000,
+        batch_size: int = API_BATCH_SIZE,
+        batch_latency: float = 0.0,
+        first_batch_latency: Optional[float] = None,
+        error_rate: float = 0.0,
+        error_kind: str = "quota",
+        error_after_batches: int = 0,
+        seed: int = 0,
+    ):
+        """Initializes the fake service.
+
+        Args:
+            rows_per_stream: The number of rows every stream returns.
+            batch_size: The number of rows per response batch.
+            batch_latency: Seconds to wait before each batch.
+            first_batch_latency: Seconds to wait before the first batch, to
+                model query planning. Defaults to batch_latency.
+            error_rate: The fraction of streams that fail.
+            error_kind: The kind of error failing streams raise, one of
+                ERROR_KINDS.
+            error_after_batches: The number of batches a failing stream
+                yields before raising.
+            seed: The seed that decides which streams fail.
+        """
+        self.rows_per_stream = rows_per_stream
+        self.batch_size = batch_size
+        self.batch_latency = batch_latency
+        self.first_batch_latency = (
+            batch_latency if first_batch_latency is None else first_batch_latency
+        )
+        self.error_rate = error_rate
+        self.error_kind = error_kind
+        self.error_after_batches = error_after_batches
+        self.streams: List[Dict[str, Any]] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._batches: Dict[str, List[bytes]] = {}
+
+    def prepare(self, query: str) -> None:
+        """Generates the batches for a query ahead of the first stream.
+
+        Otherwise they are generated when the query is first streamed, which
+        is slow for large reports and would be counted as API latency.
+        """
+        with self._lock:
+            self._prepare(query)
+
+    def _prepare(self, query: str) -> List[bytes]:
+        if query not in self._batches:
+            fields = _parse_select_fields(query)
+            sizes = [self.batch_size] * (self.rows_per_stream // self.batch_size)
+            if self.rows_per_stream % self.batch_size:
+                sizes.append(self.rows_per_stream % self.batch_size)
+            self._batches[query] = [
+                make_batch_bytes(fields, size, i * self.batch_size)
+                for i, size in enumerate(sizes)
+            ]
+        return self._batches[query]
+
+    def _plan_stream(self, customer_id: str, query: str) -> Dict[str, Any]:
+        with self._lock:
+            batches = self._prepare(query)
+            fails = self._random.random() < self.error_rate
+            stream = {
+                "customer_id": customer_id,
+                "opened": time.monotonic(),
+                "first_batch": None,
+                "batches": batches,
+                # The index at which a failing stream raises instead of
+                # yielding a batch.
+                "fail_at": (
+                    min(self.error_after_batches, len(batches)) if fails else None
+                ),
+            }
+            self.streams.append(stream)
+            return stream
+
+    def _batch_delay(self, index: int) -> float:
+        return self.first_batch_latency if index == 0 else self.batch_latency
+
+    def _next_batch(self, stream: Dict[str, Any], index: int) -> Any:
+        if index == stream["fail_at"]:
+            raise make_google_ads_exception(self.error_kind)
+        if stream["first_batch"] is None:
+            stream["first_batch"] = time.monotonic()
+        return SearchGoogleAdsStreamResponse.deserialize(stream["batches"][index])
+
+    def search_stream(self, customer_id: str, query: str, **kwargs: Any) -> Any:
+        stream = self._plan_stream(customer_id, query)
+
+        def batches():
+            for index in range(_batch_count(stream)):
+                time.sleep(self._batch_delay(index))
+                yield self._next_batch(stream, index)
+
+        return batches()
+
+
+class FakeAsyncGoogleAdsService(FakeGoogleAdsService):
+    """The async counterpart of FakeGoogleAdsService.
+
+    Like the real async client, search_stream returns an awaitable that
+    resolves to an async iterable of batches.
+    """
+
+    def search_stream(self, customer_id: str, query: str, **kwargs: Any) -> Any:
+        stream = self._plan_stream(customer_id, query)
+
+        async def batches():
+            for index in range(_batch_count(stream)):
+                await asyncio.sleep(self._batch_delay(index))
+                yield self._next_batch(stream, index)
+
+        async def open_stream():
+            return batches()
+
+        return open_stream()
+
+
+class FakeGoogleAdsClient:
+    """A GoogleAdsClient that hands out one shared fake service."""
+
+    def __init__(self, **service_options: Any):
+        self.login_customer_id = None
+        self.service = FakeGoogleAdsService(**service_options)
+        self.async_service = FakeAsyncGoogleAdsService(**service_options)
+
+    def get_service(self, name: str, is_async: bool = False, **kwargs: Any) -> Any:
+        return self.async_service if is_async else self.service
+
+
+def _create_fake_pooled_service(
+    client: FakeGoogleAdsClient, options: Any, is_async: bool = False
+) -> Any:
+    """Stands in for the downloader's gRPC channel creation in ServicePool."""
+    channel = mock.AsyncMock() if is_async else mock.MagicMock()
+    return client.get_service("GoogleAdsService", is_async=is_async), channel
+
+
+def _percentile(values: List[float], percent: int) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def run_scenario(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs one benchmark scenario in the current process.
+
+    Args:
+        config: The scenario settings, see _scenario_configs for the keys.
+
+    Returns:
+        The scenario name and its measurements.
+    """
+    client = FakeGoogleAdsClient(
+        rows_per_stream=config["rows"],
+        batch_size=config["batch_size"],
+        batch_latency=config["latency_ms"] / 1000,
+        first_batch_latency=config["first_batch_latency_ms"] / 1000,
+        error_rate=config["error_rate"],
+        error_kind=config["error_kind"],
+    )
+    fields = FIELD_SETS[config["fields"]]
+    query = (
+        f"SELECT {', '.join(fields)} FROM campaign "
+        "WHERE segments.date DURING LAST_30_DAYS"
+    )
+    jobs = [
+        (str(1000000000 + i), query, f"Report {i}") for i in range(config["reports"])
+    ]
+    is_async = config["engine"] == "asyncio"
+    service = client.async_service if is_async else client.service
+    service.prepare(query)
+    controller = None
+    if config["adaptive"]:
+        controller = AdaptiveConcurrencyController(
+            initial_limit=MAX_WORKERS, max_limit=config["concurrency"]
+        )
+
+    with contextlib.ExitStack() as stack:
+        # The downloader reports progress on stdout for every report.
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        sink_factory = None
+        decode_pool = None
+        if config["decode_workers"]:
+            decode_pool = stack.enter_context(
+                ProcessPoolExecutor(max_workers=config["decode_workers"])
+            )
+        if config["output_format"] != "none":
+            output_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            sink_factory = build_job_sink_factory(
+                output_dir, config["output_format"], {}, decode_pool
+            )
+        service_pool = None
+        if config["channels"]:
+            stack.enter_context(
+                mock.patch.object(
+                    pool,
+                    "_create_pooled_service",
+                    _create_fake_pooled_service,
+                )
+            )
+            service_pool = ServicePool(client, config["channels"], is_async=is_async)
+
+        cpu_start = _cpu_seconds()
+        start = time.monotonic()
+        if is_async:
+            results = asyncio.run(
+                _run_reports_async(
+                    client,
+                    jobs,
+                    config["concurrency"],
+                    controller,
+                    sink_factory,
+                    None,
+                    service_pool,
+                )
+            )
+        else:
+            results = _run_reports_threaded(
+                client,
+                jobs,
+                config["concurrency"],
+                controller,
+                sink_factory,
+                None,
+                service_pool,
+            )
+        seconds = time.monotonic() - start
+
+    cpu_seconds = _cpu_seconds() - cpu_start
+    time_to_first_row = [
+        stream["first_batch"] - start
+        for stream in service.streams
+        if stream["first_batch"] is not None
+    ]
+    rows = sum(
+        result["sink"].rows_written if "sink" in result else len(result["rows"] or [])
+        for result in results.values()
+        if not result["exception"]
+    )
+    return {
+        "scenario": config["name"],
+        "reports": len(jobs),
+        "failed": sum(1 for result in results.values() if result["exception"]),
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+        "ttfr_p50": _percentile(time_to_first_row, 50),
+        "ttfr_max": max(time_to_first_row, default=0.0),
+        "peak_rss_mb": _peak_rss_mb(),
+        "cpu_ms_per_report": cpu_seconds * 1000 / len(jobs),
+    }
+
+
+def _cpu_seconds() -> float:
+    """Returns the CPU time of this process and its finished children."""
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_isolated(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs a scenario in a fresh process, so that peak RSS is its own."""
+    context = multiprocessing.get_context("spawn")
+    # Unlike multiprocessing.Pool workers, these may start a decode pool.
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_scenario, config).result()
+
+
+def _scenario_configs(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    configs = []
+    for engine in args.engines:
+        for decode_workers in args.decode_workers:
+            if decode_workers and args.output_format == "none":
+                continue  # Decode workers only apply when writing sinks.
+            name = f"{engine}"
+            if args.adaptive:
+                name += " adaptive"
+            if decode_workers:
+                name += f" decode={decode_workers}"
+            if args.channels:
+                name += f" channels={args.channels}"
+            configs.append(
+                {
+                    "name": name,
+                    "engine": engine,
+                    "concurrency": args.concurrency
+                    or (100 if engine == "asyncio" else MAX_WORKERS),
+                    "adaptive": args.adaptive,
+                    "decode_workers": decode_workers,
+                    "channels": args.channels,
+                    "reports": args.reports,
+                    "rows": args.rows,
+                    "batch_size": args.batch_size,
+                    "fields": args.fields,
+                    "latency_ms": args.latency_ms,
+                    "first_batch_latency_ms": (
+                        args.latency_ms
+                        if args.first_batch_latency_ms is None
+                        else args.first_batch_latency_ms
+                    ),
+                    "error_rate": args.error_rate,
+                    "error_kind": args.error_kind,
+                    "output_format": args.output_format,
+                }
+            )
+    return configs
+
+
+def _print_table(
+    results: List[Dict[str, Any]], baseline: Optional[Dict[str, Dict[str, Any]]]
+) -> None:
+    header = (
+        f"{'scenario':<32} {'rows/s':>12} {'ttfr p50':>9} {'ttfr max':>9} "
+        f"{'RSS MB':>8} {'CPU ms/rpt':>11} {'failed':>7}"
+    )
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        line = (
+            f"{result['scenario']:<32} {result['rows_per_second']:>12,.0f} "
+            f"{result['ttfr_p50']:>8.3f}s {result['ttfr_max']:>8.3f}s "
+            f"{result['peak_rss_mb']:>8.1f} {result['cpu_ms_per_report']:>11.1f} "
+            f"{result['failed']:>7}"
+        )
+        base = (baseline or {}).get(result["scenario"])
+        if base and base["rows_per_second"]:
+            change = result["rows_per_second"] / base["rows_per_second"] - 1
+            line += f" {change:>+8.0%}"
+        print(line)
+
+
+def main(args: argparse.Namespace) -> None:
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {result["scenario"]: result for result in json.load(f)}
+
+    results = []
+    for config in _scenario_configs(args):
+        print(f"Running {config['name']}...", file=sys.stderr)
+        results.append(
+            run_scenario(config) if args.in_process else _run_isolated(config)
+        )
+
+    print(
+        f"{args.reports} reports x {args.rows} rows ({args.fields} fields), "
+        f"batch size {args.batch_size}, {args.latency_ms} ms per batch, "
+        f"output {args.output_format}:"
+    )
+    _print_table(results, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--engines", nargs="+", choices=("threads", "asyncio"), default=["threads"]
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Worker threads or async streams (default: the downloader's).",
+    )
+    parser.add_argument("--adaptive", action="store_true")
+    parser.add_argument(
+        "--decode_workers",
+        type=int,
+        nargs="+",
+        default=[0],
+        help="Decode pool sizes to compare; 0 decodes on the writer thread.",
+    )
+    parser.add_argument("--channels", type=int, default=0)
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=20000, help="Rows per report.")
+    parser.add_argument("--batch_size", type=int, default=API_BATCH_SIZE)
+    parser.add_argument("--fields", choices=sorted(FIELD_SETS), default="wide")
+    parser.add_argument("--latency_ms", type=float, default=0.0)
+    parser.add_argument("--first_batch_latency_ms", type=float)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--error_kind", choices=ERROR_KINDS, default="quota")
+    parser.add_argument(
+        "--output_format", choices=("none", "csv", "jsonl", "parquet"), default="none"
+    )
+    parser.add_argument("--save", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="A JSON file saved by an earlier run.")
+    parser.add_argument(
+        "--in_process",
+        action="store_true",
+        help="Run scenarios in this process; peak RSS is then cumulative.",
+    )
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmarks flattening GoogleAdsRow batches with and without proto-plus.
+
+Compares the proto-plus path (_flatten_row on proto-plus rows) with the
+compiled accessors that read raw protobuf rows, both on decoded rows and
+starting from serialized batch bytes as in the decode worker processes. No
+API access is needed; the rows are synthetic.
+
+Usage:
+    python api_examples/tests/benchmark_row_accessors.py --rows 10000
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import argparse
+import timeit
+
+from google.ads.googleads.v22.services.types.google_ads_service import (
+    GoogleAdsRow,
+    SearchGoogleAdsStreamResponse,
+)
+
+from report_downloader import compile_row_accessor
+from report_downloader.gaql import (
+    _decode_batch,
+    _flatten_row,
+    _raw_message,
+)
+
+FIELDS = [
+    "campaign.id",
+    "campaign.name",
+    "campaign.status",
+    "campaign.advertising_channel_type",
+    "segments.date",
+    "metrics.impressions",
+    "metrics.clicks",
+    "metrics.cost_micros",
+    "metrics.conversions",
+    "metrics.conversions_value",
+]
+
+
+def _make_batch(row_count: int) -> SearchGoogleAdsStreamResponse:
+    rows = []
+    for i in range(row_count):
+        row = GoogleAdsRow()
+        row.campaign.id = i
+        row.campaign.name = f"Campaign {i}"
+        row.campaign.status = 2  # ENABLED
+        row.campaign.advertising_channel_type = 2  # SEARCH
+        row.segments.date = "2025-01-01"
+        row.metrics.impressions = i * 100
+        row.metrics.clicks = i * 10
+        row.metrics.cost_micros = i * 1000000
+        row.metrics.conversions = i / 10
+        row.metrics.conversions_value = i * 1.5
+        rows.append(row)
+    return SearchGoogleAdsStreamResponse(results=rows)
+
+
+def main(row_count: int, repeat: int) -> None:
+    batch = _make_batch(row_count)
+    results = batch.results
+    data = SearchGoogleAdsStreamResponse.serialize(batch)
+    accessor = compile_row_accessor(FIELDS)
+
+    cases = {
+        "proto-plus _flatten_row": lambda: [
+            _flatten_row(row, FIELDS) for row in results
+        ],
+        "compiled accessor": lambda: [accessor(_raw_message(row)) for row in results],
+        "bytes -> proto-plus _flatten_row": lambda: [
+            _flatten_row(row, FIELDS)
+            for row in SearchGoogleAdsStreamResponse.deserialize(data).results
+        ],
+        "bytes -> _decode_batch": lambda: _decode_batch(data, FIELDS),
+    }
+
+    print(f"{row_count} rows x {len(FIELDS)} fields, best of {repeat}:")
+    baseline = None
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=1, repeat=repeat))
+        if baseline is None or (name.startswith("bytes") and "proto-plus" in name):
+            baseline = seconds
+        print(
+            f"  {name:<34} {seconds * 1000:9.1f} ms "
+            f"{row_count / seconds:12,.0f} rows/s  {baseline / seconds:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.rows, args.repeat)
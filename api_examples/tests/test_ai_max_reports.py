@@ -17,6 +17,8 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
+import csv
+import tempfile
 import unittest
 from unittest.mock import MagicMock, patch, mock_open
 from io import StringIO
@@ -29,6 +31,7 @@ from google.ads.googleads.client import GoogleAdsClient
 from api_examples.ai_max_reports import (
     main,
     _write_to_csv,
+    get_all_reports,
     get_campaign_details,
     get_landing_page_matches,
     get_search_terms,
@@ -222,6 +225,77 @@ class TestAIMaxReports(unittest.TestCase):
                 "789,AI Max Campaign 3,test search term,1000,50,1000000,5.0\r\n"
             )
 
+    # --- Test get_all_reports ---
+    def test_get_all_reports_fuses_landing_page_queries(self):
+        landing_page_row = MagicMock()
+        landing_page_row.campaign.id = 123
+        landing_page_row.campaign.name = "AI Max Campaign 1"
+        landing_page_row.expanded_landing_page_view.expanded_final_url = (
+            "http://example.com"
+        )
+        landing_page_row.campaign.ai_max_setting.enable_ai_max = True
+        search_term_row = MagicMock()
+        search_term_row.campaign.id = 789
+        search_term_row.campaign.name = "AI Max Campaign 3"
+        search_term_row.ai_max_search_term_ad_combination_view.search_term = "term"
+        search_term_row.metrics.impressions = 1000
+        search_term_row.metrics.clicks = 50
+        search_term_row.metrics.cost_micros = 1000000
+        search_term_row.metrics.conversions = 5.0
+
+        def search_stream(customer_id, query):
+            if "expanded_landing_page_view" in query:
+                return [MagicMock(results=[landing_page_row])]
+            return [MagicMock(results=[search_term_row])]
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = {
+                name: os.path.join(tmp_dir, f"{name}.csv")
+                for name in ("details", "matches", "search_terms")
+            }
+            with patch.multiple(
+                "api_examples.ai_max_reports",
+                _CAMPAIGN_DETAILS_PATH=paths["details"],
+                _LANDING_PAGE_MATCHES_PATH=paths["matches"],
+                _SEARCH_TERMS_PATH=paths["search_terms"],
+            ):
+                get_all_reports(self.mock_client, self.customer_id)
+            contents = {}
+            for name, path in paths.items():
+                with open(path, newline="", encoding="utf-8") as f:
+                    contents[name] = list(csv.reader(f))
+
+        self.mock_client.get_service.assert_called_once_with("GoogleAdsService")
+        self.assertEqual(self.mock_ga_service.search_stream.call_count, 2)
+        self.assertEqual(
+            contents["details"][1],
+            ["123", "AI Max Campaign 1", "http://example.com", "True"],
+        )
+        self.assertEqual(
+            contents["matches"],
+            [
+                ["Campaign ID", "Campaign Name", "Expanded Landing Page URL"],
+                ["123", "AI Max Campaign 1", "http://example.com"],
+            ],
+        )
+        self.assertEqual(
+            contents["search_terms"][1],
+            ["789", "AI Max Campaign 3", "term", "1000", "50", "1000000", "5.0"],
+        )
+        output = self.captured_output.getvalue()
+        self.assertIn(f"Report written to {paths['search_terms']}", output)
+
+    def test_main_all_reports(self):
+        with patch(
+            "api_examples.ai_max_reports.get_all_reports"
+        ) as mock_get_all_reports:
+            main(self.mock_client, self.customer_id, "all")
+            mock_get_all_reports.assert_called_once_with(
+                self.mock_client, self.customer_id
+            )
+
     # --- Test main function ---
     def test_main_campaign_details_report(self):
         with patch(
@@ -0,0 +1,108 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import asyncio
+import unittest
+
+from google.ads.googleads.errors import GoogleAdsException
+
+from report_downloader import is_quota_error
+from report_downloader.gaql import _flatten_row
+from api_examples.tests.benchmark_parallel_report_downloader import (
+    FakeAsyncGoogleAdsService,
+    FakeGoogleAdsService,
+    make_google_ads_exception,
+    run_scenario,
+)
+
+_QUERY = (
+    "SELECT campaign.id, campaign.status, segments.date, metrics.clicks FROM campaign"
+)
+
+
+class TestBenchmarkParallelReportDownloader(unittest.TestCase):
+    def test_fake_service_streams_synthetic_batches(self):
+        service = FakeGoogleAdsService(rows_per_stream=25, batch_size=10)
+
+        batches = list(service.search_stream(customer_id="1", query=_QUERY))
+
+        self.assertEqual([len(batch.results) for batch in batches], [10, 10, 5])
+        row = _flatten_row(
+            batches[2].results[0],
+            ["campaign.id", "campaign.status", "segments.date", "metrics.clicks"],
+        )
+        self.assertEqual(row["campaign.id"], 20)
+        self.assertNotIn(row["campaign.status"], ("UNSPECIFIED", "UNKNOWN"))
+        self.assertEqual(row["segments.date"], "2025-01-21")
+        self.assertIsNotNone(service.streams[0]["first_batch"])
+
+    def test_fake_service_injects_errors(self):
+        service = FakeGoogleAdsService(
+            rows_per_stream=30, batch_size=10, error_rate=1.0, error_after_batches=2
+        )
+        received = []
+
+        with self.assertRaises(GoogleAdsException) as context:
+            for batch in service.search_stream(customer_id="1", query=_QUERY):
+                received.append(batch)
+
+        self.assertEqual(len(received), 2)
+        self.assertTrue(is_quota_error(context.exception))
+        self.assertFalse(is_quota_error(make_google_ads_exception("internal")))
+
+    def test_fake_async_service_streams_batches(self):
+        service = FakeAsyncGoogleAdsService(rows_per_stream=15, batch_size=10)
+
+        async def collect():
+            stream = await service.search_stream(customer_id="1", query=_QUERY)
+            return [len(batch.results) async for batch in stream]
+
+        self.assertEqual(asyncio.run(collect()), [10, 5])
+
+    def test_run_scenario_reports_measurements(self):
+        config = {
+            "name": "threads",
+            "engine": "threads",
+            "concurrency": 2,
+            "adaptive": False,
+            "decode_workers": 0,
+            "channels": 1,
+            "reports": 3,
+            "rows": 50,
+            "batch_size": 20,
+            "fields": "campaign",
+            "latency_ms": 0,
+            "first_batch_latency_ms": 0,
+            "error_rate": 0.0,
+            "error_kind": "quota",
+            "output_format": "csv",
+        }
+
+        result = run_scenario(config)
+
+        self.assertEqual(result["reports"], 3)
+        self.assertEqual(result["failed"], 0)
+        self.assertEqual(result["rows"], 150)
+        self.assertGreater(result["rows_per_second"], 0)
+        self.assertGreater(result["peak_rss_mb"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
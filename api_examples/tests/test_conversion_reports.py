@@ -25,6 +25,9 @@ from datetime import datetime, timedelta
 
 from google.ads.googleads.errors import GoogleAdsException
 from google.ads.googleads.client import GoogleAdsClient
+from google.ads.googleads.v22.services.types.google_ads_service import (
+    GoogleAdsRow,
+)
 
 # Import functions from the script
 from api_examples.conversion_reports import (
@@ -249,6 +252,41 @@ class TestConversionReports(unittest.TestCase):
             )
             handle.write.assert_any_call("2025-10-20,Website_Sale,10.0\r\n")
 
+    def test_get_conversion_performance_report_reads_raw_rows(self):
+        row = GoogleAdsRow()
+        row.segments.date = "2025-10-20"
+        row.campaign.id = 123
+        row.campaign.name = "Test Campaign"
+        row.metrics.impressions = 2000
+
+        mock_batch = MagicMock()
+        mock_batch.results = [row]
+        self.mock_ga_service.search_stream.return_value = [mock_batch]
+
+        get_conversion_performance_report(
+            self.mock_client,
+            self.customer_id,
+            "console",
+            "",
+            "2025-10-01",
+            "2025-10-31",
+            None,
+            ["impressions"],
+            [],
+            None,
+            None,
+        )
+
+        lines = self.captured_output.getvalue().splitlines()
+        self.assertEqual(
+            [cell.strip() for cell in lines[0].split("|")],
+            ["Date", "Campaign ID", "Campaign Name", "Impressions"],
+        )
+        self.assertEqual(
+            [cell.strip() for cell in lines[2].split("|")],
+            ["2025-10-20", "123", "Test Campaign", "2000"],
+        )
+
     # --- Test main function ---
     def test_main_conversion_actions_report(self):
         with patch(
@@ -17,15 +17,22 @@ import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
+import tempfile
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from io import StringIO
 
 from google.ads.googleads.errors import GoogleAdsException
 from google.ads.googleads.client import GoogleAdsClient
+from google.ads.googleads.v22.services.types.google_ads_service import GoogleAdsRow
 
 # Import the main function from the script
-from api_examples.get_geo_targets import main
+from api_examples.get_geo_targets import (
+    GeoTargetCache,
+    main,
+    resolve_geo_targets,
+)
+from api_examples.prefetch_api_constants import ConstantStore, prefetch_constants
 
 
 class TestGetGeoTargets(unittest.TestCase):
@@ -36,10 +43,40 @@ class TestGetGeoTargets(unittest.TestCase):
         self.customer_id = "1234567890"
         self.captured_output = StringIO()
         sys.stdout = self.captured_output
+        # Every test starts with an empty process-wide cache.
+        self.cache = GeoTargetCache()
+        cache_patcher = patch(
+            "api_examples.get_geo_targets._geo_target_cache", self.cache
+        )
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+        # Constants prefetched on this machine must not affect the tests.
+        store_patcher = patch(
+            "api_examples.get_geo_targets._default_constant_store",
+            return_value=None,
+        )
+        store_patcher.start()
+        self.addCleanup(store_patcher.stop)
 
     def tearDown(self):
         sys.stdout = sys.__stdout__
 
+    def _make_criterion_row(self, campaign_id, criterion_id):
+        row = MagicMock()
+        row.campaign.id = campaign_id
+        row.campaign.name = f"Campaign {campaign_id}"
+        row.campaign_criterion.negative = False
+        row.campaign_criterion.criterion_id = criterion_id
+        return row
+
+    def _make_geo_row(self, criterion_id, name):
+        row = MagicMock()
+        row.geo_target_constant.id = criterion_id
+        row.geo_target_constant.name = name
+        row.geo_target_constant.canonical_name = f"{name}, United States"
+        row.geo_target_constant.country_code = "US"
+        return row
+
     def test_main_successful_call(self):
         # Mock for the first search_stream call (campaign_criterion)
         mock_campaign = MagicMock()
@@ -61,6 +98,7 @@ class TestGetGeoTargets(unittest.TestCase):
 
         # Mock for the second search_stream call (geo_target_constant)
         mock_geo_target_constant = MagicMock()
+        mock_geo_target_constant.id = 21137
         mock_geo_target_constant.name = "New York"
         mock_geo_target_constant.canonical_name = "New York, New York, United States"
         mock_geo_target_constant.country_code = "US"
@@ -76,7 +114,7 @@ class TestGetGeoTargets(unittest.TestCase):
             if "campaign_criterion.type = 'LOCATION'" in query:
                 yield mock_batch_1
             elif (
-                "geo_target_constant.resource_name = 'geoTargetConstants/21137'"
+                "geo_target_constant.resource_name IN ('geoTargetConstants/21137')"
                 in query
             ):
                 yield mock_geo_batch
@@ -105,7 +143,7 @@ class TestGetGeoTargets(unittest.TestCase):
         )
         self.assertEqual(second_call_kwargs["customer_id"], self.customer_id)
         self.assertIn(
-            "geo_target_constant.resource_name = 'geoTargetConstants/21137'",
+            "geo_target_constant.resource_name IN ('geoTargetConstants/21137')",
             second_call_kwargs["query"],
         )
 
@@ -202,6 +240,165 @@ class TestGetGeoTargets(unittest.TestCase):
             "Error retrieving geo target details for geoTargetConstants/21137: Geo error details",
             output,
         )
+        self.assertIn("has geo target 'Unknown'", output)
+
+    def test_main_resolves_distinct_geo_targets_in_chunks(self):
+        criterion_rows = [
+            self._make_criterion_row(1, 21137),
+            self._make_criterion_row(2, 1014044),
+            self._make_criterion_row(3, 21137),
+        ]
+        geo_rows = {
+            21137: self._make_geo_row(21137, "New York"),
+            1014044: self._make_geo_row(1014044, "Chicago"),
+        }
+
+        def search_stream_side_effect(customer_id, query):
+            if "campaign_criterion.type = 'LOCATION'" in query:
+                return [MagicMock(results=criterion_rows)]
+            return [
+                MagicMock(
+                    results=[
+                        row
+                        for criterion_id, row in geo_rows.items()
+                        if f"geoTargetConstants/{criterion_id}'" in query
+                    ]
+                )
+            ]
+
+        self.mock_ga_service.search_stream.side_effect = search_stream_side_effect
+
+        main(self.mock_client, self.customer_id)
+        # A second run resolves everything from the cache.
+        main(self.mock_client, self.customer_id)
+
+        # Two criteria queries and a single geo target query.
+        self.assertEqual(self.mock_ga_service.search_stream.call_count, 3)
+        output = self.captured_output.getvalue()
+        self.assertEqual(output.count("has geo target 'New York'"), 4)
+        self.assertEqual(output.count("has geo target 'Chicago'"), 2)
+
+    def test_resolve_geo_targets_batches_ids_in_one_query(self):
+        self.mock_ga_service.search_stream.return_value = [
+            MagicMock(
+                results=[
+                    self._make_geo_row(1, "A"),
+                    self._make_geo_row(2, "B"),
+                ]
+            )
+        ]
+
+        geo_targets = resolve_geo_targets(
+            self.mock_ga_service, self.customer_id, [1, 2, 1, 3]
+        )
+
+        self.mock_ga_service.search_stream.assert_called_once()
+        self.assertIn(
+            "IN ('geoTargetConstants/1', 'geoTargetConstants/2', "
+            "'geoTargetConstants/3')",
+            self.mock_ga_service.search_stream.call_args.kwargs["query"],
+        )
+        self.assertEqual(geo_targets[2], ("B", "B, United States", "US"))
+        self.assertNotIn(3, geo_targets)
+
+    def test_resolve_geo_targets_splits_ids_into_chunks(self):
+        def search_stream_side_effect(customer_id, query):
+            return [
+                MagicMock(
+                    results=[
+                        self._make_geo_row(criterion_id, str(criterion_id))
+                        for criterion_id in range(5)
+                        if f"geoTargetConstants/{criterion_id}'" in query
+                    ]
+                )
+            ]
+
+        self.mock_ga_service.search_stream.side_effect = search_stream_side_effect
+
+        geo_targets = resolve_geo_targets(
+            self.mock_ga_service, self.customer_id, range(5), chunk_size=2
+        )
+
+        self.assertEqual(self.mock_ga_service.search_stream.call_count, 3)
+        self.assertEqual(sorted(geo_targets), [0, 1, 2, 3, 4])
+        self.assertEqual(len(self.cache), 5)
+
+    def _prefetched_store(self, tmp_dir):
+        row = GoogleAdsRow()
+        row.geo_target_constant.id = 21137
+        row.geo_target_constant.name = "New York"
+        row.geo_target_constant.canonical_name = "New York,New York,United States"
+        row.geo_target_constant.country_code = "US"
+        prefetch_service = MagicMock()
+        prefetch_service.search_stream.return_value = [MagicMock(results=[row])]
+        path = os.path.join(tmp_dir, "v22.sqlite3")
+        prefetch_constants(
+            prefetch_service, self.customer_id, path, ["geo_target_constant"]
+        )
+        store = ConstantStore(path)
+        self.addCleanup(store.close)
+        return store
+
+    def test_resolve_geo_targets_reads_prefetched_constants(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = self._prefetched_store(tmp_dir)
+
+            geo_targets = resolve_geo_targets(
+                self.mock_ga_service,
+                self.customer_id,
+                [21137],
+                constant_store=store,
+            )
+
+        self.mock_ga_service.search_stream.assert_not_called()
+        self.assertEqual(
+            geo_targets,
+            {21137: ("New York", "New York,New York,United States", "US")},
+        )
+
+    def test_resolve_geo_targets_queries_only_ids_missing_from_store(self):
+        self.mock_ga_service.search_stream.return_value = [
+            MagicMock(results=[self._make_geo_row(1023191, "Springfield")])
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with patch(
+                "api_examples.get_geo_targets._default_constant_store",
+                return_value=self._prefetched_store(tmp_dir),
+            ):
+                geo_targets = resolve_geo_targets(
+                    self.mock_ga_service, self.customer_id, [21137, 1023191]
+                )
+
+        self.mock_ga_service.search_stream.assert_called_once()
+        query = self.mock_ga_service.search_stream.call_args.kwargs["query"]
+        self.assertIn("IN ('geoTargetConstants/1023191')", query)
+        self.assertEqual(sorted(geo_targets), [21137, 1023191])
+
+    def test_geo_target_cache_evicts_least_recently_used(self):
+        cache = GeoTargetCache(maxsize=2)
+        cache.put(1, ("A", "A", "US"))
+        cache.put(2, ("B", "B", "US"))
+        cache.get(1)
+        cache.put(3, ("C", "C", "US"))
+
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(len(cache), 2)
+
+    def test_geo_target_cache_persists_to_file(self):
+        cache = GeoTargetCache()
+        cache.put(21137, ("New York", "New York, United States", "US"))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "geo_targets.json")
+            cache.save(path)
+            loaded = GeoTargetCache()
+            loaded.load(path)
+
+        self.assertEqual(
+            loaded.get(21137), ("New York", "New York, United States", "US")
+        )
 
 
 if __name__ == "__main__":
@@ -16,21 +16,134 @@ import sys
 import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from io import StringIO
 from datetime import datetime, timedelta
 
+import grpc
 from google.ads.googleads.errors import GoogleAdsException
 from google.ads.googleads.client import GoogleAdsClient
+from google.ads.googleads.v22.services.services.google_ads_service import GoogleAdsServiceClient
+from google.ads.googleads.v22.services.types.google_ads_service import (
+    GoogleAdsRow,
+    SearchGoogleAdsStreamResponse,
+)
 
 # Import functions from the script
 from api_examples.parallel_report_downloader_optimized import (
-    _get_date_range_strings,
+    _build_report_jobs,
+    _expand_sharded_jobs,
+    _fetch_report_adaptive,
+    fetch_report_async,
+    _fetch_report_async_adaptive,
     fetch_report_threaded,
+    _get_date_range_strings,
     main,
+    _run_reports_async,
+    _run_reports_threaded,
+)
+from report_downloader import (
+    AdaptiveConcurrencyController,
+    BoundedSinkWriter,
+    build_job_sink_factory,
+    compile_row_accessor,
+    CsvSink,
+    discover_client_accounts,
+    filter_client_accounts,
+    fuse_jobs,
+    HedgingPolicy,
+    is_quota_error,
+    JobDurationHistory,
+    JsonlMetricsRecorder,
+    JsonlSink,
+    load_client_accounts,
+    make_sink,
+    merge_shard_rows,
+    merge_sharded_results,
+    MetricsRecorder,
+    open_metrics_recorder,
+    order_jobs_longest_first,
+    plan_date_shards,
+    RateLimitError,
+    RunManifest,
+    ServicePool,
+    SqliteMetricsRecorder,
+    summarize_stream_metrics,
 )
+from report_downloader.gaql import (
+    _decode_batch,
+    _flatten_row,
+    _parse_order_by,
+    _parse_select_fields,
+    _split_date_range,
+)
+from report_downloader.metrics import _report_definition_name
+from report_downloader.pool import _create_pooled_service
+
+
+class _AsyncStream:
+    """An async iterable over a fixed list of batches."""
+
+    def __init__(self, batches, error=None):
+        self._batches = list(batches)
+        self._error = error
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._batches:
+            return self._batches.pop(0)
+        if self._error:
+            raise self._error
+        raise StopAsyncIteration
+
+
+class _DelayedAsyncStream(_AsyncStream):
+    """An async stream call whose first batch arrives after a delay."""
+
+    def __init__(self, batches, delay):
+        super().__init__(batches)
+        self._delay = delay
+        self.cancelled = False
+
+    async def __anext__(self):
+        if self._delay:
+            await asyncio.sleep(self._delay)
+            self._delay = 0
+        return await super().__anext__()
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def _make_google_ads_exception(request_id="test_request_id"):
+    return GoogleAdsException(
+        error=MagicMock(),
+        call=MagicMock(),
+        failure=MagicMock(
+            errors=[
+                MagicMock(
+                    message="Error details",
+                    location=MagicMock(
+                        field_path_elements=[MagicMock(field_name="test_field")]
+                    ),
+                )
+            ]
+        ),
+        request_id=request_id,
+    )
 
 
 class TestParallelReportDownloaderOptimized(unittest.TestCase):
@@ -118,6 +231,1806 @@ class TestParallelReportDownloaderOptimized(unittest.TestCase):
             self.captured_output.getvalue(),
         )
 
+    # --- Test fetch_report_async ---
+    def test_fetch_report_async_success(self):
+        mock_batch = MagicMock()
+        mock_batch.results = [MagicMock(), MagicMock()]
+
+        async def search_stream(**kwargs):
+            return _AsyncStream([mock_batch, mock_batch])
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+
+        report_name, rows, exception = asyncio.run(
+            fetch_report_async(
+                self.mock_ga_service,
+                self.customer_id,
+                "SELECT campaign.id FROM campaign",
+                "Async Report",
+                asyncio.Semaphore(1),
+            )
+        )
+
+        self.assertEqual(report_name, "Async Report")
+        self.assertEqual(len(rows), 4)
+        self.assertIsNone(exception)
+        self.mock_ga_service.search_stream.assert_called_once_with(
+            customer_id=self.customer_id, query="SELECT campaign.id FROM campaign"
+        )
+        self.assertIn(
+            "[Async Report] Finished report fetch. Found 4 rows.",
+            self.captured_output.getvalue(),
+        )
+
+    def test_fetch_report_async_exception_mid_stream(self):
+        mock_batch = MagicMock()
+        mock_batch.results = [MagicMock()]
+        self.mock_ga_service.search_stream.return_value = _AsyncStream(
+            [mock_batch], error=_make_google_ads_exception("async_request_id")
+        )
+
+        report_name, rows, exception = asyncio.run(
+            fetch_report_async(
+                self.mock_ga_service,
+                self.customer_id,
+                "SELECT campaign.id FROM campaign",
+                "Async Report With Error",
+                asyncio.Semaphore(1),
+            )
+        )
+
+        self.assertEqual(report_name, "Async Report With Error")
+        self.assertEqual(len(rows), 1)
+        self.assertIsInstance(exception, GoogleAdsException)
+        self.assertIn(
+            "[Async Report With Error] Request with ID 'async_request_id' failed",
+            self.captured_output.getvalue(),
+        )
+
+    def test_run_reports_async_limits_concurrency(self):
+        in_flight = 0
+        peak = 0
+
+        async def search_stream(customer_id, query):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            batch = MagicMock()
+            batch.results = [customer_id]
+            return _AsyncStream([batch])
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+        jobs = _build_report_jobs(
+            ["111", "222", "333"],
+            [{"name": "R1", "query": "Q1"}, {"name": "R2", "query": "Q2"}],
+        )
+
+        all_results = asyncio.run(_run_reports_async(self.mock_client, jobs, 2))
+
+        self.mock_client.get_service.assert_called_once_with(
+            "GoogleAdsService", is_async=True
+        )
+        self.assertEqual(len(all_results), 6)
+        self.assertEqual(all_results["R2 (Customer: 333)"]["rows"], ["333"])
+        self.assertLessEqual(peak, 2)
+
+    def test_run_reports_async_marks_units_running_once_they_have_a_slot(self):
+        query = "SELECT campaign.id FROM campaign"
+        jobs = _build_report_jobs(
+            ["111"], [{"name": "R1", "query": query}, {"name": "R2", "query": query}]
+        )
+        statuses = []
+
+        async def search_stream(customer_id, query):
+            await asyncio.sleep(0.01)  # Lets the other report reach the semaphore.
+            statuses.append(
+                {name: unit["status"] for name, unit in manifest.units.items()}
+            )
+            return _AsyncStream([MagicMock(results=[])])
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest = RunManifest(os.path.join(output_dir, "manifest.jsonl"))
+            manifest.register(jobs)
+            asyncio.run(
+                _run_reports_async(
+                    self.mock_client,
+                    jobs,
+                    1,
+                    sink_factory=lambda query, name: make_sink(
+                        output_dir, "csv", query, name
+                    ),
+                    manifest=manifest,
+                )
+            )
+
+        # The second report waits for the only stream slot as pending.
+        self.assertEqual(
+            statuses[0],
+            {"R1 (Customer: 111)": "running", "R2 (Customer: 111)": "pending"},
+        )
+        self.assertEqual(
+            statuses[1],
+            {"R1 (Customer: 111)": "done", "R2 (Customer: 111)": "running"},
+        )
+
+    # --- Test AdaptiveConcurrencyController ---
+    def _make_quota_exception(self):
+        ex = _make_google_ads_exception("quota_request_id")
+        ex.error.code.return_value = grpc.StatusCode.RESOURCE_EXHAUSTED
+        return ex
+
+    def test_is_quota_error(self):
+        self.assertTrue(is_quota_error(self._make_quota_exception()))
+        self.assertFalse(is_quota_error(_make_google_ads_exception()))
+
+    def test_controller_increases_after_healthy_round(self):
+        controller = AdaptiveConcurrencyController(initial_limit=2, max_limit=3)
+        for _ in range(2):
+            self.assertTrue(controller.try_acquire())
+        self.assertFalse(controller.try_acquire())
+        controller.release(0.1)
+        controller.release(0.1)
+        self.assertEqual(controller.limit, 3)
+        # The limit never grows past max_limit.
+        for _ in range(10):
+            controller.try_acquire()
+            controller.release(0.1)
+        self.assertEqual(controller.limit, 3)
+
+    def test_controller_ignores_slow_requests(self):
+        controller = AdaptiveConcurrencyController(
+            initial_limit=1, max_limit=5, latency_target=1.0
+        )
+        controller.try_acquire()
+        controller.release(2.0)
+        self.assertEqual(controller.limit, 1)
+
+    def test_controller_backs_off_once_per_cooldown(self):
+        controller = AdaptiveConcurrencyController(initial_limit=8, cooldown_seconds=60)
+        quota_exception = self._make_quota_exception()
+        for _ in range(3):
+            controller.try_acquire()
+            controller.release(0.1, quota_exception)
+        self.assertEqual(controller.limit, 4)
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_controller_backs_off_on_error_rate(self):
+        controller = AdaptiveConcurrencyController(
+            initial_limit=4, error_window=4, max_error_rate=0.5
+        )
+        for _ in range(4):
+            controller.try_acquire()
+            controller.release(0.1, _make_google_ads_exception())
+        self.assertEqual(controller.limit, 2)
+
+    @patch("api_examples.parallel_report_downloader_optimized.time.sleep")
+    @patch("api_examples.parallel_report_downloader_optimized.fetch_report_threaded")
+    def test_fetch_report_adaptive_retries_quota_errors(
+        self, mock_fetch_report_threaded, mock_sleep
+    ):
+        quota_exception = self._make_quota_exception()
+        mock_fetch_report_threaded.side_effect = [
+            ("Report", [], quota_exception),
+            ("Report", ["row"], None),
+        ]
+        controller = AdaptiveConcurrencyController(initial_limit=4)
+
+        report_name, rows, exception = _fetch_report_adaptive(
+            controller, self.mock_client, self.customer_id, "Q", "Report"
+        )
+
+        self.assertEqual(rows, ["row"])
+        self.assertIsNone(exception)
+        self.assertEqual(mock_fetch_report_threaded.call_count, 2)
+        mock_sleep.assert_called_once()
+        self.assertEqual(controller.limit, 2)
+        self.assertIn("Quota error, retrying", self.captured_output.getvalue())
+
+    @patch("api_examples.parallel_report_downloader_optimized.time.sleep")
+    @patch("api_examples.parallel_report_downloader_optimized.fetch_report_threaded")
+    def test_fetch_report_adaptive_gives_up_after_max_retries(
+        self, mock_fetch_report_threaded, mock_sleep
+    ):
+        quota_exception = self._make_quota_exception()
+        mock_fetch_report_threaded.return_value = ("Report", [], quota_exception)
+        controller = AdaptiveConcurrencyController(initial_limit=4)
+
+        _, _, exception = _fetch_report_adaptive(
+            controller, self.mock_client, self.customer_id, "Q", "Report"
+        )
+
+        self.assertIs(exception, quota_exception)
+        self.assertEqual(mock_fetch_report_threaded.call_count, 4)
+
+    # --- Test sinks ---
+    def _make_campaign_row(self, campaign_id, name):
+        row = GoogleAdsRow()
+        row.campaign.id = campaign_id
+        row.campaign.name = name
+        row.campaign.status = 2  # ENABLED
+        row.metrics.clicks = campaign_id * 10
+        return row
+
+    def test_parse_select_fields(self):
+        fields = _parse_select_fields(
+            """
+            SELECT
+                campaign.id,
+                campaign.name,
+                metrics.clicks
+            FROM campaign
+            WHERE segments.date DURING LAST_7_DAYS"""
+        )
+        self.assertEqual(fields, ["campaign.id", "campaign.name", "metrics.clicks"])
+
+    def test_flatten_row_resolves_enums_and_renamed_fields(self):
+        row = self._make_campaign_row(1, "Campaign 1")
+        row.ad_group_criterion.listing_group.type_ = 2  # SUBDIVISION
+
+        flattened = _flatten_row(
+            row,
+            [
+                "campaign.id",
+                "campaign.status",
+                "ad_group_criterion.listing_group.type",
+            ],
+        )
+
+        self.assertEqual(
+            flattened,
+            {
+                "campaign.id": 1,
+                "campaign.status": "ENABLED",
+                "ad_group_criterion.listing_group.type": "SUBDIVISION",
+            },
+        )
+
+    def test_fetch_report_threaded_with_csv_sink(self):
+        batches = [
+            MagicMock(results=[self._make_campaign_row(1, "C1")]),
+            MagicMock(
+                results=[
+                    self._make_campaign_row(2, "C2"),
+                    self._make_campaign_row(3, "C3"),
+                ]
+            ),
+        ]
+        self.mock_ga_service.search_stream.return_value = batches
+        query = "SELECT campaign.id, campaign.name, campaign.status FROM campaign"
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            sink = make_sink(output_dir, "csv", query, "Campaigns (Customer: 1)")
+            report_name, rows, exception = fetch_report_threaded(
+                self.mock_client, self.customer_id, query, "Campaigns", sink
+            )
+            with open(sink.path, newline="", encoding="utf-8") as f:
+                written = list(csv.DictReader(f))
+
+        self.assertIsNone(rows)
+        self.assertIsNone(exception)
+        self.assertEqual(sink.rows_written, 3)
+        self.assertTrue(sink.path.endswith("campaigns_customer_1.csv"))
+        self.assertEqual(
+            written[2],
+            {"campaign.id": "3", "campaign.name": "C3", "campaign.status": "ENABLED"},
+        )
+        self.assertIn(
+            "[Campaigns] Finished report fetch. Found 3 rows.",
+            self.captured_output.getvalue(),
+        )
+
+    def test_jsonl_sink_reopen_discards_previous_attempt(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            sink = JsonlSink(
+                os.path.join(output_dir, "report.jsonl"),
+                ["campaign.id", "metrics.clicks"],
+            )
+            for campaign_ids in ([1, 2], [3]):
+                writer = BoundedSinkWriter(sink)
+                writer.put(
+                    MagicMock(
+                        results=[
+                            self._make_campaign_row(i, f"C{i}") for i in campaign_ids
+                        ]
+                    )
+                )
+                writer.close()
+            with open(sink.path, encoding="utf-8") as f:
+                written = [json.loads(line) for line in f]
+
+        self.assertEqual(written, [{"campaign.id": 3, "metrics.clicks": 30}])
+        self.assertEqual(sink.rows_written, 1)
+
+    def test_bounded_sink_writer_surfaces_sink_errors(self):
+        sink = MagicMock(spec=CsvSink)
+        sink.write_batch.side_effect = OSError("disk full")
+        writer = BoundedSinkWriter(sink, queue_size=1)
+        writer.put(MagicMock(results=["row"]))
+
+        with self.assertRaises(OSError):
+            writer.close()
+        sink.close.assert_called_once()
+
+    def test_compile_row_accessor_reads_raw_rows(self):
+        row = self._make_campaign_row(7, "C7")
+        row.campaign.labels.extend(["customers/1/labels/2"])
+        row.ad_group_criterion.listing_group.type_ = 2  # SUBDIVISION
+        raw_row = GoogleAdsRow.pb(row)
+        raw_row.campaign.advertising_channel_type = 999  # Unknown to this version.
+
+        accessor = compile_row_accessor(
+            [
+                "campaign.id",
+                "campaign.status",
+                "campaign.labels",
+                "ad_group_criterion.listing_group.type",
+                "campaign.advertising_channel_type",
+                "metrics.clicks",
+            ]
+        )
+
+        self.assertEqual(
+            accessor(raw_row),
+            (7, "ENABLED", ["customers/1/labels/2"], "SUBDIVISION", 999, 70),
+        )
+
+    def test_compile_row_accessor_matches_flatten_row(self):
+        fields = ["campaign.id", "campaign.name", "campaign.status", "metrics.clicks"]
+        row = self._make_campaign_row(3, "C3")
+
+        self.assertEqual(
+            dict(zip(fields, compile_row_accessor(fields)(GoogleAdsRow.pb(row)))),
+            _flatten_row(row, fields),
+        )
+        self.assertIs(compile_row_accessor(fields), compile_row_accessor(fields))
+
+    def test_compile_row_accessor_rejects_unknown_fields(self):
+        with self.assertRaises(ValueError):
+            compile_row_accessor(["campaign.no_such_field"])
+        with self.assertRaises(ValueError):
+            compile_row_accessor(["campaign.id.value"])
+
+    def test_decode_batch_returns_columns(self):
+        batch = SearchGoogleAdsStreamResponse(
+            results=[self._make_campaign_row(i, f"C{i}") for i in (1, 2)]
+        )
+        columns = _decode_batch(
+            SearchGoogleAdsStreamResponse.serialize(batch),
+            ["campaign.id", "campaign.status", "metrics.clicks"],
+        )
+
+        self.assertEqual(
+            columns,
+            {
+                "campaign.id": [1, 2],
+                "campaign.status": ["ENABLED", "ENABLED"],
+                "metrics.clicks": [10, 20],
+            },
+        )
+
+    def test_bounded_sink_writer_decodes_in_process_pool(self):
+        fields = ["campaign.id", "campaign.name", "campaign.status"]
+        batches = [
+            SearchGoogleAdsStreamResponse(
+                results=[self._make_campaign_row(i, f"C{i}") for i in ids]
+            )
+            for ids in ([1, 2], [3], [4, 5])
+        ]
+        with tempfile.TemporaryDirectory() as output_dir:
+            sink = CsvSink(os.path.join(output_dir, "report.csv"), fields)
+            with ProcessPoolExecutor(max_workers=2) as pool:
+                writer = BoundedSinkWriter(sink, decode_pool=pool)
+                for batch in batches:
+                    writer.put(batch)
+                writer.close()
+            with open(sink.path, newline="", encoding="utf-8") as f:
+                written = list(csv.DictReader(f))
+
+        self.assertEqual(sink.rows_written, 5)
+        self.assertEqual([row["campaign.id"] for row in written], list("12345"))
+        self.assertEqual(written[4]["campaign.status"], "ENABLED")
+
+    def test_main_decode_workers_requires_output_dir(self):
+        with patch(
+            "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+        ):
+            with self.assertRaises(ValueError):
+                main(["111"], None, decode_workers=2)
+
+    # --- Test date sharding ---
+    _SHARDABLE_QUERY = """
+        SELECT
+            campaign.id,
+            metrics.clicks,
+            metrics.cost_micros
+        FROM campaign
+        WHERE segments.date BETWEEN '2025-01-01' AND '2025-01-10'
+        ORDER BY metrics.clicks DESC
+        LIMIT 2"""
+
+    def test_split_date_range(self):
+        self.assertEqual(
+            _split_date_range("2025-01-01", "2025-01-10", 7),
+            [("2025-01-01", "2025-01-07"), ("2025-01-08", "2025-01-10")],
+        )
+        self.assertEqual(len(_split_date_range("2025-01-01", "2025-01-10", 1)), 10)
+
+    def test_parse_order_by(self):
+        self.assertEqual(
+            _parse_order_by("SELECT a FROM b ORDER BY a DESC, c LIMIT 5"),
+            [("a", True), ("c", False)],
+        )
+
+    def test_plan_date_shards_reaggregates_without_segments_date(self):
+        plan = plan_date_shards(self._SHARDABLE_QUERY, 7)
+
+        self.assertTrue(plan["reaggregate"])
+        self.assertTrue(plan["needs_merge"])
+        self.assertEqual(len(plan["shards"]), 2)
+        start, end, shard_query = plan["shards"][1]
+        self.assertEqual((start, end), ("2025-01-08", "2025-01-10"))
+        self.assertIn(
+            "segments.date BETWEEN '2025-01-08' AND '2025-01-10'", shard_query
+        )
+        # The LIMIT only applies after shards have been re-aggregated.
+        self.assertNotIn("LIMIT", shard_query)
+
+    def test_plan_date_shards_keeps_limit_with_segments_date(self):
+        query = self._SHARDABLE_QUERY.replace(
+            "campaign.id,", "campaign.id, segments.date,"
+        )
+        plan = plan_date_shards(query, 7)
+
+        self.assertFalse(plan["reaggregate"])
+        self.assertIn("LIMIT 2", plan["shards"][0][2])
+
+    def test_plan_date_shards_rejects_unshardable_queries(self):
+        non_additive = self._SHARDABLE_QUERY.replace(
+            "metrics.cost_micros", "metrics.average_cpc"
+        )
+        self.assertIsNone(plan_date_shards(non_additive, 7))
+        self.assertIsNone(plan_date_shards(self._SHARDABLE_QUERY, 30))
+        self.assertIsNone(plan_date_shards("SELECT campaign.id FROM campaign", 1))
+
+    def _make_metrics_row(self, campaign_id, clicks, cost_micros):
+        row = GoogleAdsRow()
+        row.campaign.id = campaign_id
+        row.metrics.clicks = clicks
+        row.metrics.cost_micros = cost_micros
+        return row
+
+    def test_merge_shard_rows_reaggregates_and_applies_global_limit(self):
+        merged = merge_shard_rows(
+            self._SHARDABLE_QUERY,
+            [
+                [
+                    self._make_metrics_row(1, 10, 100),
+                    self._make_metrics_row(2, 8, 200),
+                ],
+                [
+                    self._make_metrics_row(3, 9, 300),
+                    self._make_metrics_row(2, 5, 50),
+                ],
+            ],
+        )
+
+        self.assertEqual(
+            merged,
+            [
+                {"campaign.id": 2, "metrics.clicks": 13, "metrics.cost_micros": 250},
+                {"campaign.id": 1, "metrics.clicks": 10, "metrics.cost_micros": 100},
+            ],
+        )
+
+    def test_expand_and_merge_sharded_jobs(self):
+        jobs, shard_groups = _expand_sharded_jobs(
+            [
+                ("111", self._SHARDABLE_QUERY, "Report"),
+                ("111", "SELECT campaign.id FROM campaign", "Unsharded"),
+            ],
+            7,
+        )
+
+        self.assertEqual(
+            [name for _, _, name in jobs],
+            [
+                "Report [2025-01-01..2025-01-07]",
+                "Report [2025-01-08..2025-01-10]",
+                "Unsharded",
+            ],
+        )
+        all_results = {
+            "Report [2025-01-01..2025-01-07]": {
+                "rows": [self._make_metrics_row(1, 4, 10)],
+                "exception": None,
+            },
+            "Report [2025-01-08..2025-01-10]": {
+                "rows": [self._make_metrics_row(1, 6, 20)],
+                "exception": None,
+            },
+            "Unsharded": {"rows": [], "exception": None},
+        }
+
+        merged = merge_sharded_results(all_results, shard_groups)
+
+        self.assertEqual(sorted(merged), ["Report", "Unsharded"])
+        self.assertEqual(
+            merged["Report"]["rows"],
+            [{"campaign.id": 1, "metrics.clicks": 10, "metrics.cost_micros": 30}],
+        )
+
+    def test_merge_sharded_results_propagates_shard_failure(self):
+        _, shard_groups = _expand_sharded_jobs(
+            [("111", self._SHARDABLE_QUERY, "Report")], 7
+        )
+        exception = _make_google_ads_exception()
+        all_results = {
+            "Report [2025-01-01..2025-01-07]": {"rows": [], "exception": None},
+            "Report [2025-01-08..2025-01-10]": {"rows": [], "exception": exception},
+        }
+
+        merged = merge_sharded_results(all_results, shard_groups)
+
+        self.assertIs(merged["Report"]["exception"], exception)
+        self.assertIsNone(merged["Report"]["rows"])
+
+    def _stage_shards(self, output_dir, query, shard_rows):
+        """Writes each shard's rows through the run's job sink factory."""
+        jobs, shard_groups = _expand_sharded_jobs([("111", query, "Report")], 7)
+        sink_factory = build_job_sink_factory(output_dir, "csv", shard_groups)
+        all_results = {}
+        for (_, shard_query, shard_name), rows in zip(jobs, shard_rows):
+            sink = sink_factory(shard_query, shard_name)
+            sink.open()
+            sink.write_rows(rows)
+            sink.close()
+            all_results[shard_name] = {"rows": None, "exception": None, "sink": sink}
+        return all_results, shard_groups
+
+    def test_merge_sharded_results_concatenates_shards_into_one_file(self):
+        query = """
+            SELECT campaign.id, segments.date, metrics.clicks
+            FROM campaign
+            WHERE segments.date BETWEEN '2025-01-01' AND '2025-01-10'"""
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            all_results, shard_groups = self._stage_shards(
+                output_dir,
+                query,
+                [
+                    [
+                        {
+                            "campaign.id": 1,
+                            "segments.date": "2025-01-02",
+                            "metrics.clicks": 3,
+                        }
+                    ],
+                    [
+                        {
+                            "campaign.id": 1,
+                            "segments.date": "2025-01-09",
+                            "metrics.clicks": 4,
+                        }
+                    ],
+                ],
+            )
+            self.assertFalse(shard_groups["Report"]["needs_merge"])
+
+            merged = merge_sharded_results(
+                all_results,
+                shard_groups,
+                lambda query, name: make_sink(output_dir, "csv", query, name),
+            )
+            sink = merged["Report"]["sink"]
+            with open(sink.path, newline="") as f:
+                written = list(csv.DictReader(f))
+
+        self.assertEqual(list(merged), ["Report"])
+        self.assertEqual(sink.rows_written, 2)
+        self.assertEqual(
+            [row["segments.date"] for row in written], ["2025-01-02", "2025-01-09"]
+        )
+
+    def _merge_staged(self, query, shard_rows):
+        with tempfile.TemporaryDirectory() as output_dir:
+            all_results, shard_groups = self._stage_shards(
+                output_dir, query, shard_rows
+            )
+            merged = merge_sharded_results(
+                all_results,
+                shard_groups,
+                lambda query, name: make_sink(output_dir, "jsonl", query, name),
+            )
+            with open(merged["Report"]["sink"].path) as f:
+                written = [json.loads(line) for line in f]
+            staged = os.listdir(os.path.join(output_dir, "shards"))
+        # Only the shard files are left in the staging directory.
+        self.assertEqual(len(staged), 2)
+        return written
+
+    def test_merge_sharded_results_reaggregates_staged_shards(self):
+        shard_rows = [
+            [
+                {"campaign.id": 1, "metrics.clicks": 10, "metrics.cost_micros": 100},
+                {"campaign.id": 2, "metrics.clicks": 8, "metrics.cost_micros": 200},
+            ],
+            [
+                {"campaign.id": 3, "metrics.clicks": 9, "metrics.cost_micros": 300},
+                {"campaign.id": 2, "metrics.clicks": 5, "metrics.cost_micros": 50},
+            ],
+        ]
+
+        written = self._merge_staged(self._SHARDABLE_QUERY, shard_rows)
+
+        self.assertEqual(
+            written,
+            [
+                {"campaign.id": 2, "metrics.clicks": 13, "metrics.cost_micros": 250},
+                {"campaign.id": 1, "metrics.clicks": 10, "metrics.cost_micros": 100},
+            ],
+        )
+
+    def test_merge_sharded_results_merges_sorted_shards(self):
+        query = self._SHARDABLE_QUERY.replace(
+            "campaign.id,", "campaign.id, segments.date,"
+        )
+        # Each shard comes back sorted by the query's ORDER BY.
+        shard_rows = [
+            [
+                {"campaign.id": 1, "segments.date": "2025-01-01", "metrics.clicks": 7},
+                {"campaign.id": 2, "segments.date": "2025-01-02", "metrics.clicks": 3},
+            ],
+            [
+                {"campaign.id": 1, "segments.date": "2025-01-08", "metrics.clicks": 9},
+                {"campaign.id": 2, "segments.date": "2025-01-09", "metrics.clicks": 5},
+            ],
+        ]
+        for rows in shard_rows:
+            for row in rows:
+                row["metrics.cost_micros"] = 0
+
+        written = self._merge_staged(query, shard_rows)
+
+        self.assertEqual([row["metrics.clicks"] for row in written], [9, 7])
+
+    # --- Test RunManifest ---
+    def test_run_manifest_records_and_reloads_unit_states(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, "run", "manifest.jsonl")
+            output_path = os.path.join(tmp_dir, "report.csv")
+            open(output_path, "w").close()
+            sink = CsvSink(output_path, ["campaign.id"])
+            sink.rows_written = 7
+
+            manifest = RunManifest(manifest_path)
+            manifest.register([("111", "Q", "Done"), ("111", "Q", "Failed")])
+            manifest.mark_running("Done")
+            manifest.mark_finished("Done", None, sink)
+            manifest.mark_running("Failed")
+            manifest.mark_finished("Failed", _make_google_ads_exception(), None)
+            # Simulate a crash in the middle of writing a line.
+            with open(manifest_path, "a") as f:
+                f.write('{"unit": "Do')
+
+            reloaded = RunManifest(manifest_path)
+
+            self.assertTrue(reloaded.is_done("Done", output_path))
+            self.assertFalse(reloaded.is_done("Done", output_path + ".moved"))
+            self.assertFalse(reloaded.is_done("Failed", output_path))
+            self.assertEqual(reloaded.units["Done"]["rows"], 7)
+            self.assertEqual(reloaded.units["Done"]["customer_id"], "111")
+            self.assertEqual(reloaded.units["Failed"]["status"], RunManifest.FAILED)
+            os.remove(output_path)
+            self.assertFalse(reloaded.is_done("Done", output_path))
+
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_resumes_from_manifest(self, mock_load_from_storage):
+        mock_load_from_storage.return_value = self.mock_client
+        failures = {"keyword_view": _make_google_ads_exception()}
+
+        def search_stream(customer_id, query):
+            for resource, exception in list(failures.items()):
+                if resource in query:
+                    del failures[resource]
+                    raise exception
+            return [MagicMock(results=[GoogleAdsRow()])]
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest_path = os.path.join(output_dir, "manifest.jsonl")
+            main(["111"], None, output_dir=output_dir, manifest_path=manifest_path)
+            self.assertEqual(self.mock_ga_service.search_stream.call_count, 3)
+
+            main(["111"], None, output_dir=output_dir, manifest_path=manifest_path)
+            manifest = RunManifest(manifest_path)
+
+        # Only the failed keyword report is fetched again.
+        self.assertEqual(self.mock_ga_service.search_stream.call_count, 4)
+        self.assertIn(
+            "keyword_view", self.mock_ga_service.search_stream.call_args.kwargs["query"]
+        )
+        self.assertIn(
+            "Resuming run: skipping 2 completed units, fetching 1.",
+            self.captured_output.getvalue(),
+        )
+        self.assertTrue(
+            all(unit["status"] == "done" for unit in manifest.units.values())
+        )
+
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_merges_staged_shards_into_output(self, mock_load_from_storage):
+        mock_load_from_storage.return_value = self.mock_client
+        row = GoogleAdsRow()
+        row.campaign.id = 1
+        row.metrics.clicks = 2
+        self.mock_ga_service.search_stream.return_value = [MagicMock(results=[row])]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            main(["111"], None, output_dir=output_dir, shard_by="week")
+            with open(
+                os.path.join(
+                    output_dir,
+                    "campaign_performance_last_30_days_customer_111.csv",
+                ),
+                newline="",
+            ) as f:
+                written = list(csv.DictReader(f))
+            staged = os.listdir(os.path.join(output_dir, "shards"))
+
+        # Five weekly shards of one row each are summed into one row.
+        self.assertEqual(len(written), 1)
+        self.assertEqual(written[0]["metrics.clicks"], "10")
+        self.assertEqual(len(staged), 15)
+
+    # --- Test ServicePool ---
+    def _make_service_pool(self, channels, **kwargs):
+        services = [MagicMock(name=f"service_{i}") for i in range(channels)]
+        channel_options = []
+
+        def create_pooled_service(client, options, is_async=False):
+            channel_options.append(options)
+            return services[len(channel_options) - 1], MagicMock()
+
+        with patch(
+            "report_downloader.pool._create_pooled_service",
+            side_effect=create_pooled_service,
+        ):
+            pool = ServicePool(self.mock_client, channels, **kwargs)
+        return pool, services, channel_options
+
+    def test_service_pool_creates_channels_with_pool_options(self):
+        _, _, channel_options = self._make_service_pool(2, keepalive_ms=1234)
+
+        self.assertEqual(len(channel_options), 2)
+        for options in channel_options:
+            self.assertIn(("grpc.keepalive_time_ms", 1234), options)
+            self.assertIn(("grpc.use_local_subchannel_pool", 1), options)
+            self.assertIn(
+                ("grpc.max_receive_message_length", 64 * 1024 * 1024), options
+            )
+        self.mock_client.get_service.assert_not_called()
+
+    def test_create_pooled_service_uses_given_channel_options(self):
+        client = GoogleAdsClient(
+            credentials=MagicMock(),
+            developer_token="token",
+            login_customer_id="1234567890",
+            version="v22",
+        )
+        options = [("grpc.keepalive_time_ms", 1234)]
+
+        with patch("grpc.secure_channel") as mock_secure_channel:
+            service, channel = _create_pooled_service(client, options)
+
+        self.assertIsInstance(service, GoogleAdsServiceClient)
+        self.assertIs(channel, mock_secure_channel.return_value)
+        self.assertEqual(mock_secure_channel.call_args.kwargs["options"], options)
+
+    def test_service_pool_leases_least_busy_channel(self):
+        pool, services, _ = self._make_service_pool(2)
+
+        with pool.lease() as first, pool.lease() as second:
+            with pool.lease() as third:
+                self.assertEqual(
+                    [first, second, third], [services[0], services[1], services[0]]
+                )
+        stats = pool.stats()
+
+        self.assertEqual([channel["streams"] for channel in stats], [2, 1])
+        self.assertEqual([channel["peak_in_flight"] for channel in stats], [2, 1])
+        self.assertTrue(all(0 < channel["busy"] <= 1 for channel in stats))
+
+    def test_service_pool_waits_for_a_free_stream(self):
+        pool, services, _ = self._make_service_pool(1, max_streams_per_channel=1)
+        leased = []
+
+        def fetch():
+            with pool.lease() as service:
+                leased.append(service)
+
+        with pool.lease():
+            waiter = threading.Thread(target=fetch)
+            waiter.start()
+            time.sleep(0.05)
+            self.assertEqual(leased, [])
+            # The asyncio engine never waits; its semaphore bounds the streams.
+            with pool.lease(block=False) as service:
+                self.assertIs(service, services[0])
+        waiter.join(timeout=1)
+
+        self.assertEqual(leased, [services[0]])
+        self.assertGreater(pool.wait_seconds, 0)
+        self.assertEqual(pool.stats()[0]["peak_in_flight"], 2)
+
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_shares_pooled_channels(self, mock_load_from_storage):
+        mock_load_from_storage.return_value = self.mock_client
+        self.mock_ga_service.search_stream.return_value = [
+            MagicMock(results=[GoogleAdsRow()])
+        ]
+
+        with patch(
+            "report_downloader.pool._create_pooled_service",
+            return_value=(self.mock_ga_service, MagicMock()),
+        ) as mock_create_pooled_service:
+            main(["111", "222"], None, channels=2)
+
+        # Two pooled channels serve all six reports.
+        self.assertEqual(mock_create_pooled_service.call_count, 2)
+        self.assertEqual(self.mock_ga_service.search_stream.call_count, 6)
+        self.assertIn("Channel 1:", self.captured_output.getvalue())
+
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_asyncio_engine_opens_pooled_channels_on_its_loop(
+        self, mock_load_from_storage
+    ):
+        mock_load_from_storage.return_value = self.mock_client
+        channel_loops = []
+        channels = []
+
+        async def search_stream(**kwargs):
+            return _AsyncStream([MagicMock(results=[GoogleAdsRow()])])
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+
+        def create_pooled_service(client, options, is_async=False):
+            # grpc.aio channels created outside the loop fail on every call.
+            channel_loops.append(asyncio.get_running_loop())
+            channels.append(AsyncMock())
+            return self.mock_ga_service, channels[-1]
+
+        with patch(
+            "report_downloader.pool._create_pooled_service",
+            side_effect=create_pooled_service,
+        ):
+            main(["111", "222"], None, engine="asyncio", channels=2)
+
+        self.assertEqual(len(channel_loops), 2)
+        self.assertIs(channel_loops[0], channel_loops[1])
+        self.assertTrue(channel_loops[0].is_closed())
+        for channel in channels:
+            channel.close.assert_awaited_once()
+        self.assertEqual(self.mock_ga_service.search_stream.call_count, 6)
+        self.assertIn("Channel 1:", self.captured_output.getvalue())
+        self.assertNotIn("Report failed", self.captured_output.getvalue())
+
+    # --- Test stream metrics ---
+    def test_report_definition_name(self):
+        self.assertEqual(
+            _report_definition_name("Campaigns (Customer: 111)"), "Campaigns"
+        )
+        self.assertEqual(
+            _report_definition_name(
+                "Ad Group Performance (Last 30 Days) (Customer: 111) "
+                "[2025-01-01..2025-01-07]"
+            ),
+            "Ad Group Performance (Last 30 Days)",
+        )
+
+    def test_summarize_stream_metrics(self):
+        entries = [
+            {
+                "report": "Campaigns" if i < 10 else "Keywords",
+                "customer_id": str(i % 2),
+                "attempt": 1 if i == 3 else 0,
+                "rows": 10,
+                "bytes": 100,
+                "total_seconds": float(i + 1),
+                "time_to_first_batch": 0.5 if i else None,
+                "error": "boom" if i == 11 else None,
+            }
+            for i in range(12)
+        ]
+
+        by_report = summarize_stream_metrics(entries)
+        by_customer = summarize_stream_metrics(entries, "customer_id")
+
+        self.assertEqual([s["report"] for s in by_report], ["Campaigns", "Keywords"])
+        campaigns = by_report[0]
+        self.assertEqual(campaigns["streams"], 10)
+        self.assertEqual(campaigns["retries"], 1)
+        self.assertEqual(campaigns["rows"], 100)
+        self.assertEqual(campaigns["total_seconds"], 55.0)
+        self.assertAlmostEqual(campaigns["total_seconds_p50"], 5.5)
+        self.assertAlmostEqual(campaigns["total_seconds_p99"], 9.91)
+        self.assertEqual(campaigns["time_to_first_batch_p95"], 0.5)
+        self.assertEqual(by_report[1]["failed"], 1)
+        self.assertEqual(sum(s["streams"] for s in by_customer), 12)
+
+    def _fetch_with_metrics(self, metrics, error=None):
+        batches = [
+            SearchGoogleAdsStreamResponse(
+                results=[self._make_campaign_row(i, f"C{i}") for i in ids],
+                request_id="req-1",
+            )
+            for ids in ([1, 2], [3])
+        ]
+
+        def search_stream(customer_id, query):
+            yield from batches
+            if error:
+                raise error
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+        return fetch_report_threaded(
+            self.mock_client,
+            "111",
+            "SELECT campaign.id FROM campaign",
+            "Campaigns (Customer: 111)",
+            metrics=metrics,
+        )
+
+    def test_fetch_report_records_jsonl_metrics(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            metrics = open_metrics_recorder(os.path.join(tmp_dir, "metrics.jsonl"))
+            self._fetch_with_metrics(metrics)
+            self._fetch_with_metrics(
+                metrics, _make_google_ads_exception(request_id="req-2")
+            )
+            metrics.close()
+            with open(metrics.path, encoding="utf-8") as f:
+                entries = [json.loads(line) for line in f]
+
+        self.assertIsInstance(metrics, JsonlMetricsRecorder)
+        self.assertEqual(entries, metrics.entries)
+        succeeded, failed = entries
+        self.assertEqual(succeeded["report"], "Campaigns")
+        self.assertEqual(succeeded["customer_id"], "111")
+        self.assertEqual(succeeded["request_id"], "req-1")
+        self.assertEqual(succeeded["batches"], 2)
+        self.assertEqual(succeeded["rows"], 3)
+        self.assertGreater(succeeded["bytes"], 0)
+        self.assertIsNotNone(succeeded["time_to_first_batch"])
+        self.assertIsNotNone(succeeded["interval_mean"])
+        self.assertIsNone(succeeded["error"])
+        self.assertEqual(failed["request_id"], "req-2")
+        self.assertIsNotNone(failed["error"])
+
+    def test_fetch_report_records_unexpected_errors_as_failures(self):
+        metrics = MetricsRecorder(None)
+        error = grpc.RpcError("connection reset")
+
+        report_name, rows, exception = self._fetch_with_metrics(metrics, error)
+
+        self.assertIs(exception, error)
+        (entry,) = metrics.entries
+        self.assertEqual(entry["rows"], 3)
+        self.assertIn("connection reset", entry["error"])
+        self.assertIn(
+            "[Campaigns (Customer: 111)] Report fetch failed",
+            self.captured_output.getvalue(),
+        )
+
+    def test_fetch_report_async_records_sink_errors_as_failures(self):
+        batch = SearchGoogleAdsStreamResponse(
+            results=[self._make_campaign_row(1, "C1")], request_id="req-3"
+        )
+        googleads_service = MagicMock()
+        googleads_service.search_stream.return_value = _AsyncStream([batch])
+        sink = MagicMock(spec=CsvSink, decode_pool=None)
+        sink.write_batch.side_effect = OSError("disk full")
+        metrics = MetricsRecorder(None)
+
+        _, _, exception = asyncio.run(
+            fetch_report_async(
+                googleads_service,
+                "111",
+                "SELECT campaign.id FROM campaign",
+                "Campaigns (Customer: 111)",
+                sink=sink,
+                metrics=metrics,
+            )
+        )
+
+        self.assertIsInstance(exception, OSError)
+        (entry,) = metrics.entries
+        self.assertEqual(entry["error"], "disk full")
+        sink.close.assert_called_once()
+
+    def test_sqlite_metrics_accumulate_across_runs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "metrics.db")
+            for _ in range(2):
+                metrics = open_metrics_recorder(path)
+                self._fetch_with_metrics(metrics)
+                self.assertEqual(len(metrics.entries), 1)
+                metrics.close()
+            metrics = SqliteMetricsRecorder(path)
+            entries = metrics.load()
+            metrics.close()
+
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]["rows"], 3)
+        self.assertEqual(summarize_stream_metrics(entries)[0]["streams"], 2)
+
+    def test_fetch_report_async_records_metrics(self):
+        batch = SearchGoogleAdsStreamResponse(
+            results=[self._make_campaign_row(1, "C1")], request_id="req-3"
+        )
+        googleads_service = MagicMock()
+        googleads_service.search_stream.return_value = _AsyncStream([batch])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            metrics = open_metrics_recorder(os.path.join(tmp_dir, "metrics.jsonl"))
+            asyncio.run(
+                fetch_report_async(
+                    googleads_service,
+                    "111",
+                    "SELECT campaign.id FROM campaign",
+                    "Campaigns (Customer: 111)",
+                    metrics=metrics,
+                    attempt=2,
+                )
+            )
+
+        (entry,) = metrics.entries
+        self.assertEqual(entry["request_id"], "req-3")
+        self.assertEqual(entry["attempt"], 2)
+        self.assertEqual(entry["rows"], 1)
+
+    # --- Test shared rate limiting ---
+    def test_fetch_report_acquires_rate_limiter_before_streaming(self):
+        events = []
+        rate_limiter = MagicMock()
+        rate_limiter.acquire.side_effect = lambda: events.append("acquire")
+
+        def search_stream(customer_id, query):
+            events.append("search_stream")
+            return [SearchGoogleAdsStreamResponse()]
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+
+        fetch_report_threaded(
+            self.mock_client,
+            "111",
+            "SELECT campaign.id FROM campaign",
+            "Campaigns",
+            rate_limiter=rate_limiter,
+        )
+
+        self.assertEqual(events, ["acquire", "search_stream"])
+
+    def test_fetch_report_async_acquires_rate_limiter(self):
+        rate_limiter = MagicMock()
+        googleads_service = MagicMock()
+        googleads_service.search_stream.return_value = _AsyncStream([])
+
+        asyncio.run(
+            fetch_report_async(
+                googleads_service,
+                "111",
+                "SELECT campaign.id FROM campaign",
+                "Campaigns",
+                rate_limiter=rate_limiter,
+            )
+        )
+
+        rate_limiter.acquire.assert_called_once_with()
+
+    def test_rate_limiter_is_acquired_for_every_adaptive_attempt(self):
+        rate_limiter = MagicMock()
+        controller = AdaptiveConcurrencyController(initial_limit=1, max_limit=1)
+        self.mock_ga_service.search_stream.side_effect = [
+            self._make_quota_exception(),
+            [SearchGoogleAdsStreamResponse()],
+        ]
+
+        with patch("time.sleep"):
+            results = _run_reports_threaded(
+                self.mock_client,
+                [("111", "SELECT campaign.id FROM campaign", "Campaigns")],
+                1,
+                controller,
+                rate_limiter=rate_limiter,
+            )
+
+        self.assertIsNone(results["Campaigns"]["exception"])
+        self.assertEqual(rate_limiter.acquire.call_count, 2)
+
+    def _refusing_rate_limiter(self):
+        """A limiter that grants the first request and refuses the second."""
+        rate_limiter = MagicMock()
+        rate_limiter.acquire.side_effect = [
+            0.0,
+            RuntimeError("Rate limit tokens are not available for another 900s."),
+        ]
+        return rate_limiter
+
+    def _assert_one_report_refused(self, results):
+        exceptions = [result["exception"] for result in results.values()]
+        refused = [ex for ex in exceptions if isinstance(ex, RateLimitError)]
+        self.assertEqual(len(refused), 1)
+        self.assertIn("not available", str(refused[0]))
+        self.assertEqual(exceptions.count(None), 1)
+
+    def test_rate_limiter_refusal_fails_only_that_report(self):
+        self.mock_ga_service.search_stream.return_value = [
+            SearchGoogleAdsStreamResponse()
+        ]
+        jobs = [
+            (
+                customer_id,
+                "SELECT campaign.id FROM campaign",
+                f"Campaigns {customer_id}",
+            )
+            for customer_id in ("111", "222")
+        ]
+
+        results = _run_reports_threaded(
+            self.mock_client, jobs, 1, rate_limiter=self._refusing_rate_limiter()
+        )
+
+        self._assert_one_report_refused(results)
+        self.assertEqual(self.mock_ga_service.search_stream.call_count, 1)
+
+    def test_rate_limiter_refusal_fails_only_that_async_report(self):
+        self.mock_client.get_service.return_value.search_stream.side_effect = (
+            lambda **kwargs: _AsyncStream([])
+        )
+        jobs = [
+            (
+                customer_id,
+                "SELECT campaign.id FROM campaign",
+                f"Campaigns {customer_id}",
+            )
+            for customer_id in ("111", "222")
+        ]
+
+        results = asyncio.run(
+            _run_reports_async(
+                self.mock_client,
+                jobs,
+                1,
+                rate_limiter=self._refusing_rate_limiter(),
+            )
+        )
+
+        self._assert_one_report_refused(results)
+
+    # --- Test hedged requests ---
+    def test_hedging_policy_deadline_and_budget(self):
+        policy = HedgingPolicy(percentile=50, max_hedge_ratio=0.5, min_samples=3)
+
+        policy.observe(2.0)
+        policy.observe(4.0)
+        self.assertIsNone(policy.deadline())
+        policy.observe(6.0)
+        self.assertEqual(policy.deadline(), 4.0)
+
+        policy.streams = 3
+        self.assertTrue(policy.try_hedge())
+        self.assertFalse(policy.try_hedge())
+        policy.streams = 4
+        self.assertTrue(policy.try_hedge())
+        self.assertEqual(policy.hedges, 2)
+
+    def _make_hedging_policy(self):
+        policy = HedgingPolicy(max_hedge_ratio=1.0, min_samples=1, min_delay=0.05)
+        policy.observe(0.01)
+        return policy
+
+    def test_fetch_report_async_keeps_faster_hedge(self):
+        slow = _DelayedAsyncStream(
+            [SearchGoogleAdsStreamResponse(results=[GoogleAdsRow()])], delay=5
+        )
+        fast = _AsyncStream(
+            [SearchGoogleAdsStreamResponse(results=[GoogleAdsRow(), GoogleAdsRow()])]
+        )
+        googleads_service = MagicMock()
+        googleads_service.search_stream.side_effect = [slow, fast]
+        policy = self._make_hedging_policy()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            metrics = open_metrics_recorder(os.path.join(tmp_dir, "metrics.jsonl"))
+            _, rows, exception = asyncio.run(
+                fetch_report_async(
+                    googleads_service,
+                    "111",
+                    "SELECT campaign.id FROM campaign",
+                    "Campaigns",
+                    metrics=metrics,
+                    hedging=policy,
+                )
+            )
+
+        self.assertIsNone(exception)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(slow.cancelled)
+        self.assertEqual((policy.streams, policy.hedges, policy.hedge_wins), (1, 1, 1))
+        (entry,) = metrics.entries
+        self.assertEqual((entry["hedged"], entry["hedge_won"]), (1, 1))
+        self.assertEqual(summarize_stream_metrics(metrics.entries)[0]["hedges"], 1)
+
+    def test_fetch_report_async_waits_for_hedge_when_primary_fails(self):
+        failing = _DelayedAsyncStream([], delay=0.1)
+        failing._error = _make_google_ads_exception()
+        fast = _DelayedAsyncStream(
+            [SearchGoogleAdsStreamResponse(results=[GoogleAdsRow()])], delay=0.2
+        )
+        googleads_service = MagicMock()
+        googleads_service.search_stream.side_effect = [failing, fast]
+
+        _, rows, exception = asyncio.run(
+            fetch_report_async(
+                googleads_service,
+                "111",
+                "SELECT campaign.id FROM campaign",
+                "Campaigns",
+                hedging=self._make_hedging_policy(),
+            )
+        )
+
+        self.assertIsNone(exception)
+        self.assertEqual(len(rows), 1)
+
+    def test_fetch_report_async_does_not_hedge_without_samples(self):
+        googleads_service = MagicMock()
+        googleads_service.search_stream.return_value = _DelayedAsyncStream(
+            [SearchGoogleAdsStreamResponse(results=[GoogleAdsRow()])], delay=0.1
+        )
+        policy = HedgingPolicy(min_samples=5, min_delay=0.01)
+
+        asyncio.run(
+            fetch_report_async(
+                googleads_service,
+                "111",
+                "SELECT campaign.id FROM campaign",
+                "Campaigns",
+                hedging=policy,
+            )
+        )
+
+        googleads_service.search_stream.assert_called_once()
+        self.assertEqual((policy.streams, policy.hedges), (1, 0))
+
+    def _fetch_hedged_with_limits(self, streams, channel_streams):
+        slow = _DelayedAsyncStream(
+            [SearchGoogleAdsStreamResponse(results=[GoogleAdsRow()])], delay=0.3
+        )
+        fast = _AsyncStream(
+            [SearchGoogleAdsStreamResponse(results=[GoogleAdsRow(), GoogleAdsRow()])]
+        )
+        pool, services, _ = self._make_service_pool(
+            1, max_streams_per_channel=channel_streams
+        )
+        services[0].search_stream.side_effect = [slow, fast]
+        policy = self._make_hedging_policy()
+
+        async def fetch():
+            semaphore = asyncio.Semaphore(streams)
+            result = await fetch_report_async(
+                None,
+                "111",
+                "SELECT campaign.id FROM campaign",
+                "Campaigns",
+                semaphore,
+                service_pool=pool,
+                hedging=policy,
+            )
+            # Every slot is given back.
+            self.assertFalse(semaphore.locked())
+            return result
+
+        _, rows, _ = asyncio.run(fetch())
+        return rows, policy, pool
+
+    def test_hedge_takes_its_own_stream_slot_and_channel(self):
+        rows, policy, pool = self._fetch_hedged_with_limits(2, 2)
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(policy.hedges, 1)
+        (channel,) = pool.stats()
+        self.assertEqual(channel["streams"], 2)
+        self.assertEqual(channel["peak_in_flight"], 2)
+
+    def test_hedge_is_not_sent_without_a_free_stream_slot(self):
+        rows, policy, _ = self._fetch_hedged_with_limits(1, 2)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(policy.hedges, 0)
+        self.assertIn(
+            "[Campaigns] Not hedging: no free stream slot.",
+            self.captured_output.getvalue(),
+        )
+
+    def test_hedge_is_not_sent_without_a_free_channel(self):
+        rows, policy, pool = self._fetch_hedged_with_limits(2, 1)
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(policy.hedges, 0)
+        self.assertEqual(pool.stats()[0]["peak_in_flight"], 1)
+
+    def test_adaptive_hedge_returns_its_controller_slot(self):
+        slow = _DelayedAsyncStream(
+            [SearchGoogleAdsStreamResponse(results=[GoogleAdsRow()])], delay=5
+        )
+        fast = _AsyncStream([SearchGoogleAdsStreamResponse(results=[GoogleAdsRow()])])
+        googleads_service = MagicMock()
+        googleads_service.search_stream.side_effect = [slow, fast]
+        controller = AdaptiveConcurrencyController(initial_limit=2)
+        policy = self._make_hedging_policy()
+
+        _, rows, _ = asyncio.run(
+            _fetch_report_async_adaptive(
+                controller,
+                googleads_service,
+                "111",
+                "SELECT campaign.id FROM campaign",
+                "Campaigns",
+                hedging=policy,
+            )
+        )
+
+        self.assertEqual(policy.hedges, 1)
+        self.assertEqual(controller.in_flight, 0)
+        # Only the report's own completion counts towards the limit.
+        self.assertEqual(controller.limit, 2)
+
+    def test_sqlite_metrics_adds_missing_columns(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "metrics.db")
+            old_fields = [
+                f for f in SqliteMetricsRecorder.FIELDS if not f.startswith("hedge")
+            ]
+            connection = sqlite3.connect(path)
+            connection.execute(f"CREATE TABLE stream_metrics ({', '.join(old_fields)})")
+            connection.close()
+
+            metrics = SqliteMetricsRecorder(path)
+            self._fetch_with_metrics(metrics)
+            entries = metrics.load()
+            metrics.close()
+
+        self.assertEqual(entries[0]["hedged"], 0)
+
+    def test_main_hedging_requires_asyncio_engine(self):
+        with patch(
+            "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+        ):
+            with self.assertRaises(ValueError):
+                main(["111"], None, hedge_percentile=95)
+
+    def test_hedge_percentile_must_be_between_1_and_99(self):
+        for percentile in (0, 100, 150):
+            with self.assertRaises(ValueError):
+                HedgingPolicy(percentile=percentile)
+            with patch(
+                "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+            ) as mock_load_from_storage:
+                with self.assertRaises(ValueError):
+                    main(["111"], None, engine="asyncio", hedge_percentile=percentile)
+            mock_load_from_storage.assert_not_called()
+
+    # --- Test longest-job-first scheduling ---
+    def test_job_duration_history_estimates_and_smooths(self):
+        def entry(customer_id, report_name, seconds, error=None):
+            return {
+                "customer_id": customer_id,
+                "report_name": report_name,
+                "total_seconds": seconds,
+                "error": error,
+            }
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "history.json")
+            history = JobDurationHistory(path)
+            self.assertEqual(history.estimate("1", "Keywords (Customer: 1)"), 0.0)
+            history.update(
+                [
+                    entry("1", "Keywords (Customer: 1) [2025-01-01..2025-01-07]", 10),
+                    entry("1", "Keywords (Customer: 1) [2025-01-08..2025-01-14]", 20),
+                    entry("2", "Keywords (Customer: 2)", 30),
+                    entry("2", "Campaigns (Customer: 2)", 1),
+                    entry("3", "Campaigns (Customer: 3)", 99, error="boom"),
+                ]
+            )
+            JobDurationHistory(path).update([entry("2", "Keywords (Customer: 2)", 50)])
+            history = JobDurationHistory(path)
+
+        self.assertEqual(history.estimate("1", "Keywords (Customer: 1)"), 15.0)
+        self.assertEqual(history.estimate("2", "Keywords (Customer: 2)"), 40.0)
+        # Unknown customer: the mean of the report for other customers.
+        self.assertEqual(history.estimate("3", "Keywords (Customer: 3)"), 27.5)
+        self.assertEqual(history.estimate("3", "Campaigns (Customer: 3)"), 1.0)
+        # Unknown report: the longest known duration.
+        self.assertEqual(history.estimate("3", "Ads (Customer: 3)"), 40.0)
+
+    def test_order_jobs_longest_first(self):
+        history = JobDurationHistory(os.path.join(tempfile.gettempdir(), "missing"))
+        history.durations = {
+            "1\tCampaigns": 1.0,
+            "1\tKeywords": 30.0,
+            "2\tCampaigns": 5.0,
+            "2\tKeywords": 10.0,
+        }
+        jobs = _build_report_jobs(
+            ["1", "2"],
+            [{"name": "Campaigns", "query": "q1"}, {"name": "Keywords", "query": "q2"}],
+        )
+
+        ordered = order_jobs_longest_first(jobs, history)
+
+        self.assertEqual(
+            [name for _, _, name in ordered],
+            [
+                "Keywords (Customer: 1)",
+                "Keywords (Customer: 2)",
+                "Campaigns (Customer: 2)",
+                "Campaigns (Customer: 1)",
+            ],
+        )
+
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_schedules_from_and_updates_job_history(self, mock_load_from_storage):
+        mock_load_from_storage.return_value = self.mock_client
+        started = []
+
+        def search_stream(customer_id, query):
+            started.append(query)
+            return [SearchGoogleAdsStreamResponse(results=[GoogleAdsRow()])]
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "history.json")
+            with open(path, "w") as f:
+                json.dump(
+                    {
+                        "111\tCampaign Performance (Last 30 Days)": 1.0,
+                        "111\tAd Group Performance (Last 30 Days)": 2.0,
+                        "111\tKeyword Performance (Last 30 Days)": 60.0,
+                    },
+                    f,
+                )
+
+            main(["111"], None, max_concurrency=1, job_history_path=path)
+
+            with open(path) as f:
+                durations = json.load(f)
+
+        self.assertEqual(
+            [query.split("FROM")[1].split()[0] for query in started],
+            ["keyword_view", "ad_group", "campaign"],
+        )
+        self.assertEqual(len(durations), 3)
+        self.assertLess(durations["111\tKeyword Performance (Last 30 Days)"], 60.0)
+        self.assertNotIn("--- Stream metrics", self.captured_output.getvalue())
+
+    # --- Test query fusion ---
+    _LANDING_PAGE_WHERE = (
+        "FROM expanded_landing_page_view "
+        "WHERE campaign.ai_max_setting.enable_ai_max = TRUE ORDER BY campaign.id"
+    )
+
+    def test_fuse_jobs_groups_compatible_queries(self):
+        details = f"SELECT campaign.id, campaign.name {self._LANDING_PAGE_WHERE}"
+        matches = (
+            "SELECT campaign.id,\n  expanded_landing_page_view.expanded_final_url\n"
+            + self._LANDING_PAGE_WHERE.replace(" WHERE", "\nWHERE")
+        )
+        other_filter = "SELECT campaign.id FROM expanded_landing_page_view"
+        with_metrics = f"SELECT metrics.clicks {self._LANDING_PAGE_WHERE}"
+        jobs = [
+            ("1", details, "Details (Customer: 1) [2025-01-01..2025-01-07]"),
+            ("1", other_filter, "All (Customer: 1)"),
+            ("1", matches, "Matches (Customer: 1) [2025-01-01..2025-01-07]"),
+            ("1", with_metrics, "Clicks (Customer: 1)"),
+            ("2", details, "Details (Customer: 2)"),
+        ]
+
+        fused_jobs, fusion_groups = fuse_jobs(jobs)
+
+        self.assertEqual(
+            [name for _, _, name in fused_jobs],
+            [
+                "Details + Matches (Customer: 1) [2025-01-01..2025-01-07]",
+                "All (Customer: 1)",
+                "Clicks (Customer: 1)",
+                "Details (Customer: 2)",
+            ],
+        )
+        fused_query = fused_jobs[0][1]
+        self.assertEqual(
+            _parse_select_fields(fused_query),
+            [
+                "campaign.id",
+                "campaign.name",
+                "expanded_landing_page_view.expanded_final_url",
+            ],
+        )
+        self.assertIn(self._LANDING_PAGE_WHERE, fused_query)
+        self.assertEqual(
+            [name for name, _ in fusion_groups[fused_jobs[0][2]]],
+            [
+                "Details (Customer: 1) [2025-01-01..2025-01-07]",
+                "Matches (Customer: 1) [2025-01-01..2025-01-07]",
+            ],
+        )
+
+    def test_fuse_jobs_keeps_queries_with_different_segments_apart(self):
+        jobs = [
+            ("1", "SELECT campaign.id, segments.date FROM campaign", "A"),
+            ("1", "SELECT campaign.name, segments.device FROM campaign", "B"),
+            ("1", "SELECT campaign.id FROM campaign LIMIT 10", "C"),
+        ]
+
+        fused_jobs, fusion_groups = fuse_jobs(jobs)
+
+        self.assertEqual(fused_jobs, jobs)
+        self.assertEqual(fusion_groups, {})
+
+    @patch("api_examples.parallel_report_downloader_optimized._get_report_definitions")
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_fuses_queries_into_per_report_files(
+        self, mock_load_from_storage, mock_get_report_definitions
+    ):
+        mock_load_from_storage.return_value = self.mock_client
+        self._mock_fusable_reports(mock_get_report_definitions)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            main(["111"], None, output_dir=tmp_dir, fuse_queries=True)
+
+            with open(os.path.join(tmp_dir, "details_customer_111.csv")) as f:
+                details = list(csv.reader(f))
+            with open(os.path.join(tmp_dir, "matches_customer_111.csv")) as f:
+                matches = list(csv.reader(f))
+
+        self.mock_ga_service.search_stream.assert_called_once()
+        self.assertEqual(details, [["campaign.id", "campaign.name"], ["7", "AI Max"]])
+        self.assertEqual(
+            matches,
+            [
+                ["campaign.id", "expanded_landing_page_view.expanded_final_url"],
+                ["7", "https://example.com/a"],
+            ],
+        )
+        output = self.captured_output.getvalue()
+        self.assertIn("Fused 2 reports into 1 queries.", output)
+        self.assertIn("--- Results for Details (Customer: 111) ---", output)
+        self.assertIn("--- Results for Matches (Customer: 111) ---", output)
+
+    @patch("api_examples.parallel_report_downloader_optimized._get_report_definitions")
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_resumed_fused_reports_keep_their_row_counts(
+        self, mock_load_from_storage, mock_get_report_definitions
+    ):
+        mock_load_from_storage.return_value = self.mock_client
+        self._mock_fusable_reports(mock_get_report_definitions)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manifest_path = os.path.join(tmp_dir, "manifest.jsonl")
+            main(
+                ["111"],
+                None,
+                output_dir=tmp_dir,
+                manifest_path=manifest_path,
+                fuse_queries=True,
+            )
+            self.captured_output.truncate(0)
+            self.captured_output.seek(0)
+            main(
+                ["111"],
+                None,
+                output_dir=tmp_dir,
+                manifest_path=manifest_path,
+                fuse_queries=True,
+            )
+
+        self.mock_ga_service.search_stream.assert_called_once()
+        output = self.captured_output.getvalue()
+        self.assertIn("Resuming run: skipping 1 completed units, fetching 0.", output)
+        self.assertIn("Wrote 1 rows to", output)
+        self.assertNotIn("Wrote 0 rows", output)
+
+    def _mock_fusable_reports(self, mock_get_report_definitions):
+        mock_get_report_definitions.return_value = [
+            {
+                "name": "Details",
+                "query": f"SELECT campaign.id, campaign.name {self._LANDING_PAGE_WHERE}",
+            },
+            {
+                "name": "Matches",
+                "query": (
+                    "SELECT campaign.id, "
+                    "expanded_landing_page_view.expanded_final_url "
+                    f"{self._LANDING_PAGE_WHERE}"
+                ),
+            },
+        ]
+        row = GoogleAdsRow()
+        row.campaign.id = 7
+        row.campaign.name = "AI Max"
+        row.expanded_landing_page_view.expanded_final_url = "https://example.com/a"
+        self.mock_ga_service.search_stream.return_value = [
+            SearchGoogleAdsStreamResponse(results=[row])
+        ]
+
+    # --- Test account discovery ---
+    def _mock_customer_client_tree(self, tree, failing=()):
+        """Serves a customer_client tree of {manager_id: [(id, manager, status,
+        currency)]} from the mock GoogleAdsService."""
+
+        def search_stream(customer_id, query):
+            self.assertIn("customer_client.level <= 1", query)
+            if customer_id in failing:
+                raise _make_google_ads_exception()
+            rows = [GoogleAdsRow()]
+            rows[0].customer_client.id = int(customer_id)
+            rows[0].customer_client.manager = True
+            for client_id, manager, status, currency in tree.get(customer_id, []):
+                row = GoogleAdsRow()
+                row.customer_client.id = client_id
+                row.customer_client.level = 1
+                row.customer_client.manager = manager
+                row.customer_client.status = status
+                row.customer_client.currency_code = currency
+                rows.append(row)
+            return [SearchGoogleAdsStreamResponse(results=rows)]
+
+        self.mock_ga_service.search_stream.side_effect = search_stream
+
+    def test_discover_client_accounts_walks_levels(self):
+        self._mock_customer_client_tree(
+            {
+                "100": [(200, True, 2, "USD"), (300, False, 2, "USD")],
+                "200": [
+                    (300, False, 2, "USD"),
+                    (400, False, 3, "EUR"),
+                    (500, True, 4, "USD"),
+                ],
+            }
+        )
+
+        accounts = discover_client_accounts(self.mock_client, "100")
+
+        self.assertEqual(
+            [(a["customer_id"], a["level"], a["parent_id"]) for a in accounts],
+            [
+                ("200", 1, "100"),
+                ("300", 1, "100"),
+                ("400", 2, "200"),
+                ("500", 2, "200"),
+            ],
+        )
+        self.assertEqual(accounts[2]["status"], "CANCELED")
+        # The cancelled manager 500 is not descended into.
+        queried = [
+            c.kwargs["customer_id"]
+            for c in self.mock_ga_service.search_stream.call_args_list
+        ]
+        self.assertEqual(queried, ["100", "200"])
+
+    def test_discover_client_accounts_skips_failed_managers(self):
+        self._mock_customer_client_tree(
+            {"100": [(200, True, 2, "USD"), (300, False, 2, "USD")]},
+            failing=("200",),
+        )
+
+        accounts = discover_client_accounts(self.mock_client, "100")
+
+        self.assertEqual([a["customer_id"] for a in accounts], ["200", "300"])
+
+    def test_filter_client_accounts(self):
+        accounts = [
+            {
+                "customer_id": "1",
+                "manager": True,
+                "status": "ENABLED",
+                "currency_code": "USD",
+            },
+            {
+                "customer_id": "2",
+                "manager": False,
+                "status": "ENABLED",
+                "currency_code": "USD",
+            },
+            {
+                "customer_id": "3",
+                "manager": False,
+                "status": "ENABLED",
+                "currency_code": "EUR",
+            },
+            {
+                "customer_id": "4",
+                "manager": False,
+                "status": "CANCELED",
+                "currency_code": "USD",
+            },
+        ]
+
+        self.assertEqual(filter_client_accounts(accounts), ["2", "3"])
+        self.assertEqual(
+            filter_client_accounts(accounts, currency_codes=["USD"]), ["2"]
+        )
+        self.assertEqual(
+            filter_client_accounts(accounts, None, include_managers=True),
+            ["1", "2", "3", "4"],
+        )
+
+    def test_load_client_accounts_uses_cache_within_ttl(self):
+        self._mock_customer_client_tree({"100": [(300, False, 2, "USD")]})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, "tree.json")
+            first = load_client_accounts(self.mock_client, "100", cache_path)
+            cached = load_client_accounts(self.mock_client, "100", cache_path)
+            self.assertEqual(self.mock_ga_service.search_stream.call_count, 1)
+
+            load_client_accounts(self.mock_client, "100", cache_path, ttl_seconds=0)
+            load_client_accounts(self.mock_client, "100", cache_path, refresh=True)
+            self.assertEqual(self.mock_ga_service.search_stream.call_count, 3)
+
+        self.assertEqual(first, cached)
+        self.assertEqual(cached[0]["customer_id"], "300")
+
+    @patch("api_examples.parallel_report_downloader_optimized.fetch_report_threaded")
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_runs_reports_for_discovered_accounts(
+        self, mock_load_from_storage, mock_fetch_report_threaded
+    ):
+        mock_load_from_storage.return_value = self.mock_client
+        self._mock_customer_client_tree(
+            {"100": [(200, False, 2, "USD"), (300, False, 3, "USD")]}
+        )
+        mock_fetch_report_threaded.side_effect = (
+            lambda client, customer_id, query, report_name, sink: (
+                report_name,
+                [],
+                None,
+            )
+        )
+
+        main(
+            ["111"],
+            None,
+            manager_customer_id="100",
+            discovery_cache_path=None,
+        )
+
+        self.assertEqual(self.mock_client.login_customer_id, "100")
+        customers = {c.args[1] for c in mock_fetch_report_threaded.call_args_list}
+        self.assertEqual(customers, {"111", "200"})
+        self.assertIn(
+            "Running reports for 1 of 2 accounts", self.captured_output.getvalue()
+        )
+
     # --- Test main function ---
     @patch("api_examples.parallel_report_downloader_optimized.fetch_report_threaded")
     @patch(
@@ -209,6 +2122,71 @@ class TestParallelReportDownloaderOptimized(unittest.TestCase):
         output = self.captured_output.getvalue()
         self.assertIn("No data found.", output)
 
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_with_output_dir(self, mock_load_from_storage):
+        mock_load_from_storage.return_value = self.mock_client
+        self.mock_ga_service.search_stream.return_value = [
+            MagicMock(results=[GoogleAdsRow()])
+        ]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            main(["111"], None, output_dir=output_dir, output_format="jsonl")
+            written_files = sorted(os.listdir(output_dir))
+
+        self.assertEqual(len(written_files), 3)
+        self.assertTrue(all(name.endswith(".jsonl") for name in written_files))
+        self.assertIn("Wrote 1 rows to", self.captured_output.getvalue())
+
+    @patch("api_examples.parallel_report_downloader_optimized.fetch_report_threaded")
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_shard_by_week(
+        self, mock_load_from_storage, mock_fetch_report_threaded
+    ):
+        mock_load_from_storage.return_value = self.mock_client
+        mock_fetch_report_threaded.side_effect = (
+            lambda client, customer_id, query, report_name, sink: (
+                report_name,
+                [],
+                None,
+            )
+        )
+
+        main(["111"], None, shard_by="week")
+
+        # Three 31-day reports are split into five weekly shards each.
+        self.assertEqual(mock_fetch_report_threaded.call_count, 15)
+        output = self.captured_output.getvalue()
+        self.assertEqual(output.count("--- Results for"), 3)
+        self.assertIn(
+            "--- Results for Keyword Performance (Last 30 Days) (Customer: 111) ---",
+            output,
+        )
+
+    @patch("api_examples.parallel_report_downloader_optimized._run_reports_async")
+    @patch(
+        "api_examples.parallel_report_downloader_optimized.GoogleAdsClient.load_from_storage"
+    )
+    def test_main_asyncio_engine(self, mock_load_from_storage, mock_run_reports_async):
+        mock_load_from_storage.return_value = self.mock_client
+
+        async def run_reports(client, jobs, *args):
+            return {name: {"rows": [], "exception": None} for _, _, name in jobs}
+
+        mock_run_reports_async.side_effect = run_reports
+
+        main(["111"], None, engine="asyncio", max_concurrency=50)
+
+        _, jobs, max_streams, *options = mock_run_reports_async.call_args.args
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(max_streams, 50)
+        # No controller, sink factory, manifest, service pool or metrics.
+        self.assertEqual(options, [None] * len(options))
+        self.assertIn("No data found.", self.captured_output.getvalue())
+
 
 if __name__ == "__main__":
     unittest.main()
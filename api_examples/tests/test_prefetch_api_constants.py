@@ -0,0 +1,236 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from io import StringIO
+
+from google.ads.googleads.client import GoogleAdsClient
+from google.ads.googleads.errors import GoogleAdsException
+from google.ads.googleads.v22.services.types.google_ads_service import GoogleAdsRow
+
+from api_examples.prefetch_api_constants import (
+    ConstantStore,
+    main,
+    prefetch_constants,
+)
+
+
+def _geo_row(criterion_id, name, canonical_name):
+    row = GoogleAdsRow()
+    row.geo_target_constant.id = criterion_id
+    row.geo_target_constant.name = name
+    row.geo_target_constant.canonical_name = canonical_name
+    row.geo_target_constant.country_code = "US"
+    row.geo_target_constant.target_type = "City"
+    row.geo_target_constant.status = 2  # ENABLED
+    return row
+
+
+def _language_row(language_id, code, name):
+    row = GoogleAdsRow()
+    row.language_constant.id = language_id
+    row.language_constant.code = code
+    row.language_constant.name = name
+    row.language_constant.targetable = True
+    return row
+
+
+def _product_category_row(category_id, localizations):
+    row = GoogleAdsRow()
+    row.product_category_constant.category_id = category_id
+    row.product_category_constant.level = 2  # LEVEL1
+    for language_code, region_code, value in localizations:
+        localization = type(row.product_category_constant).ProductCategoryLocalization(
+            language_code=language_code, region_code=region_code, value=value
+        )
+        row.product_category_constant.localizations.append(localization)
+    return row
+
+
+class TestPrefetchApiConstants(unittest.TestCase):
+    def setUp(self):
+        self.mock_ga_service = MagicMock()
+        self.rows = {
+            "geo_target_constant": [
+                _geo_row(21137, "New York", "New York,New York,United States"),
+                _geo_row(1014221, "Springfield", "Springfield,Illinois,United States"),
+                _geo_row(1023191, "Springfield", "Springfield,Missouri,United States"),
+            ],
+            "language_constant": [
+                _language_row(1000, "en", "English"),
+                _language_row(1003, "es", "Spanish"),
+            ],
+            "product_category_constant": [
+                _product_category_row(
+                    1604, [("de", "DE", "Bekleidung"), ("en", "US", "Apparel")]
+                ),
+            ],
+        }
+        self.mock_ga_service.search_stream.side_effect = self._search_stream
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.store_dir.cleanup)
+        self.store_path = os.path.join(self.store_dir.name, "v22.sqlite3")
+        self.captured_output = StringIO()
+        sys.stdout = self.captured_output
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+
+    def _search_stream(self, customer_id, query):
+        table = query.rsplit(" FROM ", 1)[1].strip()
+        return [MagicMock(results=self.rows.get(table, []))]
+
+    def _prefetch(self, **kwargs):
+        return prefetch_constants(
+            self.mock_ga_service,
+            "1234567890",
+            self.store_path,
+            ["geo_target_constant", "language_constant", "product_category_constant"],
+            **kwargs,
+        )
+
+    def test_prefetch_and_lookup_by_id_and_name(self):
+        fetched = self._prefetch()
+
+        self.assertEqual(
+            fetched,
+            {
+                "geo_target_constant": 3,
+                "language_constant": 2,
+                "product_category_constant": 1,
+            },
+        )
+        queries = [
+            call.kwargs["query"]
+            for call in self.mock_ga_service.search_stream.call_args_list
+        ]
+        self.assertIn(
+            "SELECT geo_target_constant.id, geo_target_constant.name, "
+            "geo_target_constant.canonical_name",
+            queries[0],
+        )
+
+        with ConstantStore(self.store_path) as store:
+            new_york = store.get("geo_target_constant", 21137)
+            self.assertEqual(
+                new_york["canonical_name"], "New York,New York,United States"
+            )
+            self.assertEqual(new_york["status"], "ENABLED")
+            self.assertIsNone(store.get("geo_target_constant", 1))
+            self.assertEqual(
+                [geo["id"] for geo in store.find("geo_target_constant", "springfield")],
+                [1014221, 1023191],
+            )
+            self.assertEqual(
+                store.find("geo_target_constant", "Springfield,Missouri,United States")[
+                    0
+                ]["id"],
+                1023191,
+            )
+            self.assertEqual(
+                store.find("language_constant", "EN")[0]["name"], "English"
+            )
+            self.assertEqual(
+                store.find("language_constant", "Spanish")[0]["code"], "es"
+            )
+            category = store.get("product_category_constant", 1604)
+            self.assertEqual(category["name"], "Apparel")
+            self.assertEqual(category["level"], "LEVEL1")
+            self.assertEqual(category["localizations"]["de-DE"], "Bekleidung")
+            self.assertEqual(store.tables()["language_constant"][2], 2)
+
+    def test_prefetch_skips_stored_tables_unless_refreshed(self):
+        self._prefetch()
+        self.mock_ga_service.search_stream.reset_mock()
+
+        self.assertEqual(self._prefetch(), {})
+        self.mock_ga_service.search_stream.assert_not_called()
+
+        self.rows["language_constant"] = [_language_row(1000, "en", "English (US)")]
+        self.assertEqual(self._prefetch(refresh=True)["language_constant"], 1)
+        with ConstantStore(self.store_path) as store:
+            self.assertIsNone(store.get("language_constant", 1003))
+            self.assertEqual(store.find("language_constant", "english"), [])
+            self.assertEqual(
+                store.get("language_constant", 1000)["name"], "English (US)"
+            )
+
+    def test_prefetch_for_a_new_api_version(self):
+        self._prefetch()
+        self.mock_ga_service.search_stream.reset_mock()
+
+        fetched = self._prefetch(api_version="v23")
+
+        self.assertEqual(len(fetched), 3)
+        with ConstantStore(self.store_path) as store:
+            self.assertEqual(store.tables()["geo_target_constant"][0], "v23")
+
+    def test_store_errors(self):
+        with self.assertRaises(FileNotFoundError):
+            ConstantStore(os.path.join(self.store_dir.name, "missing.sqlite3"))
+
+        prefetch_constants(
+            self.mock_ga_service, "1234567890", self.store_path, ["language_constant"]
+        )
+        with ConstantStore(self.store_path) as store:
+            with self.assertRaises(KeyError):
+                store.get("carrier_constant", 70091)
+
+    def test_main_prefetches_every_table(self):
+        mock_client = MagicMock(spec=GoogleAdsClient)
+        mock_client.get_service.return_value = self.mock_ga_service
+
+        main(mock_client, "1234567890", self.store_path)
+
+        self.assertEqual(self.mock_ga_service.search_stream.call_count, 5)
+        with ConstantStore(self.store_path) as store:
+            self.assertEqual(len(store.tables()), 5)
+            self.assertEqual(store.tables()["carrier_constant"][2], 0)
+        self.assertIn(
+            f"Constant store: {self.store_path}", self.captured_output.getvalue()
+        )
+
+    def test_main_google_ads_exception(self):
+        mock_client = MagicMock(spec=GoogleAdsClient)
+        mock_client.get_service.return_value = self.mock_ga_service
+        mock_error = MagicMock()
+        mock_error.message = "Test error"
+        mock_error.location.field_path_elements = []
+        mock_failure = MagicMock()
+        mock_failure.errors = [mock_error]
+        self.mock_ga_service.search_stream.side_effect = GoogleAdsException(
+            error=MagicMock(code=MagicMock(name="INTERNAL")),
+            call=MagicMock(),
+            failure=mock_failure,
+            request_id="test_request_id",
+        )
+
+        with self.assertRaises(SystemExit) as cm:
+            main(mock_client, "1234567890", self.store_path)
+
+        self.assertEqual(cm.exception.code, 1)
+        self.assertIn(
+            'Request with ID "test_request_id" failed', self.captured_output.getvalue()
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,24 +2,17 @@ import csv
 import sys
 from collections import defaultdict
 
+from product_mapping_store import ProductMappingStore
+
 def main():
     perf_path = "saved_csv/product_performance_last30.csv"
     mapping_path = "saved_csv/merchant_center_product_mapping.csv"
     output_path = "saved_csv/attribute_alpha_report.csv"
 
-    # Step 1: Load mapping (Normalize SKU to Lowercase)
-    sku_to_attr = {}
+    # Step 1: Load mapping (keyed by lowercase SKU in the indexed store)
     try:
-        with open(mapping_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                sku_normalized = row['item_id'].lower()
-                sku_to_attr[sku_normalized] = {
-                    "color": row['color'],
-                    "bu": row['custom_label_0'],
-                    "parent_id": row['item_group_id'],
-                    "product_type": row['product_type']
-                }
+        with ProductMappingStore(mapping_path) as mapping:
+            sku_to_attr = mapping.lookup(["color"])
     except FileNotFoundError:
         print(f"Error: {mapping_path} not found.")
         return
@@ -1,39 +1,22 @@
 import csv
-from collections import defaultdict
 
-def main():
-    collections = defaultdict(lambda: {'revenue': 0.0, 'cost': 0.0, 'clicks': 0})
-    sku_to_collection = {}
-
-    # 1. Map SKUs to Collections
-    with open('saved_csv/merchant_center_product_mapping.csv', 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            title = row['title']
-            if 'Collection' in title:
-                col = title.split('Collection')[0].strip()
-                sku_to_collection[row['item_id'].lower()] = col
+from rollup_cube import DEFAULT_CUBE_PATH, RollupCube
 
-    # 2. Map Performance
-    with open('saved_csv/product_performance_last30.csv', 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            sku = row['segments.product_item_id'].lower()
-            if sku in sku_to_collection:
-                col = sku_to_collection[sku]
-                collections[col]['revenue'] += float(row['metrics.conversions_value'])
-                collections[col]['cost'] += float(row['metrics.cost_micros']) / 1000000.0
-                collections[col]['clicks'] += int(row['metrics.clicks'])
+def main():
+    # 1. Collection totals from the rollup cube (python saved_code/rollup_cube.py)
+    try:
+        with RollupCube(DEFAULT_CUBE_PATH) as cube:
+            cells = cube.query(by=('collection',))
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        return
 
-    # 3. Report
+    # 2. Report (the cube returns the cells sorted by revenue)
     report = []
-    for col, stats in collections.items():
-        if stats['cost'] > 0:
-            roas = stats['revenue'] / stats['cost']
-            report.append({'name': col, 'revenue': stats['revenue'], 'roas': roas, 'cost': stats['cost']})
+    for cell in cells:
+        if cell['cost'] > 0:
+            report.append({'name': cell['collection'], 'revenue': cell['revenue'], 'roas': cell['roas'], 'cost': cell['cost']})
 
-    report.sort(key=lambda x: x['revenue'], reverse=True)
-    
     print('--- TOP 5 COLLECTIONS BY REVENUE (30D) ---')
     for r in report[:5]:
         print(f"Collection: {r['name']} | Rev: ${r['revenue']:.2f} | ROAS: {r['roas']:.2f}")
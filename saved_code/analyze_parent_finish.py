@@ -1,21 +1,23 @@
 import csv
 from collections import defaultdict
 
+from product_mapping_store import ProductMappingStore
+
 def main():
     perf_path = "saved_csv/product_performance_last30.csv"
     mapping_path = "saved_csv/merchant_center_product_mapping.csv"
     output_path = "saved_csv/parent_finish_matrix.csv"
 
     # Step 1: Load mapping
-    sku_to_attr = {}
-    with open(mapping_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            sku_to_attr[row['item_id'].lower()] = {
+    with ProductMappingStore(mapping_path) as mapping:
+        sku_to_attr = {
+            sku: {
                 "color": row['color'],
                 "parent_id": row['item_group_id'],
                 "parent_title": row['title'].split(" - ")[0] # Heuristic for clean title
             }
+            for sku, row in mapping.lookup(["color", "item_group_id", "title"]).items()
+        }
 
     # Step 2: Aggregate by Parent + Finish
     matrix = defaultdict(lambda: {"cost": 0.0, "revenue": 0.0, "clicks": 0})
@@ -3,6 +3,7 @@ import sys
 from datetime import datetime, timedelta
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
+from quota_limiter import get_limited_service
 
 def get_customer_id():
     try:
@@ -16,7 +17,7 @@ def get_customer_id():
         sys.exit(1)
 
 def main(client, customer_id):
-    ga_service = client.get_service("GoogleAdsService")
+    ga_service = get_limited_service(client, "GoogleAdsService")
 
     # Last 30 days
     end_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
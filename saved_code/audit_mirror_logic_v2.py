@@ -2,6 +2,7 @@ import csv
 import sys
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
+from gaql_cache import get_cached_service
 
 def get_customer_id():
     with open("customer_id.txt", "r") as f:
@@ -9,7 +10,7 @@ def get_customer_id():
         return content.split(":")[1].strip() if ":" in content else content
 
 def main(client, customer_id):
-    ga_service = client.get_service("GoogleAdsService")
+    ga_service = get_cached_service(client)
 
     # This query pulls comprehensive bidding and negative logic for the "Paper Towel Holders" mirror
     # We include portfolio strategy resource name and ad group level overrides
@@ -1,6 +1,8 @@
 import csv
 import os
 
+from product_mapping_store import ProductMappingStore
+
 def main():
     perf_path = "saved_csv/product_performance_last30.csv"
     mapping_path = "saved_csv/merchant_center_product_mapping.csv"
@@ -19,15 +21,15 @@ def main():
             bu_status[row['bu_name']] = row['action']
 
     # 2. Load Product Metadata (Price, Availability, BU)
-    product_meta = {}
-    with open(mapping_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            product_meta[row['item_id'].lower()] = {
+    with ProductMappingStore(mapping_path) as mapping:
+        product_meta = {
+            sku: {
                 "price": float(row['price_value']) if row['price_value'] else 0.0,
                 "availability": row['availability'],
                 "bu": row['custom_label_0']
             }
+            for sku, row in mapping.lookup(["price_value", "availability", "custom_label_0"]).items()
+        }
 
     # 3. Analyze Performance Correlation
     # Group results by BU Status (REDUCE vs INCREASE)
@@ -1,9 +1,10 @@
 import csv
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
+from quota_limiter import get_limited_service
 
 def main(client, customer_id):
-    ga_service = client.get_service("GoogleAdsService")
+    ga_service = get_limited_service(client, "GoogleAdsService")
 
     # Revised Query: Use Campaign-level metrics for IS since Shopping View has limitations
     # We will identify which CAMPAIGNS have the headroom first
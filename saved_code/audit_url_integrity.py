@@ -3,6 +3,8 @@ import os
 import requests
 import time
 
+from product_mapping_store import ProductMappingStore
+
 def main():
     audit_path = "saved_csv/price_availability_audit.csv"
     mapping_path = "saved_csv/merchant_center_product_mapping.csv"
@@ -25,13 +27,11 @@ def main():
     target_skus = {a['sku']: a for a in anchors[:50]}
 
     # 2. Map SKUs to their URLs
-    sku_to_url = {}
-    with open(mapping_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            sku = row['item_id'].lower()
-            if sku in target_skus:
-                sku_to_url[sku] = row['link']
+    with ProductMappingStore(mapping_path) as mapping:
+        sku_to_url = {
+            sku: row['link']
+            for sku, row in mapping.lookup(["link"], target_skus).items()
+        }
 
     # 3. Audit URLs for Status and Redirects
     print(f"--- STARTING URL INTEGRITY AUDIT (Top {len(sku_to_url)} SKUs) ---")
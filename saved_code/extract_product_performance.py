@@ -1,8 +1,11 @@
+import argparse
 import csv
 import sys
 from datetime import datetime, timedelta
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
+from performance_store import DEFAULT_RESTATEMENT_DAYS, PerformanceStore
+from quota_limiter import get_limited_service
 
 def get_customer_id():
     try:
@@ -15,70 +18,59 @@ def get_customer_id():
         print("Error: customer_id.txt not found.")
         sys.exit(1)
 
-def main(client, customer_id):
-    ga_service = client.get_service("GoogleAdsService")
 
-    # Last 30 days (excluding today)
-    end_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-    start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
+FIELDS = [
+    "campaign.id",
+    "campaign.name",
+    "campaign.advertising_channel_type",
+    "segments.product_item_id",
+    "segments.product_title",
+    "segments.product_brand",
+    "metrics.impressions",
+    "metrics.clicks",
+    "metrics.cost_micros",
+    "metrics.conversions",
+    "metrics.conversions_value",
+]
 
-    # No-Filter Query: Capturing EVERY product with an impression
-    query = f"""
-        SELECT
-          campaign.id,
-          campaign.name,
-          campaign.advertising_channel_type,
-          segments.product_item_id,
-          segments.product_title,
-          segments.product_brand,
-          metrics.impressions,
-          metrics.clicks,
-          metrics.cost_micros,
-          metrics.conversions,
-          metrics.conversions_value
-        FROM shopping_performance_view
-        WHERE segments.date BETWEEN '{start_date}' AND '{end_date}'
-        ORDER BY metrics.cost_micros DESC"""
+def main(client, customer_id, window_days=(30,), restatement_days=DEFAULT_RESTATEMENT_DAYS):
+    ga_service = get_limited_service(client, "GoogleAdsService")
 
-    output_path = "saved_csv/product_performance_last30.csv"
+    # Windows end yesterday (excluding today). Only days missing from the local
+    # partition store, or still inside the restatement window, are downloaded.
+    # No-Filter extract: capturing EVERY product with an impression
+    end_date = (datetime.now() - timedelta(days=1)).date()
+    start_date = end_date - timedelta(days=max(window_days) - 1)
+    store = PerformanceStore(customer_id, "shopping_performance_view", FIELDS)
 
     try:
-        stream = ga_service.search_stream(customer_id=customer_id, query=query)
-        
-        with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                "campaign.id", "campaign.name", "campaign.advertising_channel_type",
-                "segments.product_item_id", "segments.product_title", "segments.product_brand",
-                "metrics.impressions", "metrics.clicks", "metrics.cost_micros",
-                "metrics.conversions", "metrics.conversions_value"
-            ])
-
-            count = 0
-            for batch in stream:
-                for row in batch.results:
-                    writer.writerow([
-                        row.campaign.id,
-                        row.campaign.name,
-                        row.campaign.advertising_channel_type.name,
-                        row.segments.product_item_id,
-                        row.segments.product_title,
-                        row.segments.product_brand,
-                        row.metrics.impressions,
-                        row.metrics.clicks,
-                        row.metrics.cost_micros,
-                        row.metrics.conversions,
-                        row.metrics.conversions_value
-                    ])
-                    count += 1
-        
-        print(f"Successfully extracted {count:,} SKUs to {output_path}")
-
+        fetched = store.sync(ga_service, start_date, end_date, restatement_days)
+        print(f"Fetched {len(fetched)} of {max(window_days)} days from the API")
     except GoogleAdsException as ex:
         print(f"Request failed with status '{ex.error.code().name}'")
         sys.exit(1)
 
+    for days in window_days:
+        rows = store.rolling_window(end_date, days)
+        rows.sort(key=lambda r: r["metrics.cost_micros"], reverse=True)
+        output_path = f"saved_csv/product_performance_last{days}.csv"
+
+        with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+        print(f"Successfully extracted {len(rows):,} SKUs to {output_path}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract rolling-window product performance.")
+    parser.add_argument("--window-days", type=int, nargs="+", default=[30],
+                        help="Rolling windows to build, e.g. 7 14 30 90 (default: 30).")
+    parser.add_argument("--restatement-days", type=int, default=DEFAULT_RESTATEMENT_DAYS,
+                        help="Days after which a stored day is considered final "
+                             "and is no longer re-fetched for conversion lag.")
+    args = parser.parse_args()
+
     client = GoogleAdsClient.load_from_storage(version="v22")
     customer_id = get_customer_id()
-    main(client, customer_id)
+    main(client, customer_id, args.window_days, args.restatement_days)
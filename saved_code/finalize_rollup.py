@@ -1,6 +1,8 @@
 import csv
 from collections import defaultdict
 
+from product_mapping_store import ProductMappingStore
+
 def main():
     matrix_path = "saved_csv/parent_finish_matrix.csv"
     mapping_path = "saved_csv/merchant_center_product_mapping.csv"
@@ -8,9 +10,8 @@ def main():
 
     # Step 1: Map Parent IDs to BU and Product Type
     parent_to_meta = {}
-    with open(mapping_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+    with ProductMappingStore(mapping_path) as mapping:
+        for row in mapping.rows(["item_group_id", "custom_label_0", "product_type"]):
             p_id = row['item_group_id']
             if p_id not in parent_to_meta:
                 parent_to_meta[p_id] = {
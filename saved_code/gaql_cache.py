@@ -0,0 +1,407 @@
+"""On-disk cache for GoogleAdsService.search_stream results.
+
+The audit scripts in this folder re-issue the same structural queries every
+time they run. Wrapping the service with `get_cached_service` replays a
+previous response from disk while it is fresh, instead of spending API latency
+and quota on it again.
+
+Entries are keyed on the customer ID, the login (manager) customer ID the
+client sends, and a normalized form of the GAQL string, so whitespace, keyword case, SELECT field order and the order of
+AND-ed WHERE conditions do not produce separate entries. Each entry is a gzip
+file of length-prefixed serialized SearchGoogleAdsStreamResponse batches. An
+entry that does not read back cleanly (e.g. after a disk error) is deleted and
+treated as a miss.
+
+Cache misses go through the host-wide rate limiter in quota_limiter.py when
+it is enabled, so only requests that actually reach the API take tokens.
+
+Pass --no-cache on the command line (or set GAQL_CACHE_BYPASS=1) to skip
+cached entries. Fresh results are still written back, so a bypassed run also
+refreshes the cache.
+
+Usage:
+    python saved_code/gaql_cache.py --prune   # delete expired entries
+    python saved_code/gaql_cache.py --clear   # delete all entries
+"""
+
+import argparse
+import gzip
+import hashlib
+import importlib
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+from quota_limiter import get_limited_service
+
+DEFAULT_CACHE_DIR = "saved_csv/.gaql_cache"
+BYPASS_FLAG = "--no-cache"
+BYPASS_ENV_VAR = "GAQL_CACHE_BYPASS"
+
+# Account structure changes rarely; reporting views change with every sync.
+DEFAULT_TTL_SECONDS = 60 * 60
+METRICS_TTL_SECONDS = 60 * 60
+RESOURCE_TTL_SECONDS = {
+    "customer": 24 * 60 * 60,
+    "customer_client": 24 * 60 * 60,
+    "campaign": 6 * 60 * 60,
+    "ad_group": 6 * 60 * 60,
+    "ad_group_criterion": 6 * 60 * 60,
+    "campaign_criterion": 6 * 60 * 60,
+    "shared_set": 6 * 60 * 60,
+    "shared_criterion": 6 * 60 * 60,
+    "campaign_shared_set": 6 * 60 * 60,
+    "asset_group": 6 * 60 * 60,
+    "asset_group_listing_group_filter": 6 * 60 * 60,
+    "search_term_view": 30 * 60,
+    "shopping_performance_view": 30 * 60,
+}
+
+CACHE_EXTENSION = ".gz"
+
+_RECORD_HEADER = struct.Struct(">I")
+_TOKEN_PATTERN = re.compile(
+    r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|[(),]|[^\s(),'\"]+"
+)
+_CLAUSE_KEYWORDS = ("SELECT", "FROM", "WHERE", "ORDER", "LIMIT", "PARAMETERS")
+_KEYWORDS = set(_CLAUSE_KEYWORDS) | {
+    "AND",
+    "ALL",
+    "ANY",
+    "ASC",
+    "BETWEEN",
+    "BY",
+    "CONTAINS",
+    "DESC",
+    "DURING",
+    "FALSE",
+    "IN",
+    "IS",
+    "LIKE",
+    "NONE",
+    "NOT",
+    "NULL",
+    "REGEXP_MATCH",
+    "TRUE",
+}
+
+
+def _split_clauses(tokens):
+    """Groups query tokens by the top-level GAQL clause they belong to."""
+    clauses = {}
+    current = None
+    depth = 0
+    for token in tokens:
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        if depth == 0 and token in _CLAUSE_KEYWORDS:
+            current = token
+            clauses[current] = []
+        elif current == "ORDER" and token == "BY" and not clauses[current]:
+            continue
+        elif current is not None:
+            clauses[current].append(token)
+    return clauses
+
+
+def _split_on(tokens, separator):
+    """Splits tokens on a top-level separator, keeping BETWEEN x AND y intact."""
+    parts = [[]]
+    depth = 0
+    pending_between = False
+    for token in tokens:
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        if token == "BETWEEN":
+            pending_between = True
+        if depth == 0 and token == separator:
+            if separator == "AND" and pending_between:
+                pending_between = False
+            else:
+                parts.append([])
+                continue
+        parts[-1].append(token)
+    return [" ".join(part) for part in parts if part]
+
+
+def normalize_query(query):
+    """Returns a canonical form of a GAQL query for use as a cache key.
+
+    Whitespace is collapsed and keywords are upper-cased outside string
+    literals. SELECT fields and AND-ed WHERE conditions are sorted because
+    their order does not change the rows returned; ORDER BY, LIMIT and
+    PARAMETERS are kept as written.
+
+    Args:
+        query: the GAQL query string.
+
+    Returns:
+        The normalized query string.
+    """
+    tokens = [
+        token.upper() if token.upper() in _KEYWORDS else token
+        for token in _TOKEN_PATTERN.findall(query)
+    ]
+    clauses = _split_clauses(tokens)
+    if "SELECT" not in clauses or "FROM" not in clauses:
+        return " ".join(tokens)
+
+    parts = [
+        "SELECT " + ", ".join(sorted(set(_split_on(clauses["SELECT"], ",")))),
+        "FROM " + " ".join(clauses["FROM"]),
+    ]
+    if "WHERE" in clauses:
+        parts.append(
+            "WHERE " + " AND ".join(sorted(_split_on(clauses["WHERE"], "AND")))
+        )
+    if "ORDER" in clauses:
+        parts.append("ORDER BY " + " ".join(clauses["ORDER"]))
+    for clause in ("LIMIT", "PARAMETERS"):
+        if clause in clauses:
+            parts.append(clause + " " + " ".join(clauses[clause]))
+    return " ".join(parts)
+
+
+def _customer_id(customer_id):
+    return str(customer_id or "").replace("-", "")
+
+
+def cache_key(customer_id, query, version, login_customer_id=None):
+    """Returns the hex digest identifying a (customer, query, version) entry.
+
+    The login customer ID is part of the key because the manager a request is
+    made through can change what it returns (e.g. customer_client rows).
+    """
+    normalized = normalize_query(query)
+    payload = (
+        f"{version}\n{_customer_id(customer_id)}\n"
+        f"{_customer_id(login_customer_id)}\n{normalized}"
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ttl_for_query(query, overrides=None):
+    """Returns the time-to-live in seconds for the results of a query.
+
+    The TTL is looked up by the FROM resource. Queries that select metrics are
+    capped at METRICS_TTL_SECONDS, since those values change as data syncs.
+    """
+    ttls = dict(RESOURCE_TTL_SECONDS)
+    ttls.update(overrides or {})
+    match = re.search(r"\bFROM\s+(\w+)", query, re.IGNORECASE)
+    resource = match.group(1).lower() if match else None
+    ttl = ttls.get(resource, DEFAULT_TTL_SECONDS)
+    if re.search(r"\bmetrics\.", query):
+        ttl = min(ttl, METRICS_TTL_SECONDS)
+    return ttl
+
+
+def cache_bypass_requested(argv=None):
+    """Returns True if --no-cache was passed or GAQL_CACHE_BYPASS is set."""
+    argv = sys.argv[1:] if argv is None else argv
+    env_value = os.environ.get(BYPASS_ENV_VAR, "").strip().lower()
+    return BYPASS_FLAG in argv or env_value not in ("", "0", "false", "no")
+
+
+class CachedGoogleAdsService:
+    """Wraps a GoogleAdsService client and caches search_stream results.
+
+    Every other attribute is delegated to the wrapped service, so scripts can
+    use the wrapper wherever they used the service itself.
+    """
+
+    def __init__(
+        self,
+        service,
+        response_type,
+        version,
+        cache_dir=DEFAULT_CACHE_DIR,
+        ttl_overrides=None,
+        bypass=False,
+        login_customer_id=None,
+    ):
+        self._service = service
+        self._response_type = response_type
+        self._version = version
+        self._login_customer_id = login_customer_id
+        self.cache_dir = cache_dir
+        self.ttl_overrides = ttl_overrides or {}
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self._service, name)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_EXTENSION)
+
+    def search_stream(self, customer_id=None, query=None, **kwargs):
+        """Returns the cached batches for a query, or streams and caches them.
+
+        Requests with extra arguments (e.g. summary_row_setting) are passed
+        straight through, since they are not part of the cache key.
+        """
+        if kwargs:
+            return self._service.search_stream(
+                customer_id=customer_id, query=query, **kwargs
+            )
+
+        path = self._path(
+            cache_key(customer_id, query, self._version, self._login_customer_id)
+        )
+        if not self.bypass and self._is_fresh(
+            path, ttl_for_query(query, self.ttl_overrides)
+        ):
+            if self._is_intact(path):
+                self.hits += 1
+                return self._replay(path)
+            _remove(path)
+
+        self.misses += 1
+        stream = self._service.search_stream(customer_id=customer_id, query=query)
+        return self._record(stream, path)
+
+    def _is_fresh(self, path, ttl):
+        try:
+            return time.time() - os.path.getmtime(path) < ttl
+        except OSError:
+            return False
+
+    def _is_intact(self, path):
+        """Returns True if every record of an entry reads back in full.
+
+        Reading to the end also checks the gzip CRC, so a damaged entry is
+        found before any of its batches are handed to the caller.
+        """
+        try:
+            with gzip.open(path, "rb") as f:
+                while True:
+                    header = f.read(_RECORD_HEADER.size)
+                    if not header:
+                        return True
+                    if len(header) < _RECORD_HEADER.size:
+                        return False
+                    (length,) = _RECORD_HEADER.unpack(header)
+                    if len(f.read(length)) < length:
+                        return False
+        except (OSError, EOFError, zlib.error):
+            return False
+
+    def _replay(self, path):
+        with gzip.open(path, "rb") as f:
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if not header:
+                    return
+                (length,) = _RECORD_HEADER.unpack(header)
+                yield self._response_type.deserialize(f.read(length))
+
+    def _record(self, stream, path):
+        """Yields batches from the API while writing them to a temp file.
+
+        The entry only replaces the cache file once the stream completes, so
+        a failed or abandoned stream never leaves a truncated entry behind.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        completed = False
+        try:
+            with gzip.open(os.fdopen(fd, "wb"), "wb") as f:
+                for batch in stream:
+                    data = type(batch).serialize(batch)
+                    f.write(_RECORD_HEADER.pack(len(data)))
+                    f.write(data)
+                    yield batch
+            os.replace(tmp_path, path)
+            completed = True
+        finally:
+            if not completed:
+                _remove(tmp_path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_cached_service(
+    client, cache_dir=DEFAULT_CACHE_DIR, bypass=None, ttl_overrides=None, limiter=None
+):
+    """Returns a caching GoogleAdsService for the given client.
+
+    Args:
+        client: an initialized GoogleAdsClient instance.
+        cache_dir: the directory where cache entries are stored.
+        bypass: whether to skip cached entries. Defaults to checking the
+            command line and environment with cache_bypass_requested().
+        ttl_overrides: optional dict of FROM resource to TTL in seconds.
+        limiter: the rate limiter cache misses go through. Defaults to the
+            host-wide limiter from quota_limiter.default_limiter(), if it is
+            enabled.
+
+    Returns:
+        A CachedGoogleAdsService wrapping client.get_service("GoogleAdsService").
+    """
+    if bypass is None:
+        bypass = cache_bypass_requested()
+    version = client.version or "v22"
+    types_module = importlib.import_module(
+        f"google.ads.googleads.{version}.services.types.google_ads_service"
+    )
+    return CachedGoogleAdsService(
+        get_limited_service(client, "GoogleAdsService", limiter, version=version),
+        types_module.SearchGoogleAdsStreamResponse,
+        version,
+        cache_dir=cache_dir,
+        ttl_overrides=ttl_overrides,
+        bypass=bypass,
+        login_customer_id=client.login_customer_id,
+    )
+
+
+def prune_cache(cache_dir=DEFAULT_CACHE_DIR, max_age=None):
+    """Deletes cache entries older than max_age seconds (all entries if None).
+
+    TTLs depend on the query, which is not recoverable from the key, so
+    without max_age the longest configured TTL is used.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    if max_age is None:
+        max_age = max([DEFAULT_TTL_SECONDS, *RESOURCE_TTL_SECONDS.values()])
+    removed = 0
+    now = time.time()
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if (
+            name.endswith((CACHE_EXTENSION, ".tmp"))
+            and now - os.path.getmtime(path) >= max_age
+        ):
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Manage the on-disk GAQL result cache."
+    )
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--prune", action="store_true", help="Delete expired entries.")
+    group.add_argument("--clear", action="store_true", help="Delete all entries.")
+    args = parser.parse_args()
+
+    count = prune_cache(args.cache_dir, max_age=0 if args.clear else None)
+    print(f"Removed {count} cache entries from {args.cache_dir}")
@@ -18,10 +18,11 @@ import sys
 
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
+from quota_limiter import get_limited_service
 
 
 def main(client: GoogleAdsClient, customer_id: str) -> None:
-  ga_service = client.get_service("GoogleAdsService")
+  ga_service = get_limited_service(client, "GoogleAdsService")
 
   query = """
         SELECT
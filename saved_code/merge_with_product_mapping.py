@@ -32,14 +32,31 @@ One-time setup:
            --output /Users/bobby/Documents/GitHub/google-ads-api-developer-assistant/saved_csv/merchant_center_product_mapping.csv
 
     2. Use this script for every performance report going forward
+
+The performance CSV is streamed through the join (a hash join against the
+mapping index), so memory stays proportional to the mapping, not to the
+performance file. Rollups use a vectorized NumPy engine when numpy is
+installed (poetry install --extras rollup), and an equivalent pure-Python
+loop otherwise. Both engines produce the same rows.
 """
 
 import argparse
 import csv
 import sys
 from collections import defaultdict
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from product_mapping_store import ProductMappingStore, normalize_item_id
+
+try:
+    import numpy as np
+except ImportError:  # The pure-Python rollup is used instead.
+    np = None
+
+# Rows parsed into arrays at a time by the NumPy rollup.
+ROLLUP_CHUNK_SIZE = 20_000
 
 
 def load_csv(path: Path) -> List[Dict[str, str]]:
@@ -67,74 +84,150 @@ def write_csv(rows: List[Dict], path: Path, fieldnames: Optional[List[str]] = No
     print(f"✓ Wrote {len(rows):,} rows to {path}")
 
 
-def merge_performance_with_mapping(
-    performance_rows: List[Dict],
-    mapping_rows: List[Dict],
-    item_id_col: str = "segments.product_item_id",
-) -> List[Dict]:
-    """Join performance data with product mapping on item_id.
+def write_csv_stream(rows: Iterable[Dict], path: Path, fieldnames: List[str]) -> int:
+    """Write dicts to CSV as they are produced, without holding them in memory.
+
+    Columns missing from a row are left empty.
+
+    Returns:
+        The number of rows written
+    """
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
+        print(f"⚠️  No rows to write to {path}")
+        return 0
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    count = 1
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+        writer.writerow(first_row)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+
+    print(f"✓ Wrote {count:,} rows to {path}")
+    return count
+
+
+def build_mapping_index(
+    mapping_rows: Union[Iterable[Dict], ProductMappingStore],
+    item_ids: Optional[Iterable[str]] = None,
+) -> Dict[str, Dict]:
+    """Index product mapping rows by normalized item_id (the hash side of the join).
 
     Args:
-        performance_rows: Performance data from Google Ads API
-        mapping_rows: Product mapping from Merchant Center
-        item_id_col: Column name in performance data that contains item_id/offer_id
+        mapping_rows: Product mapping from Merchant Center, as CSV rows or an
+            indexed ProductMappingStore
+        item_ids: With a ProductMappingStore, only read these item_ids
 
     Returns:
-        Enriched performance rows with product metadata joined in
+        Dict of normalized item_id -> product metadata
     """
-    # Build mapping lookup (item_id -> product metadata)
+    if isinstance(mapping_rows, ProductMappingStore):
+        return mapping_rows.lookup(item_ids=item_ids)
+
     mapping_dict: Dict[str, Dict] = {}
     for row in mapping_rows:
         item_id = row.get("item_id")
         if item_id:
-            mapping_dict[item_id.lower()] = row
+            mapping_dict[normalize_item_id(item_id)] = row
+    return mapping_dict
 
-    print(f"  Loaded {len(mapping_dict):,} products from mapping")
 
-    # Join
-    enriched = []
-    matched = 0
-    unmatched = 0
+def new_merge_stats() -> Dict[str, int]:
+    return {"rows": 0, "matched": 0, "unmatched": 0}
+
+
+def stream_merge(
+    performance_rows: Iterable[Dict],
+    mapping_dict: Dict[str, Dict],
+    item_id_col: str = "segments.product_item_id",
+    stats: Optional[Dict[str, int]] = None,
+) -> Iterator[Dict]:
+    """Hash-join performance rows against the mapping index, one row at a time.
+
+    Only the mapping index is held in memory, so performance files of any
+    size can be streamed straight into a CSV writer or the rollup.
+
+    Args:
+        performance_rows: Performance data from Google Ads API (e.g. a csv.DictReader)
+        mapping_dict: Output of build_mapping_index
+        item_id_col: Column name in performance data that contains item_id/offer_id
+        stats: Dict from new_merge_stats(), updated with row/match counts
+
+    Yields:
+        Enriched performance rows with product metadata joined in
+    """
+    stats = new_merge_stats() if stats is None else stats
 
     for perf_row in performance_rows:
+        stats["rows"] += 1
         item_id = perf_row.get(item_id_col)
 
         if not item_id:
-            unmatched += 1
+            stats["unmatched"] += 1
             continue
 
-        product = mapping_dict.get(item_id.lower())
+        product = mapping_dict.get(normalize_item_id(item_id))
 
         if product:
             # Merge product metadata into performance row
-            enriched_row = {**perf_row, **product}
-            enriched.append(enriched_row)
-            matched += 1
+            stats["matched"] += 1
+            yield {**perf_row, **product}
         else:
             # No match found - keep performance row but mark it
-            enriched.append({**perf_row, "item_group_id": None})
-            unmatched += 1
+            stats["unmatched"] += 1
+            yield {**perf_row, "item_group_id": None}
 
-    print(f"  Matched: {matched:,} / {len(performance_rows):,} ({matched / len(performance_rows) * 100:.1f}%)")
-    if unmatched > 0:
-        print(f"  ⚠️  Unmatched: {unmatched:,} rows (item_id not found in mapping)")
 
-    return enriched
+def print_merge_stats(stats: Dict[str, int]) -> None:
+    matched = stats["matched"]
+    total = stats["rows"]
+    print(f"  Matched: {matched:,} / {total:,} ({matched / max(total, 1) * 100:.1f}%)")
+    if stats["unmatched"] > 0:
+        print(f"  ⚠️  Unmatched: {stats['unmatched']:,} rows (item_id not found in mapping)")
 
 
-def rollup_by_dimension(
-    enriched_rows: List[Dict], rollup_key: str, metrics: List[str]
+def merge_performance_with_mapping(
+    performance_rows: List[Dict],
+    mapping_rows: Union[List[Dict], ProductMappingStore],
+    item_id_col: str = "segments.product_item_id",
 ) -> List[Dict]:
-    """Roll up performance metrics by a dimension (e.g., item_group_id).
+    """Join performance data with product mapping on item_id.
+
+    Materializes the result; use stream_merge for large performance files.
 
     Args:
-        enriched_rows: Enriched performance rows
-        rollup_key: Column to group by (e.g., "item_group_id")
-        metrics: List of metric columns to sum (e.g., ["metrics.cost_micros", "metrics.clicks"])
+        performance_rows: Performance data from Google Ads API
+        mapping_rows: Product mapping from Merchant Center, as CSV rows or an
+            indexed ProductMappingStore
+        item_id_col: Column name in performance data that contains item_id/offer_id
 
     Returns:
-        Rolled-up rows with summed metrics
+        Enriched performance rows with product metadata joined in
     """
+    # Build mapping lookup (item_id -> product metadata). From a store, only
+    # the products that appear in the performance data are read.
+    mapping_dict = build_mapping_index(
+        mapping_rows, (row.get(item_id_col) for row in performance_rows)
+    )
+    print(f"  Loaded {len(mapping_dict):,} matching products from mapping")
+
+    stats = new_merge_stats()
+    enriched = list(stream_merge(performance_rows, mapping_dict, item_id_col, stats))
+    print_merge_stats(stats)
+
+    return enriched
+
+
+def _rollup_python(
+    enriched_rows: Iterable[Dict], rollup_key: str, metrics: List[str]
+) -> List[Dict]:
+    """Row-at-a-time rollup, used when NumPy is not installed."""
     # Group by rollup_key
     groups: Dict[str, Dict] = defaultdict(lambda: {rollup_key: None, **{m: 0 for m in metrics}})
 
@@ -196,6 +289,167 @@ def rollup_by_dimension(
     # Sort by conversions_value desc
     rollup_rows.sort(key=lambda r: r.get("metrics.conversions_value", 0) or 0, reverse=True)
 
+    return rollup_rows
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value or 0)
+    except (ValueError, TypeError):
+        return None  # Skip non-numeric values
+
+
+def _safe_divide(numerator, denominator):
+    """Element-wise numerator / denominator, 0 where denominator <= 0."""
+    return np.divide(
+        numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0
+    )
+
+
+def _to_column(values, defined) -> List:
+    """values as a list, with the int 0 _rollup_python writes where not defined."""
+    return [
+        value if is_defined else 0
+        for value, is_defined in zip(values.tolist(), defined.tolist())
+    ]
+
+
+def _rollup_numpy(
+    enriched_rows: Iterable[Dict], rollup_key: str, metrics: List[str]
+) -> List[Dict]:
+    """Columnar rollup: factorized group codes summed with np.bincount.
+
+    Rows are consumed in chunks of ROLLUP_CHUNK_SIZE, so a streamed join only
+    holds one chunk plus the per-group sums. Each metric column of a chunk is
+    parsed into a float64 array at once; only a column that fails to parse is
+    parsed value by value. Non-metric columns are taken from the first row of
+    each group. The output matches _rollup_python value for value, including
+    the int 0 it leaves for sums with no numeric value and for derived metrics
+    with a zero denominator.
+    """
+    codes_by_key: Dict[str, int] = {}
+    first_rows: List[Dict] = []
+    sums = {metric: np.zeros(0) for metric in metrics}
+    # Numeric values summed per group; a group with none keeps the int 0.
+    counts = {metric: np.zeros(0) for metric in metrics}
+    rows_iter = iter(enriched_rows)
+
+    while True:
+        chunk = list(islice(rows_iter, ROLLUP_CHUNK_SIZE))
+        if not chunk:
+            break
+
+        # Skip rows without the rollup key
+        rows = [
+            row
+            for row in chunk
+            if row.get(rollup_key) and row.get(rollup_key) != "None"
+        ]
+        if not rows:
+            continue
+
+        # Factorize the keys into group codes 0..n-1, in order of first appearance
+        known_groups = len(codes_by_key)
+        group_codes = np.array(
+            [codes_by_key.setdefault(row[rollup_key], len(codes_by_key)) for row in rows],
+            dtype=np.intp,
+        )
+        group_count = len(codes_by_key)
+        codes, first_indexes = np.unique(group_codes, return_index=True)
+        first_rows.extend(
+            rows[i] for i in first_indexes[codes >= known_groups].tolist()
+        )
+
+        for metric in metrics:
+            column = [row.get(metric) or 0 for row in rows]
+            try:
+                values = np.array(column, dtype=np.float64)
+                parsed = np.ones(len(column))
+            except (ValueError, TypeError):
+                floats = [_to_float(value) for value in column]
+                parsed = np.array([value is not None for value in floats], dtype=np.float64)
+                values = np.array([value or 0.0 for value in floats], dtype=np.float64)
+            chunk_sums = np.bincount(group_codes, weights=values, minlength=group_count)
+            chunk_sums[: len(sums[metric])] += sums[metric]
+            sums[metric] = chunk_sums
+            chunk_counts = np.bincount(group_codes, weights=parsed, minlength=group_count)
+            chunk_counts[: len(counts[metric])] += counts[metric]
+            counts[metric] = chunk_counts
+
+    group_count = len(first_rows)
+    if not group_count:
+        return []
+
+    # Calculate derived metrics
+    zeros = np.zeros(group_count)
+    cost = sums.get("metrics.cost_micros", zeros) / 1_000_000
+    conversions_value = sums.get("metrics.conversions_value", zeros)
+    clicks = sums.get("metrics.clicks", zeros)
+    impressions = sums.get("metrics.impressions", zeros)
+    derived = {
+        "ROAS": (_safe_divide(conversions_value, cost), cost > 0),
+        "avg_cpc": (_safe_divide(cost, clicks), clicks > 0),
+        "CTR": (_safe_divide(clicks, impressions) * 100, impressions > 0),
+        "conversion_rate": (
+            _safe_divide(sums.get("metrics.conversions", zeros), clicks) * 100,
+            clicks > 0,
+        ),
+    }
+
+    # Sort by conversions_value desc (stable, like list.sort)
+    order = np.argsort(-conversions_value, kind="stable").tolist()
+    metric_columns = {
+        metric: _to_column(total, counts[metric] > 0) for metric, total in sums.items()
+    }
+    derived_columns = {
+        name: _to_column(column, defined) for name, (column, defined) in derived.items()
+    }
+
+    rollup_rows = []
+    for i in order:
+        first_row = first_rows[i]
+        group = {rollup_key: first_row[rollup_key]}
+        for metric in metrics:
+            group[metric] = metric_columns[metric][i]
+        # Copy over non-metric dimensions (use first encountered value)
+        for col, val in first_row.items():
+            if col not in group:
+                group[col] = val
+        for name, column in derived_columns.items():
+            group[name] = column[i]
+        rollup_rows.append(group)
+
+    return rollup_rows
+
+
+def rollup_by_dimension(
+    enriched_rows: Iterable[Dict],
+    rollup_key: str,
+    metrics: List[str],
+    use_numpy: Optional[bool] = None,
+) -> List[Dict]:
+    """Roll up performance metrics by a dimension (e.g., item_group_id).
+
+    Args:
+        enriched_rows: Enriched performance rows (read once, so a generator works)
+        rollup_key: Column to group by (e.g., "item_group_id")
+        metrics: List of metric columns to sum (e.g., ["metrics.cost_micros", "metrics.clicks"])
+        use_numpy: Use the vectorized NumPy engine. Defaults to using it when
+            NumPy is installed.
+
+    Returns:
+        Rolled-up rows with summed metrics, sorted by conversions_value desc
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy and np is None:
+        raise ImportError(
+            "The NumPy rollup engine requires numpy: poetry install --extras rollup"
+        )
+
+    rollup = _rollup_numpy if use_numpy else _rollup_python
+    rollup_rows = rollup(enriched_rows, rollup_key, metrics)
+
     print(f"  Rolled up to {len(rollup_rows):,} unique {rollup_key} values")
 
     return rollup_rows
@@ -304,30 +558,37 @@ Examples:
         print("Merging performance data with product mapping")
         print("=" * 80)
 
-        # Load data
-        print(f"Loading performance data: {args.performance}")
-        performance_rows = load_csv(args.performance)
-        print(f"  Loaded {len(performance_rows):,} performance rows")
-
+        # Load the mapping index (the only thing held in memory)
         print(f"Loading product mapping: {args.mapping}")
-        mapping_rows = load_csv(args.mapping)
-
-        # Merge
-        print("Merging...")
-        enriched = merge_performance_with_mapping(
-            performance_rows, mapping_rows, args.item_id_col
-        )
-
-        # Rollup (optional)
-        if args.rollup_by:
-            print(f"Rolling up by {args.rollup_by}...")
-            output_rows = rollup_by_dimension(enriched, args.rollup_by, args.metrics)
-        else:
-            output_rows = enriched
-
-        # Write output
-        print(f"Writing output: {args.output}")
-        write_csv(output_rows, args.output)
+        with ProductMappingStore(args.mapping) as mapping:
+            if mapping.rebuilt:
+                print(f"  Indexed mapping into {mapping.store_path}")
+            mapping_dict = build_mapping_index(mapping)
+            mapping_columns = mapping.columns
+        print(f"  Loaded {len(mapping_dict):,} products from mapping")
+
+        # Stream performance rows through the join
+        print(f"Merging performance data: {args.performance}")
+        stats = new_merge_stats()
+        with open(args.performance, "r", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            enriched = stream_merge(reader, mapping_dict, args.item_id_col, stats)
+
+            if args.rollup_by:
+                # Rollup (optional)
+                print(f"Rolling up by {args.rollup_by}...")
+                output_rows = rollup_by_dimension(enriched, args.rollup_by, args.metrics)
+                print(f"Writing output: {args.output}")
+                write_csv(output_rows, args.output)
+                output_count = len(output_rows)
+            else:
+                print(f"Writing output: {args.output}")
+                # Performance columns, then mapping columns, as {**perf_row, **product}
+                fieldnames = list(
+                    dict.fromkeys([*(reader.fieldnames or []), *mapping_columns, "item_group_id"])
+                )
+                output_count = write_csv_stream(enriched, args.output, fieldnames)
+        print_merge_stats(stats)
 
         print()
         print("=" * 80)
@@ -335,10 +596,10 @@ Examples:
         print("=" * 80)
 
         if args.rollup_by:
-            print(f"Parent-product rollup complete: {len(output_rows):,} unique {args.rollup_by} values")
+            print(f"Parent-product rollup complete: {output_count:,} unique {args.rollup_by} values")
             print("Sort by 'metrics.conversions_value' desc to see top revenue drivers")
         else:
-            print(f"SKU-level enrichment complete: {len(output_rows):,} rows")
+            print(f"SKU-level enrichment complete: {output_count:,} rows")
             print("You can now filter/pivot by item_group_id, product_type, brand, etc.")
 
         print()
@@ -0,0 +1,233 @@
+"""Date-partitioned local store for daily performance extracts.
+
+Each (customer, resource, day) is stored as its own CSV partition under
+saved_csv/partitions/<customer_id>/<resource>/<YYYY-MM-DD>.csv. A sync only
+fetches the days that are missing, plus days still inside the restatement
+window (conversions keep being attributed to a day for a while after it
+ends). Any rolling window is then rebuilt locally by summing the partitions.
+
+Partitions are written to a temp file and moved into place, so an interrupted
+sync never leaves a half-written day behind. The fetch time of each partition
+is kept in _index.json next to the partitions.
+"""
+
+import csv
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+DEFAULT_STORE_DIR = "saved_csv/partitions"
+DEFAULT_RESTATEMENT_DAYS = 3
+DATE_FIELD = "segments.date"
+INDEX_FILE = "_index.json"
+
+
+def get_field_value(row, field):
+    """Returns a CSV-friendly value for a dotted GAQL field on a GoogleAdsRow."""
+    value = row
+    for part in field.split("."):
+        value = getattr(value, part if hasattr(value, part) else part + "_")
+    return value.name if hasattr(value, "name") and hasattr(value, "value") else value
+
+
+def _is_id_field(field):
+    name = field.rsplit(".", 1)[-1]
+    return name == "id" or name.endswith("_id")
+
+
+def _parse_number(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def date_range(start, end):
+    """Returns every date from start to end, inclusive."""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def contiguous_runs(days):
+    """Groups sorted dates into (first, last) runs of consecutive days."""
+    runs = []
+    for day in sorted(days):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+class PerformanceStore:
+    """Stores one resource's daily rows for one customer as day partitions.
+
+    Args:
+        customer_id: the customer the rows belong to.
+        resource: the FROM resource, e.g. "shopping_performance_view".
+        fields: the SELECT fields, excluding segments.date.
+        root: the directory holding all partitions.
+        where: optional extra WHERE condition applied to every fetch.
+        key_fields: the fields rolling_window groups rows by. Defaults to the
+            ID fields (campaign.id, segments.product_item_id, ...), or to every
+            non-metric field if there are none.
+    """
+
+    def __init__(
+        self,
+        customer_id,
+        resource,
+        fields,
+        root=DEFAULT_STORE_DIR,
+        where=None,
+        key_fields=None,
+    ):
+        self.customer_id = str(customer_id).replace("-", "")
+        self.resource = resource
+        self.fields = [f for f in fields if f != DATE_FIELD]
+        self.where = where
+        if key_fields is None:
+            dimensions = [f for f in self.fields if not f.startswith("metrics.")]
+            key_fields = [f for f in dimensions if _is_id_field(f)] or dimensions
+        self.key_fields = list(key_fields)
+        self.path = os.path.join(root, self.customer_id, resource)
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.path, INDEX_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        self._atomic_write(
+            os.path.join(self.path, INDEX_FILE),
+            lambda f: json.dump(self.index, f, indent=2, sort_keys=True),
+        )
+
+    def _atomic_write(self, path, write):
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def partition_path(self, day):
+        return os.path.join(self.path, f"{day.isoformat()}.csv")
+
+    def days_to_fetch(
+        self, start, end, restatement_days=DEFAULT_RESTATEMENT_DAYS, today=None
+    ):
+        """Returns the days in [start, end] that need to be (re)fetched.
+
+        A day is fetched if it has no partition, or if it was last fetched
+        before it settled (less than restatement_days after the day itself)
+        and not already today.
+        """
+        today = today or date.today()
+        days = []
+        for day in date_range(start, end):
+            fetched = self.index.get(day.isoformat())
+            if fetched is None or not os.path.exists(self.partition_path(day)):
+                days.append(day)
+                continue
+            fetched_on = datetime.fromisoformat(fetched).date()
+            settled = fetched_on >= day + timedelta(days=restatement_days)
+            if not settled and fetched_on < today:
+                days.append(day)
+        return days
+
+    def build_query(self, first, last):
+        conditions = [
+            f"{DATE_FIELD} BETWEEN '{first.isoformat()}' AND '{last.isoformat()}'"
+        ]
+        if self.where:
+            conditions.append(self.where)
+        return (
+            f"SELECT {', '.join(self.fields + [DATE_FIELD])} "
+            f"FROM {self.resource} WHERE {' AND '.join(conditions)}"
+        )
+
+    def sync(
+        self,
+        ga_service,
+        start,
+        end,
+        restatement_days=DEFAULT_RESTATEMENT_DAYS,
+        today=None,
+    ):
+        """Fetches missing and unsettled days and writes them as partitions.
+
+        Consecutive days are fetched with a single query and split by date.
+        Days that return no rows still get an empty partition, so they are
+        not fetched again.
+
+        Returns:
+            The list of days that were fetched.
+        """
+        days = self.days_to_fetch(start, end, restatement_days, today)
+        for first, last in contiguous_runs(days):
+            rows_by_day = {day.isoformat(): [] for day in date_range(first, last)}
+            stream = ga_service.search_stream(
+                customer_id=self.customer_id, query=self.build_query(first, last)
+            )
+            for batch in stream:
+                for row in batch.results:
+                    rows_by_day[row.segments.date].append(
+                        [get_field_value(row, field) for field in self.fields]
+                    )
+
+            fetched_at = datetime.now().isoformat(timespec="seconds")
+            for day, rows in rows_by_day.items():
+                self._write_partition(day, rows)
+                self.index[day] = fetched_at
+            self._save_index()
+        return days
+
+    def _write_partition(self, day, rows):
+        def write(f):
+            writer = csv.writer(f)
+            writer.writerow(self.fields)
+            writer.writerows(rows)
+
+        self._atomic_write(os.path.join(self.path, f"{day}.csv"), write)
+
+    def read_days(self, start, end):
+        """Yields the stored rows for [start, end] as dicts."""
+        for day in date_range(start, end):
+            path = self.partition_path(day)
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"Missing partition for {day} in {self.path}; run sync first."
+                )
+            with open(path, newline="", encoding="utf-8") as f:
+                yield from csv.DictReader(f)
+
+    def rolling_window(self, end, days):
+        """Sums the stored rows over the `days` days ending on `end`.
+
+        Rows are grouped by the key fields and metrics.* fields are summed.
+        Other fields, such as campaign.name or segments.product_title, can
+        change during the window; they take their value from the latest day,
+        so a rename does not split a campaign or product into two rows.
+        Returns a list of dicts keyed by field name.
+        """
+        metric_fields = [f for f in self.fields if f.startswith("metrics.")]
+        dimension_fields = [f for f in self.fields if f not in metric_fields]
+        totals = {}
+        # Days are read oldest first, so the last value written is the latest.
+        for row in self.read_days(end - timedelta(days=days - 1), end):
+            key = tuple(row[f] for f in self.key_fields)
+            total = totals.get(key)
+            if total is None:
+                total = totals[key] = dict.fromkeys(self.fields, 0)
+            for field in dimension_fields:
+                total[field] = row[field]
+            for field in metric_fields:
+                total[field] += _parse_number(row[field])
+        return list(totals.values())
@@ -0,0 +1,365 @@
+"""Indexed local store for the Merchant Center product mapping CSV.
+
+Every analysis in this folder joins performance rows to
+saved_csv/merchant_center_product_mapping.csv on the lower-cased item_id.
+Parsing that 85k-row CSV and rebuilding an item_id dict took most of each
+run, so the CSV is imported once into a SQLite file next to it, with an index
+on the normalized item_id. Opening the store and looking items up is then a
+matter of milliseconds.
+
+The store remembers the SHA-256 of the CSV it was built from. When the CSV
+changes (a new Merchant Center export), the store is rebuilt automatically the
+next time it is opened. The CSV is only re-hashed when its size or mtime
+changed. Rebuilds write a temp file and move it into place, so a script that
+is reading the old store is not affected.
+
+Usage:
+    python saved_code/product_mapping_store.py             # build if stale, show status
+    python saved_code/product_mapping_store.py --rebuild   # force a rebuild
+    python saved_code/product_mapping_store.py --get SKU123
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+DEFAULT_MAPPING_PATH = "saved_csv/merchant_center_product_mapping.csv"
+ITEM_ID_COLUMN = "item_id"
+# 2: duplicate item_ids keep the position of their first row.
+STORE_FORMAT_VERSION = 2
+_HASH_CHUNK_SIZE = 1024 * 1024
+# Keys per IN (...) lookup; SQLite allows 999 parameters per statement.
+_LOOKUP_CHUNK_SIZE = 900
+# Seconds to wait for readers before skipping the size/mtime refresh.
+_META_UPDATE_TIMEOUT = 1.0
+
+
+def normalize_item_id(item_id):
+    """Returns the join key of an item_id / offer_id: lower-cased."""
+    return item_id.lower()
+
+
+def default_store_path(csv_path):
+    """Returns the store file for a mapping CSV: a hidden file next to it."""
+    directory, filename = os.path.split(csv_path)
+    return os.path.join(directory, "." + os.path.splitext(filename)[0] + ".sqlite3")
+
+
+def file_sha256(path):
+    """Returns the hex SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _read_meta(path):
+    """Returns the metadata of an existing store, or {} if it is unusable."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return dict(connection.execute("SELECT key, value FROM meta"))
+        finally:
+            connection.close()
+    except sqlite3.DatabaseError:
+        return {}
+
+
+def build_store(csv_path, store_path, source_hash=None):
+    """Imports a mapping CSV into a new store file.
+
+    Rows without an item_id are skipped. If an item_id appears more than once,
+    the last row wins but keeps the position of the first, as with the dicts
+    the scripts used to build, so rows() follows the CSV order.
+
+    Returns:
+        The number of products imported.
+    """
+    source_hash = source_hash or file_sha256(csv_path)
+    stat = os.stat(csv_path)
+    directory = os.path.dirname(store_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(tmp_path)
+        try:
+            with open(csv_path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                columns = next(reader, [])
+                if ITEM_ID_COLUMN not in columns:
+                    raise ValueError(f"{csv_path} has no {ITEM_ID_COLUMN} column.")
+                item_index = columns.index(ITEM_ID_COLUMN)
+                width = len(columns)
+                connection.execute(
+                    "CREATE TABLE products (item_key TEXT NOT NULL, "
+                    + ", ".join(f"{_quote(c)} TEXT" for c in columns)
+                    + ")"
+                )
+                connection.execute(
+                    "CREATE UNIQUE INDEX products_item_key ON products (item_key)"
+                )
+                # An upsert updates the row in place and keeps its rowid;
+                # INSERT OR REPLACE would move a duplicate to the end.
+                insert = (
+                    f"INSERT INTO products VALUES ({', '.join('?' * (width + 1))}) "
+                    "ON CONFLICT (item_key) DO UPDATE SET "
+                    + ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in columns)
+                )
+                connection.executemany(
+                    insert,
+                    (
+                        [normalize_item_id(row[item_index])]
+                        + (row + [""] * width)[:width]
+                        for row in reader
+                        if len(row) > item_index and row[item_index]
+                    ),
+                )
+            count = connection.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [
+                    ("format_version", str(STORE_FORMAT_VERSION)),
+                    ("source_sha256", source_hash),
+                    ("source_size", str(stat.st_size)),
+                    ("source_mtime_ns", str(stat.st_mtime_ns)),
+                    ("columns", json.dumps(columns)),
+                    ("row_count", str(count)),
+                    ("built_at", time.strftime("%Y-%m-%dT%H:%M:%S")),
+                ],
+            )
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp_path, store_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return count
+
+
+def _record_source_stat(store_path, source_hash, stat):
+    """Records the CSV's new size and mtime in an up-to-date store.
+
+    Pipeline stages may open the store in parallel, so the update runs in one
+    write transaction that first checks the store still matches source_hash
+    (another process may have replaced it). If readers hold the store for
+    longer than _META_UPDATE_TIMEOUT, the update is skipped: it only saves
+    re-hashing the CSV next time.
+    """
+    connection = sqlite3.connect(
+        store_path, timeout=_META_UPDATE_TIMEOUT, isolation_level=None
+    )
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            current = connection.execute(
+                "SELECT value FROM meta WHERE key = 'source_sha256'"
+            ).fetchone()
+            if current == (source_hash,):
+                connection.executemany(
+                    "UPDATE meta SET value = ? WHERE key = ?",
+                    [
+                        (str(stat.st_size), "source_size"),
+                        (str(stat.st_mtime_ns), "source_mtime_ns"),
+                    ],
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    except sqlite3.OperationalError:
+        pass  # Busy: the store is still valid, only the shortcut is stale.
+    finally:
+        connection.close()
+
+
+def ensure_store(csv_path=DEFAULT_MAPPING_PATH, store_path=None, rebuild=False):
+    """Builds the store for a mapping CSV if it is missing or stale.
+
+    Returns:
+        (store_path, rebuilt)
+
+    Raises:
+        FileNotFoundError: if the CSV does not exist.
+    """
+    store_path = store_path or default_store_path(csv_path)
+    stat = os.stat(csv_path)
+    meta = _read_meta(store_path)
+    if not rebuild and meta.get("format_version") == str(STORE_FORMAT_VERSION):
+        if meta.get("source_size") == str(stat.st_size) and meta.get(
+            "source_mtime_ns"
+        ) == str(stat.st_mtime_ns):
+            return store_path, False
+        source_hash = file_sha256(csv_path)
+        if meta.get("source_sha256") == source_hash:
+            # Touched but unchanged: only record the new size and mtime.
+            _record_source_stat(store_path, source_hash, stat)
+            return store_path, False
+    else:
+        source_hash = None
+    build_store(csv_path, store_path, source_hash)
+    return store_path, True
+
+
+class ProductMappingStore:
+    """Read-only lookups of the product mapping by normalized item_id.
+
+    The store is (re)built from the CSV first if needed.
+
+    Args:
+        csv_path: the Merchant Center product mapping CSV.
+        store_path: the store file. Defaults to a hidden file next to the CSV.
+        rebuild: rebuild the store even if it is up to date.
+    """
+
+    def __init__(self, csv_path=DEFAULT_MAPPING_PATH, store_path=None, rebuild=False):
+        self.csv_path = str(csv_path)
+        self.store_path, self.rebuilt = ensure_store(
+            self.csv_path, store_path and str(store_path), rebuild
+        )
+        self._connection = sqlite3.connect(
+            f"file:{self.store_path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self.meta = dict(self._connection.execute("SELECT key, value FROM meta"))
+        self.columns = json.loads(self.meta["columns"])
+        self._statements = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def __len__(self):
+        return int(self.meta["row_count"])
+
+    def __contains__(self, item_id):
+        return (
+            self._connection.execute(
+                "SELECT 1 FROM products WHERE item_key = ?",
+                (normalize_item_id(item_id),),
+            ).fetchone()
+            is not None
+        )
+
+    def _select(self, columns):
+        columns = tuple(columns or self.columns)
+        statement = self._statements.get(columns)
+        if statement is None:
+            unknown = set(columns) - set(self.columns)
+            if unknown:
+                raise KeyError(
+                    f"Unknown mapping column(s): {', '.join(sorted(unknown))}"
+                )
+            statement = (
+                "SELECT " + ", ".join(_quote(c) for c in columns) + " FROM products"
+            )
+            self._statements[columns] = statement
+        return columns, statement
+
+    def get(self, item_id, columns=None):
+        """Returns the mapping row of an item_id as a dict, or None.
+
+        Args:
+            item_id: the item_id / offer_id, in any case.
+            columns: the columns to return. Defaults to every column.
+        """
+        columns, statement = self._select(columns)
+        row = self._connection.execute(
+            statement + " WHERE item_key = ?", (normalize_item_id(item_id),)
+        ).fetchone()
+        return dict(zip(columns, row)) if row else None
+
+    def rows(self, columns=None):
+        """Yields every mapping row as a dict."""
+        columns, statement = self._select(columns)
+        for row in self._connection.execute(statement + " ORDER BY rowid"):
+            yield dict(zip(columns, row))
+
+    def lookup(self, columns=None, item_ids=None):
+        """Returns {normalized item_id: row dict} for the given columns.
+
+        For scripts that join many performance rows: one bulk read, after
+        which each lookup is a dict access. Only the requested columns are
+        read, so this is much cheaper than parsing the whole CSV.
+
+        Args:
+            columns: the columns to return. Defaults to every column.
+            item_ids: only look these item_ids up, e.g. the SKUs of a
+                performance file, instead of reading every product.
+        """
+        columns, statement = self._select(columns)
+        statement = statement.replace("SELECT ", "SELECT item_key, ", 1)
+        if item_ids is None:
+            batches = [self._connection.execute(statement)]
+        else:
+            keys = list(dict.fromkeys(normalize_item_id(i) for i in item_ids if i))
+            batches = (
+                self._connection.execute(
+                    f"{statement} WHERE item_key IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                for chunk in (
+                    keys[i : i + _LOOKUP_CHUNK_SIZE]
+                    for i in range(0, len(keys), _LOOKUP_CHUNK_SIZE)
+                )
+            )
+        return {
+            row[0]: dict(zip(columns, row[1:])) for batch in batches for row in batch
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build or inspect the product mapping store."
+    )
+    parser.add_argument(
+        "--mapping", default=DEFAULT_MAPPING_PATH, help="The mapping CSV."
+    )
+    parser.add_argument(
+        "--store", help="The store file. Defaults to a hidden file next to the CSV."
+    )
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Rebuild even if up to date."
+    )
+    parser.add_argument(
+        "--get", metavar="ITEM_ID", help="Print the mapping row of an item_id."
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with ProductMappingStore(args.mapping, args.store, args.rebuild) as store:
+        elapsed = time.perf_counter() - started
+        if args.get:
+            row = store.get(args.get)
+            print(
+                json.dumps(row, indent=2)
+                if row
+                else f"{args.get} is not in the mapping."
+            )
+        else:
+            action = "Rebuilt" if store.rebuilt else "Opened"
+            print(f"{action} {store.store_path} in {elapsed * 1000:.0f} ms")
+            print(f"  Products: {len(store):,}")
+            print(f"  Columns: {', '.join(store.columns)}")
+            print(
+                f"  Source: {store.csv_path} (sha256 {store.meta['source_sha256'][:12]}...)"
+            )
+            print(f"  Built at: {store.meta['built_at']}")
@@ -0,0 +1,313 @@
+"""Token-bucket rate limiter shared by every script process on this host.
+
+Several audits and reports often run at the same time from cron, and each of
+them used to call the API with no knowledge of the others, so together they
+would trip the developer token's rate limits and all fail with quota errors.
+Wrapping a service with `get_limited_service` makes each request first take
+tokens from buckets that are shared by all processes, waiting when they are
+empty instead of sending the request.
+
+There are two buckets:
+  - "qps": requests per second, refilled continuously, with a small burst.
+  - "daily": operations per day. Every search / search_stream request is one
+    operation, a mutate is one operation per item it changes. The bucket is
+    refilled in full at local midnight rather than continuously, so no more
+    than the daily allowance is spent on any one calendar day.
+
+The bucket state lives in a small JSON file guarded by an exclusive file
+lock (fcntl on POSIX hosts, msvcrt on Windows). Processes may be configured
+with different rates; each refills the shared QPS tokens at its own rate.
+
+The limiter is off unless GOOGLE_ADS_RATE_LIMIT is set to 1 (or true / yes);
+until then get_limited_service returns the plain service. Rates default to
+the values below, which match the Basic access level, and can be changed per
+process with the GOOGLE_ADS_QPS and GOOGLE_ADS_DAILY_OPERATIONS environment
+variables. With Standard access, raise GOOGLE_ADS_DAILY_OPERATIONS before
+turning the limiter on.
+
+Usage:
+    python saved_code/quota_limiter.py --status   # show the shared buckets
+    python saved_code/quota_limiter.py --reset    # refill both buckets
+"""
+
+import argparse
+import datetime
+import json
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_STATE_PATH = os.path.join(tempfile.gettempdir(), "google_ads_rate_limit.json")
+DEFAULT_QPS = 10
+DEFAULT_DAILY_OPERATIONS = 15000  # Basic access level.
+DEFAULT_MAX_WAIT_SECONDS = 15 * 60
+
+STATE_ENV_VAR = "GOOGLE_ADS_RATE_LIMIT_STATE"
+QPS_ENV_VAR = "GOOGLE_ADS_QPS"
+DAILY_ENV_VAR = "GOOGLE_ADS_DAILY_OPERATIONS"
+ENABLED_ENV_VAR = "GOOGLE_ADS_RATE_LIMIT"
+
+LIMITED_METHODS = ("search", "search_stream")
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when tokens will not be available within the allowed wait."""
+
+
+def _lock(f, exclusive=True):
+    """Locks an open file; msvcrt has no shared locks, so they are exclusive."""
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:  # LK_LOCK gives up after about 10 seconds.
+            continue
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _day(now):
+    return datetime.date.fromtimestamp(now).isoformat()
+
+
+def _seconds_until_midnight(now):
+    tomorrow = datetime.date.fromtimestamp(now) + datetime.timedelta(days=1)
+    midnight = datetime.datetime.combine(tomorrow, datetime.time())
+    return max(0.0, midnight.timestamp() - now)
+
+
+class SharedRateLimiter:
+    """Takes tokens from the host-wide QPS and daily operation buckets.
+
+    Args:
+        state_path: the JSON file holding the shared bucket state.
+        qps: requests per second allowed across all processes.
+        daily_operations: operations per day allowed across all processes.
+        burst: the number of requests that may be sent at once after an idle
+            period. Defaults to qps.
+        max_wait: the longest acquire() waits before raising
+            QuotaExhaustedError, in seconds.
+    """
+
+    def __init__(
+        self,
+        state_path=DEFAULT_STATE_PATH,
+        qps=DEFAULT_QPS,
+        daily_operations=DEFAULT_DAILY_OPERATIONS,
+        burst=None,
+        max_wait=DEFAULT_MAX_WAIT_SECONDS,
+    ):
+        self.state_path = state_path
+        self.max_wait = max_wait
+        # bucket name -> capacity
+        self.buckets = {"qps": burst or qps, "daily": daily_operations}
+        self.qps = qps
+        self.waited_seconds = 0.0
+
+    def _locked_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        return open(self.state_path + ".lock", "w")
+
+    def _read_state(self, now):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        capacity = self.buckets["qps"]
+        bucket = state.get("qps") or {"tokens": capacity, "updated": now}
+        elapsed = max(0.0, now - bucket["updated"])
+        bucket["tokens"] = min(capacity, bucket["tokens"] + elapsed * self.qps)
+        bucket["updated"] = now
+        state["qps"] = bucket
+        today = _day(now)
+        daily = state.get("daily")
+        if not daily or daily.get("day") != today:
+            daily = {"tokens": self.buckets["daily"], "day": today}
+        state["daily"] = daily
+        return state
+
+    def _write_state(self, state):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def try_acquire(self, operations=1):
+        """Takes tokens for one request if they are available right now.
+
+        Args:
+            operations: the number of daily operations the request uses.
+
+        Returns:
+            0 if the tokens were taken, otherwise the number of seconds until
+            they will be available.
+        """
+        with self._locked_state() as lock:
+            _lock(lock)
+            try:
+                now = time.time()
+                state = self._read_state(now)
+                wait = max(0.0, (1 - state["qps"]["tokens"]) / self.qps)
+                if operations > state["daily"]["tokens"]:
+                    wait = max(wait, _seconds_until_midnight(now))
+                if wait == 0:
+                    state["qps"]["tokens"] -= 1
+                    state["daily"]["tokens"] -= operations
+                self._write_state(state)
+                return wait
+            finally:
+                _unlock(lock)
+
+    def acquire(self, operations=1):
+        """Waits until tokens for one request are available and takes them.
+
+        Args:
+            operations: the number of daily operations the request uses.
+
+        Returns:
+            The number of seconds spent waiting.
+
+        Raises:
+            QuotaExhaustedError: if the tokens will not be available within
+                max_wait seconds, e.g. because the daily bucket is empty.
+        """
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(operations)
+            if wait == 0:
+                waited = time.monotonic() - started
+                self.waited_seconds += waited
+                return waited
+            if time.monotonic() - started + wait > self.max_wait:
+                raise QuotaExhaustedError(
+                    f"Rate limit tokens for {operations} operation(s) are not "
+                    f"available for another {wait:.0f}s (state: {self.state_path})."
+                )
+            time.sleep(wait)
+
+    def status(self):
+        """Returns {bucket: (tokens available, capacity)} without taking any."""
+        with self._locked_state() as lock:
+            _lock(lock, exclusive=False)
+            try:
+                state = self._read_state(time.time())
+            finally:
+                _unlock(lock)
+        return {
+            name: (state[name]["tokens"], capacity)
+            for name, capacity in self.buckets.items()
+        }
+
+    def reset(self):
+        """Refills both buckets for every process."""
+        with self._locked_state() as lock:
+            _lock(lock)
+            try:
+                self._write_state({})
+            finally:
+                _unlock(lock)
+
+
+def _count_operations(args, kwargs):
+    """Returns the number of operations in a mutate call's request."""
+    operations = kwargs.get("operations", kwargs.get("mutate_operations"))
+    if operations is None:
+        request = kwargs.get("request", args[0] if args else None)
+        operations = getattr(request, "operations", None) or getattr(
+            request, "mutate_operations", None
+        )
+    return max(1, len(operations or []))
+
+
+class RateLimitedService:
+    """Wraps an API service so every request first acquires limiter tokens.
+
+    search, search_stream and mutate* calls are limited; every other
+    attribute is delegated to the wrapped service.
+    """
+
+    def __init__(self, service, limiter):
+        self._service = service
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        attribute = getattr(self._service, name)
+        if not callable(attribute) or not (
+            name in LIMITED_METHODS or name.startswith("mutate")
+        ):
+            return attribute
+
+        def limited(*args, **kwargs):
+            operations = (
+                _count_operations(args, kwargs) if name.startswith("mutate") else 1
+            )
+            self.limiter.acquire(operations)
+            return attribute(*args, **kwargs)
+
+        return limited
+
+
+def configured_limiter():
+    """Returns the host-wide limiter with the rates set in the environment."""
+    return SharedRateLimiter(
+        state_path=os.environ.get(STATE_ENV_VAR, DEFAULT_STATE_PATH),
+        qps=float(os.environ.get(QPS_ENV_VAR, DEFAULT_QPS)),
+        daily_operations=float(os.environ.get(DAILY_ENV_VAR, DEFAULT_DAILY_OPERATIONS)),
+    )
+
+
+def default_limiter():
+    """Returns the host-wide limiter if it is enabled, otherwise None.
+
+    It is enabled by setting GOOGLE_ADS_RATE_LIMIT to 1, true or yes.
+    """
+    if os.environ.get(ENABLED_ENV_VAR, "").strip().lower() not in ("1", "true", "yes"):
+        return None
+    return configured_limiter()
+
+
+def get_limited_service(client, name, limiter=None, **kwargs):
+    """Returns client.get_service(name) limited by the shared rate limiter.
+
+    Args:
+        client: an initialized GoogleAdsClient instance.
+        name: the service name, e.g. "GoogleAdsService".
+        limiter: the limiter to use. Defaults to default_limiter().
+        **kwargs: passed on to client.get_service.
+
+    Returns:
+        A RateLimitedService, or the plain service if limiting is disabled.
+    """
+    service = client.get_service(name, **kwargs)
+    limiter = limiter or default_limiter()
+    return RateLimitedService(service, limiter) if limiter else service
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the shared API rate limiter.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--status", action="store_true", help="Show the shared buckets.")
+    group.add_argument("--reset", action="store_true", help="Refill both buckets.")
+    args = parser.parse_args()
+
+    limiter = configured_limiter()
+    if args.reset:
+        limiter.reset()
+    for bucket, (tokens, capacity) in limiter.status().items():
+        print(f"{bucket}: {tokens:,.1f} of {capacity:,.0f} tokens available")
+    print(f"State file: {limiter.state_path}")
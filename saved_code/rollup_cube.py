@@ -0,0 +1,387 @@
+"""Multi-dimensional rollup cube for the three-layer playbook.
+
+analyze_attributes (finish), analyze_parent_finish (parent x finish),
+finalize_rollup (business unit, product type) and analyze_collections each
+re-read the performance and mapping CSVs to answer one grouping. This script
+scans the performance CSV once, joins it to the product mapping store, and
+aggregates it into every grouping set the playbook uses, with their
+subtotals. The cells are saved to saved_csv/rollup_cube.sqlite3, where
+analyze_collections reads its grouping from.
+
+Dimensions:
+  bu            custom_label_0 of the parent
+  parent_id     item_group_id
+  finish        color ("Unknown" if empty)
+  product_type  product_type of the parent
+  collection    the title before "Collection", if the title has one
+
+A parent's bu and product_type are those of its first row in the mapping, as
+in finalize_rollup, so every SKU of a parent lands in the same bu and
+product_type cell even if the mapping disagrees between its variants.
+
+The performance rows are first summed into base cells (one per distinct
+combination of all dimensions). Every grouping set is then rolled up from
+the base cells instead of the raw rows. Questions about a combination of
+dimensions that is not a precomputed grouping set are answered from the
+base cells too.
+
+The cube is only rebuilt when the content of either input CSV changed.
+
+Usage:
+    python saved_code/rollup_cube.py                       # build if stale
+    python saved_code/rollup_cube.py --query bu=Faucets parent_id=12345 finish="Matte Black"
+    python saved_code/rollup_cube.py --query bu=Faucets --by finish
+"""
+
+import argparse
+import csv
+import os
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+
+from product_mapping_store import ProductMappingStore, file_sha256, normalize_item_id
+
+DEFAULT_PERFORMANCE_PATH = "saved_csv/product_performance_last30.csv"
+DEFAULT_MAPPING_PATH = "saved_csv/merchant_center_product_mapping.csv"
+DEFAULT_CUBE_PATH = "saved_csv/rollup_cube.sqlite3"
+
+# 2: bu and product_type are attributed per parent.
+CUBE_FORMAT_VERSION = 2
+
+DIMENSIONS = ("bu", "parent_id", "finish", "product_type", "collection")
+MEASURES = ("cost", "revenue", "clicks", "conversions", "impressions", "skus")
+
+# Grouping sets computed up front. The bu > parent_id > finish hierarchy
+# carries its subtotals, like GROUP BY ROLLUP (bu, parent_id, finish).
+GROUPING_SETS = {
+    "total": (),
+    "bu": ("bu",),
+    "bu_parent": ("bu", "parent_id"),
+    "bu_parent_finish": ("bu", "parent_id", "finish"),
+    "finish": ("finish",),
+    "parent": ("parent_id",),
+    "parent_finish": ("parent_id", "finish"),
+    "product_type": ("product_type",),
+    "bu_product_type": ("bu", "product_type"),
+    "collection": ("collection",),
+}
+BASE_SET = "base"
+
+
+def _collection(title):
+    if "Collection" in title:
+        return title.split("Collection")[0].strip()
+    return None
+
+
+def _sku_dimensions(product, parent):
+    return (
+        parent["custom_label_0"],
+        product["item_group_id"],
+        product["color"] or "Unknown",
+        parent["product_type"],
+        _collection(product["title"]),
+    )
+
+
+def parent_attributes(mapping):
+    """Returns {parent_id: bu and product_type of its first mapping row}."""
+    parents = {}
+    for row in mapping.rows(["item_group_id", "custom_label_0", "product_type"]):
+        parents.setdefault(row["item_group_id"], row)
+    return parents
+
+
+def _read_performance(perf_path):
+    """Sums the performance CSV by lower-cased SKU in one pass."""
+    by_sku = defaultdict(lambda: [0.0, 0.0, 0, 0.0, 0])
+    with open(perf_path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            totals = by_sku[normalize_item_id(row["segments.product_item_id"])]
+            totals[0] += float(row["metrics.cost_micros"]) / 1000000.0
+            totals[1] += float(row["metrics.conversions_value"])
+            totals[2] += int(row["metrics.clicks"])
+            totals[3] += float(row["metrics.conversions"])
+            totals[4] += int(row.get("metrics.impressions") or 0)
+    return by_sku
+
+
+def _add(cell, measures):
+    for i, value in enumerate(measures):
+        cell[i] += value
+
+
+def aggregate(by_sku, products, parents):
+    """Aggregates per-SKU totals into base cells and every grouping set.
+
+    Args:
+        by_sku: {sku: [cost, revenue, clicks, conversions, impressions]}.
+        products: {sku: mapping row} for the SKUs in by_sku.
+        parents: {parent_id: row with custom_label_0 and product_type}, see
+            parent_attributes.
+
+    Returns:
+        ({grouping set: {dimension values: measures}}, parent titles,
+        unmapped cost)
+    """
+    base = defaultdict(lambda: [0.0, 0.0, 0, 0.0, 0, 0])
+    parent_titles = {}
+    unmapped_cost = 0.0
+    for sku, totals in by_sku.items():
+        product = products.get(sku)
+        if product is None:
+            unmapped_cost += totals[0]
+            continue
+        parent = parents[product["item_group_id"]]
+        _add(base[_sku_dimensions(product, parent)], totals + [1])
+        parent_titles.setdefault(
+            product["item_group_id"], product["title"].split(" - ")[0]
+        )
+
+    cells = {BASE_SET: dict(base)}
+    for name, dimensions in GROUPING_SETS.items():
+        positions = [DIMENSIONS.index(d) for d in dimensions]
+        rolled_up = defaultdict(lambda: [0.0, 0.0, 0, 0.0, 0, 0])
+        for key, measures in base.items():
+            sub_key = tuple(key[p] for p in positions)
+            if None in sub_key:
+                continue  # e.g. SKUs without a collection
+            _add(rolled_up[sub_key], measures)
+        cells[name] = dict(rolled_up)
+    return cells, parent_titles, unmapped_cost
+
+
+def _cube_is_current(cube_path, sources):
+    if not os.path.exists(cube_path):
+        return False
+    try:
+        connection = sqlite3.connect(f"file:{cube_path}?mode=ro", uri=True)
+        try:
+            meta = dict(connection.execute("SELECT key, value FROM meta"))
+        finally:
+            connection.close()
+    except sqlite3.DatabaseError:
+        return False
+    return all(meta.get(key) == value for key, value in sources.items())
+
+
+def build_cube(
+    perf_path=DEFAULT_PERFORMANCE_PATH,
+    mapping_path=DEFAULT_MAPPING_PATH,
+    cube_path=DEFAULT_CUBE_PATH,
+    rebuild=False,
+):
+    """Builds the cube file unless it is current for both input CSVs.
+
+    Returns:
+        True if the cube was (re)built.
+    """
+    sources = {
+        "format_version": str(CUBE_FORMAT_VERSION),
+        "performance_sha256": file_sha256(perf_path),
+        "mapping_sha256": file_sha256(mapping_path),
+    }
+    if not rebuild and _cube_is_current(cube_path, sources):
+        return False
+
+    by_sku = _read_performance(perf_path)
+    with ProductMappingStore(mapping_path) as mapping:
+        products = mapping.lookup(
+            ["item_group_id", "color", "title"],
+            by_sku,
+        )
+        parents = parent_attributes(mapping)
+    cells, parent_titles, unmapped_cost = aggregate(by_sku, products, parents)
+
+    directory = os.path.dirname(cube_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(tmp_path)
+        try:
+            connection.execute(
+                "CREATE TABLE cells (grouping_set TEXT NOT NULL, "
+                + ", ".join(f"{d} TEXT" for d in DIMENSIONS)
+                + ", cost REAL, revenue REAL, clicks INTEGER, conversions REAL, "
+                "impressions INTEGER, skus INTEGER)"
+            )
+            for name, grouping in cells.items():
+                dimensions = DIMENSIONS if name == BASE_SET else GROUPING_SETS[name]
+                columns = ", ".join(("grouping_set",) + tuple(dimensions) + MEASURES)
+                placeholders = ", ".join("?" * (1 + len(dimensions) + len(MEASURES)))
+                connection.executemany(
+                    f"INSERT INTO cells ({columns}) VALUES ({placeholders})",
+                    ([name, *key, *measures] for key, measures in grouping.items()),
+                )
+            connection.execute(
+                "CREATE INDEX cells_lookup ON cells (grouping_set, "
+                + ", ".join(DIMENSIONS)
+                + ")"
+            )
+            connection.execute(
+                "CREATE TABLE parents (parent_id TEXT PRIMARY KEY, parent_title TEXT)"
+            )
+            connection.executemany(
+                "INSERT INTO parents VALUES (?, ?)", parent_titles.items()
+            )
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            connection.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                list(sources.items())
+                + [
+                    ("performance_path", perf_path),
+                    ("mapping_path", mapping_path),
+                    ("unmapped_cost", repr(unmapped_cost)),
+                    ("built_at", time.strftime("%Y-%m-%dT%H:%M:%S")),
+                ],
+            )
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp_path, cube_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return True
+
+
+def _with_ratios(cell):
+    cell["roas"] = cell["revenue"] / cell["cost"] if cell["cost"] > 0 else 0
+    cell["avg_cpc"] = cell["cost"] / cell["clicks"] if cell["clicks"] > 0 else 0
+    return cell
+
+
+class RollupCube:
+    """Answers playbook questions from the saved cube cells.
+
+    Args:
+        path: the cube file written by build_cube.
+    """
+
+    def __init__(self, path=DEFAULT_CUBE_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No rollup cube at {path}; run rollup_cube.py first."
+            )
+        self.path = path
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.meta = dict(self._connection.execute("SELECT key, value FROM meta"))
+        self.unmapped_cost = float(self.meta["unmapped_cost"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def parent_title(self, parent_id):
+        row = self._connection.execute(
+            "SELECT parent_title FROM parents WHERE parent_id = ?", (parent_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def query(self, by=(), **filters):
+        """Returns the cells for the given filters, broken down by `by`.
+
+        Uses the precomputed grouping set with exactly these dimensions if
+        there is one, otherwise rolls the base cells up.
+
+        Args:
+            by: the dimensions to break the result down by.
+            **filters: dimension=value conditions, e.g. bu="Faucets".
+
+        Returns:
+            A list of dicts with the dimensions, measures, roas and avg_cpc,
+            sorted by revenue descending.
+
+        Raises:
+            ValueError: if a dimension name is unknown.
+        """
+        dimensions = tuple(d for d in DIMENSIONS if d in filters or d in by)
+        unknown = (set(filters) | set(by)) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown dimension(s): {', '.join(sorted(unknown))}")
+
+        grouping_set = next(
+            (name for name, dims in GROUPING_SETS.items() if dims == dimensions), None
+        )
+        conditions = [f"{d} = ?" for d in filters]
+        if grouping_set is None:
+            grouping_set = BASE_SET
+            conditions += [f"{d} IS NOT NULL" for d in dimensions]
+            measures = ", ".join(f"SUM({m})" for m in MEASURES)
+            group_by = f" GROUP BY {', '.join(dimensions)}" if dimensions else ""
+        else:
+            measures = ", ".join(MEASURES)
+            group_by = ""
+        select = ", ".join(dimensions + (measures,))
+        where = " AND ".join(["grouping_set = ?"] + conditions)
+        rows = self._connection.execute(
+            f"SELECT {select} FROM cells WHERE {where}{group_by}",
+            [grouping_set, *filters.values()],
+        )
+        cells = [_with_ratios(dict(zip(dimensions + MEASURES, row))) for row in rows]
+        cells = [cell for cell in cells if cell["skus"]]
+        cells.sort(key=lambda cell: cell["revenue"], reverse=True)
+        return cells
+
+    def get(self, **filters):
+        """Returns the single cell for dimension=value filters, or None."""
+        cells = self.query(**filters)
+        return cells[0] if cells else None
+
+
+def _parse_filter(text):
+    name, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Expected dimension=value, got {text!r}")
+    return name, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build or query the playbook rollup cube."
+    )
+    parser.add_argument("--performance", default=DEFAULT_PERFORMANCE_PATH)
+    parser.add_argument("--mapping", default=DEFAULT_MAPPING_PATH)
+    parser.add_argument("--cube", default=DEFAULT_CUBE_PATH)
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Rebuild even if current."
+    )
+    parser.add_argument(
+        "--query",
+        nargs="*",
+        type=_parse_filter,
+        metavar="DIMENSION=VALUE",
+        help=f"Answer from the cube. Dimensions: {', '.join(DIMENSIONS)}.",
+    )
+    parser.add_argument(
+        "--by", nargs="+", default=(), help="Break the answer down by these dimensions."
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="Rows to print for a breakdown."
+    )
+    args = parser.parse_args()
+
+    if args.query is None:
+        started = time.perf_counter()
+        built = build_cube(args.performance, args.mapping, args.cube, args.rebuild)
+        elapsed = time.perf_counter() - started
+        print(f"{'Built' if built else 'Up to date:'} {args.cube} ({elapsed:.2f}s)")
+    with RollupCube(args.cube) as cube:
+        cells = cube.query(tuple(args.by), **dict(args.query or []))
+        for cell in cells[: args.top]:
+            labels = " | ".join(f"{d}: {cell[d]}" for d in DIMENSIONS if d in cell)
+            print(
+                f"{labels or 'Total'} | Rev: ${cell['revenue']:.2f} | ROAS: {cell['roas']:.2f} "
+                f"| Cost: ${cell['cost']:.2f} | SKUs: {cell['skus']}"
+            )
+        if not cells:
+            print("No matching cells.")
+        print(f"Unmapped Spend (SKUs not in mapping): ${cube.unmapped_cost:.2f}")
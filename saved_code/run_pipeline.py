@@ -0,0 +1,449 @@
+"""Runs the saved_code analysis chain as a memoized DAG.
+
+The analyses are only connected by the CSV paths they read and write. This
+runner declares each stage's input and output files in STAGES and derives the
+dependencies from them: a stage depends on the stages that write its inputs.
+
+A stage is skipped when its script, the local modules it imports (e.g.
+product_mapping_store.py), the content hashes of its inputs, and its outputs
+are unchanged since its last successful run. So after a refresh only
+the stages downstream of a file whose content actually changed are re-run.
+Stages whose dependencies are done run in parallel, each script in its own
+process, from the repository root as when run by hand.
+
+Stages with no input files (the API extract) have nothing to compare. They
+run on every invocation unless --skip-sources is passed; the extract is
+incremental anyway, and the stages below it only re-run if the extracted CSV
+changed.
+
+The hashes and timings of the last successful run of each stage are kept in
+saved_csv/.pipeline_state.json.
+
+Usage:
+    python saved_code/run_pipeline.py                       # refresh everything
+    python saved_code/run_pipeline.py --skip-sources        # re-run offline stages only
+    python saved_code/run_pipeline.py --target calculate_reallocation
+    python saved_code/run_pipeline.py --dry-run             # show what would run
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import posixpath
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_PATH = "saved_csv/.pipeline_state.json"
+DEFAULT_JOBS = 4
+
+PERFORMANCE_CSV = "saved_csv/product_performance_last30.csv"
+MAPPING_CSV = "saved_csv/merchant_center_product_mapping.csv"
+
+Stage = namedtuple("Stage", "name script inputs outputs args", defaults=((),))
+
+STAGES = [
+    Stage(
+        "extract_product_performance",
+        "saved_code/extract_product_performance.py",
+        [],
+        [PERFORMANCE_CSV],
+    ),
+    Stage(
+        "analyze_parent_finish",
+        "saved_code/analyze_parent_finish.py",
+        [PERFORMANCE_CSV, MAPPING_CSV],
+        ["saved_csv/parent_finish_matrix.csv"],
+    ),
+    Stage(
+        "finalize_rollup",
+        "saved_code/finalize_rollup.py",
+        ["saved_csv/parent_finish_matrix.csv", MAPPING_CSV],
+        ["saved_csv/final_hierarchy_rollup.csv"],
+    ),
+    Stage(
+        "calculate_reallocation",
+        "saved_code/calculate_reallocation.py",
+        ["saved_csv/final_hierarchy_rollup.csv"],
+        ["saved_csv/budget_reallocation_recommendation.csv"],
+    ),
+    Stage(
+        "audit_price_availability",
+        "saved_code/audit_price_availability.py",
+        [
+            PERFORMANCE_CSV,
+            MAPPING_CSV,
+            "saved_csv/budget_reallocation_recommendation.csv",
+        ],
+        ["saved_csv/price_availability_audit.csv"],
+    ),
+    Stage(
+        "audit_url_integrity",
+        "saved_code/audit_url_integrity.py",
+        ["saved_csv/price_availability_audit.csv", MAPPING_CSV],
+        ["saved_csv/url_integrity_audit.csv"],
+    ),
+    Stage(
+        "deep_dive_redirects",
+        "saved_code/deep_dive_redirects.py",
+        ["saved_csv/url_integrity_audit.csv"],
+        ["saved_csv/redirect_deep_dive.csv"],
+    ),
+    # Independent branches off the extract.
+    Stage(
+        "analyze_attributes",
+        "saved_code/analyze_attributes.py",
+        [PERFORMANCE_CSV, MAPPING_CSV],
+        ["saved_csv/attribute_alpha_report.csv"],
+    ),
+    # rollup_cube.py leaves a cube that is current for its inputs untouched,
+    # which would read as a failed stage; the runner has already decided the
+    # stage is stale, so always rebuild.
+    Stage(
+        "rollup_cube",
+        "saved_code/rollup_cube.py",
+        [PERFORMANCE_CSV, MAPPING_CSV],
+        ["saved_csv/rollup_cube.sqlite3"],
+        ("--rebuild",),
+    ),
+    Stage(
+        "analyze_collections",
+        "saved_code/analyze_collections.py",
+        ["saved_csv/rollup_cube.sqlite3"],
+        ["saved_csv/collection_performance_audit.csv"],
+    ),
+]
+
+
+def upstream(stages):
+    """Returns {stage name: names of the stages that write its inputs}."""
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(
+                    f"{output} is written by both {producers[output]} and {stage.name}"
+                )
+            producers[output] = stage.name
+    return {
+        stage.name: {producers[i] for i in stage.inputs if i in producers}
+        - {stage.name}
+        for stage in stages
+    }
+
+
+def topological_order(stages):
+    """Returns the stage names with every stage after its dependencies."""
+    deps = upstream(stages)
+    order, visiting, done = [], set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through {name}")
+        visiting.add(name)
+        for dep in sorted(deps[name]):
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for stage in stages:
+        visit(stage.name)
+    return order
+
+
+def with_ancestors(stages, targets):
+    """Returns the target stages plus every stage they depend on."""
+    deps = upstream(stages)
+    unknown = set(targets) - set(deps)
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+    selected, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(deps[name])
+    return [stage for stage in stages if stage.name in selected]
+
+
+class FileHasher:
+    """SHA-256 of files, re-hashed only when their size or mtime changes."""
+
+    def __init__(self, root=ROOT):
+        self.root = root
+        self._cache = {}
+
+    def __call__(self, path):
+        full_path = os.path.join(self.root, path)
+        try:
+            stat = os.stat(full_path)
+        except FileNotFoundError:
+            return None
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        if key not in self._cache:
+            digest = hashlib.sha256()
+            with open(full_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            self._cache[key] = digest.hexdigest()
+        return self._cache[key]
+
+
+def load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def local_modules(script, root=ROOT):
+    """Returns the modules next to a script that it imports, recursively.
+
+    The saved_code scripts import their helpers (product_mapping_store,
+    gaql_cache, ...) as top-level modules from their own folder, so any
+    imported name with a .py file there is a local dependency. Imports are
+    read from the source, so helpers imported inside functions count too.
+    """
+    directory = posixpath.dirname(script)
+    found, pending = set(), [script]
+    while pending:
+        path = pending.pop()
+        try:
+            with open(os.path.join(root, path), encoding="utf-8") as f:
+                tree = ast.parse(f.read(), path)
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = posixpath.join(directory, name.split(".")[0] + ".py")
+                if (
+                    module != script
+                    and module not in found
+                    and os.path.isfile(os.path.join(root, module))
+                ):
+                    found.add(module)
+                    pending.append(module)
+    return sorted(found)
+
+
+def fingerprint(stage, hasher):
+    """Returns what a stage's results depend on: its code and input hashes."""
+    return {
+        "script": hasher(stage.script),
+        "modules": {
+            path: hasher(path) for path in local_modules(stage.script, hasher.root)
+        },
+        "args": list(stage.args),
+        "inputs": {path: hasher(path) for path in stage.inputs},
+    }
+
+
+def is_current(stage, hasher, previous):
+    """Returns True if a stage's last successful run is still valid."""
+    if not previous or not stage.inputs:
+        return False
+    if previous.get("fingerprint") != fingerprint(stage, hasher):
+        return False
+    return all(hasher(path) == previous["outputs"].get(path) for path in stage.outputs)
+
+
+def _mtime(root, path):
+    try:
+        return os.stat(os.path.join(root, path)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def run_stage(stage, root=ROOT):
+    """Runs a stage's script in a subprocess.
+
+    Returns:
+        (exit code, combined output, seconds)
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, stage.script, *stage.args],
+        cwd=root,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    return result.returncode, result.stdout, time.perf_counter() - started
+
+
+def run_pipeline(
+    stages=STAGES,
+    root=ROOT,
+    state_path=STATE_PATH,
+    jobs=DEFAULT_JOBS,
+    force=False,
+    skip_sources=False,
+    dry_run=False,
+    runner=run_stage,
+):
+    """Runs the stages that are out of date, in dependency order.
+
+    A stage fails if its script exits non-zero or does not (re)write all of
+    its outputs (several scripts print an error and return when an input is
+    missing, leaving the previous outputs behind). Stages downstream of a
+    failure are not run; other branches carry on.
+
+    Returns:
+        {stage name: (status, seconds)} with status one of "ran", "skipped",
+        "failed", "blocked" or, for a dry run, "would run" / "may run".
+    """
+    state_file = os.path.join(root, state_path)
+    state = load_state(state_file)
+    hasher = FileHasher(root)
+    deps = upstream(stages)
+    by_name = {stage.name: stage for stage in stages}
+    pending = topological_order(stages)
+    results = {}
+    running = {}
+    mtimes_before = {}
+
+    def ready(name):
+        return all(dep in results for dep in deps[name])
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for name in [n for n in pending if ready(n)]:
+                pending.remove(name)
+                stage = by_name[name]
+                dep_statuses = {results[dep][0] for dep in deps[name]}
+                if dep_statuses & {"failed", "blocked"}:
+                    results[name] = ("blocked", 0.0)
+                elif dry_run and dep_statuses & {"would run", "may run"}:
+                    # Depends on whether the upstream outputs change.
+                    results[name] = ("may run", 0.0)
+                elif not stage.inputs and skip_sources:
+                    results[name] = ("skipped", 0.0)
+                elif not force and is_current(stage, hasher, state.get(name)):
+                    results[name] = ("skipped", 0.0)
+                elif dry_run:
+                    results[name] = ("would run", 0.0)
+                else:
+                    print(f"▶ {name}")
+                    mtimes_before[name] = {
+                        path: _mtime(root, path) for path in stage.outputs
+                    }
+                    running[executor.submit(runner, stage, root)] = name
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                stage = by_name[name]
+                code, output, seconds = future.result()
+                for line in output.rstrip().splitlines():
+                    print(f"  [{name}] {line}")
+                missing = [
+                    path
+                    for path in stage.outputs
+                    if _mtime(root, path) in (None, mtimes_before[name][path])
+                ]
+                if code != 0 or missing:
+                    reason = (
+                        f"exit code {code}"
+                        if code
+                        else f"did not write {', '.join(missing)}"
+                    )
+                    print(f"✗ {name} failed ({reason}) after {seconds:.1f}s")
+                    results[name] = ("failed", seconds)
+                    continue
+                results[name] = ("ran", seconds)
+                state[name] = {
+                    "fingerprint": fingerprint(stage, hasher),
+                    "outputs": {path: hasher(path) for path in stage.outputs},
+                    "seconds": round(seconds, 3),
+                    "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                save_state(state_file, state)
+                print(f"✓ {name} ({seconds:.1f}s)")
+    return {name: results[name] for name in topological_order(stages)}
+
+
+def print_report(results, state):
+    print("\n--- PIPELINE SUMMARY ---")
+    for name, (status, seconds) in results.items():
+        if status == "skipped" and name in state:
+            detail = f"unchanged, last run {state[name]['finished_at']} took {state[name]['seconds']:.1f}s"
+        else:
+            detail = f"{seconds:.1f}s"
+        print(f"{name:<30} {status:<10} {detail}")
+    ran = sum(seconds for status, seconds in results.values() if status == "ran")
+    print(f"Stage time: {ran:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the saved_code analysis chain, skipping unchanged stages."
+    )
+    parser.add_argument(
+        "--target",
+        nargs="+",
+        help="Only run these stages and the stages they depend on.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Run every selected stage even if unchanged.",
+    )
+    parser.add_argument(
+        "--skip-sources",
+        action="store_true",
+        help="Do not run stages without input files (the API extract).",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=DEFAULT_JOBS, help="Stages run at the same time."
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Show which stages would run."
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="List the stages and their dependencies."
+    )
+    args = parser.parse_args()
+
+    stages = with_ancestors(STAGES, args.target) if args.target else STAGES
+    if args.list:
+        deps = upstream(stages)
+        for name in topological_order(stages):
+            print(f"{name:<30} <- {', '.join(sorted(deps[name])) or '(source)'}")
+        sys.exit(0)
+
+    started = time.perf_counter()
+    results = run_pipeline(
+        stages,
+        jobs=args.jobs,
+        force=args.force,
+        skip_sources=args.skip_sources,
+        dry_run=args.dry_run,
+    )
+    print_report(results, load_state(os.path.join(ROOT, STATE_PATH)))
+    print(f"Wall time: {time.perf_counter() - started:.1f}s")
+    sys.exit(1 if any(status == "failed" for status, _ in results.values()) else 0)
@@ -1,11 +1,12 @@
 from google.ads.googleads.client import GoogleAdsClient
+from quota_limiter import get_limited_service
 
 def main():
     client = GoogleAdsClient.load_from_storage()  # uses ~/google-ads.yaml
     with open("customer_id.txt", "r") as f:
         customer_id = f.read().strip().split(":")[1]
 
-    ga_service = client.get_service("GoogleAdsService")
+    ga_service = get_limited_service(client, "GoogleAdsService")
     query = """
         SELECT campaign.id, campaign.name, campaign.status
         FROM campaign
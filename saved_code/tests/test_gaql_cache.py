@@ -0,0 +1,128 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from google.ads.googleads.v22.services.types.google_ads_service import (
+    GoogleAdsRow,
+    SearchGoogleAdsStreamResponse,
+)
+
+from gaql_cache import CachedGoogleAdsService, cache_key, prune_cache
+
+QUERY = "SELECT campaign.id, campaign.name FROM campaign"
+
+
+def _batches(*campaign_ids):
+    batch = SearchGoogleAdsStreamResponse()
+    for campaign_id in campaign_ids:
+        row = GoogleAdsRow()
+        row.campaign.id = campaign_id
+        batch.results.append(row)
+    return [batch]
+
+
+def _campaign_ids(stream):
+    return [row.campaign.id for batch in stream for row in batch.results]
+
+
+class TestGaqlCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.service = MagicMock()
+        self.service.search_stream.side_effect = lambda **kwargs: iter(_batches(1, 2))
+
+    def _cache(self, **kwargs):
+        return CachedGoogleAdsService(
+            self.service,
+            SearchGoogleAdsStreamResponse,
+            "v22",
+            cache_dir=self.tmp.name,
+            **kwargs,
+        )
+
+    def _entries(self):
+        return sorted(os.listdir(self.tmp.name))
+
+    def test_miss_then_hit(self):
+        cache = self._cache()
+
+        self.assertEqual(_campaign_ids(cache.search_stream("123", QUERY)), [1, 2])
+        reordered = "select campaign.name,  campaign.id from campaign"
+        self.assertEqual(_campaign_ids(cache.search_stream("1-2-3", reordered)), [1, 2])
+
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+        self.service.search_stream.assert_called_once_with(
+            customer_id="123", query=QUERY
+        )
+
+    def test_expired_entry_is_a_miss(self):
+        cache = self._cache(ttl_overrides={"campaign": 0})
+
+        list(cache.search_stream("123", QUERY))
+        list(cache.search_stream("123", QUERY))
+
+        self.assertEqual((cache.misses, cache.hits), (2, 0))
+
+    def test_login_customer_id_is_part_of_the_key(self):
+        self.assertNotEqual(
+            cache_key("123", QUERY, "v22", "111"), cache_key("123", QUERY, "v22", "222")
+        )
+        self.assertEqual(
+            cache_key("123", QUERY, "v22", "111-0"),
+            cache_key("123", QUERY, "v22", "1110"),
+        )
+
+        list(self._cache(login_customer_id="111").search_stream("123", QUERY))
+        other_manager = self._cache(login_customer_id="222")
+        list(other_manager.search_stream("123", QUERY))
+
+        self.assertEqual(other_manager.misses, 1)
+        self.assertEqual(len(self._entries()), 2)
+
+    def test_corrupted_entry_is_replaced(self):
+        cache = self._cache()
+        list(cache.search_stream("123", QUERY))
+        (entry,) = self._entries()
+        path = os.path.join(self.tmp.name, entry)
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[: len(data) // 2])
+
+        self.assertEqual(_campaign_ids(cache.search_stream("123", QUERY)), [1, 2])
+        self.assertEqual((cache.misses, cache.hits), (2, 0))
+        self.assertEqual(_campaign_ids(cache.search_stream("123", QUERY)), [1, 2])
+        self.assertEqual(cache.hits, 1)
+
+    def test_abandoned_stream_leaves_no_entry(self):
+        cache = self._cache()
+
+        stream = cache.search_stream("123", QUERY)
+        next(stream)
+        self.assertEqual(len(self._entries()), 1)  # The temp file.
+        stream.close()
+
+        self.assertEqual(self._entries(), [])
+        list(cache.search_stream("123", QUERY))
+        self.assertEqual(cache.misses, 2)
+
+    def test_prune_removes_stale_temp_files(self):
+        stale = os.path.join(self.tmp.name, "left-by-a-killed-run.tmp")
+        open(stale, "wb").close()
+        an_hour_ago = time.time() - 60 * 60
+        os.utime(stale, (an_hour_ago, an_hour_ago))
+        list(self._cache().search_stream("123", QUERY))
+
+        self.assertEqual(prune_cache(self.tmp.name, max_age=60), 1)
+        self.assertEqual(len(self._entries()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import contextlib
+import csv
+import io
+import itertools
+import tempfile
+import unittest
+from pathlib import Path
+
+import merge_with_product_mapping
+from merge_with_product_mapping import (
+    build_mapping_index,
+    new_merge_stats,
+    rollup_by_dimension,
+    stream_merge,
+    write_csv_stream,
+)
+from product_mapping_store import ProductMappingStore
+
+METRICS = [
+    "metrics.cost_micros",
+    "metrics.clicks",
+    "metrics.impressions",
+    "metrics.conversions",
+    "metrics.conversions_value",
+]
+
+
+def _rows():
+    return [
+        {
+            "item_group_id": "P1",
+            "product_title": "Towel bar",
+            "metrics.cost_micros": "2000000",
+            "metrics.clicks": "4",
+            "metrics.impressions": "100",
+            "metrics.conversions": "1",
+            "metrics.conversions_value": "50",
+        },
+        {
+            "item_group_id": "P1",
+            "product_title": "Towel bar, brass",
+            "metrics.cost_micros": "1000000",
+            "metrics.clicks": "2",
+            "metrics.impressions": "50",
+            "metrics.conversions": "0",
+            "metrics.conversions_value": "10",
+        },
+        # No spend or traffic: every derived metric has a zero denominator.
+        {
+            "item_group_id": "P2",
+            "product_title": "Mirror",
+            "metrics.cost_micros": "0",
+            "metrics.clicks": "0",
+            "metrics.impressions": "0",
+            "metrics.conversions": "",
+            "metrics.conversions_value": "0",
+        },
+        # No numeric value for a metric at all.
+        {
+            "item_group_id": "P3",
+            "product_title": "Shelf",
+            "metrics.cost_micros": "n/a",
+            "metrics.clicks": "3",
+            "metrics.impressions": "30",
+            "metrics.conversions": "1",
+            "metrics.conversions_value": "5",
+        },
+        {"item_group_id": "None", "metrics.clicks": "7"},
+    ]
+
+
+def _rollup(use_numpy):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return rollup_by_dimension(_rows(), "item_group_id", METRICS, use_numpy)
+
+
+class TestRollupByDimension(unittest.TestCase):
+    def test_python_rollup_sums_and_derives_metrics(self):
+        rollup = _rollup(use_numpy=False)
+
+        self.assertEqual([row["item_group_id"] for row in rollup], ["P1", "P3", "P2"])
+        p1 = rollup[0]
+        self.assertEqual(p1["product_title"], "Towel bar")
+        self.assertEqual(p1["metrics.clicks"], 6.0)
+        self.assertEqual(p1["ROAS"], 20.0)
+        self.assertEqual(p1["avg_cpc"], 0.5)
+        self.assertEqual(rollup[2]["ROAS"], 0)
+
+    @unittest.skipIf(merge_with_product_mapping.np is None, "numpy is not installed")
+    def test_numpy_rollup_matches_python_rollup(self):
+        python_rollup = _rollup(use_numpy=False)
+        numpy_rollup = _rollup(use_numpy=True)
+
+        self.assertEqual(numpy_rollup, python_rollup)
+        for numpy_row, python_row in zip(numpy_rollup, python_rollup):
+            self.assertEqual(list(numpy_row), list(python_row))
+            self.assertEqual(
+                [type(value) for value in numpy_row.values()],
+                [type(value) for value in python_row.values()],
+            )
+
+
+MAPPING = [
+    {"item_id": "SKU-1", "item_group_id": "P1", "title": "Towel bar"},
+    {"item_id": "SKU-2", "item_group_id": "P2", "title": "Mirror"},
+]
+
+
+class TestStreamMerge(unittest.TestCase):
+    def test_joins_on_normalized_item_id_and_keeps_unmatched_rows(self):
+        performance = [
+            {"segments.product_item_id": "sku-1", "metrics.clicks": "3"},
+            {"segments.product_item_id": "SKU-9", "metrics.clicks": "1"},
+            {"segments.product_item_id": "", "metrics.clicks": "2"},
+        ]
+        stats = new_merge_stats()
+
+        merged = list(
+            stream_merge(performance, build_mapping_index(MAPPING), stats=stats)
+        )
+
+        self.assertEqual(
+            merged,
+            [
+                {
+                    "segments.product_item_id": "sku-1",
+                    "metrics.clicks": "3",
+                    "item_id": "SKU-1",
+                    "item_group_id": "P1",
+                    "title": "Towel bar",
+                },
+                {
+                    "segments.product_item_id": "SKU-9",
+                    "metrics.clicks": "1",
+                    "item_group_id": None,
+                },
+            ],
+        )
+        self.assertEqual(stats, {"rows": 3, "matched": 1, "unmatched": 2})
+
+    def test_rows_are_joined_as_they_are_read(self):
+        performance = (
+            {"segments.product_item_id": "SKU-1", "metrics.clicks": str(i)}
+            for i in itertools.count()
+        )
+
+        merged = stream_merge(performance, build_mapping_index(MAPPING))
+
+        self.assertEqual(
+            [row["metrics.clicks"] for row in itertools.islice(merged, 3)],
+            ["0", "1", "2"],
+        )
+
+    def test_store_index_only_reads_requested_items(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = Path(tmp) / "mapping.csv"
+            with open(csv_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(MAPPING[0]))
+                writer.writeheader()
+                writer.writerows(MAPPING)
+
+            with ProductMappingStore(csv_path) as store:
+                index = build_mapping_index(store, ["SKU-2", "SKU-9"])
+
+        self.assertEqual(
+            index,
+            {"sku-2": {"item_id": "SKU-2", "item_group_id": "P2", "title": "Mirror"}},
+        )
+
+    def test_write_csv_stream_leaves_missing_columns_empty(self):
+        rows = iter([{"a": "1", "b": "2"}, {"a": "3"}])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "out" / "merged.csv"
+            with contextlib.redirect_stdout(io.StringIO()):
+                count = write_csv_stream(rows, path, ["a", "b"])
+            self.assertEqual(path.read_text(), "a,b\n1,2\n3,\n")
+
+        self.assertEqual(count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import re
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from google.ads.googleads.v22.services.types.google_ads_service import (
+    GoogleAdsRow,
+    SearchGoogleAdsStreamResponse,
+)
+
+from performance_store import PerformanceStore
+
+FIELDS = [
+    "campaign.id",
+    "campaign.name",
+    "segments.product_item_id",
+    "segments.product_title",
+    "metrics.clicks",
+    "metrics.cost_micros",
+]
+
+
+class _FakeService:
+    """Serves {day: [(campaign id, name, item id, title, clicks, cost)]}."""
+
+    def __init__(self, days):
+        self.days = days
+        self.queries = []
+
+    def search_stream(self, customer_id, query):
+        self.queries.append(query)
+        first, last = re.search(r"BETWEEN '(.+?)' AND '(.+?)'", query).groups()
+        batch = SearchGoogleAdsStreamResponse()
+        for day, rows in sorted(self.days.items()):
+            if first <= day.isoformat() <= last:
+                for campaign_id, name, item_id, title, clicks, cost in rows:
+                    row = GoogleAdsRow()
+                    row.campaign.id = campaign_id
+                    row.campaign.name = name
+                    row.segments.date = day.isoformat()
+                    row.segments.product_item_id = item_id
+                    row.segments.product_title = title
+                    row.metrics.clicks = clicks
+                    row.metrics.cost_micros = cost
+                    batch.results.append(row)
+        return [batch]
+
+
+class TestPerformanceStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = PerformanceStore(
+            "123-456", "shopping_performance_view", FIELDS, root=self.tmp.name
+        )
+
+    def _reopen(self):
+        return PerformanceStore(
+            "123456", "shopping_performance_view", FIELDS, root=self.tmp.name
+        )
+
+    def test_sync_fetches_each_missing_run_once(self):
+        service = _FakeService({date(2025, 6, 2): [(1, "Brass", "sku1", "Bar", 3, 10)]})
+
+        fetched = self.store.sync(
+            service, date(2025, 6, 1), date(2025, 6, 3), today=date(2025, 6, 20)
+        )
+
+        self.assertEqual(len(fetched), 3)
+        self.assertEqual(len(service.queries), 1)
+        # Days without rows still get a partition.
+        self.assertEqual(
+            self._reopen().days_to_fetch(date(2025, 6, 1), date(2025, 6, 3)), []
+        )
+        self.assertEqual(
+            len(list(self.store.read_days(date(2025, 6, 1), date(2025, 6, 3)))), 1
+        )
+
+    def test_unsettled_partition_is_restated(self):
+        day = date(2025, 6, 10)
+        service = _FakeService({day: [(1, "Brass", "sku1", "Bar", 3, 10)]})
+        self.store.sync(service, day, day, restatement_days=3, today=date(2025, 6, 11))
+        # Fetched the day after: conversions are still being attributed to it.
+        self.store.index[day.isoformat()] = datetime(2025, 6, 11).isoformat()
+        service.days[day] = [(1, "Brass", "sku1", "Bar", 5, 15)]
+
+        # Not fetched twice on the same day.
+        self.assertEqual(
+            self.store.days_to_fetch(
+                day, day, restatement_days=3, today=date(2025, 6, 11)
+            ),
+            [],
+        )
+        self.assertEqual(
+            self.store.sync(
+                service, day, day, restatement_days=3, today=date(2025, 6, 12)
+            ),
+            [day],
+        )
+
+        (row,) = self.store.read_days(day, day)
+        self.assertEqual(
+            (row["metrics.clicks"], row["metrics.cost_micros"]), ("5", "15")
+        )
+        # Fetched once settled: never fetched again.
+        self.store.index[day.isoformat()] = datetime(2025, 6, 13).isoformat()
+        self.assertEqual(
+            self.store.days_to_fetch(
+                day, day, restatement_days=3, today=date(2025, 6, 30)
+            ),
+            [],
+        )
+
+    def test_rolling_window_groups_by_ids_and_keeps_latest_names(self):
+        service = _FakeService(
+            {
+                date(2025, 6, 1): [
+                    (1, "Brass", "sku1", "Towel Bar", 1, 100),
+                    (1, "Brass", "sku2", "Hook", 2, 200),
+                ],
+                date(2025, 6, 2): [
+                    (1, "Brass - Shopping", "sku1", "Towel Bar 24in", 3, 300)
+                ],
+                date(2025, 6, 3): [(2, "Mirrors", "sku1", "Towel Bar 24in", 4, 400)],
+            }
+        )
+        self.store.sync(
+            service, date(2025, 6, 1), date(2025, 6, 3), today=date(2025, 6, 20)
+        )
+
+        rows = self.store.rolling_window(date(2025, 6, 3), 3)
+
+        self.assertEqual(
+            sorted(
+                rows, key=lambda r: (r["campaign.id"], r["segments.product_item_id"])
+            ),
+            [
+                {
+                    "campaign.id": "1",
+                    "campaign.name": "Brass - Shopping",
+                    "segments.product_item_id": "sku1",
+                    "segments.product_title": "Towel Bar 24in",
+                    "metrics.clicks": 4,
+                    "metrics.cost_micros": 400,
+                },
+                {
+                    "campaign.id": "1",
+                    "campaign.name": "Brass",
+                    "segments.product_item_id": "sku2",
+                    "segments.product_title": "Hook",
+                    "metrics.clicks": 2,
+                    "metrics.cost_micros": 200,
+                },
+                {
+                    "campaign.id": "2",
+                    "campaign.name": "Mirrors",
+                    "segments.product_item_id": "sku1",
+                    "segments.product_title": "Towel Bar 24in",
+                    "metrics.clicks": 4,
+                    "metrics.cost_micros": 400,
+                },
+            ],
+        )
+        self.assertEqual(len(self.store.rolling_window(date(2025, 6, 3), 1)), 1)
+
+    def test_rolling_window_requires_synced_days(self):
+        with self.assertRaises(FileNotFoundError):
+            self.store.rolling_window(date(2025, 6, 3), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
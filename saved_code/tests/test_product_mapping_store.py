@@ -0,0 +1,106 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import csv
+import sqlite3
+import tempfile
+import unittest
+
+from product_mapping_store import ProductMappingStore, ensure_store
+
+COLUMNS = ["item_id", "item_group_id", "product_type"]
+
+
+class TestProductMappingStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.csv_path = os.path.join(self.tmp.name, "mapping.csv")
+
+    def _write_csv(self, rows):
+        with open(self.csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+
+    def test_round_trip(self):
+        self._write_csv(
+            [
+                ["SKU-2", "P1", "Bath"],
+                ["SKU-1", "P1", "Bath"],
+                ["", "P9", "Skipped"],
+                ["SKU-3", "P2"],
+            ]
+        )
+
+        with ProductMappingStore(self.csv_path) as store:
+            self.assertTrue(store.rebuilt)
+            self.assertEqual(len(store), 3)
+            self.assertEqual(store.columns, COLUMNS)
+            self.assertIn("sku-1", store)
+            self.assertEqual(
+                store.get("sku-2"),
+                {"item_id": "SKU-2", "item_group_id": "P1", "product_type": "Bath"},
+            )
+            self.assertEqual(store.get("SKU-3", ["product_type"]), {"product_type": ""})
+            self.assertIsNone(store.get("SKU-9"))
+            self.assertEqual(
+                [row["item_id"] for row in store.rows()], ["SKU-2", "SKU-1", "SKU-3"]
+            )
+            self.assertEqual(
+                store.lookup(["item_group_id"], ["SKU-1", "sku-9"]),
+                {"sku-1": {"item_group_id": "P1"}},
+            )
+
+        with ProductMappingStore(self.csv_path) as store:
+            self.assertFalse(store.rebuilt)
+
+    def test_duplicate_item_id_keeps_last_row_in_first_position(self):
+        self._write_csv(
+            [
+                ["SKU-1", "P1", "Old"],
+                ["SKU-2", "P2", "Mirror"],
+                ["sku-1", "P1", "New"],
+            ]
+        )
+
+        with ProductMappingStore(self.csv_path) as store:
+            self.assertEqual(len(store), 2)
+            self.assertEqual(
+                [(row["item_id"], row["product_type"]) for row in store.rows()],
+                [("sku-1", "New"), ("SKU-2", "Mirror")],
+            )
+
+    def test_changed_csv_rebuilds_the_store(self):
+        self._write_csv([["SKU-1", "P1", "Bath"]])
+        ensure_store(self.csv_path)
+        self._write_csv([["SKU-1", "P1", "Kitchen"]])
+
+        with ProductMappingStore(self.csv_path) as store:
+            self.assertTrue(store.rebuilt)
+            self.assertEqual(store.get("SKU-1")["product_type"], "Kitchen")
+
+    def test_touched_csv_does_not_wait_for_readers(self):
+        self._write_csv([["SKU-1", "P1", "Bath"]])
+        store_path, _ = ensure_store(self.csv_path)
+        stat = os.stat(self.csv_path)
+        os.utime(self.csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        # Another stage in the middle of reading the store.
+        reader = sqlite3.connect(store_path, isolation_level=None)
+        self.addCleanup(reader.close)
+        reader.execute("BEGIN")
+        reader.execute("SELECT * FROM products").fetchone()
+
+        self.assertEqual(ensure_store(self.csv_path), (store_path, False))
+
+        reader.execute("COMMIT")
+        self.assertEqual(ensure_store(self.csv_path), (store_path, False))
+        meta = dict(reader.execute("SELECT key, value FROM meta"))
+        self.assertEqual(meta["source_mtime_ns"], str(stat.st_mtime_ns + 10**9))
+
+
+if __name__ == "__main__":
+    unittest.main()
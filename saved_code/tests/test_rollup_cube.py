@@ -0,0 +1,116 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import contextlib
+import csv
+import io
+import tempfile
+import unittest
+
+import analyze_collections
+import analyze_parent_finish
+import finalize_rollup
+from rollup_cube import DEFAULT_CUBE_PATH, RollupCube, build_cube
+
+MAPPING = [
+    ["item_id", "item_group_id", "custom_label_0", "product_type", "color", "title"],
+    # P1's variants disagree on bu and product_type; the first row counts.
+    ["SKU-1", "P1", "Faucets", "Bath > Faucets", "Chrome", "Nova Collection Faucet"],
+    ["SKU-2", "P1", "Sinks", "Kitchen", "Matte Black", "Nova Collection Faucet"],
+    ["SKU-3", "P2", "Sinks", "Kitchen", "", "Farmhouse Sink - 30 in"],
+    ["SKU-4", "P3", "Faucets", "Bath > Faucets", "Chrome", "Tala Collection Tap"],
+]
+
+PERFORMANCE = [
+    ["segments.product_item_id", "metrics.cost_micros", "metrics.conversions_value"]
+    + ["metrics.clicks", "metrics.conversions", "metrics.impressions"],
+    ["SKU-1", "10000000", "55.25", "8", "1", "100"],
+    ["sku-2", "2500000", "20.50", "3", "1", "40"],
+    ["SKU-2", "1250000", "0", "1", "0", "10"],
+    ["SKU-3", "4000000", "0", "2", "0", "30"],
+    ["SKU-4", "3750000", "12.75", "5", "1", "60"],
+    ["SKU-9", "1000000", "0", "1", "0", "5"],
+]
+
+
+class TestRollupCube(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        os.mkdir("saved_csv")
+        self._write_csv("saved_csv/merchant_center_product_mapping.csv", MAPPING)
+        self._write_csv("saved_csv/product_performance_last30.csv", PERFORMANCE)
+        build_cube()
+
+    def _write_csv(self, path, rows):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
+
+    def _read_csv(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    def _cube_totals(self, dimension):
+        with RollupCube(DEFAULT_CUBE_PATH) as cube:
+            return {
+                cell[dimension]: (
+                    round(cell["revenue"], 2),
+                    round(cell["cost"], 2),
+                    cell["clicks"],
+                )
+                for cell in cube.query(by=(dimension,))
+            }
+
+    def test_bu_and_product_type_cells_match_finalize_rollup(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyze_parent_finish.main()
+            finalize_rollup.main()
+        rollup = self._read_csv("saved_csv/final_hierarchy_rollup.csv")
+
+        for dimension, label in (
+            ("bu", "Business Unit"),
+            ("product_type", "Product Type"),
+        ):
+            expected = {
+                row["name"]: (
+                    float(row["revenue"]),
+                    float(row["cost"]),
+                    int(row["clicks"]),
+                )
+                for row in rollup
+                if row["dimension"] == label
+            }
+            self.assertEqual(self._cube_totals(dimension), expected)
+        self.assertEqual(
+            self._cube_totals("bu"),
+            {"Faucets": (88.5, 17.5, 17), "Sinks": (0.0, 4.0, 2)},
+        )
+
+    def test_cube_tracks_unmapped_cost_and_finish(self):
+        with RollupCube(DEFAULT_CUBE_PATH) as cube:
+            self.assertEqual(cube.unmapped_cost, 1.0)
+            self.assertEqual(cube.get(finish="Unknown")["skus"], 1)
+            self.assertEqual(cube.get(bu="Faucets", parent_id="P1")["skus"], 2)
+            self.assertEqual(cube.parent_title("P2"), "Farmhouse Sink")
+
+    def test_analyze_collections_reads_the_collection_cells(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyze_collections.main()
+        report = self._read_csv("saved_csv/collection_performance_audit.csv")
+
+        self.assertEqual(
+            [
+                (row["name"], float(row["revenue"]), float(row["cost"]))
+                for row in report
+            ],
+            [("Nova", 75.75, 13.75), ("Tala", 12.75, 3.75)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
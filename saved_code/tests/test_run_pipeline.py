@@ -0,0 +1,108 @@
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import contextlib
+import io
+import tempfile
+import unittest
+
+from run_pipeline import Stage, local_modules, run_pipeline, run_stage
+
+UPPER_SCRIPT = """from text_helpers import shout
+
+with open("data/in.csv") as f:
+    text = f.read()
+with open("data/upper.csv", "w") as f:
+    f.write(shout(text))
+"""
+
+HELPERS = """def shout(text):
+    return text.upper()
+"""
+
+COUNT_SCRIPT = """with open("data/upper.csv") as f:
+    text = f.read()
+with open("data/count.csv", "w") as f:
+    f.write(str(len(text)))
+"""
+
+STAGES = [
+    Stage("upper", "scripts/upper.py", ["data/in.csv"], ["data/upper.csv"]),
+    Stage("count", "scripts/count.py", ["data/upper.csv"], ["data/count.csv"]),
+]
+
+
+class TestRunPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = self.tmp.name
+        os.mkdir(os.path.join(self.root, "scripts"))
+        os.mkdir(os.path.join(self.root, "data"))
+        self._write("scripts/upper.py", UPPER_SCRIPT)
+        self._write("scripts/text_helpers.py", HELPERS)
+        self._write("scripts/count.py", COUNT_SCRIPT)
+        self._write("data/in.csv", "a,b\n")
+        self.ran = []
+
+    def _write(self, path, content):
+        with open(os.path.join(self.root, path), "w") as f:
+            f.write(content)
+
+    def _run(self):
+        def runner(stage, root):
+            self.ran.append(stage.name)
+            return run_stage(stage, root)
+
+        self.ran = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_pipeline(
+                STAGES, root=self.root, state_path="data/state.json", runner=runner
+            )
+        return {name: status for name, (status, _) in results.items()}
+
+    def test_local_modules_finds_imported_helpers(self):
+        self.assertEqual(
+            local_modules("scripts/upper.py", self.root), ["scripts/text_helpers.py"]
+        )
+        self.assertEqual(local_modules("scripts/count.py", self.root), [])
+
+    def test_rerun_skips_unchanged_stages(self):
+        self.assertEqual(self._run(), {"upper": "ran", "count": "ran"})
+        self.assertEqual(self._run(), {"upper": "skipped", "count": "skipped"})
+        self.assertEqual(self.ran, [])
+
+    def test_changed_input_reruns_downstream_stages(self):
+        self._run()
+        self._write("data/in.csv", "a,b,c\n")
+
+        self.assertEqual(self._run(), {"upper": "ran", "count": "ran"})
+
+    def test_unchanged_output_does_not_rerun_downstream_stages(self):
+        self._run()
+        # Same upper-cased output, so count.py has nothing new to read.
+        self._write("data/in.csv", "A,B\n")
+
+        self.assertEqual(self._run(), {"upper": "ran", "count": "skipped"})
+
+    def test_changed_helper_module_reruns_its_stage(self):
+        self._run()
+        self._write(
+            "scripts/text_helpers.py",
+            HELPERS.replace("text.upper()", "text.upper() * 2"),
+        )
+
+        self.assertEqual(self._run(), {"upper": "ran", "count": "ran"})
+        with open(os.path.join(self.root, "data/upper.csv")) as f:
+            self.assertEqual(f.read(), "A,B\nA,B\n")
+
+    def test_failed_stage_blocks_downstream_stages(self):
+        self._write("scripts/upper.py", "raise SystemExit(3)\n")
+
+        self.assertEqual(self._run(), {"upper": "failed", "count": "blocked"})
+
+
+if __name__ == "__main__":
+    unittest.main()